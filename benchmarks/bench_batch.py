@@ -0,0 +1,46 @@
+""" Compare a serial get_tm_info loop with MemoqTm.get_tm_info_many against a stub server with artificial latency.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch --guids 300 --latency 0.02 --workers 4 8 16 32
+"""
+import argparse
+import time
+
+from src import memoq_soap as mq
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, soap_response
+
+
+def responder(path, soap_action, body):
+    return 200, soap_response('GetTMInfo', '<Guid>00000000-0000-0000-0000-000000000000</Guid><Name>bench</Name>')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--guids', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.02, help='server latency per call, in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    guids = [f'guid-{i}' for i in range(args.guids)]
+
+    with StubSoapServer(responder=responder, latency=args.latency) as server:
+        with mq.MemoqSoap(server.url, "bench_key") as soap:
+            tm = MemoqTm(soap)
+            start = time.perf_counter()
+            for guid in guids:
+                tm.get_tm_info(guid)
+            serial = len(guids) / (time.perf_counter() - start)
+
+        batches = {}
+        for workers in args.workers:
+            with mq.MemoqSoap(server.url, "bench_key", pool_maxsize=workers) as soap:
+                batches[workers] = MemoqTm(soap).get_tm_info_many(guids, max_workers=workers)
+
+    print(f'{"serial":>12}: {serial:10.1f} calls/s')
+    for workers, batch in batches.items():
+        print(f'{f"{workers} workers":>12}: {batch.calls_per_second:10.1f} calls/s  ({batch.failed} failed)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+""" Entries per second of TM writes against the local stub: one add_or_update_entry call at a time, the batched
+add_or_update_entries with several worker counts, and the TMX import fallback.
+
+The stub adds a fixed latency per call to stand in for the server's processing and network round trip.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_write --entries 5000 --latency 0.002
+    python -m benchmarks.bench_bulk_write --entries 200000 --modes tmx
+"""
+import argparse
+import time
+
+from src import memoq_soap as mq
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, TmxImportResponder, soap_response
+
+
+def entry_responder(path, soap_action, body):
+    return 200, soap_response('AddOrUpdateEntry', None)
+
+
+def entries(count: int):
+    return ((f'Segment {i}: the quick brown fox jumps over the lazy dog.',
+             f'Segment {i}: der schnelle braune Fuchs springt über den faulen Hund.') for i in range(count))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 16])
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--modes', nargs='+', default=['single', 'bulk', 'tmx'], choices=['single', 'bulk', 'tmx'])
+    args = parser.parse_args()
+
+    if 'single' in args.modes:
+        with StubSoapServer(responder=entry_responder, latency=args.latency) as server, \
+                mq.MemoqSoap(server.url, "bench_key") as soap:
+            tm_client = MemoqTm(soap)
+            start = time.perf_counter()
+            for source, target in entries(args.entries):
+                tm_client.add_or_update_entry(source, target, 'bench-tm')
+            elapsed = time.perf_counter() - start
+        print(f'{"single calls":>22}: {args.entries / elapsed:9.0f} entries/s')
+
+    if 'bulk' in args.modes:
+        for workers in args.workers:
+            with StubSoapServer(responder=entry_responder, latency=args.latency) as server, \
+                    mq.MemoqSoap(server.url, "bench_key", pool_maxsize=workers) as soap:
+                result = MemoqTm(soap).add_or_update_entries('bench-tm', entries(args.entries), tmx_threshold=None,
+                                                             batch_size=args.batch_size, max_workers=workers)
+            print(f'{f"bulk, {workers} workers":>22}: {result.entries_per_second:9.0f} entries/s')
+
+    if 'tmx' in args.modes:
+        with StubSoapServer(responder=TmxImportResponder(), latency=args.latency) as server, \
+                mq.MemoqSoap(server.url, "bench_key") as soap:
+            result = MemoqTm(soap).add_or_update_entries('bench-tm', entries(args.entries), tmx_threshold=1,
+                                                         source_lang='eng', target_lang='ger')
+        print(f'{"TMX import":>22}: {result.entries_per_second:9.0f} entries/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+""" Crawl projects and their documents from the fake memoQ server: the serial inventory (list_projects, then
+list_project_translation_documents2 per project) against ProjectCrawler at several concurrencies.
+
+Each run writes NDJSON to a temporary file and runs in its own subprocess, so the peak RSS readings do not mix.
+
+Run from the repository root:
+    python -m benchmarks.bench_crawler --projects 5000 --latency 0.005
+    python -m benchmarks.bench_crawler --projects 20000 --latency 0 --workers 1 4 16
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import memoq_soap as mq
+from src.memoq_crawler import ProjectCrawler
+from src.memoq_projects import MemoqProjects
+from tests.fake_memoq import FakeMemoqServer
+
+
+def run(workers: int, projects: int, documents: int, latency: float) -> None:
+    with FakeMemoqServer(projects=projects, documents_per_project=documents, name_length=80,
+                         latency={'ListProjectTranslationDocuments2': latency}) as server, \
+            mq.MemoqSoap(server.url, "bench_key", pool_maxsize=max(workers, 1) + 1) as soap, \
+            tempfile.TemporaryDirectory() as directory:
+        project_client = MemoqProjects(soap)
+        path = os.path.join(directory, 'crawl.ndjson')
+        start = time.perf_counter()
+        if workers == 0:
+            with open(path, 'w', encoding='utf-8') as out:
+                for project in project_client.list_projects()[1]:
+                    guid = project['ServerProjectGuid']
+                    documents = project_client.list_project_translation_documents2(guid)[1]
+                    out.write(json.dumps({'guid': guid, 'project': project, 'documents': documents}) + '\n')
+        else:
+            ProjectCrawler(project_client, max_workers=workers).crawl_to(path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    mode = 'serial' if workers == 0 else f'{workers} workers'
+    print(f'{mode:>11}: {projects} projects in {elapsed:6.2f}s ({projects / elapsed:7.0f}/s), '
+          f'{size / 1e6:6.1f} MB written, peak RSS {peak_mb:6.1f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=5000)
+    parser.add_argument('--documents', type=int, default=10, help='documents per project')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds per document listing')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 4, 16, 32],
+                        help='crawler concurrencies to run; 0 is the serial inventory')
+    parser.add_argument('--run', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        run(args.run, args.projects, args.documents, args.latency)
+        return
+    for workers in args.workers:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_crawler', '--run', str(workers),
+                        '--projects', str(args.projects), '--documents', str(args.documents),
+                        '--latency', str(args.latency)], check=True)
+
+
+if __name__ == "__main__":
+    main()
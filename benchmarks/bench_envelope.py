@@ -0,0 +1,66 @@
+""" Envelopes per second: the original string-concatenation builder against EnvelopeBuilder.
+
+Covers a small call (GetTMInfo) and a large one (a batch of TM entries).
+
+Run from the repository root:
+    python -m benchmarks.bench_envelope --entries 1000
+"""
+import argparse
+import time
+from xml.sax.saxutils import escape
+
+from src import memoq_soap as mq
+from src.memoq_envelope import EnvelopeBuilder
+
+
+def legacy_build(soap: mq.MemoqSoap, action: str, **kwargs) -> bytes:
+    """ The pre-EnvelopeBuilder implementation of make_soap_request's payload building. """
+    payload_body = f'<{action} xmlns="{soap._namespace}">'
+    for key, value in kwargs.items():
+        payload_body += f'<{key}>{value}</{key}>'
+    payload_body += f'</{action}>'
+    return soap.generate_payload(soap._payload_template, payload_body).encode('utf-8')
+
+
+def rate(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return repeat / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--small', type=int, default=100000, help='number of small envelopes')
+    parser.add_argument('--large', type=int, default=200, help='number of large envelopes')
+    parser.add_argument('--entries', type=int, default=1000, help='TM entries per large envelope')
+    args = parser.parse_args()
+
+    soap = mq.MemoqSoap("http://bench", "bench_key")
+    builder = EnvelopeBuilder(soap._namespace, "bench_key")
+
+    guid = '3353ec0e-5a99-488b-bc78-0005003e2b02'
+    entries = [{'TMEntry': {'SourceSegment': f'Segment {i} with some typical sentence length text.',
+                            'TargetSegment': f'Segment {i} mit einer typischen Satzlänge & Text.'}}
+               for i in range(args.entries)]
+
+    def legacy_large() -> bytes:
+        # The legacy builder cannot serialize nested values or escape them, so the caller has to.
+        entries_markup = ''.join(f'<TMEntry><SourceSegment>{escape(e["TMEntry"]["SourceSegment"])}</SourceSegment>'
+                                 f'<TargetSegment>{escape(e["TMEntry"]["TargetSegment"])}</TargetSegment></TMEntry>'
+                                 for e in entries)
+        return legacy_build(soap, 'AddOrUpdateEntries', tmGuid=guid, entries=entries_markup)
+
+    cases = (
+        ('small legacy', lambda: legacy_build(soap, 'GetTMInfo', tmGuid=guid), args.small),
+        ('small builder', lambda: builder.build('GetTMInfo', {'tmGuid': guid}), args.small),
+        ('large legacy', legacy_large, args.large),
+        ('large builder', lambda: builder.build('AddOrUpdateEntries', {'tmGuid': guid, 'entries': entries}),
+         args.large),
+    )
+    for name, func, repeat in cases:
+        print(f'{name:>14}: {rate(func, repeat):12.1f} envelopes/s')
+
+
+if __name__ == "__main__":
+    main()
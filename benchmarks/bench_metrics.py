@@ -0,0 +1,34 @@
+""" Measure the per-call client overhead of the metrics observers: none, a no-op observer, and an aggregator.
+
+The transport returns a canned response without touching the network, so only client-side work is timed.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics --calls 20000
+"""
+import argparse
+
+from src import memoq_soap as mq
+from src.memoq_metrics import MetricsAggregator
+from benchmarks.bench_tracing import CannedTransport, per_call_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    aggregator = MetricsAggregator()
+    cases = (('no observers', ()),
+             ('no-op observer', (lambda metrics: None,)),
+             ('aggregator', (aggregator,)))
+    for name, observers in cases:
+        soap = mq.MemoqSoap("http://bench", "bench_key", transport=CannedTransport(), observers=observers)
+        best = min(per_call_us(soap, args.calls) for _ in range(args.repeat))
+        print(f'{name:>15}: {best:8.2f} us/call')
+    print()
+    print(aggregator.report())
+
+
+if __name__ == "__main__":
+    main()
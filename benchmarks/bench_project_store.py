@@ -0,0 +1,64 @@
+""" Compare polling ListProjects with a ProjectStore kept up to date by delta syncs, against the fake memoQ server.
+
+Times the first (full) sync, a delta sync after some projects changed, a full listing for comparison, and
+dashboard queries answered from the store.
+
+Run from the repository root:
+    python -m benchmarks.bench_project_store --projects 50000 --changes 100
+"""
+import argparse
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from src import memoq_soap as mq
+from src.memoq_project_store import ProjectStore
+from src.memoq_projects import MemoqProjects
+from tests.fake_memoq import BASE_TIME, CLIENTS, FakeMemoqServer
+
+DEADLINE = datetime.datetime.fromtimestamp(BASE_TIME + 86400 * 21, datetime.timezone.utc)
+QUERIES = {
+    'client, live, first 50': dict(client=CLIENTS[1], status='Live', limit=50),
+    'target language, due in 3 weeks': dict(target_language='jpn', deadline_before=DEADLINE, limit=50),
+    'client and target language': dict(client=CLIENTS[0], target_language='ger', limit=50),
+    'count live by client': dict(client=CLIENTS[2], status='Live'),
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=50_000)
+    parser.add_argument('--changes', type=int, default=100, help='projects changed between the syncs')
+    parser.add_argument('--repeat', type=int, default=200, help='runs of every query')
+    args = parser.parse_args()
+
+    with FakeMemoqServer(projects=args.projects, name_length=80) as server, \
+            mq.MemoqSoap(server.url, "bench_key") as soap, tempfile.TemporaryDirectory() as directory, \
+            ProjectStore(os.path.join(directory, 'projects.db')) as store:
+        project_client = MemoqProjects(soap)
+        print(f'first sync:  {store.sync(project_client)}')
+        for index in range(0, args.projects, max(1, args.projects // args.changes)):
+            server.fake.update_project(index, ProjectStatus='WrappedUp')
+        print(f'delta sync:  {store.sync(project_client, full=False)}')
+
+        start = time.perf_counter()
+        status, projects = project_client.list_projects()
+        print(f'ListProjects in full: {len(projects)} projects in {time.perf_counter() - start:.2f}s')
+        print(f'store size: {os.path.getsize(os.path.join(directory, "projects.db")) / 1e6:.1f} MB\n')
+
+        for name, query in QUERIES.items():
+            run = store.count if 'limit' not in query else store.query
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = run(**query)
+                timings.append(time.perf_counter() - start)
+            size = result if isinstance(result, int) else len(result)
+            print(f'{name:>32}: {size:6} results, median {statistics.median(timings) * 1e3:6.2f} ms, '
+                  f'max {max(timings) * 1e3:6.2f} ms')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+""" Parse time and memory of large listings, in full and with a field projection.
+
+For ListProjects and ListTMs responses held in memory, compares parse_xml_response in full (xmltodict) with
+the same call given a projection, and the streaming parser (iter_items) with and without one. The memory
+columns are the peak allocated while parsing and what the result retains, measured with tracemalloc in a
+separate run from the timings.
+
+Run from the repository root:
+    python -m benchmarks.bench_projection --count 50000
+    python -m benchmarks.bench_projection --count 20000 --repeat 5
+"""
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.bench_records_memory import synthetic_tm
+from src import memoq_soap as mq
+from src.memoq_stream import iter_items
+from tests.fake_memoq import FakeMemoq
+from tests.stub_server import soap_response
+
+LISTINGS = {
+    'ServerProjectInfo': ('ListProjects', {'ServerProjectGuid', 'Name', 'Deadline'}),
+    'TMInfo': ('ListTMs', {'Guid', 'Name', 'LastModified'}),
+}
+
+
+def modes(content: bytes, memoq_type: str, action: str, fields: set) -> dict:
+    return {
+        'parse, full': lambda: mq.MemoqSoap.parse_xml_response(content, memoq_type, action),
+        'parse, projected': lambda: mq.MemoqSoap.parse_xml_response(content, memoq_type, action, fields),
+        'iter_items, full': lambda: list(iter_items([content], memoq_type)),
+        'iter_items, projected': lambda: list(iter_items([content], memoq_type, fields=fields)),
+    }
+
+
+def measure(parse, repeat: int) -> tuple:
+    """ Return the median seconds of parse(), and the peak and retained MB of one run of it. """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        parse()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = parse()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return statistics.median(timings), peak / 1024 / 1024, retained / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=50_000, help='items per listing')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs of every mode')
+    args = parser.parse_args()
+
+    fake = FakeMemoq(projects=args.count, name_length=80)
+    items = {'ServerProjectInfo': lambda: (fake.project(i) for i in range(args.count)),
+             'TMInfo': lambda: (synthetic_tm(i) for i in range(args.count))}
+    for memoq_type, (action, fields) in LISTINGS.items():
+        content = soap_response(action, ''.join(items[memoq_type]()))
+        print(f'{args.count} {memoq_type} ({len(content) / 1e6:.1f} MB), keeping {", ".join(sorted(fields))}')
+        baseline = None
+        for name, parse in modes(content, memoq_type, action, fields).items():
+            seconds, peak_mb, retained_mb = measure(parse, args.repeat)
+            baseline = baseline or seconds
+            print(f'{name:>24}: {seconds:6.3f}s ({baseline / seconds:4.1f}x), peak {peak_mb:7.1f} MB, '
+                  f'result {retained_mb:7.1f} MB')
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+""" Memory footprint of an in-memory inventory: xmltodict dicts against the slotted records of memoq_records.
+
+Run from the repository root:
+    python -m benchmarks.bench_records_memory --count 50000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from src import memoq_soap as mq
+from src.memoq_stream import iter_items
+from src.memoq_records import to_records
+from tests.stub_server import soap_response, synthetic_project
+
+
+def synthetic_tm(index: int) -> str:
+    """ A TMInfo record shaped like the ones returned by ListTMs. """
+    return (f'<TMInfo><AccessLevel>Admin</AccessLevel><AllowMultiple>false</AllowMultiple>'
+            f'<AllowReverseLookup>true</AllowReverseLookup><Client>Client {index % 97}</Client>'
+            f'<CreatorUsername>pm{index % 13}</CreatorUsername><Domain>Legal</Domain>'
+            f'<FriendlyName>TM {index}</FriendlyName><Guid>{index:08x}-0000-4000-8000-000000000000</Guid>'
+            f'<IsQualityAssured>false</IsQualityAssured><LastModified>2023-04-01T10:00:00.1234567Z</LastModified>'
+            f'<Name>TM {index} EN-DE</Name><NumEntries>{index * 7}</NumEntries><Readonly>false</Readonly>'
+            f'<SourceLanguageCode>eng</SourceLanguageCode><TargetLanguageCode>ger</TargetLanguageCode></TMInfo>')
+
+
+def footprint(build) -> float:
+    """ Return the MB retained by the object build() returns. """
+    gc.collect()
+    tracemalloc.start()
+    inventory = build()
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del inventory
+    return retained / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=50000)
+    args = parser.parse_args()
+
+    for memoq_type, action, make in (('TMInfo', 'ListTMs', synthetic_tm),
+                                     ('ServerProjectInfo', 'ListProjects', synthetic_project)):
+        content = soap_response(action, ''.join(make(i) for i in range(args.count)))
+        dicts_mb = footprint(lambda: mq.MemoqSoap.parse_xml_response(content, memoq_type, action))
+        records_mb = footprint(lambda: [to_records(item, memoq_type)
+                                                   for item in iter_items([content], memoq_type)])
+        print(f'{args.count} {memoq_type}: dicts {dicts_mb:7.1f} MB, records {records_mb:7.1f} MB, '
+              f'{dicts_mb / records_mb:4.1f}x smaller')
+
+
+if __name__ == "__main__":
+    main()
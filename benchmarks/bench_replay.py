@@ -0,0 +1,94 @@
+""" Replay a cassette of recorded SOAP traffic as fast as possible and time each phase of every call, per action.
+
+With a cassette recorded against production (MemoqSoap(..., record_to='prod.cassette')), this profiles parsing
+and record decoding against real payload shapes, offline. Without one, a cassette is first recorded against the
+fake memoQ server.
+
+Run from the repository root:
+    python -m benchmarks.bench_replay --repeat 20
+    python -m benchmarks.bench_replay --cassette prod.cassette --result-format records --profile
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import tempfile
+import time
+
+from src import memoq_soap as mq
+from src.memoq_cassette import ReplayTransport
+from src.memoq_metrics import MetricsAggregator
+from src.memoq_projects import MemoqProjects
+from src.memoq_tb import MemoqTb
+from src.memoq_tm import MemoqTm
+from tests.fake_memoq import FakeMemoqServer, object_guid
+
+# The result type of the actions replayed; other actions are replayed but not parsed further than the body.
+MEMOQ_TYPES = {'ListProjects': 'ServerProjectInfo', 'ListProjectTranslationDocuments': 'ServerProjectTranslationDocument',
+               'ListProjectTranslationDocuments2': 'ServerProjectTranslationDocument2', 'ListTMs': 'TMInfo',
+               'GetTMInfo': 'TMInfo', 'ListTBs': 'TBInfo', 'GetEntry': 'TBEntry', 'LookupSegment': 'SegmentResult',
+               'Concordance': 'ConcordanceResult'}
+
+
+def record(path: str, projects: int) -> None:
+    with FakeMemoqServer(projects=projects, documents_per_project=25, name_length=80) as server, \
+            mq.MemoqSoap(server.url, "bench_key", record_to=path) as soap:
+        project_client = MemoqProjects(soap)
+        project_client.list_projects()
+        for index in range(0, projects, max(1, projects // 50)):
+            project_client.list_project_translation_documents2(object_guid(3, index))
+        MemoqTm(soap).list_tms()
+        MemoqTb(soap).list_tbs()
+
+
+def replay(soap: mq.MemoqSoap, transport: ReplayTransport, repeat: int) -> int:
+    calls = 0
+    for _ in range(repeat):
+        for entry in transport.entries:
+            interface = entry.soap_action.rsplit('/', 2)[-2]
+            soap.send_envelope(entry.path, interface, MEMOQ_TYPES.get(entry.action, entry.action), entry.action,
+                               entry.request)
+            calls += 1
+    return calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassette', help='the cassette to replay; by default one is recorded from the fake server')
+    parser.add_argument('--projects', type=int, default=20_000, help='projects of the recorded fake server')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--result-format', choices=mq.RESULT_FORMATS, default=mq.RESULT_NATIVE)
+    parser.add_argument('--profile', action='store_true', help='print the functions taking the most time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.cassette
+        if path is None:
+            path = os.path.join(directory, 'fake.cassette')
+            record(path, args.projects)
+        transport = ReplayTransport(path, speed=None, repeat=True)
+    print(f'{path}: {len(transport.entries)} calls')
+    for soap_action, calls, size in transport.summary():
+        print(f'  {soap_action.rsplit("/", 2)[-2]}/{soap_action.rsplit("/", 1)[-1]}: {calls} calls, {size / 1e6:.1f} MB')
+
+    aggregator = MetricsAggregator()
+    with mq.MemoqSoap("http://replay", "bench_key", transport=transport, result_format=args.result_format,
+                      observers=[aggregator]) as soap:
+        profiler = cProfile.Profile() if args.profile else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        calls = replay(soap, transport, args.repeat)
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+    print(f'\n{calls} calls replayed in {elapsed:.2f}s ({calls / elapsed:.0f} calls/s)\n')
+    print(aggregator.report())
+    if profiler is not None:
+        print()
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+""" Index build time and fuzzy-lookup throughput of a local TM replica over a synthetic TM.
+
+The TM's segments are drawn from a Zipf-distributed vocabulary, so trigram frequencies are skewed as in
+real text. Queries are TM segments with one word replaced, i.e. high fuzzy matches.
+
+Run from the repository root:
+    python -m benchmarks.bench_replica --units 5000000
+    python -m benchmarks.bench_replica --units 200000 --queries 2000 --min-score 0.6 0.8
+"""
+import argparse
+import itertools
+import random
+import resource
+import statistics
+import tempfile
+import time
+
+from src.memoq_replica import TmIndex, build_index
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(size)]
+
+
+def segments(count: int, words: list, seed: int):
+    rng = random.Random(seed)
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    for _ in range(count):
+        yield ' '.join(rng.choices(words, cum_weights=cumulative, k=rng.randint(5, 20)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--units', type=int, default=5_000_000)
+    parser.add_argument('--vocabulary', type=int, default=50_000)
+    parser.add_argument('--run-units', type=int, default=250_000)
+    parser.add_argument('--queries', type=int, default=5_000)
+    parser.add_argument('--min-score', type=float, nargs='+', default=[0.7, 0.85])
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    words = vocabulary(args.vocabulary, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        units = ((source, source[::-1]) for source in segments(args.units, words, seed=2))
+        stats = build_index(directory, units, run_units=args.run_units)
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f'build: {stats!r}, peak RSS {peak_mb:.0f} MB')
+
+        sample = sorted(rng.sample(range(args.units), min(args.queries, args.units)))
+        with TmIndex(directory) as index:
+            queries = []
+            for number in sample:
+                source_words = index.unit(number)[0].split()
+                source_words[rng.randrange(len(source_words))] = rng.choice(words)
+                queries.append(' '.join(source_words))
+            for min_score in args.min_score:
+                latencies, hits = [], 0
+                start = time.perf_counter()
+                for query in queries:
+                    began = time.perf_counter()
+                    hits += bool(index.search(query, min_score, limit=5))
+                    latencies.append(time.perf_counter() - began)
+                elapsed = time.perf_counter() - start
+                percentiles = statistics.quantiles(latencies, n=100)
+                print(f'min score {min_score:.2f}: {len(queries) / elapsed:8.0f} queries/s, '
+                      f'p50 {percentiles[49] * 1e3:.2f} ms, p99 {percentiles[98] * 1e3:.2f} ms, '
+                      f'{hits / len(queries):.0%} with a hit')
+
+
+if __name__ == "__main__":
+    main()
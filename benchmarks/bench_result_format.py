@@ -0,0 +1,53 @@
+""" CPU time and allocations of a large ListProjects in RESULT_JSON mode (plus the caller's json.loads) against
+RESULT_NATIVE.
+
+Run from the repository root:
+    python -m benchmarks.bench_result_format --projects 20000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.bench_tracing import CannedTransport
+from src import memoq_soap as mq
+from src.memoq_projects import MemoqProjects
+from tests.stub_server import soap_response, synthetic_project
+
+
+def measure(func, repeat: int) -> tuple:
+    """ Return (CPU seconds per call, peak traced MB of one call). """
+    start = time.process_time()
+    for _ in range(repeat):
+        func()
+    cpu = (time.process_time() - start) / repeat
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu, peak / 1024 / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--projects', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    content = soap_response('ListProjects', ''.join(synthetic_project(i) for i in range(args.projects)))
+    print(f'response: {len(content) / 1024 / 1024:.1f} MB, {args.projects} projects')
+
+    json_projects = MemoqProjects(mq.MemoqSoap("http://bench", "bench_key", transport=CannedTransport(content),
+                                               result_format=mq.RESULT_JSON))
+    native_projects = MemoqProjects(mq.MemoqSoap("http://bench", "bench_key", transport=CannedTransport(content)))
+
+    cases = (('json + loads', lambda: json.loads(json_projects.list_projects()[1])),
+             ('native', lambda: native_projects.list_projects()[1]))
+    for name, func in cases:
+        cpu, peak = measure(func, args.repeat)
+        print(f'{name:>13}: {cpu * 1000:8.1f} ms CPU/call, peak allocations {peak:8.1f} MB')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+""" Peak memory of ListProjects over a large synthetic response: the streaming iter_projects against list_projects.
+
+Each mode runs in its own subprocess so the peak RSS readings do not mix.
+
+Run from the repository root:
+    python -m benchmarks.bench_stream_memory --size-mb 500
+    python -m benchmarks.bench_stream_memory --size-mb 50 --modes stream full
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import time
+
+from src import memoq_soap as mq
+from src.memoq_projects import MemoqProjects
+from tests.stub_server import StubSoapServer, streamed_soap_response, synthetic_project
+
+RECORD_BYTES = len(synthetic_project(0).encode('utf-8'))
+
+
+def run(mode: str, size_mb: int) -> None:
+    count = size_mb * 1024 * 1024 // RECORD_BYTES
+
+    def responder(path, soap_action, body):
+        return 200, streamed_soap_response('ListProjects', (synthetic_project(i) for i in range(count)))
+
+    with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        projects = MemoqProjects(soap)
+        start = time.perf_counter()
+        if mode == 'stream':
+            seen = sum(1 for _ in projects.iter_projects())
+        else:
+            status, data = projects.list_projects()
+            seen = len(data)
+        elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{mode:>7}: {seen} projects ({size_mb} MB) in {elapsed:6.1f}s, peak RSS {peak_mb:8.1f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=500)
+    parser.add_argument('--modes', nargs='+', default=['stream'], choices=['stream', 'full'])
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.child, args.size_mb)
+        return
+    for mode in args.modes:
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_stream_memory', '--size-mb', str(args.size_mb),
+                        '--child', mode], check=True)
+
+
+if __name__ == "__main__":
+    main()
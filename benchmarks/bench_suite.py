@@ -0,0 +1,216 @@
+""" End-to-end benchmark suite of the client against the in-process fake memoQ server (tests/fake_memoq.py).
+
+Each scenario runs in a fresh interpreter, so that its peak RSS is its own. The results can be saved as a
+baseline and later runs compared with it; a metric that got worse by more than the tolerance is flagged, and
+with --check the run then fails, e.g. in CI.
+
+Scenarios:
+    get_tm_info       serial GetTMInfo calls: calls/s, p50 and p99 latency
+    get_tm_info_many  GetTMInfo calls on a thread pool: calls/s
+    lookup_segments   batched TM lookups: lookups/s
+    list_projects     a large ListProjects parsed in one piece: seconds, peak RSS
+    iter_projects     the same listing streamed with iter_projects: seconds, peak RSS
+    list_documents    ListProjectTranslationDocuments2 for many projects in parallel: calls/s
+    export_tmx        chunked TMX export: MB/s, peak RSS
+    import_tmx        chunked TMX import: MB/s
+
+Run from the repository root:
+    python -m benchmarks.bench_suite --save benchmarks/baseline.json
+    python -m benchmarks.bench_suite --compare benchmarks/baseline.json --check
+    python -m benchmarks.bench_suite --scenarios export_tmx import_tmx --scale 4
+"""
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import memoq_soap as mq
+from src.memoq_projects import MemoqProjects
+from src.memoq_tm import MemoqTm
+from tests.fake_memoq import FakeMemoqServer, SyntheticTmx, object_guid
+
+# Whether a larger value of a metric is better; metrics not listed are informational.
+HIGHER_IS_BETTER = {'calls_per_second': True, 'lookups_per_second': True, 'items_per_second': True,
+                    'mb_per_second': True, 'p50_ms': False, 'p99_ms': False, 'seconds': False,
+                    'peak_rss_mb': False}
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def latencies(call, count: int) -> list:
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def timing_metrics(timings: list) -> dict:
+    percentiles = statistics.quantiles(timings, n=100)
+    return {'calls_per_second': len(timings) / sum(timings), 'p50_ms': percentiles[49] * 1e3,
+            'p99_ms': percentiles[98] * 1e3}
+
+
+def bench_get_tm_info(scale: float) -> dict:
+    with FakeMemoqServer(tms=10) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        tm_client = MemoqTm(soap)
+        guid = object_guid(1, 3)
+        latencies(lambda: tm_client.get_tm_info(guid), 100)
+        return timing_metrics(latencies(lambda: tm_client.get_tm_info(guid), int(3000 * scale)))
+
+
+def bench_get_tm_info_many(scale: float) -> dict:
+    calls = int(5000 * scale)
+    with FakeMemoqServer(tms=50, latency=0.002) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        batch = MemoqTm(soap).get_tm_info_many([object_guid(1, i % 50) for i in range(calls)], max_workers=8)
+    assert batch.failed == 0, batch
+    return {'calls_per_second': batch.calls_per_second, 'seconds': batch.elapsed}
+
+
+def bench_lookup_segments(scale: float) -> dict:
+    count = int(5000 * scale)
+    requests = [(f'Segment {i}: the quick brown fox.', '', object_guid(1, i % 4), None) for i in range(count)]
+    with FakeMemoqServer(tms=4, lookup_hits=5) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        start = time.perf_counter()
+        batch = MemoqTm(soap).lookup_segments(requests, max_workers=8)
+        elapsed = time.perf_counter() - start
+    return {'lookups_per_second': count / elapsed, 'seconds': elapsed, 'calls': batch.calls}
+
+
+def _projects(scale: float, streamed: bool) -> dict:
+    count = int(50_000 * scale)
+    with FakeMemoqServer(projects=count, name_length=80) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        project_client = MemoqProjects(soap)
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        if streamed:
+            items = sum(1 for _ in project_client.iter_projects())
+        else:
+            items = len(project_client.list_projects()[1])
+        elapsed = time.perf_counter() - start
+    assert items == count, items
+    return {'items_per_second': items / elapsed, 'seconds': elapsed, 'peak_rss_mb': peak_rss_mb(),
+            'rss_growth_mb': peak_rss_mb() - rss_before}
+
+
+def bench_list_projects(scale: float) -> dict:
+    return _projects(scale, streamed=False)
+
+
+def bench_iter_projects(scale: float) -> dict:
+    return _projects(scale, streamed=True)
+
+
+def bench_list_documents(scale: float) -> dict:
+    count = int(2000 * scale)
+    with FakeMemoqServer(projects=count, documents_per_project=20, latency=0.002) as server, \
+            mq.MemoqSoap(server.url, "bench_key") as soap:
+        project_client = MemoqProjects(soap)
+        calls = [dict(route='memoqservices/ServerProject/ServerProjectService', interface='IServerProjectService',
+                      memoq_type='ServerProjectTranslationDocument2', action='ListProjectTranslationDocuments2',
+                      guid=object_guid(3, i)) for i in range(count)]
+        batch = project_client.soap_client.batch_call(calls, max_workers=8)
+    assert batch.failed == 0, batch
+    return {'calls_per_second': batch.calls_per_second, 'seconds': batch.elapsed}
+
+
+def bench_export_tmx(scale: float) -> dict:
+    units = int(200_000 * scale)
+    with FakeMemoqServer(tms=1, tm_units=units, chunk_bytes=4 << 20) as server, \
+            mq.MemoqSoap(server.url, "bench_key") as soap, tempfile.TemporaryDirectory() as directory:
+        rss_before = peak_rss_mb()
+        start = time.perf_counter()
+        stats = MemoqTm(soap).export_tmx(object_guid(1, 0), os.path.join(directory, 'export.tmx'))
+        elapsed = time.perf_counter() - start
+    return {'mb_per_second': stats.bytes / elapsed / 1e6, 'seconds': elapsed, 'bytes': stats.bytes,
+            'peak_rss_mb': peak_rss_mb(), 'rss_growth_mb': peak_rss_mb() - rss_before}
+
+
+def bench_import_tmx(scale: float) -> dict:
+    tmx = SyntheticTmx(int(200_000 * scale), 'eng', 'ger')
+    data = tmx.read(0, tmx.total_bytes)
+    with FakeMemoqServer(tms=1, tm_units=0) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        start = time.perf_counter()
+        MemoqTm(soap).import_tmx(object_guid(1, 0), io.BytesIO(data), chunk_size=4 << 20)
+        elapsed = time.perf_counter() - start
+        entries = server.fake.tms[object_guid(1, 0)]['NumEntries']
+    assert entries == tmx.units, entries
+    return {'mb_per_second': len(data) / elapsed / 1e6, 'seconds': elapsed, 'bytes': len(data)}
+
+
+SCENARIOS = {name[len('bench_'):]: function for name, function in globals().items() if name.startswith('bench_')}
+
+
+def run_scenario(name: str, scale: float) -> dict:
+    """ Run one scenario in a fresh interpreter and return its metrics. """
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_suite', '--run', name, '--scale', str(scale)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """ Print every metric next to its baseline value and return the (scenario, metric) pairs that regressed. """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            if metric not in HIGHER_IS_BETTER or not before:
+                continue
+            change = value / before - 1
+            worse = -change if HIGHER_IS_BETTER[metric] else change
+            flag = 'REGRESSION' if worse > tolerance else ''
+            if flag:
+                regressions.append((name, metric))
+            print(f'{name:>18} {metric:>20}: {before:12.2f} -> {value:12.2f} ({change:+7.1%}) {flag}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the size of every scenario')
+    parser.add_argument('--save', help='write the results to this baseline file')
+    parser.add_argument('--compare', help='compare the results with this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change flagged as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a metric regressed')
+    parser.add_argument('--run', choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(SCENARIOS[args.run](args.scale)))
+        return
+
+    results = {}
+    for name in args.scenarios:
+        results[name] = run_scenario(name, args.scale)
+        print(f'{name:>18}: ' + ', '.join(f'{metric} {value:.2f}' for metric, value in results[name].items()))
+
+    if args.save:
+        meta = {'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(), 'platform': platform.platform(), 'scale': args.scale}
+        with open(args.save, 'w', encoding='utf-8') as out:
+            json.dump({'meta': meta, 'results': results}, out, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['meta']['scale'] != args.scale:
+            print(f"warning: the baseline was run at scale {baseline['meta']['scale']}, not {args.scale}")
+        print(f"\ncompared with {args.compare} ({baseline['meta']['date']}, Python {baseline['meta']['python']}):")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions and args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
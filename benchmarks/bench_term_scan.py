@@ -0,0 +1,62 @@
+""" Build time, size and scan throughput of a TermIndex: segments scanned against a large synthetic term base.
+
+Segments are 5 to 25 words drawn from a Zipf-distributed vocabulary. Terms are one to three words drawn
+uniformly from the vocabulary without its 1000 most frequent words, as terminology avoids function words.
+
+Run from the repository root:
+    python -m benchmarks.bench_term_scan --segments 100000 --terms 200000
+    python -m benchmarks.bench_term_scan --segments 20000 --terms 50000 --stem
+"""
+import argparse
+import itertools
+import random
+import resource
+import time
+
+from src.memoq_terms import TermIndex
+
+
+def zipf(seed: int, vocabulary: list):
+    rng = random.Random(seed)
+    cumulative = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    return lambda k: rng.choices(vocabulary, cum_weights=cumulative, k=k)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, default=100_000)
+    parser.add_argument('--terms', type=int, default=200_000)
+    parser.add_argument('--vocabulary', type=int, default=100_000)
+    parser.add_argument('--stem', action='store_true', help='strip a plural -s from every word')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(args.vocabulary)]
+    draw_segment = zipf(3, vocabulary)
+    terminology = vocabulary[1000:]
+    entries = [(str(i), (' '.join(rng.choices(terminology, k=rng.randint(1, 3))),), (f'target {i}',))
+               for i in range(args.terms)]
+    segments = [' '.join(draw_segment(rng.randint(5, 25))).capitalize() + '.' for _ in range(args.segments)]
+    before_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    start = time.perf_counter()
+    index = TermIndex(stemmer=(lambda word: word[:-1] if word.endswith('s') else word) if args.stem else None)
+    index.add_entries(entries, tb='bench-tb')
+    index.build()
+    built = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'build: {args.terms} terms in {built:.2f}s, {index.stats()}, peak RSS +{peak_mb - before_mb:.0f} MB')
+
+    start = time.perf_counter()
+    matched = hits = 0
+    for _, segment_hits in index.scan_many(segments):
+        matched += 1
+        hits += len(segment_hits)
+    elapsed = time.perf_counter() - start
+    print(f'scan: {args.segments} segments in {elapsed:.2f}s, {args.segments / elapsed:.0f} segments/s, '
+          f'{hits} hits in {matched} segments')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+""" Throughput and peak memory of export_tmx over a synthetic multi-GB TM served by the local stub.
+
+Each prefetch depth runs in its own subprocess so the peak RSS readings do not mix. The TMX is written to
+os.devnull; the stub generates and encodes it in the same process, so MB/s is a lower bound.
+
+Run from the repository root:
+    python -m benchmarks.bench_tmx_export --size-mb 2048
+    python -m benchmarks.bench_tmx_export --size-mb 256 --chunk-mb 1 4 --prefetch 0 1 2
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+from src import memoq_soap as mq
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, TmxExportResponder
+
+
+def run(size_mb: int, chunk_mb: int, prefetch: int) -> None:
+    responder = TmxExportResponder(total_bytes=size_mb << 20, chunk_bytes=chunk_mb << 20)
+    with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "bench_key") as soap:
+        stats = MemoqTm(soap).export_tmx('bench-tm', os.devnull, prefetch=prefetch)
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{size_mb:6d} MB, {chunk_mb:3d} MB chunks, prefetch {prefetch}: {stats.elapsed:7.1f}s '
+          f'{stats.mb_per_second:7.1f} MB/s, peak RSS {peak_mb:7.1f} MB')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--chunk-mb', type=int, nargs='+', default=[4])
+    parser.add_argument('--prefetch', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.size_mb, args.chunk_mb[0], args.prefetch[0])
+        return
+    for chunk_mb in args.chunk_mb:
+        for prefetch in args.prefetch:
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_tmx_export', '--size-mb', str(args.size_mb),
+                            '--chunk-mb', str(chunk_mb), '--prefetch', str(prefetch), '--child'], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+""" Throughput of import_tmx against the local stub for several chunk sizes, with and without upload overlap.
+
+A synthetic TMX file is written to a temporary directory once and imported with every combination of
+chunk size and prefetch depth. The stub decodes and hashes every chunk in the same process, so the MB/s
+figures are a lower bound, but their ranking is what matters for picking a chunk size.
+
+Run from the repository root:
+    python -m benchmarks.bench_tmx_import --size-mb 256
+    python -m benchmarks.bench_tmx_import --size-mb 64 --chunk-kb 256 1024 4096 --prefetch 0 1 --latency 0.005
+"""
+import argparse
+import os
+import tempfile
+
+from src import memoq_soap as mq
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, TmxExportResponder, TmxImportResponder
+
+
+def write_tmx(path: str, size_mb: int) -> None:
+    with open(path, 'wb') as file:
+        for piece in TmxExportResponder(total_bytes=size_mb << 20).iter_content():
+            file.write(piece)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--chunk-kb', type=int, nargs='+', default=[256, 1024, 4096, 16384])
+    parser.add_argument('--prefetch', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated server latency per call, seconds')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.tmx')
+        write_tmx(path, args.size_mb)
+        for chunk_kb in args.chunk_kb:
+            for prefetch in args.prefetch:
+                responder = TmxImportResponder()
+                with StubSoapServer(responder=responder, latency=args.latency) as server, \
+                        mq.MemoqSoap(server.url, "bench_key") as soap:
+                    stats = MemoqTm(soap).import_tmx('bench-tm', path, chunk_size=chunk_kb << 10, prefetch=prefetch)
+                print(f'{chunk_kb:6d} KB chunks, prefetch {prefetch}: {stats.chunks:5d} calls {stats.elapsed:6.2f}s '
+                      f'{stats.mb_per_second:7.1f} MB/s')
+
+
+if __name__ == "__main__":
+    main()
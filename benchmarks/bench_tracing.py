@@ -0,0 +1,60 @@
+""" Measure the per-call client overhead of make_soap_request with tracing off, on, and with a wire dump.
+
+The transport returns a canned response without touching the network, so only client-side work is timed.
+
+Run from the repository root:
+    python -m benchmarks.bench_tracing --calls 20000
+"""
+import argparse
+import logging
+import time
+
+import requests
+
+from src import memoq_soap as mq
+from src.memoq_transport import Transport
+from tests.stub_server import soap_response
+
+
+class CannedTransport(Transport):
+    """ Answers every call with the same response, by default a one-item ListTMs. """
+
+    def __init__(self, content: bytes = None) -> None:
+        self.response = requests.Response()
+        self.response.status_code = 200
+        self.response._content = content or soap_response('ListTMs', '<TMInfo><Name>bench</Name></TMInfo>')
+
+    def send(self, route, url, data, headers, timeout=None, stream=False):
+        return self.response
+
+
+def per_call_us(soap: mq.MemoqSoap, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                               memoq_type='TMInfo', action='ListTMs')
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Handlers that swallow records, so the cost measured is the client's and not the terminal's.
+    for name in (mq.logger.name, mq.wire_logger.name):
+        logging.getLogger(name).addHandler(logging.NullHandler())
+        logging.getLogger(name).propagate = False
+
+    cases = (('tracing off', logging.WARNING, False),
+             ('debug trace', logging.DEBUG, False),
+             ('wire dump', logging.DEBUG, True))
+    for name, level, wire_dump in cases:
+        mq.logger.setLevel(level)
+        mq.wire_logger.setLevel(level)
+        soap = mq.MemoqSoap("http://bench", "bench_key", transport=CannedTransport(), wire_dump=wire_dump)
+        print(f'{name:>12}: {per_call_us(soap, args.calls):8.2f} us/call')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+""" Compare calls per second for per-call and pooled (keep-alive) transports against a local stub server.
+
+Run from the repository root:
+    python -m benchmarks.bench_transport --calls 2000
+"""
+import argparse
+import time
+
+from src import memoq_soap as mq
+from src.memoq_transport import PerCallTransport, PooledTransport
+from tests.stub_server import StubSoapServer
+
+
+def run(transport, url: str, calls: int) -> float:
+    """ Return calls per second for `calls` sequential ListTMs requests. """
+    with mq.MemoqSoap(url, "bench_key", transport=transport) as soap:
+        start = time.perf_counter()
+        for _ in range(calls):
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='TMInfo', action='ListTMs')
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=1000)
+    args = parser.parse_args()
+
+    with StubSoapServer() as server:
+        for name, transport in (('per-call', PerCallTransport()), ('pooled', PooledTransport())):
+            rate = run(transport, server.url, args.calls)
+            print(f'{name:>10}: {rate:10.1f} calls/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+from typing import Any, BinaryIO, Callable, Iterable, Tuple, Optional, Union
+import asyncio
+import logging
+import os
+
+import httpx
+
+from src import memoq_soap as mq
+from src.memoq_envelope import escape_text
+from src.memoq_projects import _filter_params, _options_params
+from src.memoq_tm import MemoqTm, tm_entry
+from src.memoq_tmx import Base64Decoder, TransferProgress
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMemoqSoap(mq.MemoqSoapBase):
+    """ An asyncio counterpart of MemoqSoap, built on httpx.AsyncClient.
+
+    Builds the same envelopes and parses responses with the same logic as MemoqSoap, so every call returns
+    exactly what the sync client would. Unlike MemoqSoap it keeps no "last response" attributes, since many
+    calls are in flight at once.
+    """
+
+    def __init__(self, wsdl_base_url: str, api_key: str, client: Optional[httpx.AsyncClient] = None,
+                 max_concurrency: int = 10, timeout: Optional[float] = None, wire_dump: bool = False,
+                 result_format: str = mq.RESULT_NATIVE) -> None:
+        """ Initialize the async memoq SOAP class
+        :param wsdl_base_url:
+        :param api_key:
+        :param client: httpx client to use; defaults to one with a keep-alive pool of max_concurrency connections
+        :param max_concurrency: maximum number of requests in flight at once
+        :param timeout: default deadline for a single request, in seconds
+        :param wire_dump: log full request and response bodies of this client, see MemoqSoapBase
+        :param result_format: RESULT_NATIVE, RESULT_RECORDS or RESULT_JSON, see MemoqSoapBase
+        >>> AsyncMemoqSoap("some_url", "some_key", max_concurrency=4).max_concurrency
+        4
+        """
+        super().__init__(wsdl_base_url, api_key, wire_dump=wire_dump, result_format=result_format)
+
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.client = client if client is not None else httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=None)
+
+    async def aclose(self) -> None:
+        """ Close the HTTP client and release its pooled connections. """
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def make_soap_request(self, route: str, interface: str, memoq_type: str, action: str,
+                                request_timeout: Optional[float] = None, projection: Optional[Iterable[str]] = None,
+                                **kwargs) -> mq.SoapResult:
+        """ Make a SOAP request to Memoq API.
+
+        At most max_concurrency requests run at once; the others wait for a slot. Cancelling the calling task
+        aborts the request and frees its slot.
+        :param route: route to the service requested
+        :param interface: the interface to be used
+        :param memoq_type: the type of object to be retrieved
+        :param action: the action to be performed
+        :param request_timeout: deadline for this request in seconds, overriding the client default
+        :param projection: the paths of the fields of the result's items to keep, see MemoqSoap.make_soap_request
+        :param kwargs: additional parameters like guid
+        :return: the response from the CAT tool's API, as a SoapResult (status, data) pair
+        :raises TimeoutError: when the request does not complete within its deadline
+        """
+        url = self.service_url(route)
+        soap_action = self.soap_action(interface, action)
+        payload = self.build_payload(action, **kwargs)
+        headers = {'Content-Type': 'text/xml; charset=utf-8', 'SOAPAction': soap_action}
+        timeout = request_timeout if request_timeout is not None else self._timeout
+
+        async with self._semaphore:
+            self._trace_request(url, soap_action, payload)
+            response = await asyncio.wait_for(self.client.post(url, content=payload, headers=headers), timeout)
+        self._trace_response(soap_action, response.status_code, response.content)
+
+        status, data = self.process_response(response.status_code, dict(response.headers), response.content,
+                                             memoq_type, action, projection=projection)
+        return mq.SoapResult(status, data, url=url, soap_action=soap_action, payload=payload, response=response)
+
+
+class AsyncChunkedExport:
+    """ Async counterpart of memoq_tmx.ChunkedExport.
+
+    Chunks are fetched whole with the next action and decoded, since AsyncMemoqSoap does not stream responses.
+    """
+
+    def __init__(self, soap_client: AsyncMemoqSoap, route: str, interface: str, begin_action: str,
+                 next_action: str, end_action: str) -> None:
+        self.soap_client = soap_client
+        self.route = route
+        self.interface = interface
+        self.begin_action = begin_action
+        self.next_action = next_action
+        self.end_action = end_action
+
+    async def begin(self, **kwargs) -> Tuple[int, Any]:
+        """ Open an export session.
+        :param kwargs: the parameters of the begin action, e.g. tmGuid
+        :return: status code and the GUID of the session
+        """
+        return await self.soap_client.make_soap_request(route=self.route, interface=self.interface,
+                                                        memoq_type='guid', action=self.begin_action, **kwargs)
+
+    async def next_chunk(self, session: str) -> Tuple[int, Any]:
+        """ Get the next chunk of a session.
+        :return: status code and the base64 data of the chunk, None once the export is complete
+        """
+        return await self.soap_client.make_soap_request(route=self.route, interface=self.interface,
+                                                        memoq_type='base64Binary', action=self.next_action,
+                                                        sessionId=session)
+
+    async def end(self, session: str) -> Tuple[int, Any]:
+        """ End an export session and release it on the server. """
+        return await self.soap_client.make_soap_request(route=self.route, interface=self.interface,
+                                                        memoq_type='guid', action=self.end_action, sessionId=session)
+
+    async def write(self, session: str, path: Union[str, os.PathLike, BinaryIO],
+                    progress: Optional[Callable[[TransferProgress], None]] = None) -> TransferProgress:
+        """ Write the chunks of a session to a file, then end the session, as ChunkedExport.write does.
+        :param session: the GUID of the export session
+        :param path: the file to write, or a binary file object (left open)
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :return: the final TransferProgress
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        stats = TransferProgress()
+        try:
+            out = open(path, 'wb') if isinstance(path, (str, os.PathLike)) else path
+            try:
+                while True:
+                    response_status, data = await self.next_chunk(session)
+                    if response_status != 200:
+                        raise mq.MemoqSoapError(response_status, data)
+                    if not data:
+                        break
+                    decoder = Base64Decoder()
+                    piece = decoder.decode(data) + decoder.flush()
+                    out.write(piece)
+                    stats.add(len(piece))
+                    if progress is not None:
+                        progress(stats)
+            finally:
+                if out is not path:
+                    out.close()
+        except BaseException:
+            try:
+                await self.end(session)
+            except Exception as error:
+                logger.warning("Could not end the session %s after an error: %s", session, error)
+            raise
+        await self.end(session)
+        return stats
+
+
+class AsyncMemoqTm:
+    """ Async counterpart of MemoqTm.
+
+    The batch helpers of MemoqTm (get_tm_info_many, lookup_segments, add_or_update_entries, ...) have no
+    counterpart: with asyncio, gather the single calls instead.
+    """
+
+    def __init__(self, soap_client: AsyncMemoqSoap) -> None:
+        """ Initialize the AsyncMemoqTm class with an AsyncMemoqSoap object.
+        :param soap_client: async SOAP client that will make calls to the CAT tool's API
+        """
+        self.soap_client = soap_client
+        self.service = 'ITMService'
+
+    async def list_tms(self, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get the list of TMs from the memoQ Server.
+        :param projection: the fields of every TMInfo to keep, as for MemoqTm.list_tms
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                        action='ListTMs', projection=projection)
+
+    async def create_tm(self, tm_name: str, source_lang: str, target_lang: str) -> Tuple[int, Any]:
+        """ Create a new Translation Memory.
+        :param tm_name: Name of the new TM
+        :param source_lang: Source language code
+        :param target_lang: Target language code
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        params = {
+            'tmName': tm_name,
+            'sourceLangCode': source_lang,
+            'targetLangCode': target_lang
+        }
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                        action='CreateTM', params=params)
+
+    async def add_next_tmx_chunk(self, guid: str, byte_data: bytes) -> Tuple[int, Any]:
+        """ Add the next TMX chunk.
+        :param guid: The GUID of the import session
+        :param byte_data: The byte data for the next chunk
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='guid',
+                                                        action='AddNextTMXChunk', sessionId=guid, tmxData=byte_data)
+
+    async def add_or_update_entry(self, source: str, target: str, guid: str) -> Tuple[int, Any]:
+        """ Add or update an entry in the TM.
+        :param source: The source text
+        :param target: The target text
+        :param guid: The GUID of the TM
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMEntry',
+                                                        action='AddOrUpdateEntry', tmGuid=guid,
+                                                        entry=tm_entry(source, target))
+
+    async def begin_chunked_tmx_export(self, guid: str) -> Tuple[int, Any]:
+        """ Begin chunked TMX export.
+        :param guid: The GUID of the TM
+        :return: status code and the GUID of the export session
+        """
+        return await self._tmx_export().begin(tmGuid=guid)
+
+    def _tmx_export(self) -> AsyncChunkedExport:
+        return AsyncChunkedExport(self.soap_client, 'memoqservices/tm/TMService', 'ITMService',
+                                  'BeginChunkedTMXExport', 'GetNextTMXChunk', 'EndChunkedTMXExport')
+
+    async def begin_chunked_tmx_import(self, guid: str) -> Tuple[int, Any]:
+        """ Begin chunked TMX import.
+        :param guid: The GUID of the TM
+        :return: status code and the GUID of the import session
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='guid',
+                                                        action='BeginChunkedTMXImport', tmGuid=guid)
+
+    async def concordance(self, source: str, target: str, guid: str, concordance_request: dict) -> Tuple[int, Any]:
+        """ Perform a concordance search, as MemoqTm.concordance does.
+        :param source: The source text
+        :param target: The target text; not sent
+        :param guid: The GUID of the TM
+        :param concordance_request: The concordance request parameters, e.g. {'Options': {...}}
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        request = dict(concordance_request or {}, Expression={'string': [source]})
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService',
+                                                        memoq_type='ConcordanceResult', action='Concordance',
+                                                        tmGuid=guid, request=dict(sorted(request.items())))
+
+    async def delete_tm(self, guid: str) -> Tuple[int, Any]:
+        """ Delete a TM.
+        :param guid: The GUID of the TM
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                        action='DeleteTM', tmGuid=guid)
+
+    async def end_chunked_tmx_export(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked TMX export and release the session on the server.
+        :param guid: The GUID of the export session
+        :return: status code and response content
+        """
+        return await self._tmx_export().end(guid)
+
+    async def end_chunked_tmx_import(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked TMX import and commit it on the server.
+        :param guid: The GUID of the import session
+        :return: status code and the TmxImportResult (segment counts)
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService',
+                                                        memoq_type='TmxImportResult', action='EndChunkedTMXImport',
+                                                        sessionId=guid)
+
+    async def export_tmx(self, guid: str, path: Union[str, os.PathLike, BinaryIO],
+                         progress: Optional[Callable[[TransferProgress], None]] = None) -> TransferProgress:
+        """ Export a TM as TMX to a file, one chunk at a time; the export session is always ended.
+
+        Unlike MemoqTm.export_tmx, chunks are downloaded one after the other, and exports are not resumable.
+        :param guid: The GUID of the TM
+        :param path: the file to write, or a binary file object (left open)
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :return: the final TransferProgress
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        response_status, session = await self.begin_chunked_tmx_export(guid)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, session)
+        return await self._tmx_export().write(session, path, progress)
+
+    async def get_next_tmx_chunk(self, guid: str) -> Tuple[int, Any]:
+        """ Get the next TMX chunk.
+        :param guid: The GUID of the export session
+        :return: status code and the base64 data of the chunk, None once the export is complete
+        """
+        return await self._tmx_export().next_chunk(guid)
+
+    async def import_tmx(self, guid: str, path_or_stream: Union[str, os.PathLike, BinaryIO],
+                         chunk_size: int = 1 << 20,
+                         progress: Optional[Callable[[TransferProgress], None]] = None) -> TransferProgress:
+        """ Import a TMX file into a TM, one chunk at a time.
+
+        Unlike MemoqTm.import_tmx, chunks are read and sent one after the other, and imports are not resumable.
+        The session is ended, which imports what it holds, only once every chunk was added.
+        :param guid: The GUID of the TM
+        :param path_or_stream: the TMX file, or a binary file object (left open)
+        :param chunk_size: bytes of TMX sent per AddNextTMXChunk call
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :return: the final TransferProgress; its result is the TmxImportResult returned by the server
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        stats = TransferProgress()
+        response_status, session = await self.begin_chunked_tmx_import(guid)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, session)
+        for chunk in MemoqTm._iter_source_chunks(path_or_stream, chunk_size, stats):
+            try:
+                nbytes = len(chunk)
+                response_status, data = await self.add_next_tmx_chunk(session, bytes(chunk))
+            finally:
+                chunk.release()
+            if response_status != 200:
+                raise mq.MemoqSoapError(response_status, data)
+            stats.add(nbytes)
+            if progress is not None:
+                progress(stats)
+        response_status, data = await self.end_chunked_tmx_import(session)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, data)
+        stats.result = data
+        return stats
+
+    async def get_tm_info(self, guid: str, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get information about a TM.
+        :param guid: The GUID of the TM
+        :param projection: the fields of the TMInfo to keep, as for MemoqTm.list_tms
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                        action='GetTMInfo', projection=projection, tmGuid=guid)
+
+    async def lookup_segment(self, source: str, target: str, guid: str,
+                             lookup_segment_request: dict) -> Tuple[int, Any]:
+        """ Lookup a segment in the TM, as MemoqTm.lookup_segment does.
+        :param source: The source text
+        :param target: The target text; not sent
+        :param guid: The GUID of the TM
+        :param lookup_segment_request: The lookup segment request parameters, e.g. {'Options': {'MatchThreshold': 75}}
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        request = dict(lookup_segment_request or {}, Segments={'string': [f'<seg>{escape_text(source)}</seg>']})
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService',
+                                                        memoq_type='SegmentResult', action='LookupSegment',
+                                                        tmGuid=guid, request=dict(sorted(request.items())))
+
+    async def update_properties(self, tm_update_info: dict) -> Tuple[int, Any]:
+        """ Update TM properties.
+        :param tm_update_info: The TM update information, e.g. {'Guid': ..., 'Name': ..., 'Description': ...}
+        :return: status code and response content
+        """
+        route = 'memoqservices/tm/TMService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                        action='UpdateProperties', info=tm_update_info)
+
+
+class AsyncMemoqTb:
+    """ Async counterpart of MemoqTb.
+
+    get_entries and load_term_index have no counterpart: gather get_entry calls, or export with export_csv.
+    """
+
+    def __init__(self, soap_client: AsyncMemoqSoap) -> None:
+        """ Initialize the AsyncMemoqTb class with an AsyncMemoqSoap object.
+        :param soap_client: async SOAP client that will make calls to the CAT tool's API
+        """
+        self.soap_client = soap_client
+        self.service = 'ITBService'
+
+    async def list_tbs(self, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get the list of term bases from the memoQ Server.
+        :param projection: the fields of every TBInfo to keep, as for MemoqTb.list_tbs
+        :return: status code and response content
+        """
+        route = '/memoqservices/tb/TBService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='TBInfo',
+                                                        action='ListTBs', projection=projection)
+
+    async def begin_chunked_csv_export(self, guid: str) -> Tuple[int, Any]:
+        """ Begin chunked CSV export of a term base.
+        :param guid: The GUID of the TB
+        :return: status code and the GUID of the export session
+        """
+        return await self._csv_export().begin(tbGuid=guid)
+
+    def _csv_export(self) -> AsyncChunkedExport:
+        return AsyncChunkedExport(self.soap_client, '/memoqservices/tb/TBService', 'ITBService',
+                                  'BeginChunkedCSVExport', 'GetNextCSVChunk', 'EndChunkedCSVExport')
+
+    async def end_chunked_csv_export(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked CSV export.
+        :param guid: The GUID of the export session
+        :return: status code and response content
+        """
+        return await self._csv_export().end(guid)
+
+    async def export_csv(self, guid: str, path: Union[str, os.PathLike, BinaryIO],
+                         progress: Optional[Callable[[TransferProgress], None]] = None) -> TransferProgress:
+        """ Export a term base as CSV to a file, one chunk at a time, as AsyncMemoqTm.export_tmx does.
+        :param guid: The GUID of the TB
+        :param path: the file to write, or a binary file object (left open)
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :return: the final TransferProgress
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        response_status, session = await self.begin_chunked_csv_export(guid)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, session)
+        return await self._csv_export().write(session, path, progress)
+
+    async def get_entry(self, guid: str, entry_id: int, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get one entry of a term base.
+        :param guid: The GUID of the TB
+        :param entry_id: The id of the entry
+        :param projection: the field paths of the TBEntry to keep, as for MemoqTb.get_entry
+        :return: status code and the TBEntry
+        """
+        route = '/memoqservices/tb/TBService'
+        return await self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='TBEntry',
+                                                        action='GetEntry', projection=projection, tbGuid=guid,
+                                                        entryId=entry_id)
+
+    async def get_next_csv_chunk(self, guid: str) -> Tuple[int, Any]:
+        """ Get the next CSV chunk.
+        :param guid: The GUID of the export session
+        :return: status code and the base64 data of the chunk, None once the export is complete
+        """
+        return await self._csv_export().next_chunk(guid)
+
+
+class AsyncMemoqProjects:
+    """ Async counterpart of MemoqProjects. """
+
+    def __init__(self, soap_client: AsyncMemoqSoap) -> None:
+        """ Initialize the AsyncMemoqProjects class with an AsyncMemoqSoap object.
+        :param soap_client: async SOAP client that will make calls to the CAT tool's API
+        """
+        self.soap_client = soap_client
+        self.service = 'IServerProjectService'
+
+    async def list_projects(self, filter: Optional[Union[str, dict]] = None,
+                            projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get the list of projects from the memoQ Server.
+        :param filter: Optional filter to apply when listing projects, as for MemoqProjects.list_projects
+        :param projection: the field paths of every ServerProjectInfo to keep, as for MemoqProjects.list_projects
+        :return: status code and response content
+        """
+        route = 'memoqservices/ServerProject/ServerProjectService'
+        return await self.soap_client.make_soap_request(route=route, interface='IServerProjectService',
+                                                        memoq_type='ServerProjectInfo', action='ListProjects',
+                                                        projection=projection, **_filter_params(filter))
+
+    async def list_project_translation_documents(self, guid: str,
+                                                 projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ List the translation documents in a project.
+        :param guid: The GUID of the project
+        :param projection: the field paths of every document to keep, e.g. {'DocumentGuid', 'DocumentName'}
+        :return: status code and response content
+        """
+        route = 'memoqservices/ServerProject/ServerProjectService'
+        return await self.soap_client.make_soap_request(route=route, interface='IServerProjectService',
+                                                        memoq_type='ServerProjectTranslationDocument',
+                                                        action='ListProjectTranslationDocuments',
+                                                        projection=projection, guid=guid)
+
+    async def list_project_translation_documents2(self, guid: str, options: dict = None,
+                                                  projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ List the translation documents in a project.
+        :param guid: The GUID of the project
+        :param options: Additional options for listing documents
+        :param projection: the field paths of every document to keep, e.g. {'DocumentGuid', 'DocumentName'}
+        :return: status code and response content
+        """
+        route = 'memoqservices/ServerProject/ServerProjectService'
+        return await self.soap_client.make_soap_request(route=route, interface='IServerProjectService',
+                                                        memoq_type='ServerProjectTranslationDocument2',
+                                                        action='ListProjectTranslationDocuments2',
+                                                        projection=projection, guid=guid, **_options_params(options))
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
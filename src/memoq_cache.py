@@ -0,0 +1,207 @@
+from typing import Callable, Hashable, Optional
+from collections import OrderedDict
+import threading
+import time
+
+# Seconds a successful result of each read action stays fresh. Actions not listed are never cached.
+DEFAULT_TTLS = {
+    'GetTMInfo': 300,
+    'ListTMs': 300,
+    'ListTMs2': 300,
+    'ListTBs': 300,
+    'ListProjects': 60,
+}
+
+# Cached actions whose results are dropped after a successful call of a write action. A write that names one
+# object (its scope, e.g. the TM GUID) drops only the results of that object and the unscoped ones (listings).
+DEFAULT_INVALIDATIONS = {
+    'CreateTM': ('ListTMs', 'ListTMs2'),
+    'CreateAndPublish': ('ListTMs', 'ListTMs2'),
+    'DeleteTM': ('ListTMs', 'ListTMs2', 'GetTMInfo'),
+    'UpdateProperties': ('ListTMs', 'ListTMs2', 'GetTMInfo'),
+    'AddOrUpdateEntry': ('GetTMInfo',),
+    'EndChunkedTMXImport': ('ListTMs', 'ListTMs2', 'GetTMInfo'),
+}
+
+
+class CacheStats:
+    """ Hit/miss counters of a ResponseCache. """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.merged
+        return (self.hits + self.merged) / lookups if lookups else 0.0
+
+    def __repr__(self) -> str:
+        return (f"CacheStats(hits={self.hits}, misses={self.misses}, merged={self.merged}, "
+                f"evictions={self.evictions}, invalidations={self.invalidations}, hit_rate={self.hit_rate:.2f})")
+
+
+class _InFlight:
+    """ A load in progress that concurrent callers for the same key wait on. """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when the action is invalidated during the load, so that stale data is not stored.
+        self.invalidated = False
+        self.scope = None
+
+
+class ResponseCache:
+    """ A thread-safe TTL + LRU cache for the results of memoQ read actions.
+
+    Concurrent lookups of a key that is being loaded wait for that load instead of starting their own, so a
+    burst of identical requests costs one upstream call. Cached results are shared between callers and must
+    be treated as read-only.
+    >>> now = [0.0]
+    >>> cache = ResponseCache(ttls={'ListTMs': 10}, clock=lambda: now[0])
+    >>> cache.get_or_load('ListTMs', 'k', lambda: (200, ['tm']))
+    (200, ['tm'])
+    >>> cache.get_or_load('ListTMs', 'k', lambda: (200, ['other']))
+    (200, ['tm'])
+    >>> now[0] = 11
+    >>> cache.get_or_load('ListTMs', 'k', lambda: (200, ['new']))
+    (200, ['new'])
+    >>> cache.stats
+    CacheStats(hits=1, misses=2, merged=0, evictions=0, invalidations=0, hit_rate=0.33)
+    """
+
+    def __init__(self, ttls: Optional[dict] = None, maxsize: int = 1024,
+                 invalidations: Optional[dict] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        """ Initialize the cache.
+        :param ttls: seconds each action's results stay fresh, defaults to DEFAULT_TTLS
+        :param maxsize: maximum number of cached results; the least recently used are evicted first
+        :param invalidations: write action -> cached actions it invalidates, defaults to DEFAULT_INVALIDATIONS
+        :param clock: monotonic time source, in seconds
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.invalidations = dict(DEFAULT_INVALIDATIONS if invalidations is None else invalidations)
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries = OrderedDict()
+        # scope -> keys of the entries stored with it; None holds the unscoped entries.
+        self._scopes = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def caches(self, action: str) -> bool:
+        return action in self.ttls
+
+    def get_or_load(self, action: str, key: Hashable, load: Callable[[], tuple],
+                    scope: Optional[Hashable] = None) -> tuple:
+        """ Return the fresh cached result for key, or load it.
+
+        Only results with status 200 are stored; errors go back to the caller (and to callers merged with it)
+        without being cached.
+        :param action: the SOAP action, which selects the TTL
+        :param key: identifies the request, e.g. (URL, SOAPAction, payload)
+        :param load: performs the request and returns its (status, data) result
+        :param scope: the object the result describes, e.g. the GUID of the TM, see invalidate
+        """
+        full_key = (action, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                expires, result, _ = entry
+                if expires > self._clock():
+                    self._entries.move_to_end(full_key)
+                    self.stats.hits += 1
+                    return result
+                self._drop(full_key)
+
+            in_flight = self._in_flight.get(full_key)
+            if in_flight is None:
+                in_flight = self._in_flight[full_key] = _InFlight()
+                in_flight.scope = scope
+                self.stats.misses += 1
+                leader = True
+            else:
+                self.stats.merged += 1
+                leader = False
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            in_flight.result = load()
+        except BaseException as error:
+            # Merged callers get the error too, even an interrupt of this thread, rather than waiting forever.
+            in_flight.error = error
+            raise
+        finally:
+            try:
+                with self._lock:
+                    del self._in_flight[full_key]
+                    if in_flight.error is None and in_flight.result[0] == 200 and not in_flight.invalidated:
+                        self._store(full_key, in_flight.result, scope)
+            finally:
+                in_flight.done.set()
+        return in_flight.result
+
+    def _store(self, full_key: tuple, result: tuple, scope: Optional[Hashable]) -> None:
+        if full_key in self._entries:
+            self._drop(full_key)
+        self._entries[full_key] = (self._clock() + self.ttls[full_key[0]], result, scope)
+        self._scopes.setdefault(scope, set()).add(full_key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def _drop(self, full_key: tuple) -> None:
+        scope = self._entries.pop(full_key)[2]
+        keys = self._scopes[scope]
+        keys.discard(full_key)
+        if not keys:
+            del self._scopes[scope]
+
+    def invalidate(self, *actions: str, scope: Optional[Hashable] = None) -> int:
+        """ Drop the cached results of the given actions, or of every action when none are given.
+        :param scope: drop only the results stored with this scope and those stored without one, looked up
+            without scanning the cache; None drops them all
+        :return: the number of results dropped
+        """
+        with self._lock:
+            if scope is None:
+                keys = [key for key in self._entries if not actions or key[0] in actions]
+            else:
+                keys = [key for keys in (self._scopes.get(None, ()), self._scopes.get(scope, ()))
+                        for key in keys if not actions or key[0] in actions]
+            for key in keys:
+                self._drop(key)
+            for key, in_flight in self._in_flight.items():
+                if (not actions or key[0] in actions) and (scope is None or in_flight.scope in (None, scope)):
+                    in_flight.invalidated = True
+            self.stats.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def after_write(self, action: str, scope: Optional[Hashable] = None) -> None:
+        """ Invalidate the cached actions that a successful call of the write action makes stale.
+        :param scope: the object the write changed, e.g. the GUID of the TM an entry was added to
+        """
+        stale = self.invalidations.get(action)
+        if stale:
+            self.invalidate(*stale, scope=scope)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
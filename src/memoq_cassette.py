@@ -0,0 +1,287 @@
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from src.memoq_transport import Transport, Timeout
+
+MAGIC = b'MEMOQ-CASSETTE 1\n'
+REDACTED = b'***'
+
+_API_KEY = re.compile(rb'(<ApiKey\b[^>]*>)[^<]*(</ApiKey>)')
+# Response headers that are not recorded, as they may carry credentials.
+_SKIPPED_HEADERS = {'set-cookie', 'set-cookie2'}
+
+
+def redact(body: bytes, api_key: Optional[str] = None) -> bytes:
+    """ Hide the API key of a SOAP envelope: the ApiKey header element, and the key itself wherever it appears.
+    >>> redact(b'<soap:Header><ApiKey xmlns="ns">secret</ApiKey></soap:Header><x>secret</x>', 'secret')
+    b'<soap:Header><ApiKey xmlns="ns">***</ApiKey></soap:Header><x>***</x>'
+    """
+    body = _API_KEY.sub(rb'\1***\2', body)
+    if api_key:
+        body = body.replace(api_key.encode('utf-8'), REDACTED)
+    return body
+
+
+class CassetteEntry(NamedTuple):
+    """ One recorded call: the request, the response, and how long the server and the download took. """
+    started: float
+    path: str
+    soap_action: str
+    request: bytes
+    status: int
+    headers: dict
+    response: bytes
+    server: float
+    download: float
+
+    @property
+    def action(self) -> str:
+        return self.soap_action.rsplit('/', 1)[-1]
+
+
+class CassetteWriter:
+    """ Writes recorded calls to a gzip-compressed cassette file.
+
+    The file starts with a magic line; every call is then a JSON line describing it, followed by the raw request
+    and response bodies, so large bodies are stored as they are rather than escaped or base64-encoded.
+    Request bodies are redacted before they are written. Writing is thread-safe.
+    >>> out = io.BytesIO()
+    >>> with CassetteWriter(out, api_key='secret') as cassette:
+    ...     cassette.write('/tm', 'ns/ITMService/ListTMs', b'<ApiKey>secret</ApiKey>', 200, {}, b'<ok/>', 0.1, 0.0)
+    >>> entry, = iter_cassette(io.BytesIO(out.getvalue()))
+    >>> entry.action, entry.request, entry.response
+    ('ListTMs', b'<ApiKey>***</ApiKey>', b'<ok/>')
+    """
+
+    def __init__(self, path: Union[str, os.PathLike, BinaryIO], api_key: Optional[str] = None,
+                 compresslevel: int = 6) -> None:
+        """ Open a cassette for writing.
+        :param path: the cassette file, or a binary file object (left open)
+        :param api_key: the API key to redact, besides the ApiKey element of every envelope
+        :param compresslevel: gzip compression level
+        """
+        self.api_key = api_key
+        self.entries = 0
+        self._owned = isinstance(path, (str, os.PathLike))
+        self._raw = open(path, 'wb') if self._owned else path
+        self._out = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=compresslevel)
+        self._out.write(MAGIC)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def write(self, path: str, soap_action: str, request: bytes, status: int, headers: dict, response: bytes,
+              server: float, download: float, started: Optional[float] = None) -> None:
+        """ Record one call.
+        :param path: the URL path of the service
+        :param soap_action: the SOAPAction header
+        :param request: the request body, redacted here
+        :param status: the response status
+        :param headers: the response headers
+        :param response: the response body
+        :param server: seconds until the response headers arrived
+        :param download: seconds spent reading the body
+        :param started: when the call started, in perf_counter seconds; defaults to now
+        """
+        request = redact(bytes(request), self.api_key)
+        response = redact(response, self.api_key) if self.api_key else response
+        offset = (time.perf_counter() if started is None else started) - self._start
+        header = {'started': round(offset, 6), 'path': path, 'soap_action': soap_action, 'status': status,
+                  'headers': {name: value for name, value in headers.items()
+                              if name.lower() not in _SKIPPED_HEADERS},
+                  'server': round(server, 6), 'download': round(download, 6),
+                  'request_bytes': len(request), 'response_bytes': len(response)}
+        line = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            self._out.write(line)
+            self._out.write(request)
+            self._out.write(response)
+            self.entries += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._out.closed:
+                return
+            self._out.close()
+            if self._owned:
+                self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_cassette(path: Union[str, os.PathLike, BinaryIO]) -> Iterator[CassetteEntry]:
+    """ Read the calls of a cassette, in the order they were recorded.
+    :param path: the cassette file, or a binary file object
+    """
+    raw = open(path, 'rb') if isinstance(path, (str, os.PathLike)) else path
+    try:
+        with gzip.GzipFile(fileobj=raw, mode='rb') as cassette:
+            if cassette.readline() != MAGIC:
+                raise ValueError("Not a memoQ cassette")
+            for line in iter(cassette.readline, b''):
+                header = json.loads(line)
+                request = cassette.read(header['request_bytes'])
+                response = cassette.read(header['response_bytes'])
+                yield CassetteEntry(header['started'], header['path'], header['soap_action'], request,
+                                    header['status'], header['headers'], response, header['server'],
+                                    header['download'])
+    finally:
+        if raw is not path:
+            raw.close()
+
+
+class RecordingTransport(Transport):
+    """ Wraps a transport and records every call made through it to a cassette.
+
+    Responses are read in full before they are handed on, streamed ones included, so that they can be recorded;
+    a recording client does not have the flat memory use of streaming.
+    """
+
+    def __init__(self, transport: Transport, cassette: CassetteWriter) -> None:
+        self.transport = transport
+        self.cassette = cassette
+
+    def send(self, route: str, url: str, data, headers: dict, timeout: Timeout = None,
+             stream: bool = False) -> requests.Response:
+        started = time.perf_counter()
+        response = self.transport.send(route, url, data=data, headers=headers, timeout=timeout, stream=True)
+        received = time.perf_counter()
+        content = response.content
+        finished = time.perf_counter()
+        body = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+        self.cassette.write(urlsplit(url).path, headers.get('SOAPAction', ''), body, response.status_code,
+                            response.headers, content, received - started, finished - received, started)
+        return response
+
+    def connect_seconds(self) -> float:
+        return self.transport.connect_seconds()
+
+    def close(self) -> None:
+        self.transport.close()
+        self.cassette.close()
+
+
+class CassetteMiss(LookupError):
+    """ Raised by ReplayTransport for a request the cassette has no (more) responses to. """
+
+
+class _PacedBody(io.RawIOBase):
+    # A response body whose reads take as long, in total, as the recorded download.
+
+    def __init__(self, content: bytes, seconds: float) -> None:
+        self._content = memoryview(content)
+        self._offset = 0
+        self._seconds = seconds
+        self._start = None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._start is None:
+            self._start = time.perf_counter()
+        size = min(len(buffer), len(self._content) - self._offset)
+        buffer[:size] = self._content[self._offset:self._offset + size]
+        self._offset += size
+        if self._content:
+            due = self._start + self._seconds * self._offset / len(self._content)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return size
+
+
+class ReplayTransport(Transport):
+    """ Serves the responses of a cassette instead of calling a server.
+
+    A request is answered with the next unserved response recorded for the same service path, SOAPAction and
+    request body (API key ignored), so sessions such as chunked exports replay in order. Recorded calls can be
+    replayed with their original server and download times, scaled by speed, or as fast as possible.
+    >>> out = io.BytesIO()
+    >>> with CassetteWriter(out) as cassette:
+    ...     cassette.write('/tm', 'ns/ITMService/ListTMs', b'<ApiKey>k</ApiKey>', 200, {}, b'<ok/>', 0.5, 0.0)
+    >>> replay = ReplayTransport(io.BytesIO(out.getvalue()), speed=None)
+    >>> replay.send('', 'http://any/tm', b'<ApiKey>other</ApiKey>', {'SOAPAction': 'ns/ITMService/ListTMs'}).content
+    b'<ok/>'
+    """
+
+    def __init__(self, path: Union[str, os.PathLike, BinaryIO], speed: Optional[float] = 1.0, repeat: bool = False,
+                 match_body: bool = True) -> None:
+        """ Load a cassette.
+        :param path: the cassette file, or a binary file object
+        :param speed: replay the recorded timings this many times faster; None to replay as fast as possible
+        :param repeat: serve the responses of a request again, in turn, once they were all served; for load
+            tests that call more often than the recording did
+        :param match_body: match requests on their body too; False to answer by service path and action only,
+            in recorded order, e.g. when the replayed client sends other parameters
+        """
+        self.speed = speed
+        self.repeat = repeat
+        self.match_body = match_body
+        self.entries = list(iter_cassette(path))
+        self.served = 0
+        self._queues: Dict[tuple, deque] = defaultdict(deque)
+        for entry in self.entries:
+            self._queues[self._key(entry.path, entry.soap_action, entry.request)].append(entry)
+        self._lock = threading.Lock()
+
+    def _key(self, path: str, soap_action: str, body: bytes) -> tuple:
+        return (path.rstrip('/'), soap_action) + ((redact(body),) if self.match_body else ())
+
+    def _next(self, key: tuple) -> CassetteEntry:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise CassetteMiss(f"No recorded response left for {key[1]} on {key[0]}")
+            entry = queue.popleft()
+            if self.repeat:
+                queue.append(entry)
+            self.served += 1
+            return entry
+
+    def send(self, route: str, url: str, data, headers: dict, timeout: Timeout = None,
+             stream: bool = False) -> requests.Response:
+        body = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+        entry = self._next(self._key(urlsplit(url).path, headers.get('SOAPAction', ''), body))
+        paced = self.speed is not None
+        if paced:
+            time.sleep(entry.server / self.speed)
+
+        response = requests.Response()
+        response.status_code = entry.status
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.url = url
+        response.encoding = 'utf-8'
+        response.elapsed = datetime.timedelta(seconds=entry.server)
+        response.raw = _PacedBody(entry.response, entry.download / self.speed if paced else 0.0)
+        if not stream:
+            response.content  # Read now, as a non-streamed request would.
+        return response
+
+    def summary(self) -> List[Tuple[str, int, int]]:
+        """ (SOAPAction, calls, response bytes) of the recorded calls, by action. """
+        totals = defaultdict(lambda: [0, 0])
+        for entry in self.entries:
+            totals[entry.soap_action][0] += 1
+            totals[entry.soap_action][1] += len(entry.response)
+        return [(action, calls, size) for action, (calls, size) in sorted(totals.items())]
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
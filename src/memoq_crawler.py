@@ -0,0 +1,255 @@
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, Set, TextIO, Union
+from queue import Empty, Full, Queue
+import dataclasses
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from src.memoq_records import Record
+
+logger = logging.getLogger(__name__)
+
+# Seconds a pipeline thread waits on a queue before checking whether the crawl was stopped.
+_POLL = 0.05
+
+
+class CrawlRecord(NamedTuple):
+    """ A crawled project: its ServerProjectInfo and its translation documents (ListProjectTranslationDocuments2),
+    in the client's result format, or the error that failed the document listing. """
+    guid: str
+    project: Any
+    documents: Optional[list]
+    error: Optional[str] = None
+
+
+class CrawlStats:
+    """ Progress of a crawl, updated as it runs. """
+
+    def __init__(self) -> None:
+        self.projects = 0
+        self.documents = 0
+        self.failed = 0
+        # Projects of the listing left out as already crawled.
+        self.skipped = 0
+        self.elapsed = 0.0
+
+    @property
+    def projects_per_second(self) -> float:
+        return self.projects / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        return (f"CrawlStats(projects={self.projects}, documents={self.documents}, failed={self.failed}, "
+                f"skipped={self.skipped}, elapsed={self.elapsed:.2f}s, {self.projects_per_second:.1f} projects/s)")
+
+
+def _guid(project: Any) -> str:
+    value = project.ServerProjectGuid if isinstance(project, Record) else project['ServerProjectGuid']
+    return str(value)
+
+
+def _as_list(data: Any) -> list:
+    # A parsed listing is None when empty and the item itself when there is only one.
+    if isinstance(data, str):
+        data = json.loads(data)
+    if data is None:
+        return []
+    return data if isinstance(data, list) else [data]
+
+
+def json_default(value: Any) -> Any:
+    """ Make records, GUIDs and datetimes JSON-serializable, for json.dumps(default=...).
+    >>> json.dumps({'at': datetime.datetime(2023, 4, 1, 10, 0), 'id': uuid.UUID(int=1)}, default=json_default)
+    '{"at": "2023-04-01T10:00:00", "id": "00000000-0000-0000-0000-000000000001"}'
+    """
+    if isinstance(value, Record):
+        data = {field.name: getattr(value, field.name) for field in dataclasses.fields(value)
+                if field.name != 'extra' and getattr(value, field.name) is not None}
+        data.update(value.extra or {})
+        return data
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def read_crawled(path: Union[str, os.PathLike]) -> Set[str]:
+    """ The GUIDs of the projects an NDJSON crawl file holds without an error, for resuming the crawl.
+
+    A last line cut short by an interrupted crawl is removed from the file.
+    :param path: the file written by ProjectCrawler.crawl_to; it need not exist
+    """
+    done = set()
+    try:
+        with open(path, 'r+b') as file:
+            end = 0
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                end += len(line)
+                record = json.loads(line)
+                if record.get('error') is None:
+                    done.add(record['guid'])
+            file.truncate(end)
+    except FileNotFoundError:
+        pass
+    return done
+
+
+class ProjectCrawler:
+    """ Crawls the projects of a memoQ Server and the translation documents of each, as one pipeline.
+
+    One thread streams the project listing (MemoqProjects.iter_projects) into a bounded queue; max_workers
+    threads take projects from it and list their documents (ListProjectTranslationDocuments2) concurrently; the
+    crawled projects are handed out through a second bounded queue as they complete. When the consumer falls
+    behind, the queues fill up and the workers, then the listing, wait: at most max_workers + 2 * queue_size
+    projects are held at any time, however large the server.
+
+    A crawl can be resumed: projects whose GUID is given in skip are not crawled again, and crawl_to reads
+    them back from its NDJSON file.
+    """
+
+    def __init__(self, project_client, max_workers: int = 8, queue_size: Optional[int] = None,
+                 filter: Optional[Union[str, dict]] = None) -> None:
+        """ Initialize the crawler.
+        :param project_client: the MemoqProjects to crawl with
+        :param max_workers: number of document listings in flight at once
+        :param queue_size: projects waiting in each queue; defaults to 2 * max_workers
+        :param filter: the filter of the project listing, see MemoqProjects.list_projects
+        """
+        self.project_client = project_client
+        self.max_workers = max_workers
+        self.queue_size = queue_size or 2 * max_workers
+        self.filter = filter
+        self.stats = CrawlStats()
+
+    def crawl(self, skip: Iterable[str] = ()) -> Iterator[CrawlRecord]:
+        """ Crawl the server and yield a CrawlRecord per project, in the order they complete.
+
+        A project whose documents cannot be listed is yielded with the error; a failed project listing is
+        raised once the projects already listed are crawled. Closing the generator stops the crawl.
+        :param skip: GUIDs of projects not to crawl, e.g. those of an interrupted crawl
+        :return: a generator of CrawlRecords
+        :raises MemoqSoapError: when the server rejects the project listing
+        """
+        skip = {str(guid) for guid in skip}
+        self.stats = stats = CrawlStats()
+        projects, results = Queue(self.queue_size), Queue(self.queue_size)
+        stop = threading.Event()
+        failure = []
+
+        def put(queue: Queue, item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=_POLL)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def produce() -> None:
+            listing = self.project_client.iter_projects(self.filter)
+            try:
+                for project in listing:
+                    guid = _guid(project)
+                    if guid in skip:
+                        stats.skipped += 1
+                    elif not put(projects, (guid, project)):
+                        return
+            except Exception as error:
+                failure.append(error)
+            finally:
+                listing.close()
+                for _ in range(self.max_workers):
+                    put(projects, None)
+
+        def work() -> None:
+            while not stop.is_set():
+                try:
+                    item = projects.get(timeout=_POLL)
+                except Empty:
+                    continue
+                if item is None:
+                    break
+                put(results, self._crawl_project(*item))
+            put(results, None)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=produce, name='crawl-projects', daemon=True)]
+        threads += [threading.Thread(target=work, name=f'crawl-documents-{number}', daemon=True)
+                    for number in range(self.max_workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            running = self.max_workers
+            while running:
+                record = results.get()
+                if record is None:
+                    running -= 1
+                    continue
+                stats.projects += 1
+                if record.error is None:
+                    stats.documents += len(record.documents)
+                else:
+                    stats.failed += 1
+                stats.elapsed = time.perf_counter() - start
+                yield record
+            if failure:
+                raise failure[0]
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            stats.elapsed = time.perf_counter() - start
+            logger.info("%r", stats)
+
+    def _crawl_project(self, guid: str, project: Any) -> CrawlRecord:
+        try:
+            status, data = self.project_client.list_project_translation_documents2(guid)
+        except Exception as error:
+            logger.warning("Listing the documents of project %s failed: %r", guid, error)
+            return CrawlRecord(guid, project, None, f'{type(error).__name__}: {error}')
+        if status != 200:
+            return CrawlRecord(guid, project, None, str(data))
+        return CrawlRecord(guid, project, _as_list(data))
+
+    def crawl_to(self, sink: Union[Callable[[CrawlRecord], Any], str, os.PathLike, TextIO],
+                 skip: Iterable[str] = (), resume: bool = True) -> CrawlStats:
+        """ Crawl the server into a sink.
+        :param sink: a callback given every CrawlRecord; or an NDJSON file, path or text file object, to which a
+            JSON object per project is appended ({"guid", "project", "documents"}, or "error" instead of
+            "documents"), flushed as it is written
+        :param skip: GUIDs of projects not to crawl
+        :param resume: with a file path, skip the projects the file already holds without an error, so that an
+            interrupted crawl continues where it stopped; a project that failed is crawled again and its new
+            line follows the old one
+        :return: the CrawlStats of the crawl
+        """
+        if callable(sink):
+            for record in self.crawl(skip):
+                sink(record)
+            return self.stats
+
+        if isinstance(sink, (str, os.PathLike)):
+            skip = set(skip) | (read_crawled(sink) if resume else set())
+            with open(sink, 'a' if resume else 'w', encoding='utf-8') as file:
+                return self.crawl_to(file, skip)
+
+        for record in self.crawl(skip):
+            line = {'guid': record.guid, 'project': record.project}
+            if record.error is None:
+                line['documents'] = record.documents
+            else:
+                line['error'] = record.error
+            sink.write(json.dumps(line, ensure_ascii=False, separators=(',', ':'), default=json_default) + '\n')
+            sink.flush()
+        return self.stats
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
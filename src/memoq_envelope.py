@@ -0,0 +1,218 @@
+from typing import Any
+import base64
+import binascii
+import datetime
+import threading
+
+# Bytes of a binary parameter base64-encoded at a time by build_into; a multiple of 3, so that the slices
+# encode without padding and their encodings simply follow one another.
+_BASE64_SLICE = 3 * 16384
+
+
+def escape_text(value: str) -> str:
+    """ Escape a string for use as XML element content.
+    >>> escape_text('a < b & "c"')
+    'a &lt; b &amp; "c"'
+    """
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    return value
+
+
+def format_scalar(value: Any) -> str:
+    """ Format a scalar the way the memoQ (WCF) service expects it, unescaped.
+    >>> format_scalar(True), format_scalar(42), format_scalar(b'TMX')
+    ('true', '42', 'VE1Y')
+    >>> format_scalar(datetime.datetime(2023, 5, 1, 12, 30))
+    '2023-05-01T12:30:00'
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def serialize_element(name: str, value: Any) -> str:
+    """ Serialize one parameter as an XML element.
+
+    Dicts become nested elements. A list of scalars repeats the element once per item; a list of dicts is
+    written inside a single element, each dict contributing its own children (the WCF array layout, e.g.
+    [{'TMEntry': {...}}, {'TMEntry': {...}}]). None is sent as xsi:nil.
+    >>> serialize_element('params', {'tmName': 'R&D', 'langs': ['eng', 'ger']})
+    '<params><tmName>R&amp;D</tmName><langs>eng</langs><langs>ger</langs></params>'
+    >>> serialize_element('entries', [{'TMEntry': {'Source': 'a'}}, {'TMEntry': {'Source': 'b'}}])
+    '<entries><TMEntry><Source>a</Source></TMEntry><TMEntry><Source>b</Source></TMEntry></entries>'
+    >>> serialize_element('filter', None)
+    '<filter xsi:nil="true"/>'
+    """
+    parts = []
+    _write_element(parts.append, name, value)
+    return ''.join(parts)
+
+
+def _write_element(write, name: str, value: Any) -> None:
+    # Appends pieces to one flat list, so deep or long structures are joined exactly once.
+    kind = type(value)
+    if kind is str:
+        write(f'<{name}>{escape_text(value)}</{name}>')
+    elif value is None:
+        write(f'<{name} xsi:nil="true"/>')
+    elif kind is dict or isinstance(value, dict):
+        write(f'<{name}>')
+        _write_children(write, value)
+        write(f'</{name}>')
+    elif isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            write(f'<{name}>')
+            for item in value:
+                _write_children(write, item)
+            write(f'</{name}>')
+        else:
+            for item in value:
+                _write_element(write, name, item)
+    else:
+        write(f'<{name}>{escape_text(format_scalar(value))}</{name}>')
+
+
+def _write_children(write, value: dict) -> None:
+    for key, child in value.items():
+        if type(child) is str:
+            write(f'<{key}>{escape_text(child)}</{key}>')
+        else:
+            _write_element(write, key, child)
+
+
+class EnvelopeBuilder:
+    """ Builds memoQ SOAP envelopes as UTF-8 bytes.
+
+    The envelope head (with the API key) is encoded once. For each (action, parameter names) shape the
+    fixed markup between the parameter values is encoded once and cached, so building a request only
+    escapes and encodes the values and joins the pieces.
+    >>> builder = EnvelopeBuilder('http://kilgray.com/memoqservices/2007', 'key')
+    >>> body = builder.build('GetTMInfo', {'tmGuid': 'a<b'})
+    >>> body[body.index(b'<soap:Body>'):]
+    b'<soap:Body><GetTMInfo xmlns="http://kilgray.com/memoqservices/2007"><tmGuid>a&lt;b</tmGuid></GetTMInfo></soap:Body></soap:Envelope>'
+    """
+
+    def __init__(self, namespace: str, api_key: str) -> None:
+        """ Initialize the envelope builder.
+        :param namespace: the memoQ service namespace
+        :param api_key: the API key sent in the SOAP header
+        """
+        self._namespace = namespace
+        self._head = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+            f'<soap:Header><ApiKey xmlns="{namespace}">{escape_text(api_key or "")}</ApiKey></soap:Header>'
+            '<soap:Body>'
+        ).encode('utf-8')
+        self._tail = b'</soap:Body></soap:Envelope>'
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _template(self, action: str, names: tuple) -> tuple:
+        """ Return the encoded markup around the values of one request shape: len(names) + 1 fragments,
+        the first starting with the envelope head and the last ending with the envelope tail. """
+        key = (action, names)
+        template = self._templates.get(key)
+        if template is None:
+            fragments = [f'<{action} xmlns="{self._namespace}">']
+            for name in names:
+                fragments[-1] += f'<{name}>'
+                fragments.append(f'</{name}>')
+            fragments[-1] += f'</{action}>'
+            encoded = [fragment.encode('utf-8') for fragment in fragments]
+            encoded[0] = self._head + encoded[0]
+            encoded[-1] += self._tail
+            template = tuple(encoded)
+            with self._lock:
+                self._templates.setdefault(key, template)
+        return template
+
+    def build(self, action: str, params: dict) -> bytes:
+        """ Build the envelope for an action.
+        :param action: the SOAP action, e.g. 'ListTMs'
+        :param params: the action's parameters; values may be scalars, bytes (sent as base64), dicts or lists
+        :return: the encoded envelope
+        """
+        return b''.join(self._pieces(action, params))
+
+    def build_into(self, buffer: bytearray, action: str, params: dict) -> memoryview:
+        """ Build the envelope for an action into a caller-owned buffer instead of a new bytes object.
+
+        Meant for large binary parameters sent over and over, such as TMX chunks: the buffer is grown once to
+        the largest envelope and then reused. Binary parameters are base64-encoded a 48 KiB slice at a time
+        straight into their place in the buffer, so neither the envelope nor a base64 copy of the chunk is
+        allocated per call.
+        :param buffer: the buffer to write to; it is grown as needed
+        :param action: the SOAP action, e.g. 'AddNextTMXChunk'
+        :param params: the action's parameters, as for build
+        :return: a view of the envelope at the start of buffer, valid until the buffer is written again
+        >>> builder = EnvelopeBuilder('ns', 'key')
+        >>> buffer = bytearray()
+        >>> bytes(builder.build_into(buffer, 'AddNextTMXChunk', {'tmxData': b'abc'})) == builder.build('AddNextTMXChunk', {'tmxData': b'abc'})
+        True
+        >>> data = bytes(range(256)) * 500
+        >>> bytes(builder.build_into(buffer, 'AddNextTMXChunk', {'tmxData': data})) == builder.build('AddNextTMXChunk', {'tmxData': data})
+        True
+        """
+        # Binary parameters come back unencoded, as byte memoryviews.
+        pieces = self._pieces(action, params, encode=False)
+        size = sum(4 * ((len(piece) + 2) // 3) if type(piece) is memoryview else len(piece) for piece in pieces)
+        if len(buffer) < size:
+            buffer += bytes(size - len(buffer))
+        view = memoryview(buffer)
+        position = 0
+        for piece in pieces:
+            if type(piece) is memoryview:
+                for start in range(0, len(piece), _BASE64_SLICE):
+                    encoded = binascii.b2a_base64(piece[start:start + _BASE64_SLICE], newline=False)
+                    view[position:position + len(encoded)] = encoded
+                    position += len(encoded)
+            else:
+                view[position:position + len(piece)] = piece
+                position += len(piece)
+        return view[:size]
+
+    def _pieces(self, action: str, params: dict, encode: bool = True) -> list:
+        template = self._templates.get((action, tuple(params)))
+        if template is None:
+            template = self._template(action, tuple(params))
+
+        parts = [template[0]]
+        append = parts.append
+        index = 1
+        for value in params.values():
+            kind = type(value)
+            if kind is str:
+                append(escape_text(value).encode('utf-8'))
+            elif kind is bytes or kind is bytearray or kind is memoryview:
+                append(base64.b64encode(value) if encode else memoryview(value).cast('B'))
+            elif value is None or isinstance(value, (dict, list, tuple)):
+                # Nested, list or nil values change the markup itself, so the body is serialized in one piece.
+                return [self._build_nested(action, params)]
+            else:
+                append(escape_text(format_scalar(value)).encode('utf-8'))
+            append(template[index])
+            index += 1
+        return parts
+
+    def _build_nested(self, action: str, params: dict) -> bytes:
+        pieces = [f'<{action} xmlns="{self._namespace}">']
+        write = pieces.append
+        for name, value in params.items():
+            _write_element(write, name, value)
+        write(f'</{action}>')
+        return b''.join((self._head, ''.join(pieces).encode('utf-8'), self._tail))
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,202 @@
+from typing import Callable, Dict, Optional
+from collections import Counter
+import math
+import threading
+
+# The phases of a call, in order. 'build' is the envelope serialization, 'connect' the time spent opening
+# connections (DNS, TCP and TLS), 'server' the time until the response headers arrive (upload and server time),
+# 'download' the time to read the body, 'parse' xmltodict.parse and 'serialize' the conversion of the parsed
+# result to the client's result format (json.dumps in RESULT_JSON mode, records in RESULT_RECORDS mode).
+PHASES = ('build', 'connect', 'server', 'download', 'parse', 'serialize')
+
+Observer = Callable[['CallMetrics'], None]
+
+
+class CallMetrics:
+    """ What one SOAP call cost, handed to the observers of a MemoqSoap.
+
+    A call retried by the resilience layer gives one CallMetrics per attempt; a cached result gives none.
+    >>> metrics = CallMetrics('ITMService', 'GetTMInfo', 200, 512, 2048, {'server': 0.25, 'parse': 0.01})
+    >>> metrics.tag, metrics.total, metrics.ok
+    ('ITMService/GetTMInfo', 0.26, True)
+    """
+
+    __slots__ = ('interface', 'action', 'status', 'request_bytes', 'response_bytes', 'phases', 'error', 'streamed')
+
+    def __init__(self, interface: str, action: str, status: Optional[int] = None, request_bytes: int = 0,
+                 response_bytes: int = 0, phases: Optional[Dict[str, float]] = None, error: Optional[str] = None,
+                 streamed: bool = False) -> None:
+        """ Initialize the metrics of a call.
+        :param interface: the service interface, e.g. 'ITMService'
+        :param action: the action, e.g. 'GetTMInfo'
+        :param status: the HTTP status, or None when no response arrived
+        :param request_bytes: size of the SOAP envelope sent
+        :param response_bytes: size of the response body received
+        :param phases: seconds spent in each phase of PHASES that the call went through
+        :param error: the name of the exception the call raised, if any
+        :param streamed: the call was made with iter_soap_request or iter_soap_text; its download phase then
+            includes the time the caller spent between chunks, and its parsing is not timed separately
+        """
+        self.interface = interface
+        self.action = action
+        self.status = status
+        self.request_bytes = request_bytes
+        self.response_bytes = response_bytes
+        self.phases = phases if phases is not None else {}
+        self.error = error
+        self.streamed = streamed
+
+    @property
+    def tag(self) -> str:
+        return f"{self.interface}/{self.action}"
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status == 200
+
+    def __repr__(self) -> str:
+        phases = ', '.join(f"{phase}={self.phases[phase] * 1e3:.2f}ms" for phase in PHASES if phase in self.phases)
+        return (f"CallMetrics({self.tag}, status={self.status}, request_bytes={self.request_bytes}, "
+                f"response_bytes={self.response_bytes}, {phases}{f', error={self.error}' if self.error else ''})")
+
+
+class LatencyHistogram:
+    """ A latency histogram with logarithmic buckets: constant memory, percentiles within a relative precision.
+    >>> histogram = LatencyHistogram()
+    >>> for ms in range(1, 101):
+    ...     histogram.record(ms / 1000)
+    >>> histogram.count, round(histogram.percentile(50), 3), round(histogram.percentile(99), 3)
+    (100, 0.05, 0.099)
+    """
+
+    def __init__(self, precision: float = 0.01, lowest: float = 1e-6) -> None:
+        """ Initialize an empty histogram.
+        :param precision: relative width of a bucket, and so the relative error of the percentiles
+        :param lowest: values below this (seconds) share the first bucket
+        """
+        self.lowest = lowest
+        self._log_growth = math.log1p(precision)
+        self._buckets = Counter()
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        index = int(math.log(value / self.lowest) / self._log_growth) if value > self.lowest else 0
+        self._buckets[index] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """ The value below which percent % of the recorded values fall; 0.0 when nothing was recorded. """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                # The middle of the bucket, clamped to the values actually seen.
+                value = self.lowest * math.exp((index + 0.5) * self._log_growth)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+
+class ActionStats:
+    """ Aggregated metrics of the calls of one interface/action. """
+
+    def __init__(self, tag: str, precision: float = 0.01) -> None:
+        self.tag = tag
+        self.calls = 0
+        self.errors = 0
+        self.statuses = Counter()
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.phase_seconds = dict.fromkeys(PHASES, 0.0)
+        self.latency = LatencyHistogram(precision)
+
+    def add(self, metrics: CallMetrics) -> None:
+        self.calls += 1
+        self.errors += not metrics.ok
+        self.statuses[metrics.error or metrics.status] += 1
+        self.request_bytes += metrics.request_bytes
+        self.response_bytes += metrics.response_bytes
+        for phase, seconds in metrics.phases.items():
+            self.phase_seconds[phase] += seconds
+        self.latency.record(metrics.total)
+
+    def summary(self) -> dict:
+        """ Calls, errors, statuses, latency percentiles and mean phase times (seconds), and bytes moved. """
+        calls = self.calls or 1
+        return {'tag': self.tag, 'calls': self.calls, 'errors': self.errors, 'statuses': dict(self.statuses),
+                'p50': self.latency.percentile(50), 'p95': self.latency.percentile(95),
+                'p99': self.latency.percentile(99), 'max': self.latency.max, 'mean': self.latency.mean,
+                'phases': {phase: seconds / calls for phase, seconds in self.phase_seconds.items()},
+                'request_bytes': self.request_bytes, 'response_bytes': self.response_bytes}
+
+
+class MetricsAggregator:
+    """ An observer that aggregates the calls of one or more clients per interface/action, thread-safely.
+    >>> aggregator = MetricsAggregator()
+    >>> for ms in (10, 20, 30, 40):
+    ...     aggregator(CallMetrics('ITMService', 'ListTMs', 200, 300, 900, {'server': ms / 1000}))
+    >>> aggregator(CallMetrics('ITMService', 'ListTMs', None, 300, 0, {'server': 0.005}, error='ConnectTimeout'))
+    >>> summary = aggregator.summary()['ITMService/ListTMs']
+    >>> summary['calls'], summary['errors'], summary['statuses'], round(summary['p50'], 3), summary['response_bytes']
+    (5, 1, {200: 4, 'ConnectTimeout': 1}, 0.02, 3600)
+    """
+
+    def __init__(self, precision: float = 0.01) -> None:
+        """ Initialize an empty aggregator.
+        :param precision: relative precision of the latency percentiles
+        """
+        self.precision = precision
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: CallMetrics) -> None:
+        tag = metrics.tag
+        with self._lock:
+            stats = self._stats.get(tag)
+            if stats is None:
+                stats = self._stats[tag] = ActionStats(tag, self.precision)
+            stats.add(metrics)
+
+    def summary(self) -> Dict[str, dict]:
+        """ ActionStats.summary() of every interface/action seen, keyed by tag. """
+        with self._lock:
+            return {tag: stats.summary() for tag, stats in sorted(self._stats.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def report(self) -> str:
+        """ The summary as a text table, latencies and mean phase times in milliseconds. """
+        columns = ['calls', 'errors', 'p50', 'p95', 'p99'] + list(PHASES) + ['kB in']
+        summaries = self.summary()
+        width = max([len('action')] + [len(tag) for tag in summaries]) + 2
+        rows = [f"{'action':<{width}}" + ''.join(f"{column:>10}" for column in columns)]
+        for tag, summary in summaries.items():
+            values = [summary['calls'], summary['errors']]
+            values += [f"{summary[key] * 1e3:.2f}" for key in ('p50', 'p95', 'p99')]
+            values += [f"{summary['phases'][phase] * 1e3:.2f}" for phase in PHASES]
+            values.append(f"{summary['response_bytes'] / 1024:.1f}")
+            rows.append(f"{tag:<{width}}" + ''.join(f"{value:>10}" for value in values))
+        return '\n'.join(rows)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,365 @@
+from typing import Any, Iterable, List, Optional, Tuple, Union
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from src.memoq_envelope import format_scalar
+from src.memoq_records import Record, ServerProjectInfo
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    guid TEXT PRIMARY KEY,
+    name TEXT,
+    client TEXT,
+    source_language TEXT,
+    status TEXT,
+    deadline TEXT,
+    last_changed TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_client ON projects (client, deadline);
+CREATE INDEX IF NOT EXISTS projects_source_language ON projects (source_language, deadline);
+CREATE INDEX IF NOT EXISTS projects_status ON projects (status, deadline);
+CREATE INDEX IF NOT EXISTS projects_deadline ON projects (deadline);
+CREATE TABLE IF NOT EXISTS project_languages (
+    language TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    deadline TEXT,
+    PRIMARY KEY (language, guid)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS project_languages_deadline ON project_languages (language, deadline);
+CREATE INDEX IF NOT EXISTS project_languages_guid ON project_languages (guid);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+def utc_text(value: Optional[datetime.datetime]) -> Optional[str]:
+    """ A datetime as fixed-width UTC text, so that the stored times sort and compare as strings.
+    Naive datetimes are taken to be UTC, as memoQ sends them.
+    >>> utc_text(datetime.datetime(2023, 4, 1, 12, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2))))
+    '2023-04-01T10:00:00.000000Z'
+    >>> utc_text(datetime.datetime(2023, 4, 1, 10, 0))
+    '2023-04-01T10:00:00.000000Z'
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+# The fields of a project stored in indexed columns.
+_COLUMNS = ('ServerProjectGuid', 'Name', 'Client', 'SourceLanguageCode', 'ProjectStatus', 'Deadline', 'LastChanged',
+            'TargetLanguageCodes')
+
+
+def _project_row(project: Any) -> Tuple[list, str]:
+    """ The column values of a project and its JSON text, which ServerProjectInfo.from_dict reads back.
+
+    A parsed item is stored as it is and only its indexed fields are decoded; a record is encoded back.
+    >>> _project_row({'Name': 'P', 'TargetLanguageCodes': {'string': ['ger', 'fre']}})
+    ([None, 'P', None, None, None, None, None, ('ger', 'fre')], '{"Name":"P","TargetLanguageCodes":{"string":["ger","fre"]}}')
+    >>> _project_row({'TargetLanguageCodes': {'@xmlns:b': 'http://schemas.microsoft.com/2003/10/Serialization/Arrays',
+    ...                                       'b:string': 'ger'}})[0][-1]
+    ('ger',)
+    """
+    if not isinstance(project, Record):
+        parsers = ServerProjectInfo._parsers
+        return ([parsers[name](project.get(name)) for name in _COLUMNS],
+                json.dumps(project, ensure_ascii=False, separators=(',', ':')))
+    data = dict(project.extra or {})
+    for name in ServerProjectInfo._parsers:
+        value = getattr(project, name)
+        if value is not None:
+            data[name] = list(value) if isinstance(value, tuple) else format_scalar(value)
+    return [getattr(project, name) for name in _COLUMNS], json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class ProjectSyncReport:
+    """ Outcome of ProjectStore.sync. """
+
+    def __init__(self, full: bool) -> None:
+        # Whether the whole listing was fetched, which also detects deleted projects.
+        self.full = full
+        self.fetched = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        # Fetched projects without a ServerProjectGuid, which cannot be stored.
+        self.skipped = 0
+        self.watermark = None
+        self.elapsed = 0.0
+
+    def __repr__(self) -> str:
+        return (f"ProjectSyncReport(full={self.full}, fetched={self.fetched}, inserted={self.inserted}, "
+                f"updated={self.updated}, unchanged={self.unchanged}, deleted={self.deleted}, "
+                f"skipped={self.skipped}, watermark={self.watermark!r}, elapsed={self.elapsed:.2f}s)")
+
+
+class ProjectStore:
+    """ A local copy of the memoQ Server's project list in an SQLite database, kept up to date incrementally.
+
+    sync fetches only the projects changed since the last sync, with a LastChangedAfter filter on ListProjects,
+    and upserts them. As a changed filter cannot tell about deleted projects, every full_sync_interval seconds
+    sync lists all the projects instead and drops the ones that are gone. query answers from the indexed
+    local copy, without a call, so dashboards can poll it as often as they like.
+
+    Syncs write in one transaction, so queries, which may run on other threads meanwhile, see the store as it
+    was before or after a sync, never halfway.
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory, ProjectStore(os.path.join(directory, 'p.db')) as store:
+    ...     store.upsert([{'ServerProjectGuid': '3353ec0e-5a99-488b-bc78-0005003e2b02', 'Name': 'Manual',
+    ...                    'Client': 'Acme', 'LastChanged': '2023-04-01T10:00:00Z',
+    ...                    'TargetLanguageCodes': {'string': ['ger', 'fre']}}])
+    ...     [project.Name for project in store.query(client='Acme', target_language='fre')], len(store)
+    (1, 0, 0)
+    (['Manual'], 1)
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], full_sync_interval: float = 3600.0, overlap: float = 60.0,
+                 clock=time.time) -> None:
+        """ Open (or create) a store.
+        :param path: the SQLite database file
+        :param full_sync_interval: seconds between the syncs that list every project to detect deletions
+        :param overlap: seconds before the last change seen from which changes are fetched again, so that
+            changes saved on the server while a sync was listing are not missed
+        :param clock: the time function timing full syncs, in seconds
+        """
+        self.path = os.fspath(path)
+        self.full_sync_interval = full_sync_interval
+        self.overlap = overlap
+        self.clock = clock
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._db = self._connect()
+        self._db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # Write-ahead logging lets queries read the last committed state while a sync writes.
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        # One connection per querying thread.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def __enter__(self) -> 'ProjectStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+    def __len__(self) -> int:
+        return self._reader().execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+
+    def state(self, key: str) -> Optional[str]:
+        """ A value saved by sync: 'watermark', the last LastChanged seen, or 'last_full_sync', the clock time
+        of the last full sync. """
+        row = self._reader().execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_state(self, key: str, value: Any) -> None:
+        self._db.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, str(value)))
+
+    def needs_full_sync(self) -> bool:
+        """ Whether the next sync lists every project: on the first sync, and every full_sync_interval seconds. """
+        last = self.state('last_full_sync')
+        return last is None or self.clock() - float(last) >= self.full_sync_interval
+
+    def sync(self, project_client, full: Optional[bool] = None) -> ProjectSyncReport:
+        """ Bring the store up to date with the server.
+        :param project_client: the MemoqProjects to list with
+        :param full: True to list every project and drop the deleted ones, False to fetch the changed projects
+            only; by default, see needs_full_sync
+        :return: the ProjectSyncReport
+        :raises MemoqSoapError: when the server rejects the listing; the store is then left unchanged
+        """
+        start = time.perf_counter()
+        with self._write_lock:
+            watermark = self.state('watermark')
+            if full is None:
+                full = self.needs_full_sync()
+            full = full or watermark is None
+            report = ProjectSyncReport(full)
+            if full:
+                projects = project_client.iter_projects()
+            else:
+                since = datetime.datetime.strptime(watermark, '%Y-%m-%dT%H:%M:%S.%fZ') - \
+                    datetime.timedelta(seconds=self.overlap)
+                projects = project_client.iter_projects({'LastChangedAfter': since.strftime('%Y-%m-%dT%H:%M:%SZ')})
+
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if full:
+                    self._db.execute('CREATE TEMP TABLE IF NOT EXISTS seen (guid TEXT PRIMARY KEY)')
+                    self._db.execute('DELETE FROM seen')
+                watermark = self._upsert(projects, report, watermark, seen=full)
+                if full:
+                    stale = [row[0] for row in self._db.execute(
+                        'SELECT guid FROM projects WHERE guid NOT IN (SELECT guid FROM seen)')]
+                    self._delete(stale)
+                    report.deleted = len(stale)
+                    self._db.execute('DELETE FROM seen')
+                    self._set_state('last_full_sync', self.clock())
+                if watermark is not None:
+                    self._set_state('watermark', watermark)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            if full:
+                # Fresh statistics let the planner pick the most selective index for a query.
+                self._db.execute('ANALYZE')
+        report.watermark = watermark
+        report.elapsed = time.perf_counter() - start
+        logger.info("%r", report)
+        return report
+
+    def upsert(self, projects: Iterable[Any]) -> Tuple[int, int, int]:
+        """ Insert or update projects, e.g. ones just created or fetched with a custom filter.
+        :param projects: ServerProjectInfo items, as dicts or records; those without a ServerProjectGuid are
+            skipped
+        :return: the number of projects inserted, updated and unchanged
+        """
+        report = ProjectSyncReport(False)
+        with self._write_lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._upsert(projects, report, None, seen=False)
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        return report.inserted, report.updated, report.unchanged
+
+    def _upsert(self, projects: Iterable[Any], report: ProjectSyncReport, watermark: Optional[str],
+                seen: bool) -> Optional[str]:
+        # Returns the latest LastChanged of the store and the projects written.
+        execute = self._db.execute
+        for project in projects:
+            (guid, name, client, source_language, status, deadline, last_changed, targets), data = \
+                _project_row(project)
+            report.fetched += 1
+            if guid is None:
+                report.skipped += 1
+                continue
+            guid, deadline, last_changed = str(guid), utc_text(deadline), utc_text(last_changed)
+            if seen:
+                execute('INSERT OR IGNORE INTO seen (guid) VALUES (?)', (guid,))
+            if last_changed is not None and (watermark is None or last_changed > watermark):
+                watermark = last_changed
+
+            row = execute('SELECT last_changed FROM projects WHERE guid = ?', (guid,)).fetchone()
+            if row is not None and last_changed is not None and row[0] == last_changed:
+                report.unchanged += 1
+                continue
+            execute('INSERT OR REPLACE INTO projects (guid, name, client, source_language, status, deadline, '
+                    'last_changed, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (guid, name, client, source_language, status, deadline, last_changed, data))
+            if row is not None:
+                execute('DELETE FROM project_languages WHERE guid = ?', (guid,))
+                report.updated += 1
+            else:
+                report.inserted += 1
+            # The deadline is kept with every target language too, so a query by language is one index range.
+            self._db.executemany('INSERT OR IGNORE INTO project_languages (language, guid, deadline) VALUES (?, ?, ?)',
+                                 [(language, guid, deadline) for language in targets or ()])
+        if report.skipped:
+            logger.warning("Skipped %d projects without a ServerProjectGuid", report.skipped)
+        return watermark
+
+    def _delete(self, guids: List[str]) -> None:
+        for start in range(0, len(guids), 500):
+            batch = [(guid,) for guid in guids[start:start + 500]]
+            self._db.executemany('DELETE FROM project_languages WHERE guid = ?', batch)
+            self._db.executemany('DELETE FROM projects WHERE guid = ?', batch)
+
+    def get(self, guid: str) -> Optional[ServerProjectInfo]:
+        """ The stored project with this GUID, or None. """
+        row = self._reader().execute('SELECT data FROM projects WHERE guid = ?', (str(guid),)).fetchone()
+        return ServerProjectInfo.from_dict(json.loads(row[0])) if row is not None else None
+
+    @staticmethod
+    def _select(columns: str, client: Optional[str], status: Optional[str], source_language: Optional[str],
+                target_language: Optional[str], deadline_before: Optional[datetime.datetime],
+                deadline_after: Optional[datetime.datetime]) -> Tuple[str, list, str]:
+        # The SELECT statement and its parameters, and the deadline column to order by.
+        if target_language is None:
+            tables, deadline, conditions, params = 'projects', 'projects.deadline', [], []
+        else:
+            tables, deadline = 'project_languages JOIN projects USING (guid)', 'project_languages.deadline'
+            conditions, params = ['project_languages.language = ?'], [target_language]
+        for column, value in (('client', client), ('status', status), ('source_language', source_language)):
+            if value is not None:
+                conditions.append(f'projects.{column} = ?')
+                params.append(value)
+        if deadline_before is not None:
+            conditions.append(f'{deadline} < ?')
+            params.append(utc_text(deadline_before))
+        if deadline_after is not None:
+            conditions.append(f'{deadline} >= ?')
+            params.append(utc_text(deadline_after))
+        where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        return f'SELECT {columns} FROM {tables}{where}', params, deadline
+
+    def query(self, client: Optional[str] = None, status: Optional[str] = None,
+              source_language: Optional[str] = None, target_language: Optional[str] = None,
+              deadline_before: Optional[datetime.datetime] = None,
+              deadline_after: Optional[datetime.datetime] = None,
+              limit: Optional[int] = None) -> List[ServerProjectInfo]:
+        """ The stored projects matching all the given criteria, by deadline (projects without one first).
+        :param client: the Client
+        :param status: the ProjectStatus, e.g. 'Live'
+        :param source_language: the SourceLanguageCode
+        :param target_language: one of the TargetLanguageCodes
+        :param deadline_before: only projects due before this time (naive datetimes are UTC)
+        :param deadline_after: only projects due at or after this time
+        :param limit: the most projects returned
+        :return: ServerProjectInfo records, whatever the result format of the client that synced them
+        """
+        sql, params, deadline = self._select('projects.data', client, status, source_language, target_language,
+                                             deadline_before, deadline_after)
+        sql += f' ORDER BY {deadline}'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [ServerProjectInfo.from_dict(json.loads(row[0])) for row in self._reader().execute(sql, params)]
+
+    def count(self, client: Optional[str] = None, status: Optional[str] = None,
+              source_language: Optional[str] = None, target_language: Optional[str] = None,
+              deadline_before: Optional[datetime.datetime] = None,
+              deadline_after: Optional[datetime.datetime] = None) -> int:
+        """ The number of stored projects query would return, without decoding them. """
+        sql, params, _ = self._select('COUNT(*)', client, status, source_language, target_language,
+                                      deadline_before, deadline_after)
+        return self._reader().execute(sql, params).fetchone()[0]
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,9 +1,26 @@
-from typing import Tuple, Optional
-import logging
+from typing import Any, Tuple, Optional, Iterable, Iterator, Union
 
 from src import memoq_soap as mq
 
-logging.basicConfig(level=logging.DEBUG)
+
+def _filter_params(filter: Optional[Union[str, dict]]) -> dict:
+    """ The ListProjects parameters for a project filter.
+    >>> _filter_params({'Client': 'Acme'}), _filter_params(None)
+    ({'filter': {'Client': 'Acme'}}, {})
+    """
+    if filter is None:
+        return {}
+    if isinstance(filter, dict):
+        return {'filter': filter}
+    return {'additional_params': {'filter': filter} if filter else None}
+
+
+def _options_params(options: Optional[dict]) -> dict:
+    """ The ListProjectTranslationDocuments2 parameters for its listing options.
+    >>> _options_params({'FillInAssignmentInformation': True}), _options_params(None)
+    ({'options': {'FillInAssignmentInformation': True}}, {})
+    """
+    return {'options': options} if options is not None else {}
 
 
 class MemoqProjects:
@@ -20,35 +37,47 @@ class MemoqProjects:
         self.soap_client = soap_client
         self.service = 'IServerProjectService'
 
-    def list_projects(self, filter: Optional[str] = None) -> Tuple[int, Optional[str]]:
+    def list_projects(self, filter: Optional[Union[str, dict]] = None,
+                      projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ Get the list of projects from the memoQ Server.
-        :param filter: Optional filter to apply when listing projects
+        :param filter: Optional filter to apply when listing projects; a dict is sent as the ServerProjectListFilter,
+            e.g. {'LastChangedAfter': '2023-04-01T10:00:00Z'} for the projects changed since then
+        :param projection: the field paths of every ServerProjectInfo to keep, e.g. {'ServerProjectGuid', 'Name'};
+            the other fields are skipped while the response is parsed. None keeps them all
         :return: status code and response content
         """
 
         route = 'memoqservices/ServerProject/ServerProjectService'
 
-        if filter is None:
-            response_status, data = self.soap_client.make_soap_request(
-                route=route,
-                interface='IServerProjectService',
-                memoq_type='ServerProjectInfo',
-                action='ListProjects'
-            )
-        else:
-            response_status, data = self.soap_client.make_soap_request(
-                route=route,
-                interface='IServerProjectService',
-                memoq_type='ServerProjectInfo',
-                action='ListProjects',
-                additional_params={'filter': filter} if filter else None
-            )
+        response_status, data = self.soap_client.make_soap_request(
+            route=route,
+            interface='IServerProjectService',
+            memoq_type='ServerProjectInfo',
+            action='ListProjects',
+            projection=projection,
+            **_filter_params(filter)
+        )
 
         return response_status, data
 
-    def list_project_translation_documents(self, guid: str) -> Tuple[int, Optional[str]]:
+    def iter_projects(self, filter: Optional[Union[str, dict]] = None,
+                      projection: Optional[Iterable[str]] = None) -> Iterator[dict]:
+        """ Stream the projects of the memoQ Server one ServerProjectInfo at a time, without holding the whole listing.
+        :param filter: Optional filter to apply when listing projects, as for list_projects
+        :param projection: the field paths of every ServerProjectInfo to keep, as for list_projects
+        :return: a generator of ServerProjectInfo items
+        """
+        route = 'memoqservices/ServerProject/ServerProjectService'
+
+        return self.soap_client.iter_soap_request(route=route, interface='IServerProjectService',
+                                                  memoq_type='ServerProjectInfo', action='ListProjects',
+                                                  projection=projection, **_filter_params(filter))
+
+    def list_project_translation_documents(self, guid: str,
+                                           projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ List the translation documents in a project.
         :param guid: The GUID of the project
+        :param projection: the field paths of every document to keep, e.g. {'DocumentGuid', 'DocumentName'}
         :return: status code and response content
         """
         # route = '/memoqservices/project/ProjectService'
@@ -78,16 +107,19 @@ class MemoqProjects:
             interface='IServerProjectService',
             memoq_type='ServerProjectTranslationDocument',
             action=action,
+            projection=projection,
             # serverProjectGuid=guid
             guid=guid  # Pass the constructed payload_body
         )
 
         return response_status, data
 
-    def list_project_translation_documents2(self, guid: str, options: dict = None) -> Tuple[int, Optional[str]]:
+    def list_project_translation_documents2(self, guid: str, options: dict = None,
+                                            projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ List the translation documents in a project.
         :param guid: The GUID of the project
         :param options: Additional options for listing documents
+        :param projection: the field paths of every document to keep, e.g. {'DocumentGuid', 'DocumentName'}
         :return: status code and response content
         """
         # route = '/memoqservices/project/ProjectService'
@@ -117,12 +149,27 @@ class MemoqProjects:
             interface='IServerProjectService',
             memoq_type='ServerProjectTranslationDocument2',
             action=action,
+            projection=projection,
             # serverProjectGuid=guid
-            guid=guid  # Pass the constructed payload_body
+            guid=guid,  # Pass the constructed payload_body
+            **_options_params(options)
         )
 
         return response_status, data
 
+    def list_documents_for_projects(self, guids: Iterable[str], max_workers: int = 8,
+                                    projection: Optional[Iterable[str]] = None) -> mq.BatchResult:
+        """ List the translation documents of many projects in parallel.
+        :param guids: The GUIDs of the projects
+        :param max_workers: number of calls in flight at once
+        :param projection: the field paths of every document to keep, as for list_project_translation_documents
+        :return: a BatchResult with one (status, data) result or exception per project, in order
+        """
+        route = 'memoqservices/ServerProject/ServerProjectService'
+        calls = [dict(route=route, interface='IServerProjectService', memoq_type='ServerProjectTranslationDocument',
+                      action='ListProjectTranslationDocuments', guid=guid, projection=projection)
+                 for guid in guids]
+        return self.soap_client.batch_call(calls, max_workers=max_workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+from typing import Any, Optional
+from dataclasses import dataclass, field, fields
+import datetime
+import sys
+import uuid
+
+
+def _is_nil(value: Any) -> bool:
+    return value is None or (isinstance(value, dict) and value.get('@i:nil', value.get('@xsi:nil')) == 'true')
+
+
+def parse_guid(value: Any) -> Optional[uuid.UUID]:
+    """ Parse a GUID element.
+    >>> parse_guid('3353ec0e-5a99-488b-bc78-0005003e2b02')
+    UUID('3353ec0e-5a99-488b-bc78-0005003e2b02')
+    """
+    return None if _is_nil(value) else uuid.UUID(value)
+
+
+def parse_datetime(value: Any) -> Optional[datetime.datetime]:
+    """ Parse a .NET DateTime, which may carry 7 fractional digits and a 'Z' or offset suffix.
+    >>> parse_datetime('2023-04-01T10:00:00.1234567Z')
+    datetime.datetime(2023, 4, 1, 10, 0, 0, 123456, tzinfo=datetime.timezone.utc)
+    >>> parse_datetime('2023-04-01T10:00:00')
+    datetime.datetime(2023, 4, 1, 10, 0)
+    """
+    if _is_nil(value):
+        return None
+    text = value[:-1] + '+00:00' if value.endswith('Z') else value
+    if '.' in text:
+        head, _, rest = text.partition('.')
+        digits = len(rest) - len(rest.lstrip('0123456789'))
+        text = f'{head}.{rest[:min(digits, 6)].ljust(6, "0")}{rest[digits:]}'
+    return datetime.datetime.fromisoformat(text)
+
+
+def parse_int(value: Any) -> Optional[int]:
+    return None if _is_nil(value) else int(value)
+
+
+def parse_bool(value: Any) -> Optional[bool]:
+    """
+    >>> parse_bool('true'), parse_bool('false')
+    (True, False)
+    """
+    return None if _is_nil(value) else value == 'true'
+
+
+def parse_str(value: Any) -> Optional[str]:
+    return None if _is_nil(value) else value
+
+
+def parse_code(value: Any) -> Optional[str]:
+    """ Parse a low-cardinality string (language code, status, client...), interned so that every record
+    shares one copy of it. """
+    return None if _is_nil(value) or not isinstance(value, str) else sys.intern(value)
+
+
+def parse_strings(value: Any) -> Optional[tuple]:
+    """ Parse an array of codes, e.g. <TargetLanguageCodes><string>ger</string><string>fre</string></...>.
+
+    WCF declares the namespace of the array on it, so its items are prefixed and come after the attribute.
+    >>> parse_strings({'string': ['ger', 'fre']}), parse_strings({'string': 'ger'})
+    (('ger', 'fre'), ('ger',))
+    >>> parse_strings({'@xmlns:b': 'http://schemas.microsoft.com/2003/10/Serialization/Arrays',
+    ...                'b:string': ['ger', 'fre']})
+    ('ger', 'fre')
+    >>> parse_strings({'@xmlns:b': 'http://schemas.microsoft.com/2003/10/Serialization/Arrays'})
+    ()
+    """
+    if _is_nil(value):
+        return None
+    if isinstance(value, dict):
+        keys = [key for key in value if not key.startswith('@')]
+        key = next((key for key in keys if key.rpartition(':')[2] == 'string'), keys[0] if keys else None)
+        if key is None:
+            return ()
+        value = value[key]
+    if _is_nil(value):
+        return ()
+    return tuple(map(sys.intern, value)) if isinstance(value, list) else (sys.intern(value),)
+
+
+def code():
+    """ Declare a record field parsed with parse_code. """
+    return field(default=None, metadata={'parser': parse_code})
+
+
+class Record:
+    """ Base class of the slotted memoQ record types.
+
+    Fields the record does not declare are kept in `extra` (None when there are none), so no data is lost
+    when the server adds fields.
+    """
+    __slots__ = ()
+
+    _parsers = {}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Record':
+        """ Build a record from one parsed item (as returned by xmltodict or memoq_stream.iter_items). """
+        values = {}
+        extra = None
+        parsers = cls._parsers
+        for key, value in data.items():
+            parser = parsers.get(key)
+            if parser is not None:
+                values[key] = parser(value)
+            elif not key.startswith('@'):
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        return cls(extra=extra, **values)
+
+
+def _record(cls):
+    """ Turn an annotated class into a slotted dataclass record with a parser for every field. """
+    cls = dataclass(slots=True)(cls)
+    cls._parsers = {f.name: f.metadata.get('parser') or _PARSERS[f.type] for f in fields(cls) if f.name != 'extra'}
+    return cls
+
+
+_PARSERS = {
+    Optional[uuid.UUID]: parse_guid,
+    Optional[datetime.datetime]: parse_datetime,
+    Optional[int]: parse_int,
+    Optional[bool]: parse_bool,
+    Optional[str]: parse_str,
+    Optional[tuple]: parse_strings,
+}
+
+
+@_record
+class TMInfo(Record):
+    """ A translation memory, as returned by ListTMs and GetTMInfo.
+    >>> tm = TMInfo.from_dict({'Guid': '3353ec0e-5a99-488b-bc78-0005003e2b02', 'Name': 'Legal', 'NumEntries': '12',
+    ...                        'Readonly': 'false', 'NewField': 'x'})
+    >>> tm.Name, tm.NumEntries, tm.Readonly, tm.extra
+    ('Legal', 12, False, {'NewField': 'x'})
+    """
+    AccessLevel: Optional[str] = code()
+    AllowMultiple: Optional[bool] = None
+    AllowReverseLookup: Optional[bool] = None
+    Client: Optional[str] = code()
+    CreatorUsername: Optional[str] = None
+    Description: Optional[str] = None
+    Domain: Optional[str] = code()
+    FriendlyName: Optional[str] = None
+    Guid: Optional[uuid.UUID] = None
+    IsQualityAssured: Optional[bool] = None
+    LastModified: Optional[datetime.datetime] = None
+    Name: Optional[str] = None
+    NumEntries: Optional[int] = None
+    Project: Optional[str] = code()
+    Readonly: Optional[bool] = None
+    SourceLanguageCode: Optional[str] = code()
+    StoreDocumentFullPath: Optional[bool] = None
+    StoreDocumentName: Optional[bool] = None
+    StoreFormatting: Optional[bool] = None
+    Subject: Optional[str] = code()
+    TargetLanguageCode: Optional[str] = code()
+    UseContext: Optional[bool] = None
+    UseIceSpiceContext: Optional[bool] = None
+    extra: Optional[dict] = None
+
+
+@_record
+class TBInfo(Record):
+    """ A term base, as returned by ListTBs. """
+    Client: Optional[str] = code()
+    Description: Optional[str] = None
+    Domain: Optional[str] = code()
+    FriendlyName: Optional[str] = None
+    Guid: Optional[uuid.UUID] = None
+    IsModerated: Optional[bool] = None
+    IsQTerm: Optional[bool] = None
+    LanguageCodes: Optional[tuple] = None
+    LastModified: Optional[datetime.datetime] = None
+    Name: Optional[str] = None
+    NumEntries: Optional[int] = None
+    Project: Optional[str] = code()
+    Readonly: Optional[bool] = None
+    Subject: Optional[str] = code()
+    extra: Optional[dict] = None
+
+
+@_record
+class ServerProjectInfo(Record):
+    """ A server project, as returned by ListProjects.
+    >>> project = ServerProjectInfo.from_dict({'Name': 'P', 'Deadline': '2023-05-01T12:00:00',
+    ...                                        'TargetLanguageCodes': {'string': ['ger', 'fre']},
+    ...                                        'Domain': {'@i:nil': 'true', '@xmlns:i': 'ns'}})
+    >>> project.Deadline.year, project.TargetLanguageCodes, project.Domain
+    (2023, ('ger', 'fre'), None)
+    """
+    CallbackWebServiceUrl: Optional[str] = None
+    Client: Optional[str] = code()
+    CreationTime: Optional[datetime.datetime] = None
+    CreatorUser: Optional[uuid.UUID] = None
+    Deadline: Optional[datetime.datetime] = None
+    Description: Optional[str] = None
+    DocumentStatus: Optional[str] = code()
+    Domain: Optional[str] = code()
+    LastChanged: Optional[datetime.datetime] = None
+    Name: Optional[str] = None
+    Project: Optional[str] = code()
+    ProjectStatus: Optional[str] = code()
+    ServerProjectGuid: Optional[uuid.UUID] = None
+    SourceLanguageCode: Optional[str] = code()
+    Subject: Optional[str] = code()
+    TargetLanguageCodes: Optional[tuple] = None
+    extra: Optional[dict] = None
+
+
+@_record
+class ServerProjectTranslationDocument(Record):
+    """ A translation document of a server project, as returned by ListProjectTranslationDocuments. """
+    DocumentGuid: Optional[uuid.UUID] = None
+    DocumentName: Optional[str] = None
+    DocumentStatus: Optional[str] = code()
+    ExportPath: Optional[str] = None
+    ImportPath: Optional[str] = None
+    IsImage: Optional[bool] = None
+    MajorVersion: Optional[int] = None
+    MinorVersion: Optional[int] = None
+    ParentDocumentId: Optional[str] = None
+    TargetLanguageCode: Optional[str] = code()
+    TotalSegmentCount: Optional[int] = None
+    WebTransUrl: Optional[str] = None
+    WorkflowStatus: Optional[str] = code()
+    extra: Optional[dict] = None
+
+
+@_record
+class ServerProjectTranslationDocument2(Record):
+    """ A translation document of a server project, as returned by ListProjectTranslationDocuments2. """
+    DocumentGuid: Optional[uuid.UUID] = None
+    DocumentName: Optional[str] = None
+    DocumentStatus: Optional[str] = code()
+    ExportPath: Optional[str] = None
+    ImportPath: Optional[str] = None
+    IsImage: Optional[bool] = None
+    LastModified: Optional[datetime.datetime] = None
+    MajorVersion: Optional[int] = None
+    MinorVersion: Optional[int] = None
+    ParentDocumentId: Optional[str] = None
+    TargetLanguageCode: Optional[str] = code()
+    TotalSegmentCount: Optional[int] = None
+    WebTransUrl: Optional[str] = None
+    WorkflowStatus: Optional[str] = code()
+    extra: Optional[dict] = None
+
+
+RECORD_TYPES = {cls.__name__: cls for cls in (TMInfo, TBInfo, ServerProjectInfo, ServerProjectTranslationDocument,
+                                              ServerProjectTranslationDocument2)}
+
+
+def to_records(data: Any, memoq_type: str, listing: bool = False) -> Any:
+    """ Decode a parsed item, or a list of them, into the record type for memoq_type.
+
+    Types without a record class are returned unchanged, and so is anything that is not an item (None, or the
+    text of an empty or scalar element).
+    :param listing: data is the result of a listing, which is None when the listing is empty and a single item
+        when it has one; the records are then always returned as a list
+    >>> [tb.Name for tb in to_records([{'Name': 'a'}, {'Name': 'b'}], 'TBInfo')]
+    ['a', 'b']
+    >>> to_records({'Name': 'a'}, 'SomethingElse')
+    {'Name': 'a'}
+    >>> to_records(None, 'TMInfo', listing=True), to_records(None, 'TMInfo')
+    ([], None)
+    >>> [tm.Name for tm in to_records({'Name': 'a'}, 'TMInfo', listing=True)]
+    ['a']
+    """
+    record_type = RECORD_TYPES.get(memoq_type)
+    if record_type is None:
+        return data
+    if listing and (data is None or isinstance(data, dict)):
+        data = [] if data is None else [data]
+    if isinstance(data, list):
+        return [record_type.from_dict(item) if isinstance(item, dict) else item for item in data]
+    return record_type.from_dict(data) if isinstance(data, dict) else data
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,559 @@
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import contextlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+from src.memoq_envelope import escape_text
+
+logger = logging.getLogger(__name__)
+
+_XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+
+def trigrams(text: str) -> set:
+    """ The character trigrams of a segment, case-folded, with runs of whitespace collapsed and the ends padded.
+    >>> sorted(trigrams('Ab  c'))
+    [' ab', ' c ', 'ab ', 'b c']
+    """
+    padded = f" {' '.join(text.casefold().split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def iter_tmx_units(source: Union[str, os.PathLike, BinaryIO], source_lang: Optional[str] = None,
+                   target_lang: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """ Stream the (source, target) texts of the translation units of a TMX file, one unit in memory at a time.
+
+    Inline markup in the segments (tags, placeholders) is dropped and only its text kept.
+    :param source: a TMX file path or binary file object
+    :param source_lang: the source language, defaults to the header's srclang
+    :param target_lang: the target language, defaults to the first other language of each unit
+    >>> import io
+    >>> tmx = io.BytesIO(b'<tmx><header srclang="en"/><body><tu><tuv xml:lang="en"><seg>a <ph>x</ph>b</seg></tuv>'
+    ...                  b'<tuv xml:lang="de"><seg>c</seg></tuv></tu></body></tmx>')
+    >>> list(iter_tmx_units(tmx))
+    [('a xb', 'c')]
+    """
+    body = None
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == 'header' and source_lang is None:
+                source_lang = element.get('srclang')
+            elif element.tag == 'body':
+                body = element
+            continue
+        if element.tag != 'tu':
+            continue
+        texts = {}
+        for tuv in element.iter('tuv'):
+            seg = tuv.find('seg')
+            lang = tuv.get(_XML_LANG, tuv.get('lang'))
+            if seg is not None and lang not in texts:
+                texts[lang] = ''.join(seg.itertext())
+        if source_lang is None and texts:
+            source_lang = next(iter(texts))
+        target = texts.get(target_lang) if target_lang else next((text for lang, text in texts.items()
+                                                                  if lang != source_lang), None)
+        if source_lang in texts and target is not None:
+            yield texts[source_lang], target
+        if body is not None:
+            body.clear()
+
+
+class IndexStats:
+    """ Figures of one index build. """
+
+    def __init__(self, units: int, grams: int, postings: int, size: int, elapsed: float) -> None:
+        self.units = units
+        self.grams = grams
+        self.postings = postings
+        self.size = size
+        self.elapsed = elapsed
+
+    @property
+    def units_per_second(self) -> float:
+        return self.units / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        return (f"IndexStats(units={self.units}, grams={self.grams}, postings={self.postings}, "
+                f"size={self.size / 1e6:.1f} MB, elapsed={self.elapsed:.2f}s, {self.units_per_second:.0f} units/s)")
+
+
+def build_index(directory: Union[str, os.PathLike], units: Iterable[Tuple[str, str]], run_units: int = 250_000,
+                meta: Optional[dict] = None) -> IndexStats:
+    """ Build the on-disk trigram index of (source, target) units in an empty or new directory.
+
+    Postings are collected in memory for run_units units at a time and spilled to a run file, then the runs
+    are merged, so memory use is bounded by the run size and not by the size of the TM.
+
+    Files written: text.bin (the UTF-8 segments back to back), offsets.bin (where each segment ends),
+    lengths.bin (the number of distinct source trigrams of each unit), postings.bin (the ascending unit
+    numbers of every trigram), lexicon.json (trigram -> [first posting, count]) and meta.json. The binary
+    files are in native byte order.
+    :param directory: where to write the index
+    :param units: the translation units, e.g. from iter_tmx_units
+    :param run_units: units per in-memory run
+    :param meta: extra fields saved in meta.json, e.g. the TM's info
+    :return: the IndexStats of the build
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    runs = []
+    postings = defaultdict(partial(array, 'I'))
+    offsets, lengths = array('Q', [0]), array('H')
+    position = count = 0
+    with open(os.path.join(directory, 'text.bin'), 'wb') as text, \
+            open(os.path.join(directory, 'offsets.bin'), 'wb') as offsets_out, \
+            open(os.path.join(directory, 'lengths.bin'), 'wb') as lengths_out:
+        for source, target in units:
+            for segment in (source, target):
+                position += text.write(segment.encode('utf-8'))
+                offsets.append(position)
+            grams = trigrams(source)
+            lengths.append(min(len(grams), 0xFFFF))
+            for gram in grams:
+                postings[gram].append(count)
+            count += 1
+            if count % run_units == 0:
+                runs.append(_write_run(directory, len(runs), postings))
+                postings = defaultdict(partial(array, 'I'))
+                offsets.tofile(offsets_out)
+                lengths.tofile(lengths_out)
+                offsets, lengths = array('Q'), array('H')
+        if postings or not runs:
+            runs.append(_write_run(directory, len(runs), postings))
+        offsets.tofile(offsets_out)
+        lengths.tofile(lengths_out)
+
+    lexicon = _merge_runs(directory, runs)
+    with open(os.path.join(directory, 'lexicon.json'), 'w', encoding='utf-8') as file:
+        json.dump(lexicon, file, separators=(',', ':'))
+    total = sum(posting_count for _, posting_count in lexicon.values())
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(dict(meta or {}, units=count, grams=len(lexicon), postings=total), file)
+
+    size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+    return IndexStats(count, len(lexicon), total, size, time.perf_counter() - start)
+
+
+def _write_run(directory: Union[str, os.PathLike], number: int, postings: dict) -> Tuple[str, dict]:
+    # Spill one run: the postings of every trigram back to back, and where each trigram's postings are.
+    path = os.path.join(directory, f'run{number}.tmp')
+    lexicon = {}
+    position = 0
+    with open(path, 'wb') as out:
+        for gram in sorted(postings):
+            items = postings[gram]
+            items.tofile(out)
+            lexicon[gram] = (position, len(items))
+            position += len(items)
+    return path, lexicon
+
+
+def _merge_runs(directory: Union[str, os.PathLike], runs: List[Tuple[str, dict]]) -> Dict[str, list]:
+    # Unit numbers grow from run to run, so the postings of a trigram are its runs' postings concatenated.
+    path = os.path.join(directory, 'postings.bin')
+    if len(runs) == 1:
+        run_path, lexicon = runs[0]
+        os.replace(run_path, path)
+        return {gram: list(entry) for gram, entry in lexicon.items()}
+
+    lexicon = {}
+    itemsize = array('I').itemsize
+    files = [open(run_path, 'rb') for run_path, _ in runs]
+    try:
+        maps = [mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b''
+                for file in files]
+        position = 0
+        with open(path, 'wb') as out:
+            for gram in sorted(set().union(*(run_lexicon for _, run_lexicon in runs))):
+                total = 0
+                for data, (_, run_lexicon) in zip(maps, runs):
+                    entry = run_lexicon.get(gram)
+                    if entry is not None:
+                        out.write(data[entry[0] * itemsize:(entry[0] + entry[1]) * itemsize])
+                        total += entry[1]
+                lexicon[gram] = [position, total]
+                position += total
+        for data in maps:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    finally:
+        for file in files:
+            file.close()
+        for run_path, _ in runs:
+            os.remove(run_path)
+    return lexicon
+
+
+class FuzzyMatch(NamedTuple):
+    """ A fuzzy-match candidate: the trigram similarity (Dice coefficient, 0 to 1) and the unit. """
+    score: float
+    source: str
+    target: str
+    unit: int
+
+
+class TmIndex:
+    """ A read-only trigram index built by build_index, with its postings memory-mapped.
+
+    Candidates are found with prefix filtering: a unit similar enough to the query must share at least one of
+    its rarest trigrams, so only those posting lists are scanned and the common trigrams are probed for the
+    candidates alone. Safe to query from several threads, until it is closed.
+    >>> import tempfile
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> _ = build_index(directory.name, [('The quick brown fox', 'Der schnelle braune Fuchs'), ('Hello', 'Hallo')])
+    >>> with TmIndex(directory.name) as index:
+    ...     [(round(match.score, 2), match.target) for match in index.search('the quick brown cat')]
+    [(0.79, 'Der schnelle braune Fuchs')]
+    >>> directory.cleanup()
+    """
+
+    # A posting list is counted rather than probed while it is at most this many times longer than the list
+    # of candidates left: a counted posting costs about a quarter of a binary search.
+    scan_ratio = 4
+
+    def __init__(self, directory: Union[str, os.PathLike]) -> None:
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as file:
+            self.meta = json.load(file)
+        with open(os.path.join(directory, 'lexicon.json'), 'r', encoding='utf-8') as file:
+            self.lexicon = json.load(file)
+        self._maps = []
+        # Lookups in progress through a TmReplica, and whether the replica replaced the index meanwhile: the
+        # last of those lookups then closes it. Both are guarded by the replica's lock.
+        self.readers = 0
+        self.retired = False
+        self._text = self._map('text.bin', None)
+        self._offsets = self._map('offsets.bin', 'Q')
+        self._lengths = self._map('lengths.bin', 'H')
+        self._postings = self._map('postings.bin', 'I')
+
+    def _map(self, name: str, typecode: Optional[str]) -> memoryview:
+        with open(os.path.join(self.directory, name), 'rb') as file:
+            if not os.fstat(file.fileno()).st_size:
+                view = memoryview(b'')
+                return view.cast(typecode) if typecode else view
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(data)
+        view = memoryview(data)
+        return view.cast(typecode) if typecode else view
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __enter__(self) -> 'TmIndex':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in (self._text, self._offsets, self._lengths, self._postings):
+            view.release()
+        for data in self._maps:
+            data.close()
+        self._maps = []
+
+    def unit(self, number: int) -> Tuple[str, str]:
+        """ The (source, target) texts of a unit. """
+        start, middle, end = self._offsets[2 * number:2 * number + 3]
+        return str(self._text[start:middle], 'utf-8'), str(self._text[middle:end], 'utf-8')
+
+    def postings(self, gram: str) -> memoryview:
+        """ The ascending numbers of the units whose source contains the trigram. """
+        entry = self.lexicon.get(gram)
+        return self._postings[entry[0]:entry[0] + entry[1]] if entry else self._postings[:0]
+
+    def search(self, text: str, min_score: float = 0.5, limit: int = 10) -> List[FuzzyMatch]:
+        """ Find the units whose source is most similar to text.
+        :param text: the segment to match
+        :param min_score: lowest similarity returned, between 0 (exclusive) and 1
+        :param limit: most matches returned
+        :return: the matches, best first
+        """
+        grams = trigrams(text)
+        size = len(grams)
+        if not size:
+            return []
+        # Shared trigrams needed to reach min_score with a unit of any size, and the unit sizes that can.
+        need = max(1, math.ceil(min_score * size / (2 - min_score) - 1e-9))
+        shortest, longest = need, size * (2 - min_score) / min_score
+        lists = sorted((self.postings(gram) for gram in grams), key=len)
+        lengths = self._lengths
+
+        # Count the rarest lists, then keep counting while a list is cheaper to scan than probing it for every
+        # remaining candidate; a candidate must stay within reach of `need` with the lists not yet counted.
+        counts = Counter()
+        scanned = size - need + 1
+        for postings in lists[:scanned]:
+            counts.update(postings)
+        candidates = [number for number in counts if shortest <= lengths[number] <= longest]
+        while scanned < size and len(lists[scanned]) <= self.scan_ratio * len(candidates):
+            counts.update(lists[scanned])
+            scanned += 1
+            threshold = need - (size - scanned)
+            candidates = [number for number in candidates if counts[number] >= threshold]
+
+        rest = lists[scanned:]
+        scored = []
+        for number in candidates:
+            shared = counts[number]
+            for index, postings in enumerate(rest):
+                if shared + len(rest) - index < need:
+                    break
+                position = bisect_left(postings, number)
+                if position < len(postings) and postings[position] == number:
+                    shared += 1
+            score = 2 * shared / (size + lengths[number])
+            if score >= min_score:
+                scored.append((score, -number))
+        return [FuzzyMatch(score, *self.unit(-number), -number) for score, number in heapq.nlargest(limit, scored)]
+
+
+def tm_version(info: Any) -> Optional[list]:
+    """ What identifies the content of a TM in its GetTMInfo result: LastModified and NumEntries, as strings.
+    :param info: the TMInfo, as a dict, record or JSON text
+    :return: the version, or None when the info does not carry both fields
+    >>> tm_version({'Guid': 'g', 'LastModified': '2023-04-01T10:00:00Z', 'NumEntries': '12'})
+    ['2023-04-01T10:00:00Z', '12']
+    """
+    if isinstance(info, str):
+        info = json.loads(info)
+    fields = [info.get(name) if isinstance(info, dict) else getattr(info, name, None)
+              for name in ('LastModified', 'NumEntries')]
+    return None if None in fields else [str(value) for value in fields]
+
+
+class SyncReport:
+    """ Outcome of TmReplica.sync. """
+
+    def __init__(self) -> None:
+        self.refreshed = []
+        self.skipped = []
+        # GUID -> exception, or (status, data) of a failed GetTMInfo call.
+        self.failed = {}
+        # Bytes of TMX exported, and what exporting every TM in full would have moved.
+        self.bytes_moved = 0
+        self.full_export_bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def saved_fraction(self) -> float:
+        """ Share of the full export's bytes that the sync did not move. """
+        return 1 - self.bytes_moved / self.full_export_bytes if self.full_export_bytes else 0.0
+
+    def __repr__(self) -> str:
+        return (f"SyncReport(refreshed={len(self.refreshed)}, skipped={len(self.skipped)}, failed={len(self.failed)}, "
+                f"bytes_moved={self.bytes_moved}, full_export_bytes={self.full_export_bytes}, "
+                f"saved={self.saved_fraction:.1%}, elapsed={self.elapsed:.2f}s)")
+
+
+class TmReplica:
+    """ Read-only local copies of memoQ TMs, each with its trigram index, kept in one directory.
+
+    A TM is copied (or replaced) with refresh, which exports it through the chunked TMX export and indexes
+    the export, or with sync, which re-exports only the TMs that changed. lookup_segment answers like
+    MemoqTm.lookup_segment, from the local copy and without a call. Lookups may run on several threads while
+    copies are replaced: an index that was replaced is closed once the last lookup using it has returned.
+    """
+
+    def __init__(self, root: Union[str, os.PathLike]) -> None:
+        """ Initialize the replica.
+        :param root: the directory holding the copies, one subdirectory per TM GUID
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'TmReplica':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            for index in self._indexes.values():
+                self._retire(index)
+            self._indexes = {}
+
+    def _retire(self, index: TmIndex) -> None:
+        # Close an index taken out of use now, or leave that to the last lookup still reading it.
+        index.retired = True
+        if not index.readers:
+            index.close()
+
+    @contextlib.contextmanager
+    def _reading(self, guid: str) -> Iterator[TmIndex]:
+        with self._lock:
+            index = self._indexes.get(guid)
+            if index is None:
+                index = self._indexes[guid] = TmIndex(os.path.join(self.root, guid))
+            index.readers += 1
+        try:
+            yield index
+        finally:
+            with self._lock:
+                index.readers -= 1
+                if index.retired and not index.readers:
+                    index.close()
+
+    def guids(self) -> List[str]:
+        """ The GUIDs of the TMs with a local copy. """
+        return sorted(entry.name for entry in os.scandir(self.root)
+                      if entry.is_dir() and os.path.exists(os.path.join(entry.path, 'meta.json')))
+
+    def meta(self, guid: str) -> Optional[dict]:
+        """ What was saved with a TM's local copy (its version, export size, unit count...), or None. """
+        try:
+            with open(os.path.join(self.root, guid, 'meta.json'), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def index(self, guid: str) -> TmIndex:
+        """ The index of a TM's local copy, opened on first use.
+
+        The index is closed when refresh or sync replaces the copy, or when the replica is closed; lookups
+        that must outlive that go through lookup_segment.
+        :raises FileNotFoundError: when the TM has no local copy
+        """
+        with self._lock:
+            index = self._indexes.get(guid)
+            if index is None:
+                index = self._indexes[guid] = TmIndex(os.path.join(self.root, guid))
+            return index
+
+    def refresh(self, tm_client, guid: str, prefetch: int = 1, run_units: int = 250_000,
+                meta: Optional[dict] = None) -> IndexStats:
+        """ Export a TM with tm_client.export_tmx and replace its local copy with the export.
+
+        The new copy is built next to the old one, which keeps answering lookups until the swap.
+        :param tm_client: the MemoqTm to export with
+        :param guid: The GUID of the TM
+        :param prefetch: passed on to export_tmx
+        :param run_units: passed on to build_index
+        :param meta: extra fields saved with the copy
+        :return: the IndexStats of the new copy
+        :raises MemoqSoapError: when the server rejects the export
+        """
+        building, export = os.path.join(self.root, f'{guid}.building'), os.path.join(self.root, f'{guid}.tmx')
+        shutil.rmtree(building, ignore_errors=True)
+        try:
+            progress = tm_client.export_tmx(guid, export, prefetch=prefetch)
+            stats = build_index(building, iter_tmx_units(export), run_units=run_units,
+                                meta=dict(meta or {}, guid=guid, export_bytes=progress.bytes))
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        finally:
+            if os.path.exists(export):
+                os.remove(export)
+        self._swap(guid, building)
+        logger.info("Refreshed the local copy of TM %s: %r", guid, stats)
+        return stats
+
+    def sync(self, tm_client, guids: Iterable[str], max_workers: int = 4, force: bool = False,
+             run_units: int = 250_000) -> SyncReport:
+        """ Bring the local copies of TMs up to date, exporting only the TMs that changed.
+
+        The GetTMInfo results of all the TMs are fetched in one parallel batch. A TM whose LastModified and
+        NumEntries match its local copy is skipped without further calls; the others are exported and
+        re-indexed, up to max_workers at once. A TM that fails keeps its previous copy.
+        :param tm_client: the MemoqTm to read with
+        :param guids: The GUIDs of the TMs
+        :param max_workers: number of TMs fetched at once
+        :param force: refresh every TM, also unchanged ones
+        :param run_units: passed on to build_index
+        :return: the SyncReport, with the bytes moved compared to exporting every TM in full
+        """
+        start = time.perf_counter()
+        report = SyncReport()
+        guids = list(guids)
+        changed = []
+        for guid, result in zip(guids, tm_client.get_tm_info_many(guids, max_workers=max_workers)):
+            if isinstance(result, Exception) or result[0] != 200:
+                report.failed[guid] = result
+                continue
+            version, meta = tm_version(result[1]), self.meta(guid)
+            if not force and version is not None and meta is not None and meta.get('version') == version:
+                report.skipped.append(guid)
+                report.full_export_bytes += meta.get('export_bytes', 0)
+            else:
+                changed.append((guid, version))
+
+        def refresh(guid: str, version: Optional[list]) -> IndexStats:
+            # The TMs' exports already overlap each other, so each downloads and writes in turn.
+            return self.refresh(tm_client, guid, prefetch=0, run_units=run_units, meta={'version': version})
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {guid: pool.submit(refresh, guid, version) for guid, version in changed}
+        for guid, future in futures.items():
+            error = future.exception()
+            if error is not None:
+                report.failed[guid] = error
+                continue
+            nbytes = self.meta(guid)['export_bytes']
+            report.refreshed.append(guid)
+            report.bytes_moved += nbytes
+            report.full_export_bytes += nbytes
+        report.elapsed = time.perf_counter() - start
+        logger.info("%r", report)
+        return report
+
+    def _swap(self, guid: str, building: str) -> None:
+        current, retired = os.path.join(self.root, guid), os.path.join(self.root, f'{guid}.retired')
+        with self._lock:
+            index = self._indexes.pop(guid, None)
+            if index is not None:
+                # Lookups still reading the old copy close it when they are done; its files stay readable
+                # through their mappings once the directory is removed.
+                self._retire(index)
+            shutil.rmtree(retired, ignore_errors=True)
+            if os.path.exists(current):
+                os.replace(current, retired)
+            os.replace(building, current)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    def lookup_segment(self, source: str, target: str, guid: str, lookup_segment_request: Optional[dict] = None,
+                       limit: int = 10) -> Tuple[int, Any]:
+        """ Look up a segment in the local copy of a TM, answering in the shape of MemoqTm.lookup_segment.
+        :param source: The source text
+        :param target: The target text; not used for matching
+        :param guid: The GUID of the TM
+        :param lookup_segment_request: The lookup segment request parameters; Options.MatchThreshold (percent,
+            default 50) is honoured
+        :param limit: most hits returned
+        :return: status code (404 when the TM has no local copy) and the SegmentResult
+        """
+        options = (lookup_segment_request or {}).get('Options') or {}
+        threshold = max(int(options.get('MatchThreshold', 50)), 1)
+        try:
+            with self._reading(guid) as index:
+                matches = index.search(source, threshold / 100, limit)
+        except FileNotFoundError:
+            return 404, f"No local copy of TM {guid}"
+        hits = [{'MatchRate': str(round(match.score * 100)),
+                 'TransUnit': {'SourceSegment': f'<seg>{escape_text(match.source)}</seg>',
+                               'TargetSegment': f'<seg>{escape_text(match.target)}</seg>'}}
+                for match in matches]
+        return 200, {'TMHits': {'TMHit': hits} if hits else None}
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
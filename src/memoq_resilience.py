@@ -0,0 +1,394 @@
+from typing import Any, Callable, Iterable, Optional
+from urllib.parse import urlsplit
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Actions that read without side effects, and so can be sent again when an attempt fails.
+IDEMPOTENT_PREFIXES = ('List', 'Get', 'Lookup')
+IDEMPOTENT_ACTIONS = frozenset({'Concordance'})
+# Reads that move a server-side session forward: sending one again would skip data.
+STATEFUL_ACTIONS = frozenset({'GetNextTMXChunk', 'GetNextCSVChunk'})
+
+# Statuses worth another attempt: throttling, and a gateway or server that is down or overloaded.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Statuses that count against the circuit breaker. A 500 is memoQ's SOAP fault for a bad request, so it does not.
+FAILURE_STATUSES = frozenset({502, 503, 504})
+# Statuses that make the rate limiter back off.
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+def is_idempotent(action: str) -> bool:
+    """
+    >>> is_idempotent('ListTMs'), is_idempotent('LookupSegment'), is_idempotent('GetNextTMXChunk'), is_idempotent('DeleteTM')
+    (True, True, False, False)
+    """
+    return (action.startswith(IDEMPOTENT_PREFIXES) or action in IDEMPOTENT_ACTIONS) and action not in STATEFUL_ACTIONS
+
+
+class CircuitOpenError(ConnectionError):
+    """ Raised instead of calling a server whose circuit breaker is open. """
+
+
+class RetryPolicy:
+    """ How often and how long to wait before sending an idempotent call again.
+
+    Waits grow exponentially with "full jitter" (a random wait between 0 and the exponential bound), so that
+    clients that failed together do not come back together. A Retry-After header, when the server sends one,
+    is honoured instead.
+    >>> policy = RetryPolicy(base_delay=1, max_delay=5, random=lambda: 1.0)
+    >>> [policy.delay(attempt) for attempt in range(4)]
+    [1.0, 2.0, 4.0, 5.0]
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES, idempotent: Callable[[str], bool] = is_idempotent,
+                 random: Callable[[], float] = random.random) -> None:
+        """ Initialize the policy.
+        :param max_attempts: attempts per idempotent call, the first one included
+        :param base_delay: bound of the first wait, in seconds, doubled for every later one
+        :param max_delay: largest wait, in seconds
+        :param retry_statuses: statuses that are retried; connection errors and timeouts always are
+        :param idempotent: tells whether an action may be sent again
+        :param random: source of jitter in [0, 1)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent = idempotent
+        self.random = random
+
+    def attempts_for(self, action: str) -> int:
+        return self.max_attempts if self.idempotent(action) else 1
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """ Seconds to wait after the given failed attempt (0 for the first). """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return self.random() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+class AdaptiveRateLimiter:
+    """ A token bucket whose rate follows AIMD: additive increase while calls succeed, multiplicative decrease
+    on throttling (429/503), connection errors or rising latency.
+
+    Latency is "rising" when its moving average exceeds latency_factor times the lowest average seen, which
+    catches a server slowing down under load before it starts refusing calls. At most one decrease happens
+    per cooldown, so a burst of failures from calls already in flight counts as one signal.
+    >>> now = [0.0]
+    >>> limiter = AdaptiveRateLimiter(rate=10, burst=1, clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+    >>> limiter.acquire(), limiter.acquire()
+    (0.0, 0.1)
+    >>> limiter.record(429)
+    >>> limiter.rate
+    5.0
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 10.0, min_rate: float = 0.5, max_rate: float = 200.0,
+                 increase: float = 1.0, decrease: float = 0.5, latency_factor: float = 3.0, cooldown: float = 1.0,
+                 throttle_statuses: Iterable[int] = THROTTLE_STATUSES, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        """ Initialize the limiter.
+        :param rate: starting rate, in calls per second
+        :param burst: most calls let through at once after an idle period
+        :param min_rate: the rate never goes below this
+        :param max_rate: the rate never goes above this
+        :param increase: calls per second added for each second of successful calls at the current rate
+        :param decrease: factor applied to the rate on a congestion signal
+        :param latency_factor: latency average, relative to the lowest seen, that counts as congestion
+        :param cooldown: seconds after a decrease during which further signals are ignored
+        :param throttle_statuses: statuses that signal congestion
+        :param clock: monotonic time source, in seconds
+        :param sleep: how to wait for a token
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.throttle_statuses = frozenset(throttle_statuses)
+        self.decreases = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._decreased = None
+        self._latency = None
+        self._baseline = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """ Wait for a token.
+        :return: the seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return round(waited, 9)
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def release(self) -> None:
+        """ Give back a token taken by a call that ended without an outcome to record. """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+    def record(self, status: Optional[int], latency: Optional[float] = None) -> None:
+        """ Adjust the rate after a call.
+        :param status: the call's HTTP status, None when it failed without one
+        :param latency: the call's duration, in seconds
+        """
+        with self._lock:
+            congested = status is None or status in self.throttle_statuses
+            if latency is not None and status is not None:
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                self._baseline = self._latency if self._baseline is None else min(self._baseline, self._latency)
+                congested = congested or self._latency > self.latency_factor * self._baseline
+            now = self._clock()
+            if congested:
+                if self._decreased is None or now - self._decreased >= self.cooldown:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._decreased = now
+                    self.decreases += 1
+                    # Let the baseline follow a server that stays slower.
+                    if self._baseline is not None:
+                        self._baseline *= 1.5
+                    logger.info("Backing off to %.2f calls/s after %s", self.rate,
+                                f"status {status}" if status is not None else "a connection error")
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+
+class CircuitBreaker:
+    """ Fails calls fast while a server is down.
+
+    After failure_threshold consecutive failures the circuit opens and calls raise CircuitOpenError without
+    being sent. After reset_timeout one probe call is let through (half-open): its success closes the circuit,
+    its failure opens it again for another reset_timeout.
+    >>> now = [0.0]
+    >>> breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    >>> breaker.record_failure(); breaker.record_failure(); breaker.state
+    'open'
+    >>> now[0] = 10; breaker.before_call(); breaker.state
+    'half-open'
+    >>> breaker.record_success(); breaker.state
+    'closed'
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """ Initialize the breaker.
+        :param failure_threshold: consecutive failures that open the circuit
+        :param reset_timeout: seconds the circuit stays open before a probe call
+        :param clock: monotonic time source, in seconds
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._clock = clock
+        self._opened = None
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """ Let a call through, or raise CircuitOpenError. """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self._clock() - self._opened >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(f"Circuit open after {self.failures} failures")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def release(self) -> None:
+        """ End a call that neither failed nor succeeded, e.g. one interrupted by an error of the caller: a
+        half-open circuit goes back to open, and the next call after reset_timeout is let through as a probe.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Opening the circuit after %d failures", self.failures)
+                self.state = self.OPEN
+                self._opened = self._clock()
+
+
+class ResilienceStats:
+    """ Counters of a Resilience layer. """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.gave_up = 0
+        self.waited = 0.0
+
+    def __repr__(self) -> str:
+        return (f"ResilienceStats(calls={self.calls}, attempts={self.attempts}, retries={self.retries}, "
+                f"short_circuited={self.short_circuited}, gave_up={self.gave_up}, waited={self.waited:.2f}s)")
+
+
+def _status(result: Any) -> int:
+    # A SoapResult or an HTTP response.
+    return result[0] if isinstance(result, tuple) else result.status_code
+
+
+def _retry_after(result: Any) -> Optional[float]:
+    response = getattr(result, 'response', result)
+    value = (getattr(response, 'headers', None) or {}).get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Resilience:
+    """ Retries, rate limiting and circuit breaking around the calls of a MemoqSoap client.
+
+    Every call waits for a token from the rate limiter of its server (scheme and host of the URL) and is
+    refused while that server's circuit is open. Idempotent actions (List*, Get*, lookups) are sent again
+    after a connection error, a timeout or a retryable status, following the retry policy; other actions get
+    a single attempt. When the attempts run out, the last response is returned, or the last error raised.
+    >>> resilience = Resilience(retry=RetryPolicy(random=lambda: 0.0), sleep=lambda seconds: None)
+    >>> answers = iter([(503, 'busy'), (200, 'ok')])
+    >>> resilience.call('http://memoq/tm', 'ListTMs', lambda: next(answers))
+    (200, 'ok')
+    >>> resilience.stats
+    ResilienceStats(calls=1, attempts=2, retries=1, short_circuited=0, gave_up=0, waited=0.00s)
+    """
+
+    def __init__(self, retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[Callable[[], AdaptiveRateLimiter]] = AdaptiveRateLimiter,
+                 circuit_breaker: Optional[Callable[[], CircuitBreaker]] = CircuitBreaker,
+                 clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep) -> None:
+        """ Initialize the layer.
+        :param retry: the RetryPolicy, defaults to RetryPolicy()
+        :param rate_limiter: makes the rate limiter of each server, or None for no rate limiting
+        :param circuit_breaker: makes the circuit breaker of each server, or None for no circuit breaking
+        :param clock: measures call latency, in seconds
+        :param sleep: how to wait between attempts
+        """
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.stats = ResilienceStats()
+        self._rate_limiter = rate_limiter
+        self._circuit_breaker = circuit_breaker
+        self._clock = clock
+        self._sleep = sleep
+        self._servers = {}
+        self._lock = threading.Lock()
+
+    def server(self, url: str) -> tuple:
+        """ The (rate limiter, circuit breaker) of the server of a URL, either None when disabled. """
+        parts = urlsplit(url)
+        base = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            server = self._servers.get(base)
+            if server is None:
+                server = self._servers[base] = (self._rate_limiter() if self._rate_limiter else None,
+                                                self._circuit_breaker() if self._circuit_breaker else None)
+            return server
+
+    def call(self, url: str, action: str, send: Callable[[], Any],
+             discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """ Send a call with retries, rate limiting and circuit breaking.
+        :param url: the service URL, which selects the server's limiter and breaker
+        :param action: the SOAP action, which selects the number of attempts
+        :param send: makes one attempt; returns a SoapResult or an HTTP response, or raises OSError. Other
+            exceptions are raised at once, without counting against the server
+        :param discard: releases a response that is not returned, e.g. closes a streamed one
+        :return: what the last attempt returned
+        :raises CircuitOpenError: when the server's circuit is open
+        """
+        limiter, breaker = self.server(url)
+        attempts = self.retry.attempts_for(action)
+        counts = ResilienceStats()
+        try:
+            for attempt in range(attempts):
+                if breaker is not None:
+                    try:
+                        breaker.before_call()
+                    except CircuitOpenError:
+                        counts.short_circuited = 1
+                        raise
+                if limiter is not None:
+                    counts.waited += limiter.acquire()
+                counts.attempts += 1
+                start = self._clock()
+                try:
+                    result = send()
+                except OSError:
+                    if limiter is not None:
+                        limiter.record(None)
+                    if breaker is not None:
+                        breaker.record_failure()
+                    if attempt + 1 >= attempts:
+                        counts.gave_up = int(attempts > 1)
+                        raise
+                    delay = self.retry.delay(attempt)
+                    logger.info("%s failed with a connection error, attempt %d of %d, retrying in %.2fs", action,
+                                attempt + 1, attempts, delay)
+                except BaseException:
+                    # Not a server failure (a parse error, an interrupt): release the token and the probe.
+                    if limiter is not None:
+                        limiter.release()
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                else:
+                    status = _status(result)
+                    if limiter is not None:
+                        limiter.record(status, self._clock() - start)
+                    if breaker is not None:
+                        if status in FAILURE_STATUSES:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success()
+                    if status not in self.retry.retry_statuses or attempt + 1 >= attempts:
+                        counts.gave_up = int(status in self.retry.retry_statuses and attempts > 1)
+                        return result
+                    delay = self.retry.delay(attempt, _retry_after(result))
+                    logger.info("%s returned %d, attempt %d of %d, retrying in %.2fs", action, status, attempt + 1,
+                                attempts, delay)
+                    if discard is not None:
+                        discard(result)
+                counts.retries += 1
+                counts.waited += delay
+                self._sleep(delay)
+        finally:
+            with self._lock:
+                stats = self.stats
+                stats.calls += 1
+                stats.attempts += counts.attempts
+                stats.retries += counts.retries
+                stats.short_circuited += counts.short_circuited
+                stats.gave_up += counts.gave_up
+                stats.waited += counts.waited
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
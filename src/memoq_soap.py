@@ -1,57 +1,136 @@
-from typing import Optional
+from typing import Callable, Optional, Iterable, Iterator, Union
 import os
 import configparser
-import requests
 import json
 import xmltodict
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from src.memoq_cache import ResponseCache
+from src.memoq_cassette import CassetteWriter, RecordingTransport
+from src.memoq_envelope import EnvelopeBuilder
+from src.memoq_metrics import CallMetrics, Observer
+from src.memoq_records import to_records
+from src.memoq_resilience import Resilience
+from src.memoq_stream import iter_items, iter_text, parse_projected
+from src.memoq_transport import Transport, PooledTransport, Timeout
+
+logger = logging.getLogger(__name__)
+wire_logger = logging.getLogger(f"{__name__}.wire")
+
+
+class MemoqSoapError(Exception):
+    """ Raised by the streaming API, which cannot return an error status alongside its items. """
+
+    def __init__(self, status_code: int, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SoapResult(tuple):
+    """ The (status, data) pair returned by make_soap_request, carrying the request and response of that call.
+    >>> result = SoapResult(200, {'Name': 'a'}, soap_action='ns/ITMService/ListTMs')
+    >>> status, data = result
+    >>> status, data, result.soap_action
+    (200, {'Name': 'a'}, 'ns/ITMService/ListTMs')
+    >>> result == (200, {'Name': 'a'})
+    True
+    """
+
+    def __new__(cls, status: int, data, url: str = None, soap_action: str = None,
+                payload: bytes = None, response=None):
+        result = super().__new__(cls, (status, data))
+        result.url = url
+        result.soap_action = soap_action
+        result.payload = payload
+        result.response = response
+        return result
+
+    @property
+    def status(self) -> int:
+        return self[0]
+
+    @property
+    def data(self):
+        return self[1]
+
+
+class BatchResult:
+    """ Outcome of MemoqSoap.batch_call: one entry per call, in the order the calls were given.
+
+    Each entry is the call's SoapResult, or the exception it raised.
+    >>> batch = BatchResult([SoapResult(200, 'a'), SoapResult(500, 'b'), ValueError('c')], elapsed=0.5)
+    >>> batch.succeeded, batch.failed, batch.calls_per_second
+    (1, 2, 6.0)
+    >>> [index for index, _ in batch.errors]
+    [1, 2]
+    """
+
+    def __init__(self, results: list, elapsed: float) -> None:
+        self.results = results
+        self.elapsed = elapsed
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
 
-# Debugging urllib3
-import contextlib
-from http.client import HTTPConnection
+    @staticmethod
+    def is_ok(result: Union[SoapResult, Exception]) -> bool:
+        return not isinstance(result, Exception) and result[0] == 200
 
+    @property
+    def errors(self) -> list:
+        """ (index, result or exception) for every call that raised or did not return status 200. """
+        return [(index, result) for index, result in enumerate(self.results) if not self.is_ok(result)]
 
-logging.basicConfig(level=logging.DEBUG)
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if self.is_ok(result))
 
-def debug_requests_on():
-    '''Switches on logging of the requests module.'''
-    HTTPConnection.debuglevel = 1
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
 
-    logging.basicConfig()
-    logging.getLogger().setLevel(logging.DEBUG)
-    requests_log = logging.getLogger("requests.packages.urllib3")
-    requests_log.setLevel(logging.DEBUG)
-    requests_log.propagate = True
+    @property
+    def calls_per_second(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
 
-def debug_requests_off():
-    '''Switches off logging of the requests module, might be some side-effects'''
-    HTTPConnection.debuglevel = 0
+    def __repr__(self) -> str:
+        return (f"BatchResult(calls={len(self.results)}, succeeded={self.succeeded}, failed={self.failed}, "
+                f"elapsed={self.elapsed:.3f}s, calls_per_second={self.calls_per_second:.1f})")
 
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.WARNING)
-    root_logger.handlers = []
-    requests_log = logging.getLogger("requests.packages.urllib3")
-    requests_log.setLevel(logging.WARNING)
-    requests_log.propagate = False
 
-@contextlib.contextmanager
-def debug_requests():
-    '''Use with 'with'!'''
-    debug_requests_on()
-    yield
-    debug_requests_off()
+RESULT_NATIVE = 'native'
+RESULT_JSON = 'json'
+RESULT_RECORDS = 'records'
+RESULT_FORMATS = (RESULT_NATIVE, RESULT_JSON, RESULT_RECORDS)
 
 
-class MemoqSoap:
-    """ A class to interact with memoQ's Web API using SOAP. """
+class MemoqSoapBase:
+    """ Envelope building and response parsing shared by the sync and async memoQ SOAP clients. """
 
-    def __init__(self, wsdl_base_url: str, api_key: str) -> None:
-        """ Initialize the memoq SOAP class
+    def __init__(self, wsdl_base_url: str, api_key: str, wire_dump: bool = False,
+                 result_format: str = RESULT_NATIVE) -> None:
+        """ Initialize the shared SOAP state
         :param wsdl_base_url:
         :param api_key:
-        >>> MemoqSoap("some_url", "some_key")._wsdl_base_url
-        'some_url'
+        :param wire_dump: log full request and response bodies of this client, API key redacted, to the
+            'src.memoq_soap.wire' logger at DEBUG level
+        :param result_format: RESULT_NATIVE to return parsed dicts and lists, RESULT_RECORDS to decode TMInfo,
+            TBInfo, ServerProjectInfo and document items into the slotted types of memoq_records (a listing
+            is then always a list, also when it is empty or has one item), or RESULT_JSON
+            for the json.dumps(indent=4) strings of earlier versions
         """
+        if result_format not in RESULT_FORMATS:
+            raise ValueError(f"result_format must be one of {RESULT_FORMATS}, not {result_format!r}")
 
         current_dir = os.path.dirname(os.path.abspath(__file__))
         config_path = os.path.join(current_dir, 'memoq.references.ini')
@@ -67,6 +146,9 @@ class MemoqSoap:
         self._wsdl_base_url = wsdl_base_url
         self._api_key = api_key
         self._namespace = config.get('SCHEMA', 'NAMESPACE')
+        self.wire_dump = wire_dump
+        self.result_format = result_format
+        self._envelope = EnvelopeBuilder(self._namespace, self._api_key)
         self._payload_template = f"""<?xml version="1.0" encoding="utf-8"?>
             <soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">
                 <soap:Header>
@@ -75,16 +157,6 @@ class MemoqSoap:
                 <soap:Body></soap:Body>
             </soap:Envelope>"""
 
-        # Public Fields
-        self.headers = {'Content-Type': 'text/xml; charset=utf-8', 'SOAPAction': ''}
-        self.route = None
-        self.payload = None
-        self.response = None
-        self.response_status_code = None
-        self.response_content = None
-        self.response_text = None
-        self.error_message = None
-
     def _load_config(self):
         # Construct the config file path
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -110,56 +182,103 @@ class MemoqSoap:
 
         return payload
 
-    def make_soap_request(self, route: str, interface: str, memoq_type: str, action: str, **kwargs) -> tuple[int, str]:
-        """ Make a SOAP request to Memoq API.
-        :param route: route to the service requested
-        :param interface: the interface to be used
-        :param memoq_type: the type of object to be retrieved
-        :param action: the action to be performed
-        :param kwargs: additional parameters like guid
-        :return: the response from the CAT tool's API
+    def _redact(self, payload: Union[bytes, memoryview]) -> str:
+        """ Decode a traced payload with the API key hidden.
+        >>> soap = MemoqSoap("some_url", "secret")
+        >>> soap.build_payload('ListTMs').count(b'secret'), soap._redact(soap.build_payload('ListTMs')).count('secret')
+        (1, 0)
         """
+        text = str(payload, 'utf-8', errors='replace')
+        return text.replace(self._api_key, '***') if self._api_key else text
+
+    def _trace_request(self, url: str, soap_action: str, payload: bytes) -> None:
+        # Formatting only happens when a handler will actually emit the record.
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("POST %s SOAPAction=%s (%d bytes)", url, soap_action, len(payload))
+        if self.wire_dump and wire_logger.isEnabledFor(logging.DEBUG):
+            wire_logger.debug("request %s\n%s", soap_action, self._redact(payload))
+
+    def _trace_response(self, soap_action: str, status_code: int, content: bytes) -> None:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s -> %d (%d bytes)", soap_action, status_code, len(content))
+        if self.wire_dump and wire_logger.isEnabledFor(logging.DEBUG):
+            wire_logger.debug("response %s %d\n%s", soap_action, status_code, self._redact(content))
+
+    def service_url(self, route: str) -> str:
+        """ Build the full URL of a service route.
+        >>> MemoqSoap("https://memoq.example.com/", "some_key").service_url('/memoqservices/tb/TBService')
+        'https://memoq.example.com/memoqservices/tb/TBService'
+        """
+        return f"{self._wsdl_base_url.rstrip('/')}/{route.lstrip('/')}"
 
-        url = f'{self._wsdl_base_url}/{route}'
-        soap_action = f"{interface}/{action}"
-
-        # Generate the payload body dynamically based on the action and additional parameters
-        payload_body = f'<{action} xmlns="{self._namespace}">'
-
-        # Build the payload body based on the additional parameters
-        for key, value in kwargs.items():
-            payload_body += f'<{key}>{value}</{key}>'
-
-        payload_body += f'</{action}>'
-
-        self.payload = self.generate_payload(self._payload_template, payload_body)
-        self.headers['SOAPAction'] = f"{self._namespace}/{soap_action}"
-
-        print(f"self._wsdl_url: {self._wsdl_base_url}")
-        print(f"self.headers: {self.headers}")
-        print(f"self.payload: {self.payload}")
-
-        debug_requests_on()
-        self.response = requests.request("POST", url, headers=self.headers, data=self.payload)
-        debug_requests_off()
+    def soap_action(self, interface: str, action: str) -> str:
+        """ Build the value of the SOAPAction header.
+        >>> MemoqSoap("some_url", "some_key").soap_action('ITMService', 'ListTMs')
+        'http://kilgray.com/memoqservices/2007/ITMService/ListTMs'
+        """
+        return f"{self._namespace}/{interface}/{action}"
 
-        self.response_status_code = self.response.status_code
-        self.response_content = self.response.content.decode()
+    def build_payload(self, action: str, **kwargs) -> bytes:
+        """ Build the SOAP envelope for an action and its parameters, as UTF-8 bytes.
 
-        if self.response.status_code != 200:
-            self.error_message = f"Error: {self.response.status_code}\nHeaders: {self.response.headers}\nResponse: {self.response.text}"
-            return self.response.status_code, self.error_message
+        Values are XML-escaped; dicts and lists are serialized as nested elements (see memoq_envelope).
+        >>> payload = MemoqSoap("some_url", "some_key").build_payload('GetTMInfo', tmGuid='abc')
+        >>> b'<GetTMInfo xmlns="http://kilgray.com/memoqservices/2007"><tmGuid>abc</tmGuid></GetTMInfo>' in payload
+        True
+        """
+        return self._envelope.build(action, kwargs)
 
-        parse_xml_response = self.parse_xml_response(response_text=self.response_content, memoq_type=memoq_type, action=action)
-        json_data = json.dumps(parse_xml_response, indent=4)
-        return self.response_status_code, json_data
+    def build_payload_into(self, buffer: bytearray, action: str, **kwargs) -> memoryview:
+        """ Build the SOAP envelope for an action into a reusable buffer, see EnvelopeBuilder.build_into.
+        :return: a view of the envelope, valid until the buffer is written again
+        """
+        return self._envelope.build_into(buffer, action, kwargs)
+
+    def process_response(self, status_code: int, headers, content: bytes, memoq_type: str, action: str,
+                         phases: Optional[dict] = None, projection: Optional[frozenset] = None) -> tuple:
+        """ Turn a raw HTTP response into the (status, data) pair returned by make_soap_request.
+        :param projection: the field paths of the items to keep, see parse_xml_response
+        :param phases: optional dict in which to record the seconds spent parsing ('parse') and converting to the
+            result format ('serialize')
+        :return: the status code and the parsed data (a JSON string in RESULT_JSON mode), or an error message
+            when the status is not 200
+        >>> xml = b'<s:Envelope><s:Body><ListTMsResponse><ListTMsResult><TMInfo><Name>a</Name></TMInfo></ListTMsResult></ListTMsResponse></s:Body></s:Envelope>'
+        >>> MemoqSoap("some_url", "some_key").process_response(200, {}, xml, 'TMInfo', 'ListTMs')
+        (200, {'Name': 'a'})
+        >>> MemoqSoap("some_url", "some_key", result_format=RESULT_JSON).process_response(200, {}, xml, 'TMInfo', 'ListTMs')
+        (200, '{\\n    "Name": "a"\\n}')
+        >>> MemoqSoap("some_url", "some_key", result_format=RESULT_RECORDS).process_response(200, {}, xml, 'TMInfo', 'ListTMs')[1][0].Name
+        'a'
+        >>> MemoqSoap("some_url", "some_key").process_response(500, {}, b'boom', 'TMInfo', 'ListTMs')
+        (500, 'Error: 500\\nHeaders: {}\\nResponse: boom')
+        """
+        if status_code != 200:
+            return status_code, f"Error: {status_code}\nHeaders: {headers}\nResponse: {content.decode()}"
+
+        if phases is not None:
+            started = time.perf_counter()
+        data = self.parse_xml_response(response_text=content, memoq_type=memoq_type, action=action,
+                                       projection=projection)
+        if phases is not None:
+            parsed = time.perf_counter()
+            phases['parse'] = parsed - started
+        if self.result_format == RESULT_JSON:
+            data = json.dumps(data, indent=4)
+        elif self.result_format == RESULT_RECORDS:
+            data = to_records(data, memoq_type, listing=action is not None and action.startswith('List'))
+        if phases is not None:
+            phases['serialize'] = time.perf_counter() - parsed
+        return status_code, data
 
     @staticmethod
-    def parse_xml_response(response_text: str, memoq_type: str, action: str = None) -> Optional[dict]:
+    def parse_xml_response(response_text: Union[str, bytes], memoq_type: str, action: str = None,
+                           projection: Optional[Iterable[str]] = None) -> Optional[dict]:
         """ Parse the XML response from the CAT tool's API
-        :param response_text: The XML response text
+        :param response_text: The XML response text or its encoded bytes
         :param memoq_type: The type of MemoQ object (e.g., 'TMInfo', 'TBInfo')
         :param action: The action performed (e.g., 'ListTMs', 'ListTBs')
+        :param projection: the paths of the fields of the items to keep, e.g. {'Guid', 'Name'}; the rest of the
+            response is skipped while it is scanned, without building dicts for it (see memoq_stream.iter_items)
         :return: the parsed XML response as a dictionary
         >>> xml = '<s:Envelope><s:Body><ListTMsResponse><ListTMsResult><TMInfo>list</TMInfo></ListTMsResult></ListTMsResponse></s:Body></s:Envelope>'
         >>> MemoqSoap.parse_xml_response(response_text=xml, memoq_type='TMInfo', action='ListTMs')  # Assuming a single TM object in the response
@@ -167,8 +286,14 @@ class MemoqSoap:
         >>> xml = '<s:Envelope><s:Body><TMInfo>translation memory</TMInfo></s:Body></s:Envelope>'
         >>> MemoqSoap.parse_xml_response(response_text=xml, memoq_type='TMInfo')  # Assuming a single TM object in the response
         'translation memory'
+        >>> xml = '<s:Envelope><s:Body><DeleteTMResponse xmlns="ns"/></s:Body></s:Envelope>'
+        >>> MemoqSoap.parse_xml_response(response_text=xml, memoq_type='TMInfo', action='DeleteTM') is None
+        True
         """
 
+        if projection is not None:
+            return parse_projected(response_text, memoq_type, action, projection)
+
         parsed_xml = xmltodict.parse(response_text)
 
         if action is None:
@@ -180,11 +305,372 @@ class MemoqSoap:
         else:
             action_response = f"{action}Response"
             action_result = f"{action}Result"
-            data = parsed_xml['s:Envelope']['s:Body'][action_response][action_result][memoq_type]
+            response = parsed_xml['s:Envelope']['s:Body'][action_response]
+            # Void actions (DeleteTM, UpdateProperties...) have no result element, and scalar results such
+            # as the Guid returned by CreateTM have no memoq_type element.
+            data = response.get(action_result) if isinstance(response, dict) else None
+            if isinstance(data, dict) and memoq_type in data:
+                data = data[memoq_type]
 
         return data
 
 
+class MemoqSoap(MemoqSoapBase):
+    """ A class to interact with memoQ's Web API using SOAP. """
+
+    def __init__(self, wsdl_base_url: str, api_key: str, transport: Optional[Transport] = None,
+                 timeout: Timeout = None, pool_maxsize: int = 10, route_pool_sizes: Optional[dict] = None,
+                 keep_last_response: bool = False, wire_dump: bool = False,
+                 result_format: str = RESULT_NATIVE, cache: Optional[ResponseCache] = None,
+                 resilience: Optional[Resilience] = None, observers: Iterable[Observer] = (),
+                 record_to: Optional[Union[str, os.PathLike]] = None) -> None:
+        """ Initialize the memoq SOAP class
+
+        make_soap_request keeps all per-call state local, so one instance can be shared across threads.
+        :param wsdl_base_url:
+        :param api_key:
+        :param transport: HTTP transport to use; defaults to a keep-alive PooledTransport
+        :param timeout: default timeout for every call, seconds or a (connect, read) tuple
+        :param pool_maxsize: keep-alive connections per host when the default transport is used
+        :param route_pool_sizes: optional pool size per route when the default transport is used
+        :param keep_last_response: debugging aid; store the last call's payload and response on the instance
+        :param wire_dump: log full request and response bodies of this client, see MemoqSoapBase
+        :param result_format: RESULT_NATIVE, RESULT_RECORDS or RESULT_JSON, see MemoqSoapBase
+        :param cache: optional ResponseCache for metadata reads (GetTMInfo, ListTMs, ListTBs, ListProjects...);
+            successful write actions invalidate the entries they make stale
+        :param resilience: optional Resilience layer: retries with backoff for idempotent actions, and a rate
+            limiter and circuit breaker per server for every call
+        :param observers: callbacks given the CallMetrics of every call, see add_observer
+        :param record_to: capture mode: record every request and response, with their timings and the API key
+            redacted, to this cassette file until the client is closed; replay it with memoq_cassette.ReplayTransport
+        >>> MemoqSoap("some_url", "some_key")._wsdl_base_url
+        'some_url'
+        >>> with MemoqSoap("some_url", "some_key") as soap:
+        ...     isinstance(soap.transport, PooledTransport)
+        True
+        """
+        super().__init__(wsdl_base_url, api_key, wire_dump=wire_dump, result_format=result_format)
+
+        self._timeout = timeout
+        self.transport = transport if transport is not None else PooledTransport(
+            pool_maxsize=pool_maxsize, route_pool_sizes=route_pool_sizes, base_url=wsdl_base_url)
+        if record_to is not None:
+            self.transport = RecordingTransport(self.transport, CassetteWriter(record_to, api_key=self._api_key))
+        self.cache = cache
+        self.resilience = resilience
+        # A tuple, replaced rather than changed, so calls iterate it without a lock; empty means no timing at all.
+        self._observers = tuple(observers)
+
+        # Public Fields
+        # Base headers, copied for every call; the SOAPAction is set on the copy.
+        self.headers = {'Content-Type': 'text/xml; charset=utf-8'}
+
+        # "Last response" debug state, only written when keep_last_response is set. With several threads
+        # sharing the client these describe whichever call finished last.
+        self.keep_last_response = keep_last_response
+        self._last_response_lock = threading.Lock()
+        self.route = None
+        self.payload = None
+        self.response = None
+        self.response_status_code = None
+        self.response_content = None
+        self.response_text = None
+        self.error_message = None
+
+    def close(self) -> None:
+        """ Close the transport and release its pooled connections. """
+        self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_observer(self, observer: Observer) -> None:
+        """ Call observer with the CallMetrics of every call made from now on: the time spent in each phase,
+        the byte sizes and the status, tagged with the interface and action (see memoq_metrics).
+
+        Observers run on the calling thread, after the response was processed, and must be thread-safe when
+        the client is shared; a MetricsAggregator is. An observer that raises is logged and does not fail the call.
+        >>> from src.memoq_metrics import MetricsAggregator
+        >>> soap, aggregator = MemoqSoap("some_url", "some_key"), MetricsAggregator()
+        >>> soap.add_observer(aggregator)
+        >>> soap.remove_observer(aggregator)
+        >>> soap.observers
+        ()
+        """
+        self._observers += (observer,)
+
+    def remove_observer(self, observer: Observer) -> None:
+        observers = list(self._observers)
+        observers.remove(observer)
+        self._observers = tuple(observers)
+
+    @property
+    def observers(self) -> tuple:
+        return self._observers
+
+    def _notify(self, metrics: CallMetrics) -> None:
+        for observer in self._observers:
+            try:
+                observer(metrics)
+            except Exception:
+                logger.exception("Metrics observer %r failed", observer)
+
+    def make_soap_request(self, route: str, interface: str, memoq_type: str, action: str,
+                          projection: Optional[Iterable[str]] = None, **kwargs) -> SoapResult:
+        """ Make a SOAP request to Memoq API.
+        :param route: route to the service requested
+        :param interface: the interface to be used
+        :param memoq_type: the type of object to be retrieved
+        :param action: the action to be performed
+        :param projection: the paths of the fields of the result's items to keep, e.g. {'Guid', 'Name'}; the
+            other fields are skipped while the response is parsed
+        :param kwargs: additional parameters like guid
+        :return: the response from the CAT tool's API, as a SoapResult (status, data) pair; data is the parsed
+            result (a dict, list or string), a JSON string in RESULT_JSON mode, or an error message
+        """
+
+        # The object the call reads or writes, which scopes the cache's invalidations.
+        scope = kwargs.get('tmGuid', kwargs.get('tbGuid')) if self.cache is not None else None
+        if not self._observers:
+            return self.send_envelope(route, interface, memoq_type, action, self.build_payload(action, **kwargs),
+                                      projection=projection, scope=scope)
+
+        start = time.perf_counter()
+        payload = self.build_payload(action, **kwargs)
+        return self.send_envelope(route, interface, memoq_type, action, payload, time.perf_counter() - start,
+                                  projection, scope)
+
+    def send_envelope(self, route: str, interface: str, memoq_type: str, action: str,
+                      payload: Union[bytes, memoryview], build_time: float = 0.0,
+                      projection: Optional[Iterable[str]] = None, scope: Optional[str] = None) -> SoapResult:
+        """ Send a SOAP envelope built by the caller, e.g. with build_payload_into, and process the response
+        as make_soap_request does.
+        :param route: route to the service requested
+        :param interface: the interface to be used
+        :param memoq_type: the type of object to be retrieved
+        :param action: the action the envelope calls
+        :param payload: the encoded envelope
+        :param build_time: seconds spent building the envelope, reported to observers as the 'build' phase
+        :param projection: the field paths of the items to keep, as for make_soap_request
+        :param scope: the GUID of the TM or TB the call reads or writes; a write then invalidates only the
+            cached results of that object and the listings
+        :return: a SoapResult (status, data) pair, as returned by make_soap_request
+        """
+        url = self.service_url(route)
+        soap_action = self.soap_action(interface, action)
+        if projection is not None:
+            projection = frozenset(projection)
+
+        if self._observers:
+            # Only the first attempt reports the build time; retries resend the same envelope.
+            send = partial(self._send_observed, route, url, soap_action, payload, interface, memoq_type, action,
+                           [build_time], projection)
+        else:
+            send = partial(self._send, route, url, soap_action, payload, memoq_type, action, projection)
+        if self.resilience is not None:
+            send = partial(self.resilience.call, url, action, send)
+
+        if self.cache is not None and self.cache.caches(action):
+            # The cache holds the (status, data) pair only, not the response and its body.
+            sent = []
+
+            def load() -> tuple:
+                sent.append(send())
+                return sent[0].status, sent[0].data
+
+            status, data = self.cache.get_or_load(action, (url, memoq_type, payload, projection), load, scope)
+            result = sent[0] if sent else SoapResult(status, data, url=url, soap_action=soap_action,
+                                                     payload=payload)
+        else:
+            result = send()
+            if self.cache is not None and result.status == 200:
+                self.cache.after_write(action, scope)
+
+        # A cache hit sent nothing, so the last response stays the one that was last received.
+        if self.keep_last_response and result.response is not None:
+            self._remember(route, result)
+        return result
+
+    def _send(self, route: str, url: str, soap_action: str, payload: Union[bytes, memoryview], memoq_type: str,
+              action: str, projection: Optional[frozenset] = None) -> SoapResult:
+        headers = dict(self.headers, SOAPAction=soap_action)
+
+        self._trace_request(url, soap_action, payload)
+        response = self.transport.send(route, url, data=payload, headers=headers, timeout=self._timeout)
+        self._trace_response(soap_action, response.status_code, response.content)
+
+        status, data = self.process_response(response.status_code, response.headers, response.content,
+                                             memoq_type, action, projection=projection)
+        return SoapResult(status, data, url=url, soap_action=soap_action, payload=payload, response=response)
+
+    def _send_observed(self, route: str, url: str, soap_action: str, payload: Union[bytes, memoryview],
+                       interface: str, memoq_type: str, action: str, build_time: list,
+                       projection: Optional[frozenset] = None) -> SoapResult:
+        # _send, timing each phase. The body is streamed so that waiting for the server and downloading the body
+        # can be told apart.
+        headers = dict(self.headers, SOAPAction=soap_action)
+        phases = {'build': build_time.pop() if build_time else 0.0}
+        metrics = CallMetrics(interface, action, request_bytes=len(payload), phases=phases)
+
+        self._trace_request(url, soap_action, payload)
+        connected = self.transport.connect_seconds()
+        start = time.perf_counter()
+        try:
+            response = self.transport.send(route, url, data=payload, headers=headers, timeout=self._timeout,
+                                           stream=True)
+            received = time.perf_counter()
+            phases['connect'] = self.transport.connect_seconds() - connected
+            phases['server'] = received - start - phases['connect']
+            metrics.status = response.status_code
+            content = response.content
+            phases['download'] = time.perf_counter() - received
+            metrics.response_bytes = len(content)
+            self._trace_response(soap_action, response.status_code, content)
+
+            status, data = self.process_response(response.status_code, response.headers, content, memoq_type,
+                                                 action, phases, projection)
+        except Exception as error:
+            metrics.error = type(error).__name__
+            if 'server' not in phases:
+                phases['server'] = time.perf_counter() - start
+            raise
+        finally:
+            self._notify(metrics)
+        return SoapResult(status, data, url=url, soap_action=soap_action, payload=payload, response=response)
+
+    def iter_soap_request(self, route: str, interface: str, memoq_type: str, action: str,
+                          chunk_size: int = 1 << 16, projection: Optional[Iterable[str]] = None,
+                          **kwargs) -> Iterator[Optional[dict]]:
+        """ Make a SOAP request and yield the items of its result one at a time, as the response streams in.
+
+        The body is parsed incrementally and each item is dropped once yielded, so memory stays flat however
+        large the listing is. Items have the same shape as the elements make_soap_request returns: dicts, or
+        records in RESULT_RECORDS mode.
+        :param route: route to the service requested
+        :param interface: the interface to be used
+        :param memoq_type: the type of the items, e.g. 'ServerProjectInfo'
+        :param action: the action to be performed
+        :param chunk_size: bytes read from the socket at a time
+        :param projection: the paths of the fields of an item to keep; the others are skipped unparsed
+        :param kwargs: additional parameters like guid
+        :return: a generator of items
+        :raises MemoqSoapError: when the server answers with a status other than 200
+        """
+        items = iter_items(self._iter_body(route, interface, action, chunk_size, kwargs), memoq_type,
+                           fields=projection)
+        if self.result_format == RESULT_RECORDS:
+            items = (to_records(item, memoq_type) for item in items)
+        return items
+
+    def iter_soap_text(self, route: str, interface: str, action: str, chunk_size: int = 1 << 16,
+                       **kwargs) -> Iterator[str]:
+        """ Make a SOAP request and yield the text of its result element in pieces, as the response streams in.
+
+        For scalar results too large to hold as one string, such as the base64 data of a TMX chunk.
+        :param route: route to the service requested
+        :param interface: the interface to be used
+        :param action: the action to be performed
+        :param chunk_size: bytes read from the socket at a time
+        :param kwargs: additional parameters like guid
+        :return: a generator of text pieces; empty when the result is nil
+        :raises MemoqSoapError: when the server answers with a status other than 200
+        """
+        return iter_text(self._iter_body(route, interface, action, chunk_size, kwargs), f"{action}Result")
+
+    def _iter_body(self, route: str, interface: str, action: str, chunk_size: int, kwargs: dict) -> Iterator[bytes]:
+        url = self.service_url(route)
+        soap_action = self.soap_action(interface, action)
+        start = time.perf_counter()
+        payload = self.build_payload(action, **kwargs)
+        build_time = time.perf_counter() - start
+        headers = dict(self.headers, SOAPAction=soap_action)
+
+        self._trace_request(url, soap_action, payload)
+        send = partial(self.transport.send, route, url, data=payload, headers=headers, timeout=self._timeout,
+                       stream=True)
+        if self.resilience is not None:
+            send = partial(self.resilience.call, url, action, send, discard=lambda discarded: discarded.close())
+        if self._observers:
+            yield from self._iter_body_observed(interface, action, payload, build_time, chunk_size, send)
+            return
+
+        response = send()
+        try:
+            if response.status_code != 200:
+                raise MemoqSoapError(response.status_code, f"Error: {response.status_code}\nHeaders: "
+                                                           f"{response.headers}\nResponse: {response.text}")
+            yield from response.iter_content(chunk_size)
+        finally:
+            # Returns the connection to the pool, also when the caller stops iterating early.
+            response.close()
+
+    def _iter_body_observed(self, interface: str, action: str, payload: bytes, build_time: float, chunk_size: int,
+                            send: Callable) -> Iterator[bytes]:
+        # _iter_body, timing the call. Retries by the resilience layer count as server time of one call.
+        phases = {'build': build_time}
+        metrics = CallMetrics(interface, action, request_bytes=len(payload), phases=phases, streamed=True)
+        connected = self.transport.connect_seconds()
+        start = time.perf_counter()
+        try:
+            response = send()
+            received = time.perf_counter()
+            phases['connect'] = self.transport.connect_seconds() - connected
+            phases['server'] = received - start - phases['connect']
+            metrics.status = response.status_code
+            try:
+                if response.status_code != 200:
+                    raise MemoqSoapError(response.status_code, f"Error: {response.status_code}\nHeaders: "
+                                                               f"{response.headers}\nResponse: {response.text}")
+                for chunk in response.iter_content(chunk_size):
+                    metrics.response_bytes += len(chunk)
+                    yield chunk
+            finally:
+                phases['download'] = time.perf_counter() - received
+                response.close()
+        except Exception as error:
+            metrics.error = type(error).__name__
+            if 'server' not in phases:
+                phases['server'] = time.perf_counter() - start
+            raise
+        finally:
+            self._notify(metrics)
+
+    def batch_call(self, calls: Iterable[dict], max_workers: int = 8) -> BatchResult:
+        """ Run many SOAP calls on a bounded thread pool.
+
+        Failed calls do not abort the batch: an exception is stored in place of that call's result.
+        For full parallelism, max_workers should not exceed the transport's connection pool size.
+        :param calls: keyword arguments for make_soap_request, one dict per call
+        :param max_workers: number of calls in flight at once
+        :return: a BatchResult with the results in the same order as calls
+        """
+        def run(call: dict) -> Union[SoapResult, Exception]:
+            try:
+                return self.make_soap_request(**call)
+            except Exception as error:
+                return error
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(run, calls))
+        batch = BatchResult(results, elapsed=time.perf_counter() - start)
+
+        logger.info("%r", batch)
+        return batch
+
+    def _remember(self, route: str, result: SoapResult) -> None:
+        with self._last_response_lock:
+            self.route = route
+            self.payload = result.payload
+            self.response = result.response
+            self.response_status_code = result.status
+            self.response_content = result.response.content.decode()
+            self.response_text = result.response.text
+            self.error_message = result.data if result.status != 200 else None
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
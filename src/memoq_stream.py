@@ -0,0 +1,228 @@
+from typing import Any, Iterable, Iterator, Optional, Union
+from collections import deque
+from functools import lru_cache
+from xml.parsers import expat
+
+
+@lru_cache(maxsize=256)
+def _projection_tree(fields: frozenset) -> dict:
+    tree = {}
+    for path in sorted(fields, key=lambda path: (path.count('/'), path)):
+        node = tree
+        names = path.strip('/').split('/')
+        for name in names[:-1]:
+            child = node.setdefault(name, {})
+            if child is None:
+                break
+            node = child
+        else:
+            node[names[-1]] = None
+    return tree
+
+
+def compile_projection(fields: Iterable[str]) -> dict:
+    """ Turn field paths into the tree the parser follows: an element is kept when its name is in the tree,
+    and all of it when its branch ends there (None).
+    >>> compile_projection(['Name', 'TransUnit/SourceSegment', 'TransUnit/TargetSegment'])
+    {'Name': None, 'TransUnit': {'SourceSegment': None, 'TargetSegment': None}}
+    >>> compile_projection(['Targets/string', 'Targets'])
+    {'Targets': None}
+    """
+    return _projection_tree(frozenset(fields))
+
+
+class _ItemCollector:
+    """ Expat handler that builds xmltodict-shaped dicts for the items of a listing, one at a time.
+
+    Only elements named item_name at item_depth (and their subtrees) are materialized; everything else in the
+    document is skipped as it streams past. With a projection tree, so is every element of an item that is
+    not in the tree: no dict, text or attributes are built for it.
+    """
+
+    def __init__(self, item_name: str, item_depth: int, tree: Optional[dict] = None) -> None:
+        self.item_name = item_name
+        self.item_depth = item_depth
+        self.tree = tree
+        self.depth = 0
+        # Depth below the element being skipped, 0 when not skipping.
+        self.skipping = 0
+        self.stack = []
+        self.ready = deque()
+
+    def _matches(self, name: str) -> bool:
+        return name == self.item_name or name.rpartition(':')[2] == self.item_name
+
+    def start(self, name: str, attrs: dict) -> None:
+        self.depth += 1
+        if self.skipping:
+            self.skipping += 1
+            return
+        if self.stack:
+            node = self.stack[-1][3]
+            if node is not None:
+                # A projection names fields by their local name too; the item keeps the name as written.
+                key = name if name in node else name.rpartition(':')[2]
+                if key not in node:
+                    self.skipping = 1
+                    return
+                node = node[key]
+        elif self.depth == self.item_depth and self._matches(name):
+            node = self.tree
+        else:
+            return
+        item = {f'@{key}': value for key, value in attrs.items()} if attrs else None
+        self.stack.append((name, item, [], node))
+
+    def end(self, name: str) -> None:
+        self.depth -= 1
+        if self.skipping:
+            self.skipping -= 1
+            return
+        if not self.stack:
+            return
+        name, item, data, _ = self.stack.pop()
+        text = ''.join(data).strip() if data else ''
+        if item is None:
+            item = text or None
+        elif text:
+            item['#text'] = text
+
+        if not self.stack:
+            self.ready.append(item)
+            return
+
+        parent_name, parent, parent_data, parent_node = self.stack[-1]
+        if parent is None:
+            parent = {}
+            self.stack[-1] = (parent_name, parent, parent_data, parent_node)
+        if name in parent:
+            existing = parent[name]
+            if isinstance(existing, list):
+                existing.append(item)
+            else:
+                parent[name] = [existing, item]
+        else:
+            parent[name] = item
+
+    def characters(self, text: str) -> None:
+        if self.stack and not self.skipping:
+            self.stack[-1][2].append(text)
+
+
+def _collector_parser(collector: _ItemCollector):
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = collector.start
+    parser.EndElementHandler = collector.end
+    parser.CharacterDataHandler = collector.characters
+    return parser
+
+
+def iter_items(chunks: Iterable[bytes], item_name: str, item_depth: int = 5,
+               fields: Optional[Iterable[str]] = None) -> Iterator[Optional[dict]]:
+    """ Incrementally parse a SOAP response and yield its items one at a time.
+
+    Items have the same shape xmltodict.parse would give them, so they match the elements of the list
+    returned by MemoqSoap.parse_xml_response. Memory use is bounded by the chunk size and the largest single
+    item, not by the size of the response.
+    :param chunks: the response body, as an iterable of byte chunks
+    :param item_name: the element name of one item, e.g. 'ServerProjectInfo'
+    :param item_depth: the depth of the items; 5 for Envelope/Body/<Action>Response/<Action>Result/<item>
+    :param fields: projection: the paths of the fields of an item to keep, e.g. {'Name', 'TransUnit/SourceSegment'};
+        the other fields are skipped unparsed, while the attributes and text of a kept element stay. None keeps
+        every field
+    :return: a generator of items
+    >>> xml = (b'<s:Envelope><s:Body><ListTMsResponse><ListTMsResult>'
+    ...        b'<TMInfo><Name>a</Name></TMInfo><TMInfo lang="de"><Name>b</Name><Tag>x</Tag><Tag>y</Tag></TMInfo>'
+    ...        b'</ListTMsResult></ListTMsResponse></s:Body></s:Envelope>')
+    >>> list(iter_items([xml[:50], xml[50:]], 'TMInfo'))
+    [{'Name': 'a'}, {'@lang': 'de', 'Name': 'b', 'Tag': ['x', 'y']}]
+    >>> list(iter_items([xml], 'TMInfo', fields={'Tag'}))
+    [None, {'@lang': 'de', 'Tag': ['x', 'y']}]
+    """
+    collector = _ItemCollector(item_name, item_depth, compile_projection(fields) if fields is not None else None)
+    parser = _collector_parser(collector)
+
+    for chunk in chunks:
+        parser.Parse(chunk, False)
+        while collector.ready:
+            yield collector.ready.popleft()
+    parser.Parse(b'', True)
+    while collector.ready:
+        yield collector.ready.popleft()
+
+
+def parse_projected(body: Union[str, bytes], memoq_type: str, action: Optional[str],
+                    fields: Iterable[str]) -> Any:
+    """ Parse a whole response as MemoqSoap.parse_xml_response does, keeping only the given fields of its
+    items (see iter_items): the result is a list of items, one item, or None, in the same shapes.
+
+    Both a result that lists items of memoq_type and a result that is itself the item (GetTMInfo) are
+    projected with the same fields.
+    >>> xml = (b'<s:Envelope><s:Body><GetTMInfoResponse><GetTMInfoResult><Guid>g</Guid><Name>a</Name>'
+    ...        b'<NumEntries>3</NumEntries></GetTMInfoResult></GetTMInfoResponse></s:Body></s:Envelope>')
+    >>> parse_projected(xml, 'TMInfo', 'GetTMInfo', {'Name', 'Guid'})
+    {'Guid': 'g', 'Name': 'a'}
+    """
+    tree = compile_projection(fields)
+    if action is None:
+        name, depth = memoq_type, 3
+    else:
+        name, depth, tree = f'{action}Result', 4, dict(tree, **{memoq_type: tree})
+    collector = _ItemCollector(name, depth, tree)
+    _collector_parser(collector).Parse(body, True)
+    data = collector.ready[0] if collector.ready else None
+    if action is not None and action != 'GetTMInfo' and isinstance(data, dict) and memoq_type in data:
+        data = data[memoq_type]
+    return data
+
+
+def iter_text(chunks: Iterable[bytes], element_name: str, element_depth: int = 4) -> Iterator[str]:
+    """ Incrementally parse a SOAP response and yield the character data of one element, piece by piece.
+
+    Meant for results too large to hold as one string, such as the base64 TMX chunks of an export: the text
+    is never joined. Nothing is yielded when the element is missing, empty or nil.
+    :param chunks: the response body, as an iterable of byte chunks
+    :param element_name: the element whose text is wanted, e.g. 'GetNextTMXChunkResult'
+    :param element_depth: the depth of the element; 4 for Envelope/Body/<Action>Response/<Action>Result
+    :return: a generator of text pieces
+    >>> xml = b'<s:Envelope><s:Body><R><RResult>aGVsbG8=</RResult></R></s:Body></s:Envelope>'
+    >>> ''.join(iter_text([xml[:40], xml[40:]], 'RResult'))
+    'aGVsbG8='
+    """
+    state = {'depth': 0, 'inside': False}
+    pending = deque()
+
+    def start(name: str, attrs: dict) -> None:
+        state['depth'] += 1
+        if state['depth'] == element_depth and (name == element_name or name.rpartition(':')[2] == element_name):
+            state['inside'] = True
+
+    def end(name: str) -> None:
+        if state['depth'] == element_depth:
+            state['inside'] = False
+        state['depth'] -= 1
+
+    def characters(text: str) -> None:
+        if state['inside']:
+            pending.append(text)
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.buffer_size = 1 << 16
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+
+    for chunk in chunks:
+        parser.Parse(chunk, False)
+        while pending:
+            yield pending.popleft()
+    parser.Parse(b'', True)
+    while pending:
+        yield pending.popleft()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
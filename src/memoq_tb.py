@@ -1,9 +1,13 @@
-from typing import Tuple, Optional
+from typing import Any, Tuple, Optional, Iterable, Iterator, Callable, BinaryIO, Union
 import logging
+import os
+import tempfile
 
 from src import memoq_soap as mq
+from src.memoq_terms import TermIndex, iter_csv_entries
+from src.memoq_tmx import ChunkedExport, TransferProgress
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 
 class MemoqTb:
@@ -20,14 +24,128 @@ class MemoqTb:
         self.soap_client = soap_client
         self.service = 'ITBService'
 
-    def list_tbs(self) -> Tuple[int, Optional[str]]:
+    def list_tbs(self, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ Get the list of term bases from the memoQ Server.
+        :param projection: the fields of every TBInfo to keep, e.g. {'Guid', 'Name', 'LanguageCodes'}; the others
+            are skipped while the response is parsed. None keeps them all
         :return: status code and response content
         """
         route = '/memoqservices/tb/TBService'
-        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='TBInfo', action='ListTBs')
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='TBInfo', action='ListTBs', projection=projection)
         return response_status, data
 
+    def iter_tbs(self, projection: Optional[Iterable[str]] = None) -> Iterator[dict]:
+        """ Stream the term bases of the memoQ Server one TBInfo at a time, without holding the whole listing.
+        :param projection: the fields of every TBInfo to keep, as for list_tbs
+        :return: a generator of TBInfo items
+        """
+        route = '/memoqservices/tb/TBService'
+        return self.soap_client.iter_soap_request(route=route, interface='ITBService', memoq_type='TBInfo',
+                                                  action='ListTBs', projection=projection)
+
+    def begin_chunked_csv_export(self, guid: str) -> Tuple[int, Any]:
+        """ Begin chunked CSV export of a term base.
+        :param guid: The GUID of the TB
+        :return: status code and the GUID of the export session
+        """
+        return self._csv_export().begin(tbGuid=guid)
+
+    def _csv_export(self) -> ChunkedExport:
+        return ChunkedExport(self.soap_client, '/memoqservices/tb/TBService', 'ITBService', 'BeginChunkedCSVExport',
+                             'GetNextCSVChunk', 'EndChunkedCSVExport')
+
+    def end_chunked_csv_export(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked CSV export.
+        :param guid: The GUID of the export session
+        :return: status code and response content
+        """
+        return self._csv_export().end(guid)
+
+    def export_csv(self, guid: str, path: Union[str, os.PathLike, BinaryIO], prefetch: int = 1,
+                   progress: Optional[Callable[[TransferProgress], None]] = None) -> TransferProgress:
+        """ Export a term base as CSV to a file, one chunk at a time.
+
+        Works like MemoqTm.export_tmx: chunks are decoded as they arrive and written straight to the file, the
+        next chunk downloading while one is written, and the export session is always ended.
+        :param guid: The GUID of the TB
+        :param path: the file to write, or a binary file object (left open)
+        :param prefetch: chunks downloaded ahead of the one being written; 0 to download and write in turn
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :return: the final TransferProgress
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        response_status, session = self.begin_chunked_csv_export(guid)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, session)
+        return self._csv_export().write(session, path, TransferProgress(), prefetch, progress)
+
+    def get_entry(self, guid: str, entry_id: int, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
+        """ Get one entry of a term base.
+        :param guid: The GUID of the TB
+        :param entry_id: The id of the entry
+        :param projection: the field paths of the TBEntry to keep, e.g. {'Id', 'Languages/TermBaseLanguage'}
+        :return: status code and the TBEntry
+        """
+        route = '/memoqservices/tb/TBService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='TBEntry', action='GetEntry', projection=projection, tbGuid=guid, entryId=entry_id)
+        return response_status, data
+
+    def get_entries(self, guid: str, entry_ids: Iterable[int], max_workers: int = 8,
+                    projection: Optional[Iterable[str]] = None) -> mq.BatchResult:
+        """ Get many entries of a term base in parallel.
+        :param guid: The GUID of the TB
+        :param entry_ids: The ids of the entries
+        :param max_workers: number of calls in flight at once
+        :param projection: the field paths of every TBEntry to keep, as for get_entry
+        :return: a BatchResult with one (status, data) result or exception per entry, in order
+        """
+        route = '/memoqservices/tb/TBService'
+        calls = [dict(route=route, interface='ITBService', memoq_type='TBEntry', action='GetEntry', tbGuid=guid,
+                      entryId=entry_id, projection=projection) for entry_id in entry_ids]
+        return self.soap_client.batch_call(calls, max_workers=max_workers)
+
+    def get_next_csv_chunk(self, guid: str) -> Tuple[int, Any]:
+        """ Get the next CSV chunk.
+        :param guid: The GUID of the export session
+        :return: status code and the base64 data of the chunk, None once the export is complete
+        """
+        route = '/memoqservices/tb/TBService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITBService', memoq_type='base64Binary', action='GetNextCSVChunk', sessionId=guid)
+        return response_status, data
+
+    def iter_next_csv_chunk(self, guid: str) -> Iterator[bytes]:
+        """ Get the next CSV chunk, decoding its base64 data as the response streams in.
+        :param guid: The GUID of the export session
+        :return: a generator of decoded byte pieces; empty once the export is complete
+        """
+        return self._csv_export().iter_chunk(guid)
+
+    def load_term_index(self, guids: Iterable[str], source_column: str, target_column: str,
+                        casefold: bool = True, stemmer: Optional[Callable[[str], str]] = None,
+                        index: Optional[TermIndex] = None) -> TermIndex:
+        """ Export term bases and index their terms for one language pair, for TermIndex.scan and scan_many.
+
+        Each export is spooled to a temporary file (in memory while it is small) and parsed from there.
+        :param guids: The GUIDs of the TBs
+        :param source_column: the CSV header of the source language, e.g. 'English'
+        :param target_column: the CSV header of the target language, e.g. 'German'
+        :param casefold: match regardless of case
+        :param stemmer: optional function mapping a case-folded word to its stem
+        :param index: an index to add to, instead of a new one
+        :return: the TermIndex
+        :raises MemoqSoapError: when the server rejects an export
+        """
+        if index is None:
+            index = TermIndex(casefold=casefold, stemmer=stemmer)
+        for guid in guids:
+            with tempfile.SpooledTemporaryFile(max_size=64 << 20) as spool:
+                stats = self.export_csv(guid, spool)
+                spool.seek(0)
+                added = index.add_entries(iter_csv_entries(spool, source_column, target_column), tb=guid)
+            logger.info("Indexed %d terms of TB %s (%d bytes of CSV)", added, guid, stats.bytes)
+        index.build()
+        return index
+
 
 if __name__ == "__main__":
     import doctest
@@ -0,0 +1,223 @@
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from array import array
+from collections import defaultdict, deque
+from functools import lru_cache
+import codecs
+import csv
+import io
+import re
+
+_WORD = re.compile(r"\w+(?:['’-]\w+)*")
+
+
+class TermEntry(NamedTuple):
+    """ A term base entry, with its terms in the indexed language pair. """
+    tb: Optional[str]
+    id: Optional[str]
+    source_terms: Tuple[str, ...]
+    target_terms: Tuple[str, ...]
+
+
+class TermHit(NamedTuple):
+    """ A term found in a segment: where (character offsets), which term and its entry. """
+    start: int
+    end: int
+    term: str
+    entry: TermEntry
+
+
+def iter_csv_entries(stream: BinaryIO, source_column: str, target_column: str,
+                     id_column: str = 'Entry_ID') -> Iterator[Tuple[Optional[str], tuple, tuple]]:
+    """ Stream the entries of a memoQ term base CSV export as (entry id, source terms, target terms).
+
+    The export has one row per entry and one column per term, headed by the language name; a language with
+    synonyms has several columns of the same name. The encoding (UTF-16 or UTF-8, from the byte order mark)
+    and the delimiter are detected. Entries without a term in both languages are skipped.
+    :param stream: the CSV export, as a binary file object
+    :param source_column: the header of the source language's term columns, e.g. 'English'
+    :param target_column: the header of the target language's term columns, e.g. 'German'
+    :param id_column: the header of the entry id column
+    >>> data = 'Entry_ID\\tEnglish\\tEnglish\\tGerman\\n1\\tcontract\\tagreement\\tVertrag\\n2\\tparty\\t\\t\\n'
+    >>> list(iter_csv_entries(io.BytesIO(codecs.BOM_UTF16_LE + data.encode('utf-16-le')), 'English', 'German'))
+    [('1', ('contract', 'agreement'), ('Vertrag',))]
+    """
+    head = stream.read(4)
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = 'utf-16'
+    else:
+        encoding = 'utf-8-sig'
+    text = io.TextIOWrapper(io.BufferedReader(_Prepend(head, stream), 1 << 16), encoding=encoding, newline='')
+    try:
+        header_line = text.readline()
+        delimiter = max('\t;,', key=header_line.count)
+        header = next(csv.reader([header_line], delimiter=delimiter))
+        folded = [name.strip().casefold() for name in header]
+        sources = [i for i, name in enumerate(folded) if name == source_column.casefold()]
+        targets = [i for i, name in enumerate(folded) if name == target_column.casefold()]
+        id_index = folded.index(id_column.casefold()) if id_column.casefold() in folded else None
+        for row in csv.reader(text, delimiter=delimiter):
+            source_terms = tuple(row[i].strip() for i in sources if i < len(row) and row[i].strip())
+            target_terms = tuple(row[i].strip() for i in targets if i < len(row) and row[i].strip())
+            if source_terms and target_terms:
+                entry_id = row[id_index] if id_index is not None and id_index < len(row) else None
+                yield entry_id, source_terms, target_terms
+    finally:
+        text.detach()
+
+
+class _Prepend(io.RawIOBase):
+    # A read-only stream that returns `head` and then the rest of `stream`, for TextIOWrapper.
+
+    def __init__(self, head: bytes, stream: BinaryIO) -> None:
+        self._head = head
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._head:
+            size = min(len(buffer), len(self._head))
+            buffer[:size] = self._head[:size]
+            self._head = self._head[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TermIndex:
+    """ An Aho-Corasick automaton over the words of the source terms of one language pair.
+
+    Terms match whole words only. Words are case-folded (optional) and passed through an optional stemmer,
+    both in terms and in segments, so 'Contracts' can find the term 'contract' with a stemmer that maps both
+    to one stem. Every occurrence of every term is reported, nested ones included, in one pass over the
+    segment's words whatever the number of terms. The automaton is kept compact: its transitions are one
+    dict keyed by (state, word) and its failure and output links are integer arrays.
+    >>> index = TermIndex()
+    >>> index.add_entries([('1', ('contract', 'contract law'), ('Vertrag', 'Vertragsrecht')), ('2', ('law',), ('Recht',))])
+    3
+    >>> [(hit.term, hit.entry.target_terms[0]) for hit in index.scan('Contract law, not contracts.')]
+    [('contract', 'Vertrag'), ('contract law', 'Vertrag'), ('law', 'Recht')]
+    """
+
+    def __init__(self, casefold: bool = True, stemmer: Optional[Callable[[str], str]] = None,
+                 cache_size: int = 1 << 16) -> None:
+        """ Initialize an empty index.
+        :param casefold: match regardless of case
+        :param stemmer: optional function mapping a (case-folded) word to its stem
+        :param cache_size: number of normalized words remembered
+        """
+        self.casefold = casefold
+        self.stemmer = stemmer
+        self.terms = 0
+        self._goto = {}
+        self._fail = array('i', [0])
+        self._link = array('i', [0])
+        self._outputs = {}
+        self._built = True
+        self._normalize = lru_cache(maxsize=cache_size)(self._normalize_word)
+
+    def __len__(self) -> int:
+        return self.terms
+
+    def _normalize_word(self, word: str) -> str:
+        if self.casefold:
+            word = word.casefold()
+        return self.stemmer(word) if self.stemmer is not None else word
+
+    def _words(self, text: str) -> List[Tuple[int, int, str]]:
+        normalize = self._normalize
+        return [(match.start(), match.end(), normalize(match.group())) for match in _WORD.finditer(text)]
+
+    def add(self, term: str, entry: TermEntry) -> bool:
+        """ Add a source term.
+        :return: False when the term has no words and was not added
+        """
+        words = [word for _, _, word in self._words(term)]
+        if not words:
+            return False
+        state = 0
+        for word in words:
+            child = self._goto.get((state, word))
+            if child is None:
+                child = self._goto[state, word] = len(self._fail)
+                self._fail.append(0)
+                self._link.append(0)
+            state = child
+        self._outputs.setdefault(state, []).append((term, entry, len(words)))
+        self.terms += 1
+        self._built = False
+        return True
+
+    def add_entries(self, entries: Iterable[Tuple[Optional[str], tuple, tuple]], tb: Optional[str] = None) -> int:
+        """ Add the source terms of term base entries, e.g. from iter_csv_entries.
+        :param entries: (entry id, source terms, target terms) tuples
+        :param tb: the GUID of the term base, kept in the hits' entries
+        :return: the number of terms added
+        """
+        added = 0
+        for entry_id, source_terms, target_terms in entries:
+            entry = TermEntry(tb, entry_id, tuple(source_terms), tuple(target_terms))
+            for term in entry.source_terms:
+                added += self.add(term, entry)
+        return added
+
+    def build(self) -> None:
+        """ Compute the failure and output links; done by the first scan after terms were added. """
+        children = defaultdict(list)
+        for (parent, word), child in self._goto.items():
+            children[parent].append((word, child))
+        goto, fail, link, outputs = self._goto, self._fail, self._link, self._outputs
+        queue = deque()
+        for _, child in children[0]:
+            fail[child] = link[child] = 0
+            queue.append(child)
+        while queue:
+            state = queue.popleft()
+            for word, child in children.get(state, ()):
+                target = fail[state]
+                while target and (target, word) not in goto:
+                    target = fail[target]
+                target = goto.get((target, word), 0)
+                fail[child] = target
+                link[child] = target if target in outputs else link[target]
+                queue.append(child)
+        self._built = True
+
+    def scan(self, segment: str) -> List[TermHit]:
+        """ Find the terms in a segment.
+        :return: the hits, by end position and then from the longest term to the shortest
+        """
+        if not self._built:
+            self.build()
+        goto, fail, link, outputs = self._goto, self._fail, self._link, self._outputs
+        words = self._words(segment)
+        hits = []
+        state = 0
+        for position, (_, end, word) in enumerate(words):
+            while state and (state, word) not in goto:
+                state = fail[state]
+            state = goto.get((state, word), 0)
+            found = state if state in outputs else link[state]
+            while found:
+                for term, entry, size in outputs[found]:
+                    hits.append(TermHit(words[position - size + 1][0], end, term, entry))
+                found = link[found]
+        return hits
+
+    def scan_many(self, segments: Iterable[str]) -> Iterator[Tuple[int, List[TermHit]]]:
+        """ Find the terms in many segments, yielding (segment number, hits) for the segments with hits. """
+        for number, segment in enumerate(segments):
+            hits = self.scan(segment)
+            if hits:
+                yield number, hits
+
+    def stats(self) -> Dict[str, int]:
+        """ Size of the automaton: terms, states and transitions. """
+        return {'terms': self.terms, 'states': len(self._fail), 'transitions': len(self._goto)}
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
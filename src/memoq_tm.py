@@ -1,17 +1,170 @@
-from typing import Tuple, Optional
+from typing import Any, Tuple, Optional, Iterable, Iterator, Callable, BinaryIO, Union
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+import itertools
 import logging
+import mmap
+import os
+import tempfile
+import time
 
 from src import memoq_soap as mq
+from src.memoq_cache import ResponseCache
+from src.memoq_envelope import escape_text
+from src.memoq_tmx import ChunkedExport, TransferCheckpoint, TransferProgress, prefetched, write_tmx
 
-logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# A lookup for the batch lookup APIs: (source, target, TM GUID, request options).
+LookupRequest = Tuple[str, str, str, Optional[dict]]
+
+# A TM entry for the bulk write API: a (source, target) pair, or a dict with 'source', 'target' and TMEntry fields.
+Entry = Union[Tuple[str, str], dict]
+
+
+def tm_entry(source: str, target: str, **fields) -> dict:
+    """ Build the TMEntry parameter of AddOrUpdateEntry from plain source and target text.
+
+    The segments are sent as memoQ segment XML. Other TMEntry fields (Client, Domain, Project, Subject...) are
+    passed through; members are ordered by name, as the service's data contract expects.
+    >>> tm_entry('a & b', 'c', Client='Acme')
+    {'Client': 'Acme', 'SourceSegment': '<seg>a &amp; b</seg>', 'TargetSegment': '<seg>c</seg>'}
+    """
+    fields['SourceSegment'] = f'<seg>{escape_text(source)}</seg>'
+    fields['TargetSegment'] = f'<seg>{escape_text(target)}</seg>'
+    return dict(sorted(fields.items()))
+
+
+def _entry_parts(entry: Entry) -> Tuple[str, str, dict]:
+    if isinstance(entry, dict):
+        fields = dict(entry)
+        return fields.pop('source'), fields.pop('target'), fields
+    source, target = entry
+    return source, target, {}
+
+
+def _entry_batches(entries: Iterable[Entry], batch_size: int, batch_bytes: int) -> Iterator[list]:
+    # Groups of at most batch_size entries and (roughly) batch_bytes of text.
+    batch = []
+    size = 0
+    for entry in entries:
+        source, target, _ = _entry_parts(entry)
+        batch.append(entry)
+        size += len(source) + len(target)
+        if len(batch) >= batch_size or size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def _freeze(value: Any) -> Any:
+    # A hashable, order-independent form of request options.
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _ExportChanged(Exception):
+    """ The bytes a resumed export downloaded again differ from those already written. """
+
+
+def _skip_bytes(pieces: list, skip: int, digest) -> Tuple[list, int]:
+    # Drop the first `skip` bytes of a chunk's pieces, hashing them, and return the rest and what is left to skip.
+    kept = []
+    for piece in pieces:
+        if skip:
+            head = piece[:skip]
+            digest.update(head)
+            skip -= len(head)
+            piece = piece[len(head):]
+        if piece:
+            kept.append(piece)
+    return kept, skip
+
+
+class LookupBatchResult(mq.BatchResult):
+    """ Outcome of MemoqTm.lookup_segments and MemoqTm.concordance_many: one (status, data) result or exception
+    per request, in request order, with the deduplication and memo figures of the job.
+    >>> batch = LookupBatchResult([(200, 'a'), (200, 'a'), (200, 'b'), (200, 'a')], elapsed=0.1, unique=2, calls=1)
+    >>> batch.dedup_ratio, batch.hit_rate
+    (0.5, 0.5)
+    """
+
+    def __init__(self, results: list, elapsed: float, unique: int, calls: int) -> None:
+        super().__init__(results, elapsed)
+        self.unique = unique
+        self.calls = calls
+
+    @property
+    def dedup_ratio(self) -> float:
+        """ Share of the requests answered by an identical request of the same job. """
+        return 1 - self.unique / len(self) if len(self) else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        """ Share of the unique requests answered by the memo instead of the server. """
+        return 1 - self.calls / self.unique if self.unique else 0.0
+
+    def __repr__(self) -> str:
+        return (f"LookupBatchResult(requests={len(self)}, unique={self.unique}, calls={self.calls}, "
+                f"dedup_ratio={self.dedup_ratio:.2f}, hit_rate={self.hit_rate:.2f}, failed={self.failed}, "
+                f"elapsed={self.elapsed:.2f}s)")
+
+
+class BulkWriteResult:
+    """ Outcome of MemoqTm.add_or_update_entries.
+
+    Only the failures are kept per entry, as (index, error) pairs where error is the error message or exception,
+    so the result stays small for hundreds of thousands of entries. When the entries were sent as one TMX
+    import, they share its outcome: `error` is set and every entry failed, or none did.
+    >>> result = BulkWriteResult(total=3, errors=[(1, 'Error: 500')], elapsed=0.5, mode='entries')
+    >>> result.succeeded, result.failed, result.is_ok(0), result.is_ok(1)
+    (2, 1, True, False)
+    """
+
+    def __init__(self, total: int, errors: list, elapsed: float, mode: str, error: Optional[Exception] = None,
+                 import_result: Any = None) -> None:
+        self.total = total
+        self.errors = errors
+        self.elapsed = elapsed
+        self.mode = mode
+        self.error = error
+        self.import_result = import_result
+        self._failed_indexes = {index for index, _ in errors}
+
+    @property
+    def failed(self) -> int:
+        return self.total if self.error is not None else len(self.errors)
+
+    @property
+    def succeeded(self) -> int:
+        return self.total - self.failed
+
+    def is_ok(self, index: int) -> bool:
+        return self.error is None and index not in self._failed_indexes
+
+    @property
+    def entries_per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        return (f"BulkWriteResult(mode={self.mode}, total={self.total}, succeeded={self.succeeded}, "
+                f"failed={self.failed}, elapsed={self.elapsed:.2f}s, {self.entries_per_second:.0f} entries/s)")
 
 
 class MemoqTm:
     """ A class to interact with Translation Memory objects using memoq's web service API. """
 
-    def __init__(self, soap_client: mq.MemoqSoap) -> None:
+    def __init__(self, soap_client: mq.MemoqSoap, lookup_cache: Optional[ResponseCache] = None) -> None:
         """ Initialize the MemoqTm class with a MemoqSoap object.
         :param soap_client: SOAP client that will make calls to the CAT tool's API
+        :param lookup_cache: optional memo for lookup_segments and concordance_many, shared across jobs, e.g.
+            ResponseCache(ttls={'LookupSegment': 3600, 'Concordance': 3600}, maxsize=100_000). The answers of a
+            TM are dropped from it when this client writes to that TM
         >>> soap = mq.MemoqSoap(wsdl_base_url="some_url", api_key="some_key")
         >>> tm_client = MemoqTm(soap)
         >>> isinstance(tm_client.soap_client, mq.MemoqSoap)
@@ -19,9 +172,12 @@ class MemoqTm:
         """
         self.soap_client = soap_client
         self.service = 'ITMService'
+        self.lookup_cache = lookup_cache
 
-    def list_tms(self) -> Tuple[int, Optional[str]]:
+    def list_tms(self, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ Get the list of TMs from the memoQ Server.
+        :param projection: the fields of every TMInfo to keep, e.g. {'Guid', 'Name', 'LastModified'}; the others
+            are skipped while the response is parsed. None keeps them all
         :return: status code and response content
         """
         route = 'memoqservices/tm/TMService'
@@ -30,12 +186,22 @@ class MemoqTm:
             interface='ITMService',
             memoq_type='TMInfo',
             action='ListTMs',
+            projection=projection,
             # srcLang='eng',
             )
 
         return response_status, data
 
-    def create_tm(self, tm_name: str, source_lang: str, target_lang: str) -> Tuple[int, Optional[str]]:
+    def iter_tms(self, projection: Optional[Iterable[str]] = None) -> Iterator[dict]:
+        """ Stream the TMs of the memoQ Server one TMInfo at a time, without holding the whole listing.
+        :param projection: the fields of every TMInfo to keep, as for list_tms
+        :return: a generator of TMInfo items
+        """
+        route = 'memoqservices/tm/TMService'
+        return self.soap_client.iter_soap_request(route=route, interface='ITMService', memoq_type='TMInfo',
+                                                  action='ListTMs', projection=projection)
+
+    def create_tm(self, tm_name: str, source_lang: str, target_lang: str) -> Tuple[int, Any]:
         """ Create a new Translation Memory.
         :param tm_name: Name of the new TM
         :param source_lang: Source language code
@@ -53,53 +219,164 @@ class MemoqTm:
 
     # ... Existing methods above
 
-    def add_next_tmx_chunk(self, guid: str, byte_data: bytes) -> Tuple[int, Optional[str]]:
+    def add_next_tmx_chunk(self, guid: str, byte_data: bytes) -> Tuple[int, Any]:
         """ Add the next TMX chunk.
-        :param guid: The GUID of the TM
+        :param guid: The GUID of the import session
         :param byte_data: The byte data for the next chunk
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='guid', action='AddNextTMXChunk', sessionId=guid, tmxData=byte_data)
+        return response_status, data
 
-    def add_or_update_entry(self, source: str, target: str, guid: str) -> Tuple[int, Optional[str]]:
+    def add_or_update_entry(self, source: str, target: str, guid: str) -> Tuple[int, Any]:
         """ Add or update an entry in the TM.
         :param source: The source text
         :param target: The target text
         :param guid: The GUID of the TM
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMEntry', action='AddOrUpdateEntry', tmGuid=guid, entry=tm_entry(source, target))
+        if response_status == 200:
+            self._forget_lookups(guid)
+        return response_status, data
+
+    def _forget_lookups(self, guid: str) -> None:
+        # A write to a TM makes the memoized lookups and concordance searches in it stale.
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate('LookupSegment', 'Concordance', scope=guid)
+
+    def add_or_update_entries(self, guid: str, entries: Iterable[Entry], batch_size: int = 100,
+                              batch_bytes: int = 1 << 20, max_workers: int = 8, tmx_threshold: Optional[int] = 50_000,
+                              source_lang: Optional[str] = None, target_lang: Optional[str] = None,
+                              chunk_size: int = 1 << 20) -> BulkWriteResult:
+        """ Add or update many entries in a TM.
+
+        The service writes one entry per AddOrUpdateEntry call, so entries are grouped into batches of at most
+        batch_size entries and batch_bytes of text, and up to max_workers batches are written concurrently over
+        the pooled connections. Entries are only pulled from the iterable as batches complete, so no more than
+        2 * max_workers batches are held at once.
+        When there are at least tmx_threshold entries, they are written as one TMX document instead (spooled to a
+        temporary file) and sent with import_tmx, which costs a few calls per megabyte instead of one per entry.
+        :param guid: The GUID of the TM
+        :param entries: (source, target) pairs, or dicts with 'source', 'target' and optional TMEntry fields
+            (TMEntry fields are not carried over to a TMX import)
+        :param batch_size: maximum number of entries per batch
+        :param batch_bytes: maximum characters of source and target text per batch
+        :param max_workers: number of batches written at once
+        :param tmx_threshold: entry count from which the TMX import is used; None to always write entries
+        :param source_lang: TMX source language; looked up with get_tm_info when omitted
+        :param target_lang: TMX target language; looked up with get_tm_info when omitted
+        :param chunk_size: bytes per chunk of the TMX import
+        :return: a BulkWriteResult with the failed entries
+        """
+        entries = iter(entries)
+        if tmx_threshold:
+            head = list(itertools.islice(entries, tmx_threshold))
+            if len(head) >= tmx_threshold:
+                return self._write_entries_as_tmx(guid, itertools.chain(head, entries), source_lang, target_lang,
+                                                  chunk_size)
+            entries = iter(head)
+        return self._write_entries(guid, entries, batch_size, batch_bytes, max_workers)
+
+    def _write_entries(self, guid: str, entries: Iterator[Entry], batch_size: int, batch_bytes: int,
+                       max_workers: int) -> BulkWriteResult:
+        route = 'memoqservices/tm/TMService'
+
+        def write(start: int, batch: list) -> list:
+            errors = []
+            for index, entry in enumerate(batch, start):
+                source, target, fields = _entry_parts(entry)
+                try:
+                    response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMEntry', action='AddOrUpdateEntry', tmGuid=guid, entry=tm_entry(source, target, **fields))
+                    if response_status != 200:
+                        errors.append((index, data))
+                except Exception as error:
+                    errors.append((index, error))
+            return errors
+
+        start_time = time.perf_counter()
+        total = 0
+        errors = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for batch in _entry_batches(entries, batch_size, batch_bytes):
+                if len(pending) >= 2 * max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        errors.extend(future.result())
+                pending.add(pool.submit(write, total, batch))
+                total += len(batch)
+            for future in pending:
+                errors.extend(future.result())
+        if len(errors) < total:
+            self._forget_lookups(guid)
+        errors.sort(key=lambda failure: failure[0])
+        return BulkWriteResult(total, errors, time.perf_counter() - start_time, 'entries')
+
+    def _write_entries_as_tmx(self, guid: str, entries: Iterator[Entry], source_lang: Optional[str],
+                              target_lang: Optional[str], chunk_size: int) -> BulkWriteResult:
+        start_time = time.perf_counter()
+        if source_lang is None or target_lang is None:
+            response_status, info = self.get_tm_info(guid)
+            if response_status != 200:
+                raise mq.MemoqSoapError(response_status, info)
+            languages = info if isinstance(info, dict) else {name: getattr(info, name) for name in ('SourceLanguageCode', 'TargetLanguageCode')}
+            source_lang = source_lang or languages['SourceLanguageCode']
+            target_lang = target_lang or languages['TargetLanguageCode']
 
-    def begin_chunked_tmx_export(self, guid: str) -> Tuple[int, Optional[str]]:
+        with tempfile.SpooledTemporaryFile(max_size=32 << 20) as tmx:
+            total = write_tmx(tmx, (_entry_parts(entry)[:2] for entry in entries), source_lang, target_lang)
+            tmx.seek(0)
+            try:
+                stats = self.import_tmx(guid, tmx, chunk_size=chunk_size)
+            except (mq.MemoqSoapError, OSError) as error:
+                return BulkWriteResult(total, [], time.perf_counter() - start_time, 'tmx', error=error)
+        return BulkWriteResult(total, [], time.perf_counter() - start_time, 'tmx', import_result=stats.result)
+
+    def begin_chunked_tmx_export(self, guid: str) -> Tuple[int, Any]:
         """ Begin chunked TMX export.
         :param guid: The GUID of the TM
-        :return: status code and response content
+        :return: status code and the GUID of the export session
         """
-        # Implementation here
-        pass
+        return self._tmx_export().begin(tmGuid=guid)
 
-    def begin_chunked_tmx_import(self, guid: str) -> Tuple[int, Optional[str]]:
+    def _tmx_export(self) -> ChunkedExport:
+        return ChunkedExport(self.soap_client, 'memoqservices/tm/TMService', 'ITMService', 'BeginChunkedTMXExport',
+                             'GetNextTMXChunk', 'EndChunkedTMXExport')
+
+    def begin_chunked_tmx_import(self, guid: str) -> Tuple[int, Any]:
         """ Begin chunked TMX import.
         :param guid: The GUID of the TM
-        :return: status code and response content
+        :return: status code and the GUID of the import session
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='guid', action='BeginChunkedTMXImport', tmGuid=guid)
+        return response_status, data
 
-    def concordance(self, source: str, target: str, guid: str, concordance_request: dict) -> Tuple[int, Optional[str]]:
+    def concordance(self, source: str, target: str, guid: str, concordance_request: dict) -> Tuple[int, Any]:
         """ Perform a concordance search.
         :param source: The source text
-        :param target: The target text
+        :param target: The target text; memoQ searches the source expression only, so it is not sent
         :param guid: The GUID of the TM
-        :param concordance_request: The concordance request parameters
+        :param concordance_request: The concordance request parameters, e.g. {'Options': {...}}
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        request = dict(concordance_request or {}, Expression={'string': [source]})
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='ConcordanceResult', action='Concordance', tmGuid=guid, request=dict(sorted(request.items())))
+        return response_status, data
+
+    def concordance_many(self, requests: Iterable[LookupRequest], max_workers: int = 8) -> LookupBatchResult:
+        """ Run many concordance searches, deduplicated and memoized, see lookup_segments.
+        :param requests: (source, target, TM GUID, concordance_request) tuples
+        :param max_workers: number of searches in flight at once
+        :return: a LookupBatchResult with one result per request, in order
+        """
+        return self._lookup_many('Concordance', self.concordance, requests, max_workers)
 
-    def create_and_publish(self, tm_info: dict) -> Tuple[int, Optional[str]]:
+    def create_and_publish(self, tm_info: dict) -> Tuple[int, Any]:
         """ Create and publish a new TM.
         :param tm_info: The TM information
         :return: status code and response content
@@ -107,41 +384,120 @@ class MemoqTm:
         # Implementation here
         pass
 
-    def delete_tm(self, guid: str) -> Tuple[int, Optional[str]]:
+    def delete_tm(self, guid: str) -> Tuple[int, Any]:
         """ Delete a TM.
         :param guid: The GUID of the TM
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo', action='DeleteTM', tmGuid=guid)
+        return response_status, data
 
-    def end_chunked_tmx_export(self, guid: str) -> Tuple[int, Optional[str]]:
-        """ End chunked TMX export.
-        :param guid: The GUID of the TM
+    def end_chunked_tmx_export(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked TMX export and release the session on the server.
+        :param guid: The GUID of the export session
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        return self._tmx_export().end(guid)
+
+    def end_chunked_tmx_import(self, guid: str) -> Tuple[int, Any]:
+        """ End chunked TMX import and commit it on the server.
+        :param guid: The GUID of the import session
+        :return: status code and the TmxImportResult (segment counts)
+        """
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TmxImportResult', action='EndChunkedTMXImport', sessionId=guid)
+        return response_status, data
 
-    def end_chunked_tmx_import(self, guid: str) -> Tuple[int, Optional[str]]:
-        """ End chunked TMX import.
+    def export_tmx(self, guid: str, path: Union[str, os.PathLike, BinaryIO], prefetch: int = 1,
+                   progress: Optional[Callable[[TransferProgress], None]] = None,
+                   checkpoint: Optional[Union[str, os.PathLike]] = None) -> TransferProgress:
+        """ Export a TM as TMX to a file, one chunk at a time.
+
+        Chunks are decoded as they arrive and written straight to the file, so memory use is bounded by the
+        chunk size and not by the size of the TM. While one chunk is written the next one is downloaded,
+        keeping up to `prefetch` decoded chunks in hand. The export session is always ended, also on errors; a
+        failure to end it after an error is logged rather than raised over that error.
         :param guid: The GUID of the TM
-        :return: status code and response content
+        :param path: the file to write, or a binary file object (left open)
+        :param prefetch: chunks downloaded ahead of the one being written; 0 to download and write in turn
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :param checkpoint: optional state file making the export resumable (path must then be a file path).
+            Progress is saved there after every chunk written. Calling export_tmx again with the same arguments
+            after a failure continues after the last chunk written: GetNextTMXChunk moves the server's session
+            on whether or not its answer arrives, so the export runs again in a new session, whose first bytes
+            are checked against the checkpoint's hash instead of being written. If they differ, the TM changed
+            and the export starts over.
+        :return: the final TransferProgress
+        :raises MemoqSoapError: when the server rejects a call
         """
-        # Implementation here
-        pass
+        stats = TransferProgress()
+        state = None
+        if checkpoint is not None:
+            if not isinstance(path, (str, os.PathLike)):
+                raise ValueError("A resumable export needs a file path")
+            state = TransferCheckpoint.resume(checkpoint, 'export', guid, path)
+            if state is not None:
+                stats.resumed_bytes = state.bytes
+
+        while True:
+            response_status, session = self.begin_chunked_tmx_export(guid)
+            if response_status != 200:
+                raise mq.MemoqSoapError(response_status, session)
+            if state is not None:
+                state.session = session
+                state.save()
+            elif checkpoint is not None:
+                state = TransferCheckpoint.start(checkpoint, 'export', guid, session)
+            try:
+                return self._export_session(session, path, prefetch, progress, stats, state)
+            except _ExportChanged:
+                logger.info("The TM %s changed since its export was interrupted, starting over", guid)
+                stats, state = TransferProgress(), None
+
+    def _export_session(self, session: str, path: Union[str, os.PathLike, BinaryIO], prefetch: int,
+                        progress: Optional[Callable[[TransferProgress], None]], stats: TransferProgress,
+                        state: Optional[TransferCheckpoint]) -> TransferProgress:
+        if state is None:
+            return self._tmx_export().write(session, path, stats, prefetch, progress)
+
+        # Resuming, the first state.bytes bytes of the export are already in the file: they are only hashed.
+        skip = state.bytes
+        skipped = hashlib.sha256()
+
+        def resume(pieces: list) -> list:
+            nonlocal skip
+            if skip:
+                pieces, skip = _skip_bytes(pieces, skip, skipped)
+                if not skip and skipped.hexdigest() != state.hash.hexdigest():
+                    raise _ExportChanged()
+            return pieces
 
-    def get_next_tmx_chunk(self, guid: str) -> Tuple[int, Optional[str]]:
+        def commit(pieces: list, nbytes: int) -> None:
+            for piece in pieces:
+                state.hash.update(piece)
+            state.commit(nbytes, state.hash)
+
+        self._tmx_export().write(session, path, stats, prefetch, progress, offset=state.bytes, before=resume,
+                                 after=commit)
+        if skip:
+            raise _ExportChanged()
+        state.discard()
+        return stats
+
+    def get_next_tmx_chunk(self, guid: str) -> Tuple[int, Any]:
         """ Get the next TMX chunk.
-        :param guid: The GUID of the TM
-        :return: status code and response content
+        :param guid: The GUID of the export session
+        :return: status code and the base64 data of the chunk, None once the export is complete
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='base64Binary', action='GetNextTMXChunk', sessionId=guid)
+        return response_status, data
 
-    def get_tm_info(self, guid: str) -> Tuple[int, Optional[str]]:
+    def get_tm_info(self, guid: str, projection: Optional[Iterable[str]] = None) -> Tuple[int, Any]:
         """ Get information about a TM.
         :param guid: The GUID of the TM
+        :param projection: the fields of the TMInfo to keep, as for list_tms
         :return: status code and response content
         """
 
@@ -157,11 +513,149 @@ class MemoqTm:
             interface='ITMService',
             memoq_type='TMInfo',  # The type of data you're expecting
             action='GetTMInfo',  # The SOAP action you're calling
+            projection=projection,
             tmGuid=guid  # The GUID of the TM you're querying
         )
         return response_status, data
 
-    def import_tm_metadata_scheme_from_xml(self, guid: str, xml_string: str) -> Tuple[int, Optional[str]]:
+    def get_tm_info_many(self, guids: Iterable[str], max_workers: int = 8,
+                         projection: Optional[Iterable[str]] = None) -> mq.BatchResult:
+        """ Get information about many TMs in parallel.
+        :param guids: The GUIDs of the TMs
+        :param max_workers: number of calls in flight at once
+        :param projection: the fields of every TMInfo to keep, as for list_tms
+        :return: a BatchResult with one (status, data) result or exception per GUID, in order
+        """
+        route = 'memoqservices/tm/TMService'
+        calls = [dict(route=route, interface='ITMService', memoq_type='TMInfo', action='GetTMInfo', tmGuid=guid,
+                      projection=projection) for guid in guids]
+        return self.soap_client.batch_call(calls, max_workers=max_workers)
+
+    def import_tmx(self, guid: str, path_or_stream: Union[str, os.PathLike, BinaryIO], chunk_size: int = 1 << 20,
+                   prefetch: int = 1, progress: Optional[Callable[[TransferProgress], None]] = None,
+                   checkpoint: Optional[Union[str, os.PathLike]] = None) -> TransferProgress:
+        """ Import a TMX file into a TM, one chunk at a time.
+
+        Local files are memory-mapped and read in place. Each chunk is base64-encoded straight into a reused
+        envelope buffer, and while chunk N uploads, chunk N+1 is read and encoded on a background thread, so
+        reading, encoding and uploading overlap and memory use stays at a few chunks. The import session is
+        ended, which imports what it holds, only once every chunk was added: after an error it is left
+        unended, so that nothing of a partial import is imported.
+        :param guid: The GUID of the TM
+        :param path_or_stream: the TMX file, or a binary file object (left open)
+        :param chunk_size: bytes of TMX sent per AddNextTMXChunk call
+        :param prefetch: chunks prepared ahead of the one uploading; 0 to read, encode and upload in turn
+        :param progress: optional callback, called with the running TransferProgress after every chunk
+        :param checkpoint: optional state file making the import resumable (a stream must then be seekable).
+            Progress is saved there after every chunk the server acknowledges. When an import fails with a
+            network error the session is left open, and calling import_tmx again with the same arguments sends
+            only the chunks that were not acknowledged. But when the failure left a chunk unacknowledged, the
+            server may have added it to the session already, and there is no telling: the import then starts
+            over in a new session, leaving the old one unended so that nothing of it is imported. If the server
+            no longer knows the session, the import also starts over.
+        :return: the final TransferProgress; its result is the TmxImportResult returned by the server
+        :raises MemoqSoapError: when the server rejects a call
+        """
+        stats = TransferProgress()
+        if checkpoint is not None:
+            state = TransferCheckpoint.resume(checkpoint, 'import', guid, path_or_stream)
+            if state is not None and state.pending:
+                logger.info("The last chunk sent to the TMX import into %s in session %s may or may not have "
+                            "arrived, starting over", guid, state.session)
+                state = None
+            if state is not None:
+                stats.resumed_bytes = state.bytes
+                try:
+                    self._import_session(state.session, path_or_stream, chunk_size, prefetch, progress, stats, state)
+                except mq.MemoqSoapError:
+                    if stats.chunks:
+                        raise
+                    logger.info("Cannot resume the TMX import into %s in session %s, starting over", guid, state.session)
+                    stats = TransferProgress()
+                else:
+                    self._forget_lookups(guid)
+                    return stats
+
+        response_status, session = self.begin_chunked_tmx_import(guid)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, session)
+        state = TransferCheckpoint.start(checkpoint, 'import', guid, session) if checkpoint is not None else None
+        self._import_session(session, path_or_stream, chunk_size, prefetch, progress, stats, state)
+        self._forget_lookups(guid)
+        return stats
+
+    def _import_session(self, session: str, source: Union[str, os.PathLike, BinaryIO], chunk_size: int,
+                        prefetch: int, progress: Optional[Callable[[TransferProgress], None]],
+                        stats: TransferProgress, state: Optional[TransferCheckpoint]) -> TransferProgress:
+        route = 'memoqservices/tm/TMService'
+        # One envelope buffer per chunk that can be in hand at once: uploading, queued, and being encoded.
+        buffers = [bytearray() for _ in range(max(prefetch, 0) + 2)]
+        payloads = self._iter_import_payloads(session, source, chunk_size, buffers, stats, state)
+        for payload, nbytes, digest in prefetched(payloads, prefetch):
+            if state is not None:
+                state.send(nbytes)
+            response_status, data = self.soap_client.send_envelope(route, 'ITMService', 'guid', 'AddNextTMXChunk', payload)
+            if response_status != 200:
+                raise mq.MemoqSoapError(response_status, data)
+            if state is not None:
+                state.commit(nbytes, digest)
+            stats.add(nbytes)
+            if progress is not None:
+                progress(stats)
+        # Ending the session imports what it holds, so it is only reached once every chunk was added. After a
+        # failure the session is left unended; the checkpoint, if any, tells whether it can be resumed.
+        response_status, data = self.end_chunked_tmx_import(session)
+        if response_status != 200:
+            raise mq.MemoqSoapError(response_status, data)
+        if state is not None:
+            state.discard()
+        stats.result = data
+        return stats
+
+    def _iter_import_payloads(self, session: str, source: Union[str, os.PathLike, BinaryIO], chunk_size: int,
+                              buffers: list, stats: TransferProgress,
+                              state: Optional[TransferCheckpoint]) -> Iterator[Tuple[memoryview, int, Any]]:
+        # Yields the AddNextTMXChunk envelope of every chunk, cycling through the buffers, with the running hash
+        # of the source up to and including that chunk when checkpointing.
+        offset = state.bytes if state is not None else None
+        digest = state.hash if state is not None else None
+        for index, chunk in enumerate(self._iter_source_chunks(source, chunk_size, stats, offset)):
+            try:
+                if digest is not None:
+                    digest = digest.copy()
+                    digest.update(chunk)
+                payload = self.soap_client.build_payload_into(buffers[index % len(buffers)], 'AddNextTMXChunk', sessionId=session, tmxData=chunk)
+                yield payload, len(chunk), digest
+            finally:
+                chunk.release()
+
+    @staticmethod
+    def _iter_source_chunks(source: Union[str, os.PathLike, BinaryIO], chunk_size: int, stats: TransferProgress,
+                            offset: Optional[int] = None) -> Iterator[memoryview]:
+        # Views of consecutive chunks of the source, from offset on, each released by the caller before the next
+        # one is read. Streams are read from their current position unless an offset is given.
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                stats.total_bytes = size
+                if not size:
+                    return
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    for start in range(offset or 0, size, chunk_size):
+                        yield view[start:start + chunk_size]
+            return
+
+        if offset is not None:
+            source.seek(offset)
+        read_buffer = bytearray(chunk_size)
+        with memoryview(read_buffer) as view:
+            while True:
+                count = source.readinto(view)
+                if not count:
+                    return
+                yield view[:count]
+
+    def import_tm_metadata_scheme_from_xml(self, guid: str, xml_string: str) -> Tuple[int, Any]:
         """ Import TM metadata scheme from XML.
         :param guid: The GUID of the TM
         :param xml_string: The XML string containing the metadata scheme
@@ -170,7 +664,14 @@ class MemoqTm:
         # Implementation here
         pass
 
-    def list_tms2(self, tm_list_filter: dict) -> Tuple[int, Optional[str]]:
+    def iter_next_tmx_chunk(self, guid: str) -> Iterator[bytes]:
+        """ Get the next TMX chunk, decoding its base64 data as the response streams in.
+        :param guid: The GUID of the export session
+        :return: a generator of decoded byte pieces; empty once the export is complete
+        """
+        return self._tmx_export().iter_chunk(guid)
+
+    def list_tms2(self, tm_list_filter: dict) -> Tuple[int, Any]:
         """ List TMs with a filter.
         :param tm_list_filter: The filter for listing TMs
         :return: status code and response content
@@ -178,18 +679,60 @@ class MemoqTm:
         # Implementation here
         pass
 
-    def lookup_segment(self, source: str, target: str, guid: str, lookup_segment_request: dict) -> Tuple[int, Optional[str]]:
+    def lookup_segment(self, source: str, target: str, guid: str, lookup_segment_request: dict) -> Tuple[int, Any]:
         """ Lookup a segment in the TM.
         :param source: The source text
-        :param target: The target text
+        :param target: The target text; memoQ matches on the source segment only, so it is not sent
         :param guid: The GUID of the TM
-        :param lookup_segment_request: The lookup segment request parameters
+        :param lookup_segment_request: The lookup segment request parameters, e.g. {'Options': {'MatchThreshold': 75}}
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        request = dict(lookup_segment_request or {}, Segments={'string': [f'<seg>{escape_text(source)}</seg>']})
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='SegmentResult', action='LookupSegment', tmGuid=guid, request=dict(sorted(request.items())))
+        return response_status, data
+
+    def lookup_segments(self, requests: Iterable[LookupRequest], max_workers: int = 8) -> LookupBatchResult:
+        """ Look up many segments, sending each distinct request once.
+
+        Identical (source, target, TM GUID, options) requests of the job are answered by one call, the distinct
+        ones are sent concurrently, and with a lookup_cache the answers are memoized across jobs, so repeated
+        segments (headers, boilerplate, numbers) are answered locally.
+        :param requests: (source, target, TM GUID, lookup_segment_request) tuples
+        :param max_workers: number of lookups in flight at once
+        :return: a LookupBatchResult with one result per request, in order
+        """
+        return self._lookup_many('LookupSegment', self.lookup_segment, requests, max_workers)
+
+    def _lookup_many(self, action: str, lookup: Callable[..., Tuple[int, Any]], requests: Iterable[LookupRequest],
+                     max_workers: int) -> LookupBatchResult:
+        start = time.perf_counter()
+        requests = list(requests)
+        keys = [(source, target, guid, _freeze(options)) for source, target, guid, options in requests]
+        first = {}
+        for index, key in enumerate(keys):
+            first.setdefault(key, index)
+        memo = self.lookup_cache if self.lookup_cache is not None and self.lookup_cache.caches(action) else None
+        calls = []
 
-    def start_tm_repair(self, guid: str) -> Tuple[int, Optional[str]]:
+        def run(key: tuple) -> Union[Tuple[int, Any], Exception]:
+            def load() -> Tuple[int, Any]:
+                calls.append(key)
+                return lookup(*requests[first[key]])
+
+            try:
+                return memo.get_or_load(action, key, load, scope=key[2]) if memo is not None else load()
+            except Exception as error:
+                return error
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            answers = dict(zip(first, pool.map(run, first)))
+        batch = LookupBatchResult([answers[key] for key in keys], time.perf_counter() - start, unique=len(first),
+                                  calls=len(calls))
+        logger.info("%r", batch)
+        return batch
+
+    def start_tm_repair(self, guid: str) -> Tuple[int, Any]:
         """ Start repairing a TM.
         :param guid: The GUID of the TM
         :return: status code and response content
@@ -197,13 +740,14 @@ class MemoqTm:
         # Implementation here
         pass
 
-    def update_properties(self, tm_update_info: dict) -> Tuple[int, Optional[str]]:
+    def update_properties(self, tm_update_info: dict) -> Tuple[int, Any]:
         """ Update TM properties.
-        :param tm_update_info: The TM update information
+        :param tm_update_info: The TM update information, e.g. {'Guid': ..., 'Name': ..., 'Description': ...}
         :return: status code and response content
         """
-        # Implementation here
-        pass
+        route = 'memoqservices/tm/TMService'
+        response_status, data = self.soap_client.make_soap_request(route=route, interface='ITMService', memoq_type='TMInfo', action='UpdateProperties', info=tm_update_info)
+        return response_status, data
 
     # ... More methods can be added if needed
 
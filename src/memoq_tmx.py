@@ -0,0 +1,409 @@
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Tuple, Union
+import binascii
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from src import memoq_soap as mq
+from src.memoq_envelope import escape_text
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = b' \t\r\n'
+
+
+class Base64Decoder:
+    """ Incremental base64 decoder for text that arrives in pieces of arbitrary length.
+
+    Whatever does not fill a complete 4-character group is held back until the next piece.
+    >>> decoder = Base64Decoder()
+    >>> decoder.decode('aGVs') + decoder.decode('bG') + decoder.decode('8=') + decoder.flush()
+    b'hello'
+    """
+
+    def __init__(self) -> None:
+        self._pending = b''
+
+    def decode(self, text: str) -> bytes:
+        data = self._pending + text.encode('ascii').translate(None, _WHITESPACE)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b''
+
+    def flush(self) -> bytes:
+        """ Check that the input ended on a complete group.
+        :raises ValueError: when the input was truncated
+        """
+        if self._pending:
+            raise ValueError(f"Truncated base64 data: {len(self._pending)} trailing characters")
+        return b''
+
+
+class TransferProgress:
+    """ Running totals of a chunked TMX transfer, passed to progress callbacks.
+    >>> progress = TransferProgress(total_bytes=4)
+    >>> progress.add(1)
+    >>> progress.chunks, progress.bytes, progress.fraction
+    (1, 1, 0.25)
+    """
+
+    def __init__(self, total_bytes: Optional[int] = None) -> None:
+        self.total_bytes = total_bytes
+        self.chunks = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        # Bytes already transferred by an earlier, interrupted run that this one resumed.
+        self.resumed_bytes = 0
+        # For imports, what the server returned when the import was ended.
+        self.result = None
+        self._start = time.perf_counter()
+
+    def add(self, nbytes: int) -> None:
+        self.chunks += 1
+        self.bytes += nbytes
+        self.elapsed = time.perf_counter() - self._start
+
+    @property
+    def fraction(self) -> Optional[float]:
+        return (self.resumed_bytes + self.bytes) / self.total_bytes if self.total_bytes else None
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes / 1e6 / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self) -> str:
+        return (f"TransferProgress(chunks={self.chunks}, bytes={self.bytes}, elapsed={self.elapsed:.2f}s, "
+                f"{self.mb_per_second:.1f} MB/s)")
+
+
+class TransferCheckpoint:
+    """ Progress of a resumable chunked TMX transfer, kept in a small JSON state file.
+
+    The file holds the server session, the number of chunks and bytes acknowledged so far and the SHA-256 of
+    those bytes, and the size of a chunk sent but not yet acknowledged (pending). It is replaced atomically
+    after every change. On resume the hash is checked against the local file before anything is sent or
+    received, so a changed source or a damaged export starts over instead of being continued.
+    >>> import tempfile
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> state_path, data_path = os.path.join(directory.name, 'state.json'), os.path.join(directory.name, 'tm.tmx')
+    >>> with open(data_path, 'wb') as data:
+    ...     _ = data.write(b'<tmx>...')
+    >>> checkpoint = TransferCheckpoint.start(state_path, 'export', 'tm-guid', 'session-1')
+    >>> checkpoint.hash.update(b'<tmx>')
+    >>> checkpoint.commit(5, checkpoint.hash)
+    >>> resumed = TransferCheckpoint.resume(state_path, 'export', 'tm-guid', data_path)
+    >>> resumed.session, resumed.chunks, resumed.bytes, resumed.pending
+    ('session-1', 1, 5, 0)
+    >>> TransferCheckpoint.resume(state_path, 'import', 'tm-guid', data_path) is None
+    True
+    >>> directory.cleanup()
+    """
+
+    def __init__(self, state_path: Union[str, os.PathLike], operation: str, tm_guid: str, session: str,
+                 chunks: int = 0, nbytes: int = 0, pending: int = 0) -> None:
+        self.state_path = state_path
+        self.operation = operation
+        self.tm_guid = tm_guid
+        self.session = session
+        self.chunks = chunks
+        self.bytes = nbytes
+        # Bytes of a chunk sent whose acknowledgement has not arrived: the server may or may not have it.
+        self.pending = pending
+        # Hash of the bytes acknowledged so far.
+        self.hash = hashlib.sha256()
+
+    @classmethod
+    def start(cls, state_path: Union[str, os.PathLike], operation: str, tm_guid: str,
+              session: str) -> 'TransferCheckpoint':
+        """ Record the start of a new transfer. """
+        checkpoint = cls(state_path, operation, tm_guid, session)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def resume(cls, state_path: Union[str, os.PathLike], operation: str, tm_guid: str,
+               data: Union[str, os.PathLike, BinaryIO]) -> Optional['TransferCheckpoint']:
+        """ Load the checkpoint of an interrupted transfer, if it is for this transfer and still matches the data.
+        :param state_path: the state file
+        :param operation: 'export' or 'import'
+        :param tm_guid: the GUID of the TM
+        :param data: the export's output file, or the import's source file or seekable stream
+        :return: the checkpoint, or None when there is nothing to resume
+        """
+        try:
+            with open(state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if state.get('operation') != operation or state.get('tm_guid') != tm_guid:
+            return None
+
+        checkpoint = cls(state_path, operation, tm_guid, state['session'], state['chunks'], state['bytes'],
+                         state.get('pending', 0))
+        try:
+            if not checkpoint._hash_prefix(data) or checkpoint.hash.hexdigest() != state['sha256']:
+                return None
+        except OSError:
+            return None
+        return checkpoint
+
+    def _hash_prefix(self, data: Union[str, os.PathLike, BinaryIO]) -> bool:
+        # Hash the first self.bytes bytes of data into self.hash; False when data is shorter than that.
+        stream = open(data, 'rb') if isinstance(data, (str, os.PathLike)) else data
+        try:
+            stream.seek(0)
+            remaining = self.bytes
+            while remaining:
+                block = stream.read(min(remaining, 1 << 20))
+                if not block:
+                    return False
+                self.hash.update(block)
+                remaining -= len(block)
+            return True
+        finally:
+            if stream is not data:
+                stream.close()
+
+    def send(self, nbytes: int) -> None:
+        """ Record that a chunk is about to be sent, before its acknowledgement can be lost. """
+        self.pending = nbytes
+        self.save()
+
+    def commit(self, nbytes: int, digest) -> None:
+        """ Record one more acknowledged chunk and save the state.
+        :param nbytes: size of the chunk
+        :param digest: the running hash, including the chunk
+        """
+        self.chunks += 1
+        self.bytes += nbytes
+        self.pending = 0
+        self.hash = digest
+        self.save()
+
+    def save(self) -> None:
+        state = {'operation': self.operation, 'tm_guid': self.tm_guid, 'session': self.session,
+                 'chunks': self.chunks, 'bytes': self.bytes, 'pending': self.pending,
+                 'sha256': self.hash.hexdigest()}
+        temporary = f'{os.fspath(self.state_path)}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.state_path)
+
+    def discard(self) -> None:
+        """ Remove the state file once the transfer is complete. """
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+
+def end_after_error(end: Callable[[str], Any], session: str) -> None:
+    """ End a transfer session that failed, logging an error in doing so instead of raising it over the first.
+    >>> def end(session): raise ConnectionError(session)
+    >>> end_after_error(end, 'session-guid')
+    """
+    try:
+        end(session)
+    except Exception as error:
+        logger.warning("Could not end the session %s after an error: %s", session, error)
+
+
+class ChunkedExport:
+    """ A chunked export of the memoQ services, e.g. the TMX export of a TM or the CSV export of a term base.
+
+    The begin action opens a session, the next action returns the base64 data of one chunk after another until
+    an empty one, and the end action releases the session.
+    >>> export = ChunkedExport(None, 'memoqservices/tm/TMService', 'ITMService', 'BeginChunkedTMXExport',
+    ...                        'GetNextTMXChunk', 'EndChunkedTMXExport')
+    >>> export.next_action
+    'GetNextTMXChunk'
+    """
+
+    def __init__(self, soap_client: mq.MemoqSoap, route: str, interface: str, begin_action: str,
+                 next_action: str, end_action: str) -> None:
+        self.soap_client = soap_client
+        self.route = route
+        self.interface = interface
+        self.begin_action = begin_action
+        self.next_action = next_action
+        self.end_action = end_action
+
+    def begin(self, **kwargs) -> Tuple[int, Any]:
+        """ Open an export session.
+        :param kwargs: the parameters of the begin action, e.g. tmGuid
+        :return: status code and the GUID of the session
+        """
+        response_status, data = self.soap_client.make_soap_request(route=self.route, interface=self.interface, memoq_type='guid', action=self.begin_action, **kwargs)
+        return response_status, data
+
+    def end(self, session: str) -> Tuple[int, Any]:
+        """ End an export session and release it on the server. """
+        response_status, data = self.soap_client.make_soap_request(route=self.route, interface=self.interface, memoq_type='guid', action=self.end_action, sessionId=session)
+        return response_status, data
+
+    def iter_chunk(self, session: str) -> Iterator[bytes]:
+        """ Get the next chunk of a session, decoding its base64 data as the response streams in.
+        :return: a generator of decoded byte pieces; empty once the export is complete
+        """
+        decoder = Base64Decoder()
+        for text in self.soap_client.iter_soap_text(route=self.route, interface=self.interface, action=self.next_action, sessionId=session):
+            data = decoder.decode(text)
+            if data:
+                yield data
+        decoder.flush()
+
+    def iter_chunks(self, session: str) -> Iterator[list]:
+        """ One list of decoded pieces per chunk, until the server returns an empty chunk. """
+        while True:
+            pieces = list(self.iter_chunk(session))
+            if not pieces:
+                return
+            yield pieces
+
+    def write(self, session: str, path: Union[str, os.PathLike, BinaryIO], stats: TransferProgress,
+              prefetch: int = 1, progress: Optional[Callable[[TransferProgress], None]] = None, offset: int = 0,
+              before: Optional[Callable[[list], list]] = None,
+              after: Optional[Callable[[list, int], None]] = None) -> TransferProgress:
+        """ Write the chunks of a session to a file as they arrive, then end the session.
+
+        While one chunk is written the next one is downloaded, keeping up to `prefetch` decoded chunks in hand.
+        The session is ended also on errors; a failure to end it then is logged rather than raised over the
+        error.
+        :param session: the GUID of the export session
+        :param path: the file to write, or a binary file object (left open)
+        :param stats: the TransferProgress every chunk written is added to
+        :param prefetch: chunks downloaded ahead of the one being written; 0 to download and write in turn
+        :param progress: optional callback, called with stats after every chunk written
+        :param offset: for a file path, keep its first offset bytes and write after them
+        :param before: optional function of the decoded pieces of every chunk, returning the pieces to write
+        :param after: optional callback, called with the pieces and size of every chunk once written and flushed
+        :return: stats
+        """
+        try:
+            if isinstance(path, (str, os.PathLike)):
+                out = open(path, 'r+b' if offset else 'wb')
+                if offset:
+                    out.truncate(offset)
+                    out.seek(offset)
+            else:
+                out = path
+            try:
+                for pieces in prefetched(self.iter_chunks(session), prefetch):
+                    if before is not None:
+                        pieces = before(pieces)
+                    nbytes = 0
+                    for piece in pieces:
+                        out.write(piece)
+                        nbytes += len(piece)
+                    if not nbytes:
+                        continue
+                    if after is not None:
+                        out.flush()
+                        after(pieces, nbytes)
+                    stats.add(nbytes)
+                    if progress is not None:
+                        progress(stats)
+            finally:
+                if out is not path:
+                    out.close()
+        except BaseException:
+            end_after_error(self.end, session)
+            raise
+        self.end(session)
+        return stats
+
+
+def write_tmx(out: BinaryIO, pairs: Iterable[Tuple[str, str]], source_lang: str, target_lang: str,
+              batch: int = 1000) -> int:
+    """ Write (source, target) text pairs to a binary file as a TMX 1.4 document, without holding them all.
+    :param out: the binary file to write to
+    :param pairs: the translation units, as plain text
+    :param source_lang: the source language code, e.g. 'eng'
+    :param target_lang: the target language code, e.g. 'ger'
+    :param batch: translation units encoded and written at a time
+    :return: the number of translation units written
+    >>> import io
+    >>> out = io.BytesIO()
+    >>> write_tmx(out, [('a & b', 'c')], 'eng', 'ger')
+    1
+    >>> out.getvalue().split(b'<body>')[1]
+    b'<tu><tuv xml:lang="eng"><seg>a &amp; b</seg></tuv><tuv xml:lang="ger"><seg>c</seg></tuv></tu>\\n</body></tmx>\\n'
+    """
+    out.write(f'<?xml version="1.0" encoding="utf-8"?>\n<tmx version="1.4"><header creationtool="pymemoq_api" '
+              f'creationtoolversion="1" segtype="sentence" o-tmf="memoQ" adminlang="en-us" srclang="{source_lang}" '
+              f'datatype="plaintext"/><body>'.encode('utf-8'))
+    source_open, middle = f'<tu><tuv xml:lang="{source_lang}"><seg>', f'</seg></tuv><tuv xml:lang="{target_lang}"><seg>'
+    count = 0
+    units = []
+    for source, target in pairs:
+        units.append(f'{source_open}{escape_text(source)}{middle}{escape_text(target)}</seg></tuv></tu>\n')
+        if len(units) >= batch:
+            out.write(''.join(units).encode('utf-8'))
+            count += len(units)
+            units = []
+    out.write(''.join(units).encode('utf-8'))
+    out.write(b'</body></tmx>\n')
+    return count + len(units)
+
+
+def prefetched(items: Iterable, depth: int = 1) -> Iterator:
+    """ Iterate over items while a background thread produces up to `depth` items ahead of the consumer.
+
+    Lets the next chunk download (or the next chunk's read and encode) overlap with the work done on the
+    current one, with at most depth + 1 items held at once. An exception raised by the producer is re-raised
+    in the consumer; closing the generator stops the producer after the item it is working on.
+    >>> list(prefetched(iter(range(5)), depth=2))
+    [0, 1, 2, 3, 4]
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry: tuple) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as error:
+            put((done, error))
+        finally:
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    producer = threading.Thread(target=produce, name='tmx-prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
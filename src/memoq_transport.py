@@ -0,0 +1,186 @@
+from typing import Optional, Union, Tuple
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+Timeout = Optional[Union[float, Tuple[float, float]]]
+
+
+class Transport:
+    """ Base class for the HTTP layer used by MemoqSoap to send SOAP envelopes. """
+
+    def send(self, route: str, url: str, data, headers: dict, timeout: Timeout = None,
+             stream: bool = False) -> requests.Response:
+        """ POST a SOAP envelope and return the HTTP response.
+        :param route: the memoQ service route the call belongs to (e.g. 'memoqservices/tm/TMService')
+        :param url: the full URL of the service
+        :param data: the SOAP envelope (str or bytes)
+        :param headers: the HTTP headers for this call
+        :param timeout: seconds, or a (connect, read) tuple
+        :param stream: do not read the body up front; the caller reads it with iter_content and closes the response
+        :return: the HTTP response
+        """
+        raise NotImplementedError
+
+    def connect_seconds(self) -> float:
+        """ Seconds the calling thread has spent opening connections (DNS, TCP and TLS), for phase timing.
+
+        Callers take the difference around a send. Transports that cannot tell return 0.0, and the time to
+        connect is then counted as server time.
+        """
+        return 0.0
+
+    def close(self) -> None:
+        """ Release any connections held by the transport. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PerCallTransport(Transport):
+    """ Opens a new connection for every call (the original behaviour). Kept for comparison and debugging.
+    >>> PerCallTransport().close()
+    """
+
+    def send(self, route: str, url: str, data, headers: dict, timeout: Timeout = None,
+             stream: bool = False) -> requests.Response:
+        return requests.request("POST", url, headers=headers, data=data, timeout=timeout, stream=stream)
+
+
+# Connect time of PooledTransport connections, accumulated per thread.
+_connect_clock = threading.local()
+
+
+class _TimedConnect:
+    # Mixed into urllib3's connections to add the time spent in connect() to the thread's total.
+
+    def connect(self) -> None:
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_clock.seconds = getattr(_connect_clock, 'seconds', 0.0) + time.perf_counter() - start
+
+
+class _TimedHTTPConnection(_TimedConnect, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnect, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _Session(requests.Session):
+    # Session.mount rebuilds the adapter OrderedDict that get_adapter iterates: both take the same lock, so
+    # that an adapter mounted while other threads send does not break their lookups.
+
+    def __init__(self) -> None:
+        self.adapters_lock = threading.RLock()
+        super().__init__()
+
+    def get_adapter(self, url: str):
+        with self.adapters_lock:
+            return super().get_adapter(url)
+
+    def mount(self, prefix: str, adapter) -> None:
+        with self.adapters_lock:
+            super().mount(prefix, adapter)
+
+
+class PooledTransport(Transport):
+    """ Keep-alive transport backed by a persistent requests.Session and urllib3 connection pools.
+    >>> transport = PooledTransport(pool_maxsize=4, route_pool_sizes={'memoqservices/tm/TMService': 16},
+    ...                             base_url='https://memoq.example.com')
+    >>> transport.pool_size_for('/memoqservices/tm/TMService')
+    16
+    >>> transport.pool_size_for('memoqservices/tb/TBService')
+    4
+    >>> transport.session.get_adapter('https://memoq.example.com/memoqservices/tm/TMService')._pool_maxsize
+    16
+    >>> transport.close()
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 route_pool_sizes: Optional[dict] = None, base_url: Optional[str] = None) -> None:
+        """ Initialize the pooled transport.
+        :param pool_connections: number of host pools to cache
+        :param pool_maxsize: connections kept alive per host for routes without an explicit size
+        :param pool_block: block when a pool is exhausted instead of opening throw-away connections
+        :param route_pool_sizes: optional pool size per route, e.g. {'memoqservices/tm/TMService': 32}
+        :param base_url: the server the routes belong to; their adapters are then mounted up front rather than
+            on their first call
+        """
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+        self._route_pool_sizes = {route.strip('/'): size for route, size in (route_pool_sizes or {}).items()}
+        self._mounted_routes = set()
+        self._lock = threading.Lock()
+
+        self.session = _Session()
+        self.session.headers['Connection'] = 'keep-alive'
+        self._mount_default_adapters()
+        if base_url is not None:
+            for route in self._route_pool_sizes:
+                self._ensure_route_adapter(route, f"{base_url.rstrip('/')}/{route}")
+
+    def _new_adapter(self, pool_maxsize: int) -> HTTPAdapter:
+        adapter = HTTPAdapter(pool_connections=self._pool_connections, pool_maxsize=pool_maxsize,
+                              pool_block=self._pool_block, max_retries=0)
+        adapter.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                      'https': _TimedHTTPSConnectionPool}
+        return adapter
+
+    def _mount_default_adapters(self) -> None:
+        adapter = self._new_adapter(self._pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def pool_size_for(self, route: str) -> int:
+        """ Return the connection pool size used for a route. """
+        return self._route_pool_sizes.get(route.strip('/'), self._pool_maxsize)
+
+    def _ensure_route_adapter(self, route: str, url: str) -> None:
+        # Routes with an explicit size get their own adapter, mounted on the service URL so that the
+        # session's longest-prefix match routes every call for that service through it. Without a base URL,
+        # or for another server, that happens on the route's first call.
+        key = route.strip('/')
+        if key not in self._route_pool_sizes or url in self._mounted_routes:
+            return
+        with self._lock:
+            if url not in self._mounted_routes:
+                self.session.mount(url, self._new_adapter(self._route_pool_sizes[key]))
+                self._mounted_routes.add(url)
+
+    def send(self, route: str, url: str, data, headers: dict, timeout: Timeout = None,
+             stream: bool = False) -> requests.Response:
+        self._ensure_route_adapter(route, url)
+        return self.session.post(url, headers=headers, data=data, timeout=timeout, stream=stream)
+
+    def connect_seconds(self) -> float:
+        return getattr(_connect_clock, 'seconds', 0.0)
+
+    def close(self) -> None:
+        with self._lock:
+            self.session.close()
+            self._mounted_routes.clear()
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,517 @@
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
+from collections import Counter
+from xml.sax.saxutils import escape
+import base64
+import calendar
+import codecs
+import random
+import re
+import threading
+import time
+import uuid
+
+from tests.stub_server import FaultInjector, StubSoapServer, soap_response, streamed_soap_response
+
+ITM = 'ITMService'
+ITB = 'ITBService'
+IPROJECT = 'IServerProjectService'
+
+LANGUAGE_NAMES = {'eng': 'English', 'ger': 'German', 'fre': 'French', 'hun': 'Hungarian', 'jpn': 'Japanese'}
+TARGET_LANGUAGES = ('ger', 'fre', 'hun', 'jpn')
+ARRAYS_NAMESPACE = 'http://schemas.microsoft.com/2003/10/Serialization/Arrays'
+CLIENTS = ('Müller & Söhne GmbH', 'Acme Corp.', 'Société Générale de Traduction', '株式会社サンプル', 'Nordic Legal AB')
+STATUSES = ('Live', 'Live', 'Live', 'WrappedUp')
+WORKFLOW_STATUSES = ('TranslationInProgress', 'Review1InProgress', 'Completed', 'Unknown')
+BASE_TIME = 1_680_343_200  # 2023-04-01T10:00:00Z
+
+
+def object_guid(kind: int, index: int) -> str:
+    """ The deterministic GUID of a fake object: kind tells TMs (1), TBs (2), projects (3) and documents (4) apart.
+    >>> object_guid(1, 255)
+    '000000ff-0001-4000-8000-000000000000'
+    """
+    return f'{index:08x}-{kind:04x}-4000-8000-000000000000'
+
+
+def guid_index(guid: str, kind: int) -> Optional[int]:
+    """ The index of a fake object from its GUID, or None when the GUID is not one of that kind.
+    >>> guid_index(object_guid(3, 12), 3), guid_index(object_guid(3, 12), 1), guid_index('nonsense', 3)
+    (12, None, None)
+    """
+    match = re.fullmatch(r'([0-9a-f]{8})-([0-9a-f]{4})-4000-8000-000000000000', guid or '')
+    if match is None or int(match.group(2), 16) != kind:
+        return None
+    return int(match.group(1), 16)
+
+
+def timestamp(seconds: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+
+def soap_fault(message: str) -> bytes:
+    """ The body of a SOAP fault, as memoQ returns with status 500. """
+    return (f'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault>'
+            f'<faultcode>s:Client</faultcode><faultstring xml:lang="en-US">{escape(message)}</faultstring>'
+            f'</s:Fault></s:Body></s:Envelope>').encode('utf-8')
+
+
+def padded(text: str, length: int) -> str:
+    """ Text padded with words to at least length characters, for long names. """
+    filler = ' – Übersetzung, Lektorat & QA'
+    while len(text) < length:
+        text += filler[:length - len(text)]
+    return text
+
+
+def _element(body: bytes, name: str) -> Optional[str]:
+    match = re.search(rb'<%s>(.*?)</%s>' % (name.encode(), name.encode()), body, re.S)
+    return match.group(1).decode('utf-8') if match is not None else None
+
+
+class SyntheticTmx:
+    """ A TMX document of `units` generated translation units, readable at any offset without being built.
+    >>> tmx = SyntheticTmx(3, 'eng', 'ger')
+    >>> data = tmx.read(0, tmx.total_bytes)
+    >>> len(data) == tmx.total_bytes, data.count(b'<tu>'), tmx.read(5, 10) == data[5:15]
+    (True, 3, True)
+    """
+
+    unit = ('<tu><tuv xml:lang="{source}"><seg>Segment {{0:09d}}: the quick brown fox jumps over the lazy dog '
+            '&amp; keeps running.</seg></tuv><tuv xml:lang="{target}"><seg>Segment {{0:09d}}: der schnelle braune '
+            'Fuchs springt über den faulen Hund &amp; läuft weiter.</seg></tuv></tu>\n')
+
+    def __init__(self, units: int, source_lang: str, target_lang: str) -> None:
+        self.units = units
+        self.head = (f'<?xml version="1.0" encoding="utf-8"?>\n<tmx version="1.4"><header creationtool="FakeMemoq" '
+                     f'creationtoolversion="1" segtype="sentence" o-tmf="memoQ" adminlang="en-us" '
+                     f'srclang="{source_lang}" datatype="plaintext"/><body>\n').encode('utf-8')
+        self.tail = b'</body></tmx>\n'
+        self.template = self.unit.format(source=source_lang, target=target_lang)
+        self.unit_bytes = len(self.template.format(0).encode('utf-8'))
+        self.total_bytes = len(self.head) + units * self.unit_bytes + len(self.tail)
+
+    def read(self, offset: int, size: int) -> bytes:
+        end = min(offset + size, self.total_bytes)
+        body_start = len(self.head)
+        body_end = body_start + self.units * self.unit_bytes
+        parts = []
+        if offset < body_start:
+            parts.append(self.head[offset:end])
+        low, high = max(offset, body_start) - body_start, min(end, body_end) - body_start
+        if low < high:
+            first, last = low // self.unit_bytes, (high - 1) // self.unit_bytes
+            data = ''.join(self.template.format(index) for index in range(first, last + 1)).encode('utf-8')
+            parts.append(data[low - first * self.unit_bytes:high - first * self.unit_bytes])
+        if end > body_end:
+            parts.append(self.tail[max(offset - body_end, 0):end - body_end])
+        return b''.join(parts)
+
+
+class _Export:
+    """ A chunked export session: the reader of the exported document and how far it has been sent. """
+
+    def __init__(self, read: Callable[[int, int], bytes], total_bytes: int) -> None:
+        self.read = read
+        self.total_bytes = total_bytes
+        self.offset = 0
+
+
+class FakeMemoq:
+    """ A stand-in for a memoQ server: answers the SOAP envelopes of ITMService, ITBService and
+    IServerProjectService as a StubSoapServer responder.
+
+    TMs, TBs, projects and their documents are generated from their index, so listings of any size cost no memory
+    on the server side and are the same on every run. Listings are streamed, chunked exports (TMX and CSV) are
+    generated as they are read, and TM writes and imports change the TM's entry count and modification time.
+    Projects can be changed, added and deleted, and ListProjects honours a LastChangedAfter filter.
+    Every call can be slowed down by a latency, per action or for all, and failed with a status or a dropped
+    connection, at random with a fixed seed or for chosen request numbers.
+    >>> fake = FakeMemoq(tms=2)
+    >>> status, body = fake('/memoqservices/tm/TMService', 'http://kilgray.com/memoqservices/2007/ITMService/ListTMs', b'')
+    >>> status, b''.join(body).count(b'<TMInfo>'), fake.calls['ITMService/ListTMs']
+    (200, 2, 1)
+    """
+
+    def __init__(self, tms: int = 20, tbs: int = 5, projects: int = 1000, documents_per_project: int = 10,
+                 tm_units: int = 10_000, tb_entries: int = 1000, chunk_bytes: int = 1 << 20, name_length: int = 40,
+                 lookup_hits: int = 3, latency: Union[float, Dict[str, float]] = 0.0, fault_rate: float = 0.0,
+                 fault_statuses: Iterable[Union[int, str]] = (503,), faults: Optional[dict] = None,
+                 seed: int = 0) -> None:
+        """ Initialize the fake server's data and behaviour.
+        :param tms: number of translation memories
+        :param tbs: number of term bases
+        :param projects: number of server projects
+        :param documents_per_project: translation documents in every project
+        :param tm_units: translation units in every TM, and so the size of its TMX export
+        :param tb_entries: entries in every term base
+        :param chunk_bytes: size of the chunks of the TMX and CSV exports
+        :param name_length: minimum length of the names of TMs, TBs, projects and documents
+        :param lookup_hits: TM hits returned for every segment looked up
+        :param latency: seconds added to every call, or a dict of seconds per action (e.g. {'ListProjects': 0.5})
+        :param fault_rate: fraction of calls answered with one of fault_statuses instead, at random
+        :param fault_statuses: the faults drawn from: statuses, or 'disconnect' to drop the connection
+        :param faults: fault per request number, see stub_server.FaultInjector
+        :param seed: seed of the random faults
+        """
+        self.project_count = projects
+        # Index -> changed fields of the projects changed since they were generated, and the deleted projects.
+        self.project_changes = {}
+        self.deleted_projects = set()
+        self._project_clock = BASE_TIME + projects * 60 + 30
+        self.documents_per_project = documents_per_project
+        self.tb_entries = tb_entries
+        self.chunk_bytes = chunk_bytes
+        self.name_length = name_length
+        self.lookup_hits = lookup_hits
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.fault_statuses = tuple(fault_statuses)
+        self.seed = seed
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.exports = {}
+        self.imports = {}
+        self.tms = {}
+        for index in range(tms):
+            self.add_tm(index, padded(f'TM {index}', name_length), 'eng', TARGET_LANGUAGES[index % len(TARGET_LANGUAGES)], tm_units)
+        self.tbs = {object_guid(2, index): padded(f'TB {index}', name_length) for index in range(tbs)}
+        self.faults = FaultInjector(self.respond, faults=faults, fault=self._random_fault if fault_rate else None)
+        self.handlers = {
+            (ITM, 'ListTMs'): self._list_tms,
+            (ITM, 'GetTMInfo'): self._get_tm_info,
+            (ITM, 'CreateTM'): self._create_tm,
+            (ITM, 'DeleteTM'): self._delete_tm,
+            (ITM, 'UpdateProperties'): self._void,
+            (ITM, 'AddOrUpdateEntry'): self._add_or_update_entry,
+            (ITM, 'LookupSegment'): self._lookup_segment,
+            (ITM, 'Concordance'): self._concordance,
+            (ITM, 'BeginChunkedTMXExport'): self._begin_tmx_export,
+            (ITM, 'GetNextTMXChunk'): self._next_chunk,
+            (ITM, 'EndChunkedTMXExport'): self._end_export,
+            (ITM, 'BeginChunkedTMXImport'): self._begin_tmx_import,
+            (ITM, 'AddNextTMXChunk'): self._add_tmx_chunk,
+            (ITM, 'EndChunkedTMXImport'): self._end_tmx_import,
+            (ITB, 'ListTBs'): self._list_tbs,
+            (ITB, 'GetEntry'): self._get_entry,
+            (ITB, 'BeginChunkedCSVExport'): self._begin_csv_export,
+            (ITB, 'GetNextCSVChunk'): self._next_chunk,
+            (ITB, 'EndChunkedCSVExport'): self._end_export,
+            (IPROJECT, 'ListProjects'): self._list_projects,
+            (IPROJECT, 'ListProjectTranslationDocuments'): self._list_documents,
+            (IPROJECT, 'ListProjectTranslationDocuments2'): self._list_documents,
+        }
+
+    def add_tm(self, index: int, name: str, source_lang: str, target_lang: str, units: int = 0) -> str:
+        guid = object_guid(1, index)
+        self.tms[guid] = {'Name': name, 'SourceLanguageCode': source_lang,
+                          'TargetLanguageCode': target_lang, 'NumEntries': units, 'LastModified': BASE_TIME + index}
+        return guid
+
+    def _random_fault(self, number: int) -> Optional[Union[int, str]]:
+        # Seeded by the request number, so the same requests fail on every run, whatever the thread timing.
+        rng = random.Random(self.seed * 1_000_003 + number)
+        return rng.choice(self.fault_statuses) if rng.random() < self.fault_rate else None
+
+    def __call__(self, path: str, soap_action: str, body: bytes) -> Tuple[int, Union[bytes, Iterable[bytes]]]:
+        return self.faults(path, soap_action, body)
+
+    def respond(self, path: str, soap_action: str, body: bytes) -> Tuple[int, Union[bytes, Iterable[bytes]]]:
+        """ Answer a request without injecting faults. """
+        interface, action = soap_action.rsplit('/', 2)[-2:]
+        with self.lock:
+            self.calls[f'{interface}/{action}'] += 1
+        latency = self.latency.get(action, 0.0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            time.sleep(latency)
+        handler = self.handlers.get((interface, action))
+        if handler is None:
+            return 500, soap_fault(f'The action {interface}/{action} is not supported.')
+        return handler(action, body)
+
+    def _void(self, action: str, body: bytes) -> Tuple[int, bytes]:
+        return 200, soap_response(action, None)
+
+    # ITMService
+
+    def _tm_info(self, guid: str) -> str:
+        tm = self.tms[guid]
+        return (f'<TMInfo><AccessLevel>Owner</AccessLevel><Client>{escape(CLIENTS[guid_index(guid, 1) % len(CLIENTS)])}'
+                f'</Client><Description i:nil="true" xmlns:i="http://www.w3.org/2001/XMLSchema-instance"/>'
+                f'<FriendlyName>{escape(tm["Name"])}</FriendlyName><Guid>{guid}</Guid>'
+                f'<LastModified>{timestamp(tm["LastModified"])}</LastModified><Name>{escape(tm["Name"])}</Name>'
+                f'<NumEntries>{tm["NumEntries"]}</NumEntries><Readonly>false</Readonly>'
+                f'<SourceLanguageCode>{tm["SourceLanguageCode"]}</SourceLanguageCode>'
+                f'<TargetLanguageCode>{tm["TargetLanguageCode"]}</TargetLanguageCode></TMInfo>')
+
+    def _tm_guid(self, body: bytes) -> Optional[str]:
+        guid = _element(body, 'tmGuid')
+        return guid if guid in self.tms else None
+
+    def _list_tms(self, action: str, body: bytes):
+        return 200, streamed_soap_response(action, (self._tm_info(guid) for guid in list(self.tms)))
+
+    def _get_tm_info(self, action: str, body: bytes):
+        guid = self._tm_guid(body)
+        if guid is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        return 200, soap_response(action, self._tm_info(guid)[len('<TMInfo>'):-len('</TMInfo>')])
+
+    def _create_tm(self, action: str, body: bytes):
+        name = _element(body, 'tmName') or 'New TM'
+        with self.lock:
+            index = max((guid_index(guid, 1) for guid in self.tms), default=-1) + 1
+            guid = self.add_tm(index, name, _element(body, 'sourceLangCode') or 'eng',
+                               _element(body, 'targetLangCode') or 'ger')
+        return 200, soap_response(action, guid)
+
+    def _delete_tm(self, action: str, body: bytes):
+        guid = self._tm_guid(body)
+        if guid is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        with self.lock:
+            del self.tms[guid]
+        return 200, soap_response(action, None)
+
+    def _touch(self, guid: str, added: int) -> None:
+        with self.lock:
+            tm = self.tms[guid]
+            tm['NumEntries'] += added
+            tm['LastModified'] = max(tm['LastModified'] + 1, int(time.time()))
+
+    def _add_or_update_entry(self, action: str, body: bytes):
+        guid = self._tm_guid(body)
+        if guid is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        self._touch(guid, 1)
+        return 200, soap_response(action, None)
+
+    def _hits(self, segment: str) -> str:
+        source = escape(segment)
+        return ''.join(f'<TMHit><MatchRate>{100 - 5 * rank}</MatchRate><TransUnit><SourceSegment>{source}'
+                       f'</SourceSegment><TargetSegment>{source} (übersetzt {rank})</TargetSegment>'
+                       f'<Modified>{timestamp(BASE_TIME)}</Modified></TransUnit></TMHit>'
+                       for rank in range(self.lookup_hits))
+
+    def _lookup_segment(self, action: str, body: bytes):
+        if self._tm_guid(body) is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        segments = re.findall(rb'<string>(.*?)</string>', body.split(b'<Segments>', 1)[-1], re.S) or [b'']
+        results = ''.join(f'<SegmentResult><TMHits>{self._hits(segment.decode())}</TMHits></SegmentResult>'
+                          for segment in segments)
+        return 200, soap_response(action, results)
+
+    def _concordance(self, action: str, body: bytes):
+        if self._tm_guid(body) is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        expression = (re.findall(rb'<string>(.*?)</string>', body) or [b''])[0].decode()
+        items = ''.join(f'<ConcordanceItem><Length>{len(expression)}</Length><StartPos>0</StartPos>'
+                        f'<TMEntryIndex>{rank}</TMEntryIndex></ConcordanceItem>' for rank in range(self.lookup_hits))
+        return 200, soap_response(action, f'<ConcordanceResult><ConcResult>{items}</ConcResult>'
+                                          f'<TMHits>{self._hits(expression)}</TMHits></ConcordanceResult>')
+
+    def _begin_export(self, action: str, export: _Export):
+        session = str(uuid.uuid4())
+        with self.lock:
+            self.exports[session] = export
+        return 200, soap_response(action, session)
+
+    def _begin_tmx_export(self, action: str, body: bytes):
+        guid = self._tm_guid(body)
+        if guid is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        tm = self.tms[guid]
+        tmx = SyntheticTmx(tm['NumEntries'], tm['SourceLanguageCode'], tm['TargetLanguageCode'])
+        return self._begin_export(action, _Export(tmx.read, tmx.total_bytes))
+
+    def _next_chunk(self, action: str, body: bytes):
+        export = self.exports.get(_element(body, 'sessionId'))
+        if export is None:
+            return 500, soap_fault('The session does not exist.')
+        if export.offset >= export.total_bytes:
+            return 200, soap_response(action, None)
+        return 200, self._chunk_body(action, export)
+
+    def _chunk_body(self, action: str, export: _Export) -> Iterator[bytes]:
+        # Base64-encoded in slices of a multiple of 3 bytes as it is sent. As on the real server, the session
+        # moves past the chunk when it is asked for, so a chunk cut off by a dropped connection is lost.
+        offset, end = export.offset, min(export.offset + self.chunk_bytes, export.total_bytes)
+        export.offset = end
+        head, tail = soap_response(action, '\0').split(b'\0')
+        yield head
+        for start in range(offset, end, 3 << 14):
+            yield base64.b64encode(export.read(start, min(3 << 14, end - start)))
+        yield tail
+
+    def _end_export(self, action: str, body: bytes):
+        with self.lock:
+            self.exports.pop(_element(body, 'sessionId'), None)
+        return 200, soap_response(action, None)
+
+    def _begin_tmx_import(self, action: str, body: bytes):
+        guid = self._tm_guid(body)
+        if guid is None:
+            return 500, soap_fault('The translation memory does not exist.')
+        session = str(uuid.uuid4())
+        with self.lock:
+            self.imports[session] = [guid, 0, 0]
+        return 200, soap_response(action, session)
+
+    def _add_tmx_chunk(self, action: str, body: bytes):
+        state = self.imports.get(_element(body, 'sessionId'))
+        if state is None:
+            return 500, soap_fault('The session does not exist.')
+        data = base64.b64decode(body.split(b'<tmxData>', 1)[1].split(b'</tmxData>', 1)[0])
+        state[1] += data.count(b'<tu>') + data.count(b'<tu ')
+        state[2] += len(data)
+        return 200, soap_response(action, None)
+
+    def _end_tmx_import(self, action: str, body: bytes):
+        with self.lock:
+            state = self.imports.pop(_element(body, 'sessionId'), None)
+        if state is None:
+            return 500, soap_fault('The session does not exist.')
+        guid, units, _ = state
+        self._touch(guid, units)
+        return 200, soap_response(action, f'<AllSegmentCount>{units}</AllSegmentCount>'
+                                          f'<ImportedSegmentCount>{units}</ImportedSegmentCount>')
+
+    # ITBService
+
+    def _tb_info(self, guid: str, name: str) -> str:
+        index = guid_index(guid, 2)
+        return (f'<TBInfo><Client>{escape(CLIENTS[index % len(CLIENTS)])}</Client><FriendlyName>{escape(name)}'
+                f'</FriendlyName><Guid>{guid}</Guid><LanguageCodes><string>eng</string><string>ger</string>'
+                f'</LanguageCodes><LastModified>{timestamp(BASE_TIME + index)}</LastModified><Name>{escape(name)}'
+                f'</Name><NumEntries>{self.tb_entries}</NumEntries><Readonly>false</Readonly></TBInfo>')
+
+    def _list_tbs(self, action: str, body: bytes):
+        return 200, streamed_soap_response(action, (self._tb_info(guid, name) for guid, name in self.tbs.items()))
+
+    @staticmethod
+    def term(tb: int, entry: int, language: str) -> str:
+        """ The term of an entry of a fake term base, in 'eng' or 'ger'. """
+        return f'term {tb}-{entry}' if language == 'eng' else f'Begriff {tb}-{entry}'
+
+    def _get_entry(self, action: str, body: bytes):
+        guid, entry = _element(body, 'tbGuid'), _element(body, 'entryId')
+        if guid not in self.tbs or not entry or not entry.isdigit() or int(entry) >= self.tb_entries:
+            return 500, soap_fault('The entry does not exist.')
+        tb, entry = guid_index(guid, 2), int(entry)
+        languages = ''.join(f'<TBLanguage><Language>{language}</Language><TermItems><TBTerm><Text>'
+                            f'{self.term(tb, entry, language)}</Text></TBTerm></TermItems></TBLanguage>'
+                            for language in ('eng', 'ger'))
+        return 200, soap_response(action, f'<Id>{entry}</Id><Languages>{languages}</Languages>')
+
+    def _begin_csv_export(self, action: str, body: bytes):
+        guid = _element(body, 'tbGuid')
+        if guid not in self.tbs:
+            return 500, soap_fault('The term base does not exist.')
+        tb = guid_index(guid, 2)
+        rows = [f'Entry_ID\t{LANGUAGE_NAMES["eng"]}\t{LANGUAGE_NAMES["ger"]}']
+        rows += [f'{entry}\t{self.term(tb, entry, "eng")}\t{self.term(tb, entry, "ger")}'
+                 for entry in range(self.tb_entries)]
+        csv = codecs.BOM_UTF16_LE + '\r\n'.join(rows).encode('utf-16-le')
+        return self._begin_export(action, _Export(lambda offset, size: csv[offset:offset + size], len(csv)))
+
+    # IServerProjectService
+
+    def project(self, index: int) -> str:
+        """ The ServerProjectInfo of a fake project, with the changes made by update_project. """
+        guid = object_guid(3, index)
+        changes = self.project_changes.get(index, {})
+        name = padded(f'Project {index}', self.name_length)
+        # WCF serializes string arrays in their own namespace.
+        targets = ''.join(f'<b:string>{TARGET_LANGUAGES[(index + shift) % len(TARGET_LANGUAGES)]}</b:string>'
+                          for shift in range(1 + index % 3))
+        client = changes.get('Client', CLIENTS[index % len(CLIENTS)])
+        deadline = changes.get('Deadline', BASE_TIME + 86400 * (7 + index % 60))
+        return (f'<ServerProjectInfo><CallbackWebServiceUrl i:nil="true" '
+                f'xmlns:i="http://www.w3.org/2001/XMLSchema-instance"/><Client>{escape(client)}'
+                f'</Client><CreationTime>{timestamp(BASE_TIME + index * 60)}</CreationTime>'
+                f'<CreatorUser>{object_guid(5, index % 7)}</CreatorUser>'
+                f'<Deadline>{timestamp(deadline)}</Deadline>'
+                f'<Description>{escape(padded(f"Description of project {index}.", self.name_length * 2))}'
+                f'</Description><DocumentStatus>{WORKFLOW_STATUSES[index % len(WORKFLOW_STATUSES)]}</DocumentStatus>'
+                f'<Domain>Legal</Domain><LastChanged>{timestamp(self.last_changed(index))}</LastChanged>'
+                f'<Name>{escape(name)}</Name><Project>Project {index % 13}</Project>'
+                f'<ProjectStatus>{changes.get("ProjectStatus", STATUSES[index % len(STATUSES)])}</ProjectStatus>'
+                f'<ServerProjectGuid>{guid}</ServerProjectGuid><SourceLanguageCode>eng</SourceLanguageCode>'
+                f'<Subject>Contracts</Subject><TargetLanguageCodes xmlns:b="{ARRAYS_NAMESPACE}">{targets}'
+                f'</TargetLanguageCodes></ServerProjectInfo>')
+
+    def last_changed(self, index: int) -> int:
+        """ When a fake project was last changed, in epoch seconds. """
+        changes = self.project_changes.get(index)
+        return changes['LastChanged'] if changes is not None else BASE_TIME + index * 60 + 30
+
+    def update_project(self, index: int, **changes) -> None:
+        """ Change a project, moving its LastChanged past every other project's.
+        :param changes: new values of Client, Deadline (epoch seconds) or ProjectStatus
+        """
+        with self.lock:
+            self._project_clock += 60
+            self.project_changes[index] = dict(self.project_changes.get(index, {}), LastChanged=self._project_clock,
+                                               **changes)
+
+    def add_project(self, **changes) -> int:
+        """ Create a project, changed after every other one, and return its index. """
+        with self.lock:
+            index = self.project_count
+            self.project_count += 1
+        self.update_project(index, **changes)
+        return index
+
+    def delete_project(self, index: int) -> None:
+        with self.lock:
+            self.deleted_projects.add(index)
+
+    def _has_project(self, index: Optional[int]) -> bool:
+        return index is not None and index < self.project_count and index not in self.deleted_projects
+
+    def _list_projects(self, action: str, body: bytes):
+        # Of a ServerProjectListFilter, only LastChangedAfter is honoured.
+        after = _element(body, 'LastChangedAfter')
+        after = calendar.timegm(time.strptime(after[:19], '%Y-%m-%dT%H:%M:%S')) if after else None
+        indexes = [index for index in range(self.project_count) if self._has_project(index)
+                   and (after is None or self.last_changed(index) > after)]
+        return 200, streamed_soap_response(action, (self.project(index) for index in indexes))
+
+    def document(self, project: int, index: int, memoq_type: str = 'ServerProjectTranslationDocument') -> str:
+        """ A translation document of a fake project. """
+        number = project * self.documents_per_project + index
+        name = padded(f'Document {index} of project {project}.docx', self.name_length)
+        modified = (f'<LastModified>{timestamp(BASE_TIME + number)}</LastModified>'
+                    if memoq_type.endswith('2') else '')
+        return (f'<{memoq_type}><DocumentGuid>{object_guid(4, number)}</DocumentGuid><DocumentName>{escape(name)}'
+                f'</DocumentName><DocumentStatus>{WORKFLOW_STATUSES[number % len(WORKFLOW_STATUSES)]}'
+                f'</DocumentStatus><ExportPath i:nil="true" xmlns:i="http://www.w3.org/2001/XMLSchema-instance"/>'
+                f'<ImportPath>C:\\Projects\\{project}\\{escape(name)}</ImportPath><IsImage>false</IsImage>{modified}'
+                f'<MajorVersion>1</MajorVersion><MinorVersion>{number % 5}</MinorVersion>'
+                f'<TargetLanguageCode>{TARGET_LANGUAGES[number % len(TARGET_LANGUAGES)]}</TargetLanguageCode>'
+                f'<TotalSegmentCount>{100 + number % 900}</TotalSegmentCount>'
+                f'<WorkflowStatus>{WORKFLOW_STATUSES[number % len(WORKFLOW_STATUSES)]}</WorkflowStatus></{memoq_type}>')
+
+    def _list_documents(self, action: str, body: bytes):
+        project = guid_index(_element(body, 'guid'), 3)
+        if not self._has_project(project):
+            return 500, soap_fault('The project does not exist.')
+        memoq_type = 'ServerProjectTranslationDocument2' if action.endswith('2') else 'ServerProjectTranslationDocument'
+        documents = (self.document(project, index, memoq_type) for index in range(self.documents_per_project))
+        return 200, streamed_soap_response(action, documents)
+
+
+class FakeMemoqServer(StubSoapServer):
+    """ A StubSoapServer answering with a FakeMemoq; the keyword arguments are FakeMemoq's.
+    >>> with FakeMemoqServer(tms=3) as server:
+    ...     len(server.fake.tms)
+    3
+    """
+
+    def __init__(self, record: bool = False, **kwargs) -> None:
+        self.fake = FakeMemoq(**kwargs)
+        super().__init__(responder=self.fake, record=record)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
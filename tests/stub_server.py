@@ -0,0 +1,366 @@
+from typing import Callable, Iterable, Iterator, Optional, Tuple, Union
+import base64
+import hashlib
+import socket
+import threading
+import uuid
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A responder returns the status and either the whole body or an iterable of body chunks.
+Responder = Callable[[str, str, bytes], Tuple[int, Union[bytes, Iterable[bytes]]]]
+
+
+class Disconnect(Exception):
+    """ Raised by a responder, or by the body chunks it returns, to drop the connection without (finishing) a
+    response, as a network failure would. """
+
+
+def soap_response(action: str, result_xml: Optional[str] = '') -> bytes:
+    """ Wrap a result fragment in a memoQ-style SOAP response envelope; None gives the response of a void action.
+    >>> soap_response('ListTMs', '<TMInfo>x</TMInfo>')[:40]
+    b'<s:Envelope xmlns:s="http://schemas.xmls'
+    """
+    result = '' if result_xml is None else f'<{action}Result>{result_xml}</{action}Result>'
+    return (f'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+            f'<{action}Response xmlns="http://kilgray.com/memoqservices/2007">{result}'
+            f'</{action}Response></s:Body></s:Envelope>').encode('utf-8')
+
+
+def streamed_soap_response(action: str, items: Iterable[str], batch: int = 256) -> Iterator[bytes]:
+    """ Like soap_response, but yields the envelope in chunks of `batch` items, for listings too big to build.
+    >>> b''.join(streamed_soap_response('ListTMs', ['<TMInfo>x</TMInfo>'])) == soap_response('ListTMs', '<TMInfo>x</TMInfo>')
+    True
+    """
+    head, tail = soap_response(action, '\0').split(b'\0')
+    yield head
+    pending = []
+    for item in items:
+        pending.append(item)
+        if len(pending) >= batch:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+    yield ''.join(pending).encode('utf-8')
+    yield tail
+
+
+def synthetic_project(index: int) -> str:
+    """ A ServerProjectInfo record shaped like the ones returned by ListProjects. """
+    return (f'<ServerProjectInfo><Client>Client {index % 97}</Client><CreationTime>2023-04-0{index % 9 + 1}T10:00:00'
+            f'</CreationTime><Deadline>2023-05-01T12:00:00</Deadline><Domain i:nil="true" '
+            f'xmlns:i="http://www.w3.org/2001/XMLSchema-instance"/><Name>Project {index} – Übersetzung &amp; QA</Name>'
+            f'<ServerProjectGuid>{index:08x}-0000-4000-8000-000000000000</ServerProjectGuid>'
+            f'<SourceLanguageCode>eng</SourceLanguageCode><TargetLanguageCodes><string>ger</string>'
+            f'<string>fre</string></TargetLanguageCodes></ServerProjectInfo>')
+
+
+def default_responder(path: str, soap_action: str, body: bytes) -> Tuple[int, bytes]:
+    """ Answer every action with a single TMInfo item. """
+    action = soap_action.rsplit('/', 1)[-1]
+    return 200, soap_response(action, '<TMInfo><Name>stub</Name></TMInfo>')
+
+
+class TmxExportResponder:
+    """ Serves a synthetic TM of total_bytes of TMX through the chunked TMX export actions.
+
+    The TMX is generated on the fly and each chunk is base64-encoded in small slices as it is sent, so the
+    stub itself uses little memory whatever the size of the TM.
+    >>> responder = TmxExportResponder(total_bytes=1000, chunk_bytes=600)
+    >>> len(b''.join(responder.iter_content()))
+    1000
+    """
+
+    unit = ('<tu creationdate="20230401T100000Z"><tuv xml:lang="en-US"><seg>Segment {0:09d}: the quick brown fox '
+            'jumps over the lazy dog &amp; keeps running.</seg></tuv><tuv xml:lang="de-DE"><seg>Segment {0:09d}: '
+            'der schnelle braune Fuchs springt über den faulen Hund &amp; läuft weiter.</seg></tuv></tu>\n')
+    slice_bytes = 3 << 14
+
+    def __init__(self, total_bytes: int, chunk_bytes: int = 1 << 20, fail_at_chunk: Optional[int] = None,
+                 disconnect_chunks: Iterable[int] = ()) -> None:
+        """ Initialize the responder.
+        :param total_bytes: size of the exported TMX
+        :param chunk_bytes: size of every chunk but the last
+        :param fail_at_chunk: answer 500 to the GetNextTMXChunk call for this chunk index
+        :param disconnect_chunks: chunk indexes whose response is cut off halfway, the first time they are sent;
+            as on the real server, the session has moved past the chunk before it is sent, so it is lost
+        """
+        self.total_bytes = total_bytes
+        self.chunk_bytes = chunk_bytes
+        self.fail_at_chunk = fail_at_chunk
+        self.disconnect_chunks = set(disconnect_chunks)
+        self.unit_bytes = len(self.unit.format(0).encode('utf-8'))
+        self.offsets = {}
+        self.chunks_served = 0
+        self.ended = []
+
+    def read(self, offset: int, size: int) -> bytes:
+        """ Return `size` bytes of the TMX starting at offset. """
+        first, last = offset // self.unit_bytes, (offset + size - 1) // self.unit_bytes
+        data = ''.join(self.unit.format(index) for index in range(first, last + 1)).encode('utf-8')
+        start = offset - first * self.unit_bytes
+        return data[start:start + size]
+
+    def iter_content(self) -> Iterator[bytes]:
+        """ The whole TMX, in slices, as the export should reproduce it. """
+        for offset in range(0, self.total_bytes, self.slice_bytes):
+            yield self.read(offset, min(self.slice_bytes, self.total_bytes - offset))
+
+    def _chunk_body(self, action: str, offset: int, end: int) -> Iterator[bytes]:
+        index = offset // self.chunk_bytes
+        cut = (offset + end) // 2 if index in self.disconnect_chunks else None
+        self.disconnect_chunks.discard(index)
+        head, tail = soap_response(action, '\0').split(b'\0')
+        yield head
+        for start in range(offset, end, self.slice_bytes):
+            if cut is not None and start >= cut:
+                raise Disconnect()
+            yield base64.b64encode(self.read(start, min(self.slice_bytes, end - start)))
+        yield tail
+
+    def __call__(self, path: str, soap_action: str, body: bytes) -> Tuple[int, Union[bytes, Iterable[bytes]]]:
+        action = soap_action.rsplit('/', 1)[-1]
+        if action == 'BeginChunkedTMXExport':
+            session = str(uuid.uuid4())
+            self.offsets[session] = 0
+            return 200, soap_response(action, session)
+        session = body.split(b'<sessionId>', 1)[1].split(b'</sessionId>', 1)[0].decode()
+        if action == 'EndChunkedTMXExport':
+            self.ended.append(session)
+            self.offsets.pop(session, None)
+            return 200, soap_response(action, None)
+        if action != 'GetNextTMXChunk' or session not in self.offsets:
+            return 500, b'unknown session'
+
+        offset = self.offsets[session]
+        if offset >= self.total_bytes:
+            return 200, soap_response(action, None)
+        if offset // self.chunk_bytes == self.fail_at_chunk:
+            return 500, b'export failed'
+        end = min(offset + self.chunk_bytes, self.total_bytes)
+        self.offsets[session] = end
+        self.chunks_served += 1
+        return 200, self._chunk_body(action, offset, end)
+
+
+class FixedTmxExportResponder(TmxExportResponder):
+    """ Serves the given TMX document through the chunked TMX export actions.
+    >>> responder = FixedTmxExportResponder(b'<tmx>...</tmx>', chunk_bytes=4)
+    >>> b''.join(responder.iter_content())
+    b'<tmx>...</tmx>'
+    """
+
+    def __init__(self, tmx: bytes, chunk_bytes: int = 1 << 20, **kwargs) -> None:
+        super().__init__(total_bytes=len(tmx), chunk_bytes=chunk_bytes, **kwargs)
+        self.tmx = tmx
+
+    def read(self, offset: int, size: int) -> bytes:
+        return self.tmx[offset:offset + size]
+
+
+class TmxImportResponder:
+    """ Accepts a chunked TMX import, keeping only a running hash and size of the data received per session.
+
+    digest and imported_bytes are those of the last session ended, i.e. what was imported into the TM.
+    """
+
+    def __init__(self, fail_at_chunk: Optional[int] = None, disconnect_chunks: Iterable[int] = ()) -> None:
+        """ Initialize the responder.
+        :param fail_at_chunk: answer 500 to the AddNextTMXChunk call for this chunk index
+        :param disconnect_chunks: chunk indexes (counted over all sessions) whose answer is lost the first time
+            they arrive: the chunk is added to the session, then the connection is dropped unanswered
+        """
+        self.fail_at_chunk = fail_at_chunk
+        self.disconnect_chunks = set(disconnect_chunks)
+        self.sessions = {}
+        self.chunk_sizes = []
+        self.ended = []
+        self.digest = None
+        self.received_bytes = 0
+        self.imported_bytes = None
+
+    def __call__(self, path: str, soap_action: str, body: bytes) -> Tuple[int, bytes]:
+        action = soap_action.rsplit('/', 1)[-1]
+        if action == 'BeginChunkedTMXImport':
+            session = str(uuid.uuid4())
+            self.sessions[session] = (hashlib.sha256(), 0)
+            return 200, soap_response(action, session)
+        session = body.split(b'<sessionId>', 1)[1].split(b'</sessionId>', 1)[0].decode()
+        if session not in self.sessions:
+            return 500, b'unknown session'
+        if action == 'AddNextTMXChunk':
+            index = len(self.chunk_sizes)
+            if index == self.fail_at_chunk:
+                return 500, b'import failed'
+            data = base64.b64decode(body.split(b'<tmxData>', 1)[1].split(b'</tmxData>', 1)[0])
+            digest, nbytes = self.sessions[session]
+            digest.update(data)
+            self.sessions[session] = (digest, nbytes + len(data))
+            self.chunk_sizes.append(len(data))
+            self.received_bytes += len(data)
+            if index in self.disconnect_chunks:
+                self.disconnect_chunks.discard(index)
+                raise Disconnect()
+            return 200, soap_response(action, None)
+        if action == 'EndChunkedTMXImport':
+            self.ended.append(session)
+            digest, self.imported_bytes = self.sessions.pop(session)
+            self.digest = digest.hexdigest()
+            return 200, soap_response(action, f'<AllSegmentCount>{len(self.chunk_sizes)}</AllSegmentCount>'
+                                              f'<ImportedSegmentCount>{len(self.chunk_sizes)}</ImportedSegmentCount>')
+        return 500, b'unknown action'
+
+
+class FaultInjector:
+    """ Wraps a responder and replaces the responses of chosen requests with faults, by request number.
+
+    A fault is a status (answered with an empty body), 'disconnect' (the connection is dropped unanswered) or
+    a float (seconds of delay before answering normally). Requests are numbered from 0 in arrival order, so
+    a sequential client sees the same faults on every run.
+    >>> injector = FaultInjector(faults={1: 503})
+    >>> [injector('/tm', 'ns/ITMService/ListTMs', b'')[0] for _ in range(3)]
+    [200, 503, 200]
+    """
+
+    def __init__(self, responder: Optional[Responder] = None, faults: Optional[dict] = None,
+                 fault: Optional[Callable[[int], object]] = None) -> None:
+        """ Initialize the injector.
+        :param responder: answers the requests without a fault
+        :param faults: request number -> fault
+        :param fault: alternatively, a function of the request number returning a fault or None
+        """
+        self.responder = responder or default_responder
+        self.faults = dict(faults or {})
+        self.fault = fault
+        self.count = 0
+        self.injected = []
+        self.lock = threading.Lock()
+
+    def __call__(self, path: str, soap_action: str, body: bytes) -> Tuple[int, Union[bytes, Iterable[bytes]]]:
+        with self.lock:
+            number = self.count
+            self.count += 1
+        fault = self.fault(number) if self.fault is not None else self.faults.get(number)
+        if fault is None:
+            return self.responder(path, soap_action, body)
+        with self.lock:
+            self.injected.append((number, fault))
+        if fault == 'disconnect':
+            raise Disconnect()
+        if isinstance(fault, float):
+            time.sleep(fault)
+            return self.responder(path, soap_action, body)
+        return fault, b''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment; otherwise Nagle + delayed ACK dominate the timings.
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connection_count += 1
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        soap_action = self.headers.get('SOAPAction', '')
+        with stub.lock:
+            if stub.record:
+                stub.requests.append((self.path, soap_action, body))
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            if stub.latency:
+                time.sleep(stub.latency)
+            status, payload = stub.responder(self.path, soap_action, body)
+        except Disconnect:
+            self._drop()
+            return
+        finally:
+            with stub.lock:
+                stub.in_flight -= 1
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if isinstance(payload, bytes):
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        # Any other payload is an iterable of byte chunks, streamed with chunked transfer encoding.
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for chunk in payload:
+                if chunk:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        except Disconnect:
+            self.wfile.flush()
+            self._drop()
+            return
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _drop(self):
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Room for the connections of many client threads opened at once; the default backlog of 5 resets them.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StubSoapServer:
+    """ In-process HTTP/1.1 server answering SOAP POSTs, for tests and benchmarks.
+    >>> with StubSoapServer() as server:
+    ...     server.url.startswith('http://127.0.0.1:')
+    True
+    """
+
+    def __init__(self, responder: Optional[Responder] = None, latency: float = 0.0, record: bool = False) -> None:
+        """ Initialize the stub server.
+        :param responder: callable(path, soap_action, body) returning (status, response bytes or byte chunks)
+        :param latency: artificial delay added to every response, in seconds
+        :param record: keep every (path, soap_action, body) received in self.requests
+        """
+        self.responder = responder or default_responder
+        self.latency = latency
+        self.record = record
+        self.requests = []
+        self.connection_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StubSoapServer':
+        self._httpd = _HTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
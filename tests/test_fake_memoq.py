@@ -0,0 +1,100 @@
+import io
+import time
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_projects import MemoqProjects
+from src.memoq_replica import iter_tmx_units
+from src.memoq_resilience import Resilience, RetryPolicy
+from src.memoq_tb import MemoqTb
+from src.memoq_tm import MemoqTm
+from tests.fake_memoq import FakeMemoq, FakeMemoqServer, SyntheticTmx, object_guid
+
+
+class TestFakeMemoq(unittest.TestCase):
+
+    def test_tm_service(self):
+        with FakeMemoqServer(tms=4, tm_units=2000, chunk_bytes=64 << 10) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = MemoqTm(soap)
+            status, tms = tm_client.list_tms()
+            guid = tms[1]['Guid']
+            info = tm_client.get_tm_info(guid)[1]
+            missing = tm_client.get_tm_info(object_guid(1, 99))
+            export = io.BytesIO()
+            stats = tm_client.export_tmx(guid, export)
+            created = tm_client.create_tm('Imported', 'eng', 'ger')[1]
+            tm_client.import_tmx(created, io.BytesIO(export.getvalue()), chunk_size=100_000)
+            imported = tm_client.get_tm_info(created)[1]
+            lookups = tm_client.lookup_segments([('the contract', '', guid, None), ('the party', '', guid, None)])
+
+        self.assertEqual((status, len(tms)), (200, 4))
+        self.assertEqual((info['Name'], info['NumEntries'], info['TargetLanguageCode']), (tms[1]['Name'], '2000', 'fre'))
+        self.assertEqual(missing[0], 500)
+        self.assertIn('does not exist', missing[1])
+        self.assertEqual(stats.bytes, SyntheticTmx(2000, 'eng', 'fre').total_bytes)
+        self.assertGreater(stats.chunks, 5)
+        export.seek(0)
+        self.assertEqual(sum(1 for _ in iter_tmx_units(export)), 2000)
+        self.assertEqual((imported['Name'], imported['NumEntries']), ('Imported', '2000'))
+        self.assertEqual(lookups[1][1]['TMHits']['TMHit'][0]['MatchRate'], '100')
+
+    def test_tb_service(self):
+        with FakeMemoqServer(tbs=2, tb_entries=50, chunk_bytes=256) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            tb_client = MemoqTb(soap)
+            tbs = tb_client.list_tbs()[1]
+            guid = tbs[1]['Guid']
+            entry = tb_client.get_entry(guid, 7)
+            index = tb_client.load_term_index([guid], 'English', 'German')
+
+        self.assertEqual(len(tbs), 2)
+        self.assertEqual(entry[0], 200)
+        self.assertEqual(len(index), 50)
+        hit, = index.scan('See term 1-7 here.')
+        self.assertEqual(hit.entry.target_terms, ('Begriff 1-7',))
+
+    def test_project_service(self):
+        with FakeMemoqServer(projects=300, documents_per_project=4, name_length=120) as server, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as soap:
+            project_client = MemoqProjects(soap)
+            projects = list(project_client.iter_projects())
+            documents = project_client.list_project_translation_documents2(str(projects[5].ServerProjectGuid))[1]
+            batch = project_client.list_documents_for_projects([str(projects[0].ServerProjectGuid), 'unknown'])
+
+        self.assertEqual(len(projects), 300)
+        self.assertGreaterEqual(len(projects[0].Name), 120)
+        self.assertEqual(projects[3].Client, '株式会社サンプル')
+        self.assertEqual(len(documents), 4)
+        self.assertIsNotNone(documents[0].LastModified)
+        self.assertEqual([result[0] for result in batch], [200, 500])
+
+    def test_latency_and_faults(self):
+        fake = FakeMemoq(tms=1, latency={'GetTMInfo': 0.05}, fault_rate=0.3, fault_statuses=(503, 'disconnect'),
+                         seed=4)
+        injected = [fake._random_fault(number) for number in range(1000)]
+        self.assertAlmostEqual(injected.count(None) / 1000, 0.7, delta=0.05)
+        self.assertEqual(injected, [fake._random_fault(number) for number in range(1000)])
+
+        resilience = Resilience(RetryPolicy(max_attempts=10, base_delay=0.001), rate_limiter=None)
+        with FakeMemoqServer(tms=1, latency={'GetTMInfo': 0.05}, fault_rate=0.3, fault_statuses=(503, 'disconnect'),
+                             seed=4) as server, mq.MemoqSoap(server.url, "some_key", resilience=resilience) as soap:
+            tm_client = MemoqTm(soap)
+            start = time.perf_counter()
+            statuses = [tm_client.get_tm_info(object_guid(1, 0))[0] for _ in range(10)]
+            elapsed = time.perf_counter() - start
+            calls = server.fake.calls['ITMService/GetTMInfo']
+
+        self.assertEqual(statuses, [200] * 10)
+        self.assertGreater(len(server.fake.faults.injected), 0)
+        self.assertEqual(calls, 10)
+        self.assertGreaterEqual(elapsed, 0.5)
+
+    def test_unknown_action_is_a_soap_fault(self):
+        status, body = FakeMemoq(tms=0)('/x', 'http://kilgray.com/memoqservices/2007/ITMService/NoSuchAction', b'')
+        self.assertEqual(status, 500)
+        self.assertIn(b'<s:Fault>', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
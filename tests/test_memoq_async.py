@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import io
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_async import AsyncMemoqSoap, AsyncMemoqTm, AsyncMemoqTb, AsyncMemoqProjects
+from src.memoq_projects import MemoqProjects
+from src.memoq_tb import MemoqTb
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, TmxExportResponder, TmxImportResponder, soap_response
+
+
+def responder(path, soap_action, body):
+    action = soap_action.rsplit('/', 1)[-1]
+    if action == 'GetTMInfo':
+        return 200, soap_response(action, '<Guid>g1</Guid><Name>Legal EN-DE</Name>')
+    if action == 'ListTBs':
+        return 200, soap_response(action, '<TBInfo><Name>tb1</Name></TBInfo><TBInfo><Name>tb2</Name></TBInfo>')
+    if action == 'ListProjects':
+        return 200, soap_response(action, '<ServerProjectInfo><Name>p1</Name></ServerProjectInfo>')
+    if action == 'ListProjectTranslationDocuments2':
+        return 500, b'server error'
+    return 200, soap_response(action, '<TMInfo><Name>stub</Name></TMInfo>')
+
+
+class TestAsyncMemoqSoap(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = StubSoapServer(responder=responder).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    async def test_results_match_sync_api(self):
+        sync_soap = mq.MemoqSoap(self.server.url, "some_key")
+        expected = [MemoqTm(sync_soap).list_tms(), MemoqTm(sync_soap).get_tm_info('g1'),
+                    MemoqTb(sync_soap).list_tbs(), MemoqProjects(sync_soap).list_projects()]
+        sync_soap.close()
+
+        async with AsyncMemoqSoap(self.server.url, "some_key") as soap:
+            actual = [await AsyncMemoqTm(soap).list_tms(), await AsyncMemoqTm(soap).get_tm_info('g1'),
+                      await AsyncMemoqTb(soap).list_tbs(), await AsyncMemoqProjects(soap).list_projects()]
+
+        self.assertEqual(actual, expected)
+
+    async def test_projected_results_match_sync_api(self):
+        sync_soap = mq.MemoqSoap(self.server.url, "some_key")
+        expected = [MemoqTm(sync_soap).get_tm_info('g1', projection={'Guid'}),
+                    MemoqTb(sync_soap).list_tbs(projection={'Name'}),
+                    MemoqProjects(sync_soap).list_projects(projection={'ServerProjectGuid'})]
+        sync_soap.close()
+
+        async with AsyncMemoqSoap(self.server.url, "some_key") as soap:
+            actual = [await AsyncMemoqTm(soap).get_tm_info('g1', projection={'Guid'}),
+                      await AsyncMemoqTb(soap).list_tbs(projection={'Name'}),
+                      await AsyncMemoqProjects(soap).list_projects(projection={'ServerProjectGuid'})]
+
+        self.assertEqual(actual, expected)
+        self.assertNotIn('Name', actual[0][1])
+
+    async def test_requests_match_sync_api(self):
+        calls = [('tm', 'delete_tm', ('g1',)), ('tm', 'update_properties', ({'Guid': 'g1', 'Name': 'Legal'},)),
+                 ('tm', 'lookup_segment', ('a < b', '', 'g1', {'Options': {'MatchThreshold': 75}})),
+                 ('tm', 'concordance', ('contract', '', 'g1', {})),
+                 ('tm', 'add_or_update_entry', ('source', 'target', 'g1')), ('tb', 'get_entry', ('tb1', 7)),
+                 ('projects', 'list_projects', ({'Client': 'Acme'},)),
+                 ('projects', 'list_project_translation_documents2', ('p1', {'FillInAssignmentInformation': True}))]
+        with StubSoapServer(responder=responder, record=True) as server:
+            with mq.MemoqSoap(server.url, "some_key") as sync_soap:
+                clients = {'tm': MemoqTm(sync_soap), 'tb': MemoqTb(sync_soap), 'projects': MemoqProjects(sync_soap)}
+                expected = [getattr(clients[client], method)(*args) for client, method, args in calls]
+            async with AsyncMemoqSoap(server.url, "some_key") as soap:
+                clients = {'tm': AsyncMemoqTm(soap), 'tb': AsyncMemoqTb(soap), 'projects': AsyncMemoqProjects(soap)}
+                actual = [await getattr(clients[client], method)(*args) for client, method, args in calls]
+
+        # The stub answers ListProjectTranslationDocuments2 with 500, whose error text carries the headers.
+        self.assertEqual(actual[:-1], expected[:-1])
+        self.assertEqual((actual[-1][0], expected[-1][0]), (500, 500))
+        sent = server.requests
+        self.assertEqual(sent[len(calls):], sent[:len(calls)])
+        self.assertIn(b'<Client>Acme</Client>', sent[-2][2])
+        self.assertIn(b'<FillInAssignmentInformation>true</FillInAssignmentInformation>', sent[-1][2])
+
+    async def test_chunked_tmx_export_and_import(self):
+        exporter = TmxExportResponder(total_bytes=350_000, chunk_bytes=100_000)
+        with StubSoapServer(responder=exporter) as server:
+            async with AsyncMemoqSoap(server.url, "some_key") as soap:
+                out = io.BytesIO()
+                stats = await AsyncMemoqTm(soap).export_tmx('tm-guid', out)
+
+        self.assertEqual(out.getvalue(), b''.join(exporter.iter_content()))
+        self.assertEqual((stats.chunks, len(exporter.ended)), (4, 1))
+
+        importer = TmxImportResponder()
+        with StubSoapServer(responder=importer) as server:
+            async with AsyncMemoqSoap(server.url, "some_key") as soap:
+                stats = await AsyncMemoqTm(soap).import_tmx('tm-guid', io.BytesIO(out.getvalue()),
+                                                            chunk_size=150_000)
+
+        self.assertEqual(importer.chunk_sizes, [150_000, 150_000, 50_000])
+        self.assertEqual(importer.digest, hashlib.sha256(out.getvalue()).hexdigest())
+        self.assertEqual(stats.result['AllSegmentCount'], '3')
+
+    async def test_error_status_is_returned(self):
+        async with AsyncMemoqSoap(self.server.url, "some_key") as soap:
+            status, data = await AsyncMemoqProjects(soap).list_project_translation_documents2('some_guid')
+
+        self.assertEqual(status, 500)
+        self.assertTrue(data.startswith('Error: 500'))
+
+    async def test_concurrency_is_bounded(self):
+        self.server.latency = 0.05
+        async with AsyncMemoqSoap(self.server.url, "some_key", max_concurrency=3) as soap:
+            tm = AsyncMemoqTm(soap)
+            results = await asyncio.gather(*(tm.get_tm_info(f'g{i}') for i in range(12)))
+
+        self.assertEqual(len(results), 12)
+        self.assertLessEqual(self.server.max_in_flight, 3)
+
+    async def test_request_timeout(self):
+        self.server.latency = 0.5
+        async with AsyncMemoqSoap(self.server.url, "some_key", timeout=0.05) as soap:
+            with self.assertRaises(asyncio.TimeoutError):
+                await AsyncMemoqTm(soap).list_tms()
+
+    async def test_cancellation_frees_the_slot(self):
+        self.server.latency = 0.3
+        async with AsyncMemoqSoap(self.server.url, "some_key", max_concurrency=1) as soap:
+            task = asyncio.create_task(AsyncMemoqTm(soap).list_tms())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            self.server.latency = 0
+            status, _ = await soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                                     memoq_type='TMInfo', action='ListTMs', request_timeout=5)
+        self.assertEqual(status, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
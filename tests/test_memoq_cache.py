@@ -0,0 +1,200 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.memoq_cache import ResponseCache
+from src.memoq_soap import MemoqSoap
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, soap_response
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttls={'ListTMs': 10, 'ListProjects': 1}, maxsize=2, clock=self.clock)
+
+    def test_per_action_ttl(self):
+        self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'tms'))
+        self.cache.get_or_load('ListProjects', 'k', lambda: (200, 'projects'))
+        self.clock.now = 5
+
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'new')), (200, 'tms'))
+        self.assertEqual(self.cache.get_or_load('ListProjects', 'k', lambda: (200, 'new')), (200, 'new'))
+
+    def test_least_recently_used_is_evicted(self):
+        for key in ('a', 'b'):
+            self.cache.get_or_load('ListTMs', key, lambda: (200, key))
+        self.cache.get_or_load('ListTMs', 'a', lambda: (200, 'unused'))
+        self.cache.get_or_load('ListTMs', 'c', lambda: (200, 'c'))
+
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'a', lambda: (200, 'reloaded')), (200, 'a'))
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'b', lambda: (200, 'reloaded')), (200, 'reloaded'))
+        self.assertEqual(self.cache.stats.evictions, 2)
+
+    def test_errors_are_not_cached(self):
+        self.cache.get_or_load('ListTMs', 'k', lambda: (500, 'boom'))
+        with self.assertRaises(ConnectionError):
+            self.cache.get_or_load('ListTMs', 'k', self._raise)
+
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'ok')), (200, 'ok'))
+        self.assertEqual(self.cache.stats.misses, 3)
+
+    def test_concurrent_misses_are_merged(self):
+        release = threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            release.wait(5)
+            return 200, 'tms'
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(self.cache.get_or_load, 'ListTMs', 'k', load) for _ in range(8)]
+            while self.cache.stats.misses + self.cache.stats.merged < 8:
+                threading.Event().wait(0.01)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(results, [(200, 'tms')] * 8)
+        self.assertEqual(self.cache.stats.merged, 7)
+
+    def test_merged_callers_get_an_interrupted_load_error(self):
+        release = threading.Event()
+
+        def load():
+            release.wait(5)
+            raise SystemExit(1)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(self.cache.get_or_load, 'ListTMs', 'k', load) for _ in range(4)]
+            while self.cache.stats.misses + self.cache.stats.merged < 4:
+                threading.Event().wait(0.01)
+            release.set()
+            for future in futures:
+                with self.assertRaises(SystemExit):
+                    future.result(timeout=5)
+
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'ok')), (200, 'ok'))
+
+    def test_invalidation_during_load_is_not_overwritten(self):
+        def load():
+            self.cache.invalidate('ListTMs')
+            return 200, 'stale'
+
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'k', load), (200, 'stale'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_after_write(self):
+        self.cache.invalidations = {'CreateTM': ('ListTMs',)}
+        self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'tms'))
+        self.cache.get_or_load('ListProjects', 'k', lambda: (200, 'projects'))
+
+        self.cache.after_write('CreateTM')
+        self.cache.after_write('SomethingElse')
+
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.stats.invalidations, 1)
+
+    def test_scoped_writes_drop_only_their_scope_and_listings(self):
+        self.cache = ResponseCache(ttls={'ListTMs': 10, 'GetTMInfo': 10}, maxsize=10, clock=self.clock,
+                                   invalidations={'AddOrUpdateEntry': ('ListTMs', 'GetTMInfo')})
+        self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'tms'))
+        for guid in ('a', 'b', 'c'):
+            self.cache.get_or_load('GetTMInfo', guid, lambda: (200, guid), scope=guid)
+
+        self.cache.after_write('AddOrUpdateEntry', 'b')
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get_or_load('GetTMInfo', 'a', lambda: (200, 'new'), scope='a'), (200, 'a'))
+        self.assertEqual(self.cache.get_or_load('GetTMInfo', 'b', lambda: (200, 'new'), scope='b'), (200, 'new'))
+        self.assertEqual(self.cache.get_or_load('ListTMs', 'k', lambda: (200, 'new')), (200, 'new'))
+        self.cache.after_write('AddOrUpdateEntry')
+        self.assertEqual(len(self.cache), 0)
+
+    @staticmethod
+    def _raise():
+        raise ConnectionError('down')
+
+
+def tm_responder(path, soap_action, body):
+    action = soap_action.rsplit('/', 1)[-1]
+    if action == 'GetTMInfo':
+        return 200, soap_response(action, '<Guid>g</Guid><Name>Legal</Name>')
+    if action == 'DeleteTM':
+        return 200, soap_response(action, None)
+    return 200, soap_response(action, '<TMInfo><Name>Legal</Name></TMInfo>')
+
+
+class TestMemoqSoapCache(unittest.TestCase):
+
+    def test_reads_are_served_from_cache_until_a_write(self):
+        with StubSoapServer(responder=tm_responder, record=True) as server, \
+                MemoqSoap(server.url, "some_key", cache=ResponseCache()) as soap:
+            tm_client = MemoqTm(soap)
+            for _ in range(5):
+                self.assertEqual(tm_client.get_tm_info('g'), (200, {'Guid': 'g', 'Name': 'Legal'}))
+                tm_client.list_tms()
+            tm_client.get_tm_info('other')
+            self.assertEqual(tm_client.delete_tm('g'), (200, None))
+            tm_client.get_tm_info('g')
+
+            actions = [soap_action.rsplit('/', 1)[-1] for _, soap_action, _ in server.requests]
+
+        self.assertEqual(actions, ['GetTMInfo', 'ListTMs', 'GetTMInfo', 'DeleteTM', 'GetTMInfo'])
+        self.assertEqual(soap.cache.stats.hits, 8)
+
+    def test_entry_writes_keep_the_other_tms_cached(self):
+        with StubSoapServer(responder=tm_responder, record=True) as server, \
+                MemoqSoap(server.url, "some_key", cache=ResponseCache()) as soap:
+            tm_client = MemoqTm(soap)
+            get_tm_info = dict(route='memoqservices/tm/TMService', interface='ITMService', memoq_type='TMInfo',
+                               action='GetTMInfo', tmGuid='g')
+            first = soap.make_soap_request(**get_tm_info)
+            tm_client.get_tm_info('other')
+            tm_client.add_or_update_entry('source', 'target', 'other')
+            hit = soap.make_soap_request(**get_tm_info)
+            tm_client.get_tm_info('other')
+
+            actions = [soap_action.rsplit('/', 1)[-1] for _, soap_action, _ in server.requests]
+
+        self.assertEqual(actions, ['GetTMInfo', 'GetTMInfo', 'AddOrUpdateEntry', 'GetTMInfo'])
+        # Only the status and data are cached; a hit has no HTTP response to hold on to.
+        self.assertIsNotNone(first.response)
+        self.assertEqual(hit, first)
+        self.assertIsNone(hit.response)
+
+    def test_cache_hits_keep_the_last_response(self):
+        with StubSoapServer(responder=tm_responder, record=True) as server, \
+                MemoqSoap(server.url, "some_key", keep_last_response=True, cache=ResponseCache()) as soap:
+            tm_client = MemoqTm(soap)
+            first = tm_client.list_tms()
+            response = soap.response
+            self.assertEqual(tm_client.list_tms(), first)
+
+        self.assertEqual(len(server.requests), 1)
+        self.assertIs(soap.response, response)
+        self.assertEqual(soap.response_status_code, 200)
+
+    def test_concurrent_identical_reads_cost_one_call(self):
+        with StubSoapServer(responder=tm_responder, latency=0.2, record=True) as server, \
+                MemoqSoap(server.url, "some_key", cache=ResponseCache()) as soap:
+            with ThreadPoolExecutor(max_workers=10) as pool:
+                results = list(pool.map(lambda _: MemoqTm(soap).get_tm_info('g'), range(10)))
+
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(results, [(200, {'Guid': 'g', 'Name': 'Legal'})] * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import gzip
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_cassette import CassetteMiss, ReplayTransport, iter_cassette
+from src.memoq_projects import MemoqProjects
+from src.memoq_tm import MemoqTm
+from tests.fake_memoq import FakeMemoqServer, object_guid
+
+
+def session(soap):
+    """ The calls recorded and replayed: a listing, a streamed listing, lookups, a chunked export and an error. """
+    tm_client, project_client = MemoqTm(soap), MemoqProjects(soap)
+    export = io.BytesIO()
+    tm_client.export_tmx(object_guid(1, 1), export)
+    return [project_client.list_projects(),
+            list(project_client.iter_projects()),
+            project_client.list_project_translation_documents2(object_guid(3, 2)),
+            tm_client.get_tm_info(object_guid(1, 0)),
+            tm_client.get_tm_info('no-such-tm'),
+            export.getvalue()]
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'traffic.cassette')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, **kwargs):
+        with FakeMemoqServer(projects=200, documents_per_project=3, tm_units=3000, chunk_bytes=100_000,
+                             **kwargs) as server, \
+                mq.MemoqSoap(server.url, "secret-api-key", record_to=self.path) as soap:
+            return session(soap)
+
+    def test_replay_gives_the_recorded_results(self):
+        recorded = self.record()
+        with mq.MemoqSoap("http://elsewhere", "another-key", transport=ReplayTransport(self.path, speed=None)) as soap:
+            replayed = session(soap)
+
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(recorded[4][0], 500)
+        self.assertEqual(len(recorded[1]), 200)
+        with gzip.open(self.path) as cassette:
+            raw = cassette.read()
+        self.assertNotIn(b'secret-api-key', raw)
+        self.assertIn(b'<ApiKey xmlns="http://kilgray.com/memoqservices/2007">***</ApiKey>', raw)
+        # Bodies are stored raw and compressed.
+        self.assertLess(os.path.getsize(self.path), len(raw) / 4)
+
+    def test_original_timings_or_as_fast_as_possible(self):
+        self.record(latency={'GetTMInfo': 0.2})
+        entry = next(entry for entry in iter_cassette(self.path) if entry.action == 'GetTMInfo')
+        self.assertGreaterEqual(entry.server, 0.2)
+
+        def replay(**kwargs):
+            with mq.MemoqSoap("http://elsewhere", "key", transport=ReplayTransport(self.path, **kwargs)) as soap:
+                start = time.perf_counter()
+                status = MemoqTm(soap).get_tm_info(object_guid(1, 0))[0]
+                return status, time.perf_counter() - start
+
+        self.assertGreaterEqual(replay()[1], 0.2)
+        self.assertGreaterEqual(replay(speed=2)[1], 0.1)
+        self.assertLess(replay(speed=2)[1], 0.2)
+        self.assertEqual(replay(speed=None)[0], 200)
+        self.assertLess(replay(speed=None)[1], 0.05)
+
+    def test_misses_and_repeats(self):
+        self.record()
+        transport = ReplayTransport(self.path, speed=None)
+        with mq.MemoqSoap("http://elsewhere", "key", transport=transport) as soap:
+            tm_client = MemoqTm(soap)
+            self.assertEqual(tm_client.get_tm_info(object_guid(1, 0))[0], 200)
+            with self.assertRaises(CassetteMiss):
+                tm_client.get_tm_info(object_guid(1, 0))
+            with self.assertRaises(CassetteMiss):
+                tm_client.get_tm_info(object_guid(1, 5))
+
+        transport = ReplayTransport(self.path, speed=None, repeat=True)
+        with mq.MemoqSoap("http://elsewhere", "key", transport=transport) as soap:
+            statuses = [MemoqTm(soap).get_tm_info(object_guid(1, 0))[0] for _ in range(5)]
+        self.assertEqual(statuses, [200] * 5)
+        self.assertIn(('http://kilgray.com/memoqservices/2007/ITMService/GetTMInfo', 2, len(transport.entries[-2].response)
+                       + len(transport.entries[-1].response)), transport.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_crawler import ProjectCrawler, read_crawled
+from src.memoq_projects import MemoqProjects
+from tests.fake_memoq import FakeMemoqServer, object_guid
+
+DOCUMENTS = 'IServerProjectService/ListProjectTranslationDocuments2'
+
+
+class TestProjectCrawler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'crawl.ndjson')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_documents_are_listed_concurrently(self):
+        with FakeMemoqServer(projects=200, documents_per_project=3,
+                             latency={'ListProjectTranslationDocuments2': 0.02}) as server, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as soap:
+            crawler = ProjectCrawler(MemoqProjects(soap), max_workers=10)
+            records = list(crawler.crawl())
+
+        self.assertEqual(sorted(record.guid for record in records), sorted(object_guid(3, i) for i in range(200)))
+        record = next(record for record in records if record.guid == object_guid(3, 17))
+        self.assertTrue(record.project.Name.startswith('Project 17 '))
+        self.assertEqual([document.DocumentGuid.int >> 96 for document in record.documents], [51, 52, 53])
+        self.assertEqual((crawler.stats.projects, crawler.stats.documents, crawler.stats.failed), (200, 600, 0))
+        # 200 listings of 20 ms each take 4 s one after the other.
+        self.assertLess(crawler.stats.elapsed, 2.0)
+
+    def test_a_slow_consumer_holds_back_the_crawl(self):
+        with FakeMemoqServer(projects=1000, documents_per_project=1) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            crawler = ProjectCrawler(MemoqProjects(soap), max_workers=4, queue_size=5)
+            crawl = crawler.crawl()
+            for _ in range(10):
+                next(crawl)
+            time.sleep(0.3)
+            listed = server.fake.calls[DOCUMENTS]
+            crawl.close()
+            # Closing the generator stops the pipeline's threads.
+            self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith('crawl-')])
+
+        # What was consumed, what waits in the result queue, and one listing per worker.
+        self.assertLessEqual(listed, 10 + 5 + 4)
+        self.assertEqual(crawler.stats.projects, 10)
+
+    def test_failures_and_resuming_into_ndjson(self):
+        with FakeMemoqServer(projects=150, documents_per_project=2, faults={5: 503}) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            crawler = ProjectCrawler(MemoqProjects(soap), max_workers=4)
+            first = crawler.crawl_to(self.path)
+
+            # An interrupted crawl: the file ends in the middle of a line.
+            with open(self.path, 'rb') as file:
+                lines = file.readlines()
+            with open(self.path, 'wb') as file:
+                file.writelines(lines[:100])
+                file.write(lines[100][:30])
+            server.fake.add_project()
+            calls = server.fake.calls[DOCUMENTS]
+            second = crawler.crawl_to(self.path)
+            resumed_calls = server.fake.calls[DOCUMENTS] - calls
+
+        self.assertEqual((first.projects, first.failed), (150, 1))
+        with open(self.path, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        crawled = {record['guid'] for record in records if 'documents' in record}
+        self.assertEqual(crawled, {object_guid(3, i) for i in range(151)})
+        self.assertEqual(len(records), 100 + second.projects)
+        self.assertEqual(second.skipped, sum(1 for line in lines[:100] if b'"documents"' in line))
+        self.assertEqual(second.skipped + second.projects, 151)
+        self.assertEqual(resumed_calls, second.projects)
+        self.assertEqual(read_crawled(self.path), crawled)
+        self.assertEqual(records[-1]['project']['ServerProjectGuid'], records[-1]['guid'])
+
+    def test_a_failed_project_listing_is_raised(self):
+        with FakeMemoqServer(projects=10, faults={0: 503}) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            with self.assertRaises(mq.MemoqSoapError):
+                ProjectCrawler(MemoqProjects(soap), max_workers=2).crawl_to(lambda record: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
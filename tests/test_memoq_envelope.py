@@ -0,0 +1,82 @@
+import collections
+import datetime
+import os
+import tracemalloc
+import unittest
+
+import xmltodict
+
+from src.memoq_envelope import EnvelopeBuilder
+
+NAMESPACE = 'http://kilgray.com/memoqservices/2007'
+
+
+def body_of(envelope: bytes, action: str) -> dict:
+    return xmltodict.parse(envelope)['soap:Envelope']['soap:Body'][action]
+
+
+class TestEnvelopeBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = EnvelopeBuilder(NAMESPACE, 'key&<secret>')
+
+    def test_values_are_escaped(self):
+        segment = 'Terms & <b>Conditions</b> — “quoted” ünïcode'
+        envelope = self.builder.build('LookupSegment', {'source': segment})
+
+        parsed = xmltodict.parse(envelope)['soap:Envelope']
+        self.assertEqual(parsed['soap:Body']['LookupSegment']['source'], segment)
+        self.assertEqual(parsed['soap:Header']['ApiKey']['#text'], 'key&<secret>')
+
+    def test_nested_dicts_and_lists(self):
+        params = {'tmName': 'R&D', 'sourceLangCode': 'eng', 'targetLangCode': 'ger'}
+        entries = [{'TMEntry': {'SourceSegment': 'a<1', 'TargetSegment': 'b'}},
+                   {'TMEntry': {'SourceSegment': 'c', 'TargetSegment': 'd&'}}]
+        envelope = self.builder.build('AddOrUpdateEntries', {'tmGuid': 'g', 'params': params, 'entries': entries})
+
+        body = body_of(envelope, 'AddOrUpdateEntries')
+        self.assertEqual(body['params'], params)
+        self.assertEqual([entry['SourceSegment'] for entry in body['entries']['TMEntry']], ['a<1', 'c'])
+        self.assertEqual(body['entries']['TMEntry'][1]['TargetSegment'], 'd&')
+
+    def test_dict_and_list_subclasses_are_nested(self):
+        params = collections.OrderedDict([('tmName', 'R&D'), ('sourceLangCode', 'eng')])
+        envelope = self.builder.build('CreateTM', {'params': params})
+
+        self.assertEqual(envelope, self.builder.build('CreateTM', {'params': dict(params)}))
+        self.assertEqual(body_of(envelope, 'CreateTM')['params'], dict(params))
+
+    def test_scalar_types(self):
+        envelope = self.builder.build('X', {'flag': False, 'count': 3, 'data': b'\x00\xff',
+                                            'when': datetime.datetime(2023, 1, 2, 3, 4, 5), 'gone': None})
+        body = body_of(envelope, 'X')
+        self.assertEqual((body['flag'], body['count'], body['data'], body['when']),
+                         ('false', '3', 'AP8=', '2023-01-02T03:04:05'))
+        self.assertEqual(body['gone']['@xsi:nil'], 'true')
+
+    def test_templates_are_cached_per_shape(self):
+        first = self.builder.build('GetTMInfo', {'tmGuid': 'a'})
+        second = self.builder.build('GetTMInfo', {'tmGuid': 'b'})
+        self.builder.build('GetTMInfo', {'tmGuid': 'c', 'extra': 1})
+
+        self.assertEqual(len(self.builder._templates), 2)
+        self.assertEqual(first.replace(b'>a<', b'>b<'), second)
+
+    def test_build_into_encodes_in_place(self):
+        chunk = os.urandom((1 << 20) + 1)
+        expected = self.builder.build('AddNextTMXChunk', {'sessionId': 's', 'tmxData': chunk})
+        buffer = bytearray()
+        self.builder.build_into(buffer, 'AddNextTMXChunk', {'sessionId': 's', 'tmxData': chunk})
+
+        tracemalloc.start()
+        envelope = self.builder.build_into(buffer, 'AddNextTMXChunk', {'sessionId': 's', 'tmxData': chunk})
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(bytes(envelope), expected)
+        # One base64 slice at a time, not a 1.4 MB copy of the chunk.
+        self.assertLess(peak, 256 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import random
+import time
+import unittest
+from unittest import mock
+
+from src.memoq_metrics import CallMetrics, LatencyHistogram, MetricsAggregator, PHASES
+from src.memoq_soap import MemoqSoap, MemoqSoapError, RESULT_JSON
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, soap_response
+
+TM_INFO = '<TMInfo><Name>Legal</Name><SourceLanguageCode>eng</SourceLanguageCode></TMInfo>'
+# Leading whitespace that fills the stub's write buffer, so the headers go out before the rest of the body.
+PADDING = b' ' * (1 << 17)
+
+
+def tm_responder(path, soap_action, body):
+    action = soap_action.rsplit('/', 1)[-1]
+    if action == 'GetTMInfo' and b'<tmGuid>missing</tmGuid>' in body:
+        return 500, b'no such TM'
+    if action == 'ListTMs':
+        # Headers go out at once; the body trickles in.
+        def chunks():
+            head, tail = soap_response(action, '\0').split(b'\0')
+            yield PADDING + head
+            time.sleep(0.1)
+            yield TM_INFO.encode() + tail
+        return 200, chunks()
+    return 200, soap_response(action, TM_INFO)
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles_are_within_the_precision(self):
+        rng = random.Random(3)
+        values = sorted(rng.lognormvariate(-4, 1.5) for _ in range(20000))
+        histogram = LatencyHistogram(precision=0.01)
+        for value in values:
+            histogram.record(value)
+
+        for percent in (50, 95, 99, 99.9):
+            exact = values[int(len(values) * percent / 100) - 1]
+            self.assertAlmostEqual(histogram.percentile(percent) / exact, 1, delta=0.011)
+        self.assertEqual((histogram.percentile(100), histogram.percentile(0)), (values[-1], values[0]))
+        self.assertLess(len(histogram._buckets), 2000)
+
+
+class TestMemoqSoapMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.aggregator = MetricsAggregator()
+
+    def test_phases_sizes_and_status_are_reported(self):
+        with StubSoapServer(responder=tm_responder, latency=0.1) as server, \
+                MemoqSoap(server.url, "some_key", observers=[self.calls.append, self.aggregator]) as soap:
+            tm_client = MemoqTm(soap)
+            tm_client.get_tm_info('g')
+            tm_client.get_tm_info('g')
+            tm_client.get_tm_info('missing')
+
+        first, second, failed = self.calls
+        self.assertEqual(first.tag, 'ITMService/GetTMInfo')
+        self.assertEqual(set(first.phases), set(PHASES))
+        self.assertGreaterEqual(first.phases['server'], 0.1)
+        # Only the first call opened a connection.
+        self.assertGreater(first.phases['connect'], 0)
+        self.assertEqual(second.phases['connect'], 0)
+        self.assertEqual(first.request_bytes, len(soap.build_payload('GetTMInfo', tmGuid='g')))
+        self.assertEqual(first.response_bytes, len(soap_response('GetTMInfo', TM_INFO)))
+        self.assertEqual((failed.status, failed.ok, failed.response_bytes), (500, False, 10))
+
+        summary = self.aggregator.summary()['ITMService/GetTMInfo']
+        self.assertEqual((summary['calls'], summary['errors'], summary['statuses']), (3, 1, {200: 2, 500: 1}))
+        self.assertGreaterEqual(summary['p50'], 0.1)
+        self.assertIn('ITMService/GetTMInfo', self.aggregator.report())
+
+    def test_download_and_serialize_are_timed_apart(self):
+        with StubSoapServer(responder=tm_responder) as server, \
+                MemoqSoap(server.url, "some_key", result_format=RESULT_JSON, observers=[self.calls.append]) as soap:
+            status, data = MemoqTm(soap).list_tms()
+
+        self.assertEqual(status, 200)
+        self.assertIn('"Name": "Legal"', data)
+        metrics, = self.calls
+        self.assertGreaterEqual(metrics.phases['download'], 0.09)
+        self.assertLess(metrics.phases['server'], 0.09)
+        self.assertGreater(metrics.phases['serialize'], 0)
+
+    def test_streamed_calls_and_errors(self):
+        with StubSoapServer(responder=tm_responder) as server, \
+                MemoqSoap(server.url, "some_key", observers=[self.calls.append]) as soap:
+            items = list(MemoqTm(soap).iter_tms())
+            with self.assertRaises(MemoqSoapError):
+                list(soap.iter_soap_request('memoqservices/tm/TMService', 'ITMService', 'TMInfo', 'GetTMInfo',
+                                            tmGuid='missing'))
+        with MemoqSoap('http://127.0.0.1:9', "some_key", observers=[self.calls.append]) as soap:
+            with self.assertRaises(OSError):
+                MemoqTm(soap).get_tm_info('g')
+
+        streamed, failed, refused = self.calls
+        self.assertEqual(len(items), 1)
+        self.assertTrue(streamed.streamed)
+        self.assertEqual(streamed.response_bytes, len(PADDING + soap_response('ListTMs', TM_INFO)))
+        self.assertGreaterEqual(streamed.phases['download'], 0.09)
+        self.assertEqual((failed.status, failed.error), (500, 'MemoqSoapError'))
+        self.assertEqual((refused.status, refused.error), (None, 'ConnectionError'))
+
+    def test_failing_observer_does_not_fail_the_call(self):
+        def broken(metrics):
+            raise RuntimeError('observer bug')
+
+        with StubSoapServer(responder=tm_responder) as server, \
+                MemoqSoap(server.url, "some_key", observers=[broken, self.calls.append]) as soap:
+            with self.assertLogs('src.memoq_soap', level='ERROR'):
+                self.assertEqual(MemoqTm(soap).get_tm_info('g')[0], 200)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_no_observers_no_timing(self):
+        with StubSoapServer(responder=tm_responder) as server, MemoqSoap(server.url, "some_key") as soap:
+            soap.add_observer(self.calls.append)
+            soap.remove_observer(self.calls.append)
+            with mock.patch('src.memoq_soap.CallMetrics') as metrics, \
+                    mock.patch.object(soap.transport, 'connect_seconds') as connect_seconds:
+                self.assertEqual(MemoqTm(soap).get_tm_info('g')[0], 200)
+
+        metrics.assert_not_called()
+        connect_seconds.assert_not_called()
+        self.assertEqual(self.calls, [])
+
+    def test_call_metrics_repr(self):
+        metrics = CallMetrics('ITBService', 'ListTBs', 200, 10, 20, {'server': 0.002, 'parse': 0.001})
+        self.assertEqual(repr(metrics), 'CallMetrics(ITBService/ListTBs, status=200, request_bytes=10, '
+                                        'response_bytes=20, server=2.00ms, parse=1.00ms)')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_project_store import ProjectStore
+from src.memoq_projects import MemoqProjects
+from tests.fake_memoq import ARRAYS_NAMESPACE, BASE_TIME, TARGET_LANGUAGES, FakeMemoqServer, object_guid
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProjectStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.store = ProjectStore(os.path.join(self.directory.name, 'projects.db'), full_sync_interval=3600,
+                                  clock=self.clock)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_delta_sync_fetches_only_changes(self):
+        with FakeMemoqServer(projects=500) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            project_client, fake = MemoqProjects(soap), server.fake
+            first = self.store.sync(project_client)
+            fake.update_project(10, ProjectStatus='WrappedUp')
+            fake.update_project(20, Client='New Client')
+            added = fake.add_project(Client='New Client')
+            fake.delete_project(30)
+            self.clock.now += 60
+            delta = self.store.sync(project_client)
+            self.clock.now += 3600
+            full = self.store.sync(project_client)
+
+        self.assertEqual((first.full, first.inserted), (True, 500))
+        self.assertFalse(delta.full)
+        # The changed projects, and those within the overlap before the last change seen.
+        self.assertLess(delta.fetched, 5)
+        self.assertEqual((delta.inserted, delta.updated, delta.deleted), (1, 2, 0))
+        self.assertEqual(self.store.get(object_guid(3, 10)).ProjectStatus, 'WrappedUp')
+        self.assertCountEqual([str(project.ServerProjectGuid) for project in self.store.query(client='New Client')],
+                              [object_guid(3, 20), object_guid(3, added)])
+        self.assertTrue(full.full)
+        self.assertEqual((full.fetched, full.unchanged, full.deleted), (500, 500, 1))
+        self.assertIsNone(self.store.get(object_guid(3, 30)))
+        self.assertEqual(len(self.store), 500)
+        self.assertEqual(self.store.state('watermark'), delta.watermark)
+
+    def test_queries_match_the_listing(self):
+        with FakeMemoqServer(projects=400) as server, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as soap:
+            project_client = MemoqProjects(soap)
+            self.store.sync(project_client)
+            projects = list(project_client.iter_projects())
+
+        self.assertEqual(self.store.get(object_guid(3, 7)), projects[7])
+        cutoff = datetime.datetime.fromtimestamp(BASE_TIME + 86400 * 30, datetime.timezone.utc)
+        criteria = [({'client': 'Acme Corp.'}, lambda p: p.Client == 'Acme Corp.'),
+                    ({'status': 'WrappedUp', 'target_language': 'ger'},
+                     lambda p: p.ProjectStatus == 'WrappedUp' and 'ger' in p.TargetLanguageCodes),
+                    ({'target_language': 'jpn', 'deadline_before': cutoff},
+                     lambda p: 'jpn' in p.TargetLanguageCodes and p.Deadline < cutoff),
+                    ({'source_language': 'eng', 'deadline_after': cutoff}, lambda p: p.Deadline >= cutoff)]
+        for query, matches in criteria:
+            expected = [project for project in projects if matches(project)]
+            found = self.store.query(**query)
+            self.assertTrue(expected, query)
+            self.assertCountEqual(found, expected)
+            self.assertEqual([project.Deadline for project in found], sorted(project.Deadline for project in expected))
+            self.assertEqual(self.store.count(**query), len(expected))
+            self.assertEqual(self.store.query(limit=3, **query), found[:3])
+
+    def test_target_languages_of_wcf_string_arrays(self):
+        # The fake serializes TargetLanguageCodes as WCF does, with the array namespace declared on the element.
+        with FakeMemoqServer(projects=40) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            project_client = MemoqProjects(soap)
+            self.store.sync(project_client)
+            projects = list(project_client.iter_projects())
+
+        for language in TARGET_LANGUAGES:
+            expected = [str(project['ServerProjectGuid']) for project in projects
+                        if language in project['TargetLanguageCodes']['b:string']]
+            self.assertTrue(expected, language)
+            self.assertCountEqual([str(project.ServerProjectGuid) for project in
+                                   self.store.query(target_language=language)], expected)
+        self.assertEqual(self.store.count(target_language=ARRAYS_NAMESPACE), 0)
+        self.assertEqual(self.store.get(object_guid(3, 2)).TargetLanguageCodes, ('hun', 'jpn', 'ger'))
+
+    def test_projects_without_a_guid_are_skipped(self):
+        projects = [{'Name': 'A'}, {'Name': 'B', 'ServerProjectGuid': None},
+                    {'Name': 'C', 'ServerProjectGuid': object_guid(3, 1)}]
+        with self.assertLogs('src.memoq_project_store', 'WARNING'):
+            self.assertEqual(self.store.upsert(projects), (1, 0, 0))
+
+        self.assertEqual(len(self.store), 1)
+        self.assertIsNone(self.store.get('None'))
+
+    def test_failed_sync_leaves_the_store_unchanged(self):
+        with FakeMemoqServer(projects=100) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            project_client = MemoqProjects(soap)
+            self.store.sync(project_client)
+            server.fake.delete_project(5)
+            server.fake.faults.faults[server.fake.faults.count] = 503
+            with self.assertRaises(mq.MemoqSoapError):
+                self.store.sync(project_client, full=True)
+            self.assertEqual(len(self.store), 100)
+            self.assertFalse(self.store.needs_full_sync())
+            self.assertEqual(self.store.sync(project_client, full=True).deleted, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -43,6 +43,14 @@ class TestMemoqProjects(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertEqual(data, "filtered_project_data")
 
+    def test_list_projects_with_filter_fields(self):
+        self.soap_client.make_soap_request.return_value = (200, [])
+
+        self.project_client.list_projects(filter={'LastChangedAfter': '2023-04-01T10:00:00Z'})
+
+        self.assertEqual(self.soap_client.make_soap_request.call_args.kwargs['filter'],
+                         {'LastChangedAfter': '2023-04-01T10:00:00Z'})
+
     def test_list_project_translation_documents(self):
         # Mock the make_soap_request method to return a tuple (200, "some_data")
         self.soap_client.make_soap_request.return_value = (200, "some_data")
@@ -67,6 +75,23 @@ class TestMemoqProjects(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertEqual(data, "some_data")
 
+    def test_list_documents_for_projects(self):
+        self.soap_client.batch_call.return_value = mq.BatchResult([(200, "a"), (200, "b")], elapsed=0.1)
+
+        batch = self.project_client.list_documents_for_projects(["guid1", "guid2"])
+
+        calls = self.soap_client.batch_call.call_args.args[0]
+        self.assertEqual([call['guid'] for call in calls], ["guid1", "guid2"])
+        self.assertEqual(len(batch), 2)
+
+    def test_iter_projects(self):
+        self.soap_client.iter_soap_request.return_value = iter([{"Name": "a"}, {"Name": "b"}])
+
+        items = list(self.project_client.iter_projects())
+
+        self.assertEqual(items, [{"Name": "a"}, {"Name": "b"}])
+        self.assertEqual(self.soap_client.iter_soap_request.call_args.kwargs['action'], 'ListProjects')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,94 @@
+import datetime
+import unittest
+import uuid
+
+from src import memoq_soap as mq
+from src.memoq_projects import MemoqProjects
+from src.memoq_records import ServerProjectInfo, TMInfo, to_records
+from src.memoq_tm import MemoqTm
+from tests.stub_server import StubSoapServer, soap_response, synthetic_project
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_typed_fields(self):
+        item = mq.MemoqSoap.parse_xml_response(soap_response('ListProjects', synthetic_project(5)),
+                                               'ServerProjectInfo', 'ListProjects')
+        project = to_records(item, 'ServerProjectInfo')
+
+        self.assertIsInstance(project, ServerProjectInfo)
+        self.assertEqual(project.ServerProjectGuid, uuid.UUID('00000005-0000-4000-8000-000000000000'))
+        self.assertEqual(project.CreationTime, datetime.datetime(2023, 4, 6, 10, 0))
+        self.assertEqual(project.TargetLanguageCodes, ('ger', 'fre'))
+        self.assertIsNone(project.Domain)
+        self.assertEqual(project.Name, 'Project 5 – Übersetzung & QA')
+        self.assertIsNone(project.extra)
+
+    def test_records_are_slotted(self):
+        tm = TMInfo.from_dict({'Name': 'a'})
+        self.assertFalse(hasattr(tm, '__dict__'))
+        with self.assertRaises(AttributeError):
+            tm.Unknown = 1
+
+    def test_codes_are_shared_between_records(self):
+        first, second = to_records([{'SourceLanguageCode': ''.join(['en', 'g'])},
+                                    {'SourceLanguageCode': ''.join(['e', 'ng'])}], 'TMInfo')
+        self.assertIs(first.SourceLanguageCode, second.SourceLanguageCode)
+
+    def test_wcf_string_arrays(self):
+        xml = soap_response('ListProjects', '<ServerProjectInfo><TargetLanguageCodes '
+                                            'xmlns:b="http://schemas.microsoft.com/2003/10/Serialization/Arrays">'
+                                            '<b:string>ger</b:string><b:string>fre</b:string></TargetLanguageCodes>'
+                                            '</ServerProjectInfo>')
+        item = mq.MemoqSoap.parse_xml_response(xml, 'ServerProjectInfo', 'ListProjects')
+
+        self.assertEqual(to_records(item, 'ServerProjectInfo').TargetLanguageCodes, ('ger', 'fre'))
+
+    def test_empty_results_build_no_records(self):
+        self.assertEqual(to_records(None, 'TMInfo', listing=True), [])
+        self.assertEqual(to_records([{'Name': 'a'}, None], 'TMInfo'), [TMInfo(Name='a'), None])
+        self.assertEqual(to_records('00000000-0001-4000-8000-000000000000', 'TMInfo'),
+                         '00000000-0001-4000-8000-000000000000')
+
+
+class TestRecordsResultFormat(unittest.TestCase):
+
+    def setUp(self):
+        listing = soap_response('ListProjects', ''.join(synthetic_project(i) for i in range(3)))
+        self.server = StubSoapServer(responder=lambda *args: (200, listing)).start()
+        self.soap = mq.MemoqSoap(self.server.url, "some_key", result_format=mq.RESULT_RECORDS)
+
+    def tearDown(self):
+        self.soap.close()
+        self.server.stop()
+
+    def test_list_projects_returns_records(self):
+        status, projects = MemoqProjects(self.soap).list_projects()
+
+        self.assertEqual(status, 200)
+        self.assertEqual([project.Name.split(' –')[0] for project in projects], ['Project 0', 'Project 1', 'Project 2'])
+
+    def test_empty_listing_is_an_empty_list(self):
+        with StubSoapServer(responder=lambda *args: (200, soap_response('ListTMs', ''))) as server, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as soap:
+            self.assertEqual(MemoqTm(soap).list_tms(), (200, []))
+
+    def test_one_item_listing_is_a_list(self):
+        body = soap_response('ListTMs', '<TMInfo><Guid>00000001-0000-4000-8000-000000000000</Guid><Name>Legal</Name>'
+                                        '</TMInfo>')
+        with StubSoapServer(responder=lambda *args: (200, body)) as server, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as soap:
+            status, tms = MemoqTm(soap).list_tms()
+
+        self.assertEqual([tm.Name for tm in tms], ['Legal'])
+        self.assertIsInstance(tms[0], TMInfo)
+
+    def test_iter_projects_yields_records(self):
+        streamed = list(MemoqProjects(self.soap).iter_projects())
+
+        self.assertEqual(streamed, MemoqProjects(self.soap).list_projects()[1])
+        self.assertIsInstance(streamed[0], ServerProjectInfo)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import io
+import os
+import random
+import re
+import tempfile
+import unittest
+
+from src import memoq_soap as mq
+from src.memoq_replica import TmIndex, TmReplica, build_index, iter_tmx_units, trigrams
+from src.memoq_tm import MemoqTm
+from src.memoq_tmx import write_tmx
+from tests.stub_server import FixedTmxExportResponder, StubSoapServer, soap_response
+
+WORDS = ('contract', 'party', 'agreement', 'shall', 'terminate', 'notice', 'written', 'days', 'the', 'of', 'any',
+         'payment', 'invoice', 'delivery', 'goods', 'liability', 'damages', 'law', 'court', 'within')
+
+
+def sentences(count, seed=7):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) for _ in range(count)]
+
+
+def brute_force(units, text, min_score):
+    grams = trigrams(text)
+    scores = []
+    for number, (source, _) in enumerate(units):
+        unit_grams = trigrams(source)
+        score = 2 * len(grams & unit_grams) / (len(grams) + len(unit_grams))
+        if score >= min_score:
+            scores.append((round(score, 9), number))
+    return sorted(scores, key=lambda item: (-item[0], item[1]))
+
+
+class TestTmIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.units = [(source, f'target {i}') for i, source in enumerate(sentences(500))]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_search_matches_brute_force(self):
+        stats = build_index(self.directory.name, self.units)
+        self.assertEqual(stats.units, 500)
+        queries = sentences(20, seed=11) + [source.upper() + ' extra' for source, _ in self.units[:10]]
+        with TmIndex(self.directory.name) as index:
+            for query in queries:
+                for min_score in (0.5, 0.8):
+                    expected = brute_force(self.units, query, min_score)[:10]
+                    matches = index.search(query, min_score, limit=10)
+                    self.assertEqual([(round(match.score, 9), match.unit) for match in matches], expected)
+                    for match in matches:
+                        self.assertEqual((match.source, match.target), self.units[match.unit])
+
+    def test_runs_are_merged(self):
+        merged = os.path.join(self.directory.name, 'merged')
+        single = os.path.join(self.directory.name, 'single')
+        build_index(merged, self.units, run_units=64)
+        build_index(single, self.units)
+
+        self.assertFalse([name for name in os.listdir(merged) if name.endswith('.tmp')])
+        for name in ('postings.bin', 'offsets.bin', 'lengths.bin', 'text.bin', 'lexicon.json'):
+            with open(os.path.join(merged, name), 'rb') as left, open(os.path.join(single, name), 'rb') as right:
+                self.assertEqual(left.read(), right.read(), name)
+
+    def test_empty_index(self):
+        build_index(self.directory.name, [])
+        with TmIndex(self.directory.name) as index:
+            self.assertEqual((len(index), index.search('anything')), (0, []))
+
+
+class TestTmReplica(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_iter_tmx_units_round_trip(self):
+        units = [('a & b', 'c < d'), ('e', 'f')]
+        tmx = io.BytesIO()
+        write_tmx(tmx, units, 'eng', 'ger')
+        tmx.seek(0)
+        self.assertEqual(list(iter_tmx_units(tmx)), units)
+
+    def test_refresh_from_export_and_lookup(self):
+        units = [(source, source.replace('contract', 'Vertrag')) for source in sentences(300)]
+        units.append(('The contract & the party', 'Der Vertrag & die Partei'))
+        tmx = io.BytesIO()
+        write_tmx(tmx, units, 'eng', 'ger')
+        responder = FixedTmxExportResponder(tmx.getvalue(), chunk_bytes=4096)
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap, \
+                TmReplica(self.directory.name) as replica:
+            stats = replica.refresh(MemoqTm(soap), 'tm-guid')
+            status, result = replica.lookup_segment('the contract & the party!', '', 'tm-guid',
+                                                    {'Options': {'MatchThreshold': 90}})
+            # A second refresh replaces the copy in place.
+            replica.refresh(MemoqTm(soap), 'tm-guid')
+            self.assertEqual(len(replica.index('tm-guid')), 301)
+            missing = replica.lookup_segment('x', '', 'other-guid')
+
+        self.assertEqual(stats.units, 301)
+        self.assertEqual(status, 200)
+        hit = result['TMHits']['TMHit'][0]
+        self.assertEqual(hit['TransUnit'], {'SourceSegment': '<seg>The contract &amp; the party</seg>',
+                                            'TargetSegment': '<seg>Der Vertrag &amp; die Partei</seg>'})
+        self.assertGreaterEqual(int(hit['MatchRate']), 90)
+        self.assertEqual(missing[0], 404)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['tm-guid'])
+
+    def test_refresh_during_a_lookup(self):
+        tmx = io.BytesIO()
+        write_tmx(tmx, [(source, source.upper()) for source in sentences(50)], 'eng', 'ger')
+        responder = FixedTmxExportResponder(tmx.getvalue(), chunk_bytes=4096)
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap, \
+                TmReplica(self.directory.name) as replica:
+            replica.refresh(MemoqTm(soap), 'tm-guid')
+            with replica._reading('tm-guid') as index:
+                # The copy is replaced while a lookup still reads the old index, which stays open until then.
+                replica.refresh(MemoqTm(soap), 'tm-guid')
+                self.assertTrue(index.retired)
+                self.assertEqual(len(index.search(index.unit(0)[0], 0.9, 1)), 1)
+            self.assertEqual(index._maps, [])
+            self.assertIsNot(replica.index('tm-guid'), index)
+            self.assertEqual(replica.lookup_segment('x', '', 'tm-guid')[0], 200)
+
+
+class TmServer:
+    """ Serves GetTMInfo and the chunked TMX export of several TMs, which tests can change between syncs. """
+
+    def __init__(self, count):
+        self.tms = {}
+        self.exports = []
+        for number in range(count):
+            self.change(f'tm-{number}', [(f'segment {number} {i}', f'target {i}') for i in range(50)])
+
+    def change(self, guid, units, modified='2023-04-01T10:00:00Z'):
+        tmx = io.BytesIO()
+        write_tmx(tmx, units, 'eng', 'ger')
+        self.tms[guid] = (modified, len(units), FixedTmxExportResponder(tmx.getvalue(), chunk_bytes=2048))
+
+    def __call__(self, path, soap_action, body):
+        action = soap_action.rsplit('/', 1)[-1]
+        guid = re.search(rb'<tmGuid>(.*?)</tmGuid>', body)
+        if guid is not None:
+            guid = guid.group(1).decode()
+            if guid not in self.tms:
+                return 500, b'no such TM'
+            modified, entries, responder = self.tms[guid]
+            if action == 'GetTMInfo':
+                return 200, soap_response(action, f'<Guid>{guid}</Guid><LastModified>{modified}</LastModified>'
+                                                  f'<NumEntries>{entries}</NumEntries>')
+            self.exports.append(guid)
+            return responder(path, soap_action, body)
+        session = body.split(b'<sessionId>', 1)[1].split(b'</sessionId>', 1)[0].decode()
+        for _, _, responder in self.tms.values():
+            if session in responder.offsets:
+                return responder(path, soap_action, body)
+        return 500, b'unknown session'
+
+
+class TestTmReplicaSync(unittest.TestCase):
+
+    def test_only_changed_tms_are_exported(self):
+        tms = TmServer(6)
+        guids = sorted(tms.tms) + ['missing']
+        with tempfile.TemporaryDirectory() as directory, StubSoapServer(responder=tms) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap, TmReplica(directory) as replica:
+            tm_client = MemoqTm(soap)
+            first = replica.sync(tm_client, guids, max_workers=3)
+            tms.exports.clear()
+            tms.change('tm-2', [('a new segment', 'ein neues Segment')] + [(f'segment 2 {i}', 't') for i in range(50)],
+                       modified='2023-04-02T10:00:00Z')
+            second = replica.sync(tm_client, guids, max_workers=3)
+            status, result = replica.lookup_segment('a new segment', '', 'tm-2')
+            forced = replica.sync(tm_client, ['tm-0'], force=True)
+
+        self.assertEqual((sorted(first.refreshed), first.skipped, list(first.failed)), (guids[:-1], [], ['missing']))
+        self.assertEqual(first.bytes_moved, first.full_export_bytes)
+        self.assertEqual(second.refreshed, ['tm-2'])
+        self.assertEqual(sorted(second.skipped), [guid for guid in guids[:-1] if guid != 'tm-2'])
+        self.assertEqual(sorted(set(tms.exports)), ['tm-0', 'tm-2'])
+        self.assertEqual(second.bytes_moved, len(tms.tms['tm-2'][2].tmx))
+        self.assertGreater(second.full_export_bytes, 5 * second.bytes_moved)
+        self.assertGreater(second.saved_fraction, 0.8)
+        self.assertEqual(result['TMHits']['TMHit'][0]['MatchRate'], '100')
+        self.assertEqual(forced.refreshed, ['tm-0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+import unittest
+from functools import partial
+
+import requests
+
+from src.memoq_resilience import AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, Resilience, RetryPolicy
+from src.memoq_soap import MemoqSoap
+from src.memoq_tm import MemoqTm
+from tests.stub_server import FaultInjector, StubSoapServer, soap_response
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 9))
+        self.now += seconds
+
+
+class Response:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_backoff_is_exponential_with_full_jitter(self):
+        jitter = iter([0.5, 0.25, 1.0, 0.0])
+        policy = RetryPolicy(base_delay=2, max_delay=10, random=lambda: next(jitter))
+
+        self.assertEqual([policy.delay(attempt) for attempt in range(4)], [1.0, 1.0, 8.0, 0.0])
+
+    def test_retry_after_is_honoured(self):
+        clock = FakeClock()
+        resilience = Resilience(RetryPolicy(max_delay=60), rate_limiter=None, sleep=clock.sleep)
+        answers = iter([Response(429, {'Retry-After': '7'}), Response(200)])
+
+        self.assertEqual(resilience.call('http://memoq/tm', 'ListTMs', lambda: next(answers)).status_code, 200)
+        self.assertEqual(clock.sleeps, [7.0])
+
+    def test_only_idempotent_actions_get_several_attempts(self):
+        policy = RetryPolicy(max_attempts=5)
+        self.assertEqual([policy.attempts_for(action) for action in ('ListProjects', 'GetTMInfo', 'LookupSegment',
+                                                                     'Concordance', 'GetNextTMXChunk', 'CreateTM')],
+                         [5, 5, 5, 5, 1, 1])
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = AdaptiveRateLimiter(rate=10, burst=2, min_rate=1, cooldown=1, clock=self.clock,
+                                           sleep=self.clock.sleep)
+
+    def test_tokens_are_spaced_by_the_rate(self):
+        waits = [self.limiter.acquire() for _ in range(5)]
+        self.assertEqual(waits, [0.0, 0.0, 0.1, 0.1, 0.1])
+
+    def test_aimd(self):
+        self.limiter.record(429)
+        self.limiter.record(503)
+        self.assertEqual((self.limiter.rate, self.limiter.decreases), (5.0, 1))
+
+        self.clock.now += 1
+        self.limiter.record(None)
+        self.assertEqual(self.limiter.rate, 2.5)
+        for _ in range(10):
+            self.limiter.record(200)
+        self.assertGreater(self.limiter.rate, 5.0)
+
+        self.clock.now += 100
+        for _ in range(100):
+            self.limiter.record(429)
+            self.clock.now += 1
+        self.assertEqual(self.limiter.rate, 1)
+
+    def test_rising_latency_backs_off(self):
+        for _ in range(20):
+            self.limiter.record(200, 0.05)
+        rate = self.limiter.rate
+        for _ in range(10):
+            self.limiter.record(200, 0.5)
+
+        self.assertLess(self.limiter.rate, rate)
+        self.assertEqual(self.limiter.decreases, 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_half_open_closed(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+        for _ in range(2):
+            breaker.record_failure()
+        breaker.record_success()
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        clock.now = 30
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            # Only one probe at a time.
+            breaker.before_call()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        clock.now = 60
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_probe_raising_an_error_does_not_wedge_the_circuit(self):
+        clock = FakeClock()
+        limiter = AdaptiveRateLimiter(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+        resilience = Resilience(retry=RetryPolicy(random=lambda: 0.0), rate_limiter=lambda: limiter,
+                                circuit_breaker=lambda: breaker, clock=clock, sleep=clock.sleep)
+        breaker.record_failure()
+        clock.now = 30
+
+        def broken():
+            raise KeyError('TMInfo')
+        with self.assertRaises(KeyError):
+            resilience.call('http://memoq/tm', 'ListTMs', broken)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(resilience.stats.attempts, 1)
+
+        # The next call probes again, without waiting for the token the failed one took.
+        self.assertEqual(resilience.call('http://memoq/tm', 'ListTMs', lambda: (200, 'ok')), (200, 'ok'))
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(clock.sleeps, [])
+
+
+def tm_responder(path, soap_action, body):
+    action = soap_action.rsplit('/', 1)[-1]
+    if action == 'DeleteTM':
+        return 200, soap_response(action, None)
+    return 200, soap_response(action, '<TMInfo><Name>Legal</Name></TMInfo>')
+
+
+class TestMemoqSoapResilience(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def client(self, server, **kwargs):
+        kwargs.setdefault('retry', RetryPolicy(max_attempts=4, base_delay=0.1, random=lambda: 1.0))
+        kwargs.setdefault('rate_limiter', None)
+        resilience = Resilience(sleep=self.clock.sleep, **kwargs)
+        return MemoqSoap(server.url, "some_key", resilience=resilience)
+
+    def test_transient_faults_are_retried(self):
+        faults = FaultInjector(tm_responder, faults={0: 503, 1: 'disconnect', 2: 502})
+        with StubSoapServer(responder=faults) as server, self.client(server) as soap:
+            status, data = MemoqTm(soap).list_tms()
+
+        self.assertEqual((status, data), (200, {'Name': 'Legal'}))
+        self.assertEqual(self.clock.sleeps, [0.1, 0.2, 0.4])
+        self.assertEqual((soap.resilience.stats.attempts, soap.resilience.stats.retries), (4, 3))
+
+    def test_attempts_run_out(self):
+        faults = FaultInjector(tm_responder, fault=lambda number: 503)
+        with StubSoapServer(responder=faults) as server, self.client(server) as soap:
+            self.assertEqual(MemoqTm(soap).get_tm_info('g')[0], 503)
+        faults = FaultInjector(tm_responder, fault=lambda number: 'disconnect')
+        with StubSoapServer(responder=faults) as server, self.client(server) as soap:
+            with self.assertRaises(requests.ConnectionError):
+                MemoqTm(soap).get_tm_info('g')
+
+        self.assertEqual(faults.count, 4)
+        self.assertEqual(soap.resilience.stats.gave_up, 1)
+
+    def test_writes_are_not_retried(self):
+        faults = FaultInjector(tm_responder, faults={0: 503})
+        with StubSoapServer(responder=faults) as server, self.client(server) as soap:
+            self.assertEqual(MemoqTm(soap).delete_tm('g')[0], 503)
+            self.assertEqual(MemoqTm(soap).delete_tm('g')[0], 200)
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_streamed_listing_is_retried_before_the_first_item(self):
+        faults = FaultInjector(tm_responder, faults={0: 504})
+        with StubSoapServer(responder=faults) as server, self.client(server) as soap:
+            items = list(MemoqTm(soap).iter_tms())
+
+        self.assertEqual(items, [{'Name': 'Legal'}])
+        self.assertEqual(faults.count, 2)
+
+    def test_circuit_fails_fast_while_the_server_is_down(self):
+        down = [True]
+        faults = FaultInjector(tm_responder, fault=lambda number: 503 if down[0] else None)
+        breaker = partial(CircuitBreaker, failure_threshold=3, reset_timeout=30, clock=self.clock)
+        with StubSoapServer(responder=faults) as server, \
+                self.client(server, retry=RetryPolicy(max_attempts=1), circuit_breaker=breaker) as soap:
+            tm_client = MemoqTm(soap)
+            statuses = [tm_client.list_tms()[0] for _ in range(3)]
+            for _ in range(5):
+                with self.assertRaises(CircuitOpenError):
+                    tm_client.list_tms()
+            sent_while_open = faults.count
+
+            down[0] = False
+            self.clock.now += 30
+            recovered = tm_client.list_tms()[0]
+
+        self.assertEqual(statuses, [503] * 3)
+        self.assertEqual(sent_while_open, 3)
+        self.assertEqual(recovered, 200)
+        self.assertEqual(soap.resilience.stats.short_circuited, 5)
+
+    def test_rate_limiter_backs_off_on_throttling(self):
+        faults = FaultInjector(tm_responder, faults={2: 429, 3: 429})
+        limiter = partial(AdaptiveRateLimiter, rate=100, burst=1, cooldown=0, clock=self.clock, sleep=self.clock.sleep)
+        with StubSoapServer(responder=faults) as server, \
+                self.client(server, retry=RetryPolicy(max_attempts=3, random=lambda: 0.0), rate_limiter=limiter) as soap:
+            for _ in range(3):
+                self.assertEqual(MemoqTm(soap).list_tms()[0], 200)
+            limiter = soap.resilience.server(server.url)[0]
+
+        self.assertEqual(limiter.decreases, 2)
+        self.assertLess(limiter.rate, 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
+import json
+import logging
+import re
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch
 import requests
-from src.memoq_soap import MemoqSoap
+from src.memoq_soap import MemoqSoap, RESULT_JSON
+from tests.stub_server import StubSoapServer, soap_response
 
 
 class TestMemoqSoap(unittest.TestCase):
@@ -19,7 +24,7 @@ class TestMemoqSoap(unittest.TestCase):
         expected = '<template><soap:Body><ListTMs xmlns="some_namespace"></ListTMs></soap:Body></template>'
         self.assertEqual(result, expected)
 
-    @patch('requests.request')
+    @patch('requests.Session.request')
     def test_make_soap_request(self, mock_request):
         mock_response = requests.Response()
         mock_response.status_code = 200
@@ -31,11 +36,124 @@ class TestMemoqSoap(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertIsNotNone(data)
 
+    @patch('requests.Session.request')
+    def test_make_soap_request_result_formats(self, mock_request):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = b'<s:Envelope><s:Body><ListTMsResponse><ListTMsResult><TMInfo><Name>a</Name></TMInfo><TMInfo><Name>b</Name></TMInfo></ListTMsResult></ListTMsResponse></s:Body></s:Envelope>'
+        mock_request.return_value = mock_response
+
+        route = '/memoqservices/tm/TMService'
+        _, native = self.soap_client.make_soap_request(route=route, interface="ITMService", memoq_type="TMInfo", action="ListTMs")
+        json_client = MemoqSoap("some_url", "some_key", result_format=RESULT_JSON)
+        _, json_data = json_client.make_soap_request(route=route, interface="ITMService", memoq_type="TMInfo", action="ListTMs")
+
+        self.assertEqual(native, [{'Name': 'a'}, {'Name': 'b'}])
+        self.assertEqual(json.loads(json_data), native)
+
+    def test_unknown_result_format(self):
+        with self.assertRaises(ValueError):
+            MemoqSoap("some_url", "some_key", result_format="xml")
+
     def test_parse_xml_response(self):
         xml = '<s:Envelope><s:Body><ListTMsResponse><ListTMsResult><TMInfo>list</TMInfo></ListTMsResult></ListTMsResponse></s:Body></s:Envelope>'
         result = self.soap_client.parse_xml_response(xml, "TMInfo", "ListTMs")
         self.assertEqual(result, "list")
 
 
+def echo_responder(path, soap_action, body):
+    """ Echo back the SOAPAction header, the body's action element and its tmGuid parameter. """
+    header_action = soap_action.rsplit('/', 1)[-1]
+    body_action = re.search(rb'<soap:Body><(\w+) ', body).group(1).decode()
+    guid = re.search(rb'<tmGuid>(.*?)</tmGuid>', body).group(1).decode()
+    item = f'<Item><HeaderAction>{header_action}</HeaderAction><BodyAction>{body_action}</BodyAction><Guid>{guid}</Guid></Item>'
+    return 200, soap_response(header_action, item)
+
+
+class TestMemoqSoapThreadSafety(unittest.TestCase):
+
+    def test_shared_client_does_not_cross_calls(self):
+        actions = ['ListTMs', 'ListTBs', 'ListProjects', 'GetTMInfo2']
+        calls = [(actions[i % len(actions)], f'guid-{i}') for i in range(400)]
+
+        def call(action, guid):
+            return soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                          memoq_type='Item', action=action, tmGuid=guid)
+
+        with StubSoapServer(responder=echo_responder) as server, MemoqSoap(server.url, "some_key") as soap:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(lambda c: call(*c), calls))
+
+        for (action, guid), result in zip(calls, results):
+            self.assertEqual(result.status, 200)
+            self.assertEqual(result.data, {'HeaderAction': action, 'BodyAction': action, 'Guid': guid})
+            self.assertTrue(result.soap_action.endswith(f'/ITMService/{action}'))
+
+    def test_last_response_is_opt_in(self):
+        with StubSoapServer(responder=echo_responder) as server:
+            soap = MemoqSoap(server.url, "some_key")
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='Item', action='ListTMs', tmGuid='g')
+            self.assertIsNone(soap.response)
+
+            soap = MemoqSoap(server.url, "some_key", keep_last_response=True)
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='Item', action='ListTMs', tmGuid='g')
+            self.assertEqual(soap.response_status_code, 200)
+            self.assertIn(b'<tmGuid>g</tmGuid>', soap.payload)
+
+
+class TestMemoqSoapTracing(unittest.TestCase):
+
+    def test_wire_dump_is_scoped_to_one_client_and_redacts_the_api_key(self):
+        with StubSoapServer(responder=echo_responder) as server:
+            quiet = MemoqSoap(server.url, "quiet_key")
+            dumping = MemoqSoap(server.url, "secret_key", wire_dump=True)
+            with self.assertLogs('src.memoq_soap.wire', level=logging.DEBUG) as logs:
+                for soap in (quiet, dumping):
+                    soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                           memoq_type='Item', action='ListTMs', tmGuid='g')
+
+        output = '\n'.join(logs.output)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('<tmGuid>g</tmGuid>', output)
+        self.assertNotIn('secret_key', output)
+        self.assertNotIn('quiet_key', output)
+
+    def test_global_logging_is_left_alone(self):
+        root = logging.getLogger()
+        level, handlers = root.level, list(root.handlers)
+        with StubSoapServer() as server, MemoqSoap(server.url, "some_key", wire_dump=True) as soap:
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='TMInfo', action='ListTMs')
+        self.assertEqual((root.level, root.handlers), (level, handlers))
+
+
+class TestMemoqSoapBatchCall(unittest.TestCase):
+
+    def test_batch_call_keeps_order_and_collects_errors(self):
+        def responder(path, soap_action, body):
+            guid = re.search(rb'<tmGuid>(.*?)</tmGuid>', body).group(1).decode()
+            if guid.endswith('3'):
+                return 500, b'no such TM'
+            return 200, soap_response('GetTMInfo', f'<Guid>{guid}</Guid>')
+
+        calls = [dict(route='memoqservices/tm/TMService', interface='ITMService', memoq_type='TMInfo',
+                      action='GetTMInfo', tmGuid=f'guid-{i}') for i in range(20)]
+        calls.insert(5, dict(route='memoqservices/tm/TMService', interface='ITMService', memoq_type='TMInfo',
+                             action='NoSuchParser', tmGuid='guid-x'))
+
+        with StubSoapServer(responder=responder) as server, MemoqSoap(server.url, "some_key") as soap:
+            batch = soap.batch_call(calls, max_workers=4)
+
+        self.assertEqual(len(batch), 21)
+        self.assertIsInstance(batch[5], KeyError)
+        self.assertEqual(batch[0], (200, {'Guid': 'guid-0'}))
+        self.assertEqual(batch[20].data, {'Guid': 'guid-19'})
+        self.assertEqual([index for index, _ in batch.errors], [3, 5, 14])
+        self.assertEqual((batch.succeeded, batch.failed), (18, 3))
+        self.assertGreater(batch.calls_per_second, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
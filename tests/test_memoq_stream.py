@@ -0,0 +1,139 @@
+import tracemalloc
+import unittest
+
+import xmltodict
+
+from src import memoq_soap as mq
+from src.memoq_cache import ResponseCache
+from src.memoq_projects import MemoqProjects
+from src.memoq_stream import iter_items, parse_projected
+from src.memoq_tm import MemoqTm
+from tests.fake_memoq import FakeMemoqServer
+from tests.stub_server import StubSoapServer, soap_response, streamed_soap_response, synthetic_project
+
+LISTING = soap_response('ListProjects', ''.join(synthetic_project(i) for i in range(50)) +
+                        '<ServerProjectInfo/><ServerProjectInfo a="1">text<Name>n</Name></ServerProjectInfo>')
+
+
+class TestIterItems(unittest.TestCase):
+
+    def test_items_match_parse_xml_response(self):
+        expected = mq.MemoqSoap.parse_xml_response(LISTING.decode(), 'ServerProjectInfo', 'ListProjects')
+
+        self.assertEqual(list(iter_items([LISTING], 'ServerProjectInfo')), expected)
+
+    def test_chunk_boundaries_do_not_matter(self):
+        expected = list(iter_items([LISTING], 'ServerProjectInfo'))
+        one_byte_chunks = (LISTING[i:i + 1] for i in range(len(LISTING)))
+
+        self.assertEqual(list(iter_items(one_byte_chunks, 'ServerProjectInfo')), expected)
+
+    def test_other_elements_are_skipped(self):
+        xml = soap_response('ListTMs', '<TMInfo><TMInfo>nested</TMInfo></TMInfo><Other>x</Other>')
+        self.assertEqual(list(iter_items([xml], 'TMInfo')), [{'TMInfo': 'nested'}])
+
+
+class TestProjection(unittest.TestCase):
+
+    def test_projected_items_are_the_full_items_cut_down(self):
+        fields = {'Name', 'ServerProjectGuid', 'Domain', 'TargetLanguageCodes/string', 'Missing'}
+        full = list(iter_items([LISTING], 'ServerProjectInfo'))
+        projected = list(iter_items([LISTING], 'ServerProjectInfo', fields=fields))
+
+        top = {field.split('/')[0] for field in fields}
+        expected = [{key: value for key, value in item.items() if key in top or key[0] in '@#'}
+                    if isinstance(item, dict) else item for item in full]
+        self.assertEqual(projected, expected)
+        self.assertEqual(projected[0]['Domain'], {'@i:nil': 'true', '@xmlns:i': 'http://www.w3.org/2001/XMLSchema-instance'})
+
+    def test_prefixed_fields_keep_their_names(self):
+        xml = soap_response('ListProjects', '<ServerProjectInfo><a:Name xmlns:a="urn:a">P</a:Name><TargetLanguageCodes '
+                                            'xmlns:b="http://schemas.microsoft.com/2003/10/Serialization/Arrays">'
+                                            '<b:string>ger</b:string><b:string>fre</b:string></TargetLanguageCodes>'
+                                            '<Domain>Legal</Domain></ServerProjectInfo>')
+        full = mq.MemoqSoap.parse_xml_response(xml, 'ServerProjectInfo', 'ListProjects')
+
+        projected = parse_projected(xml, 'ServerProjectInfo', 'ListProjects', {'Name', 'TargetLanguageCodes/string'})
+        self.assertEqual(projected, {key: full[key] for key in ('a:Name', 'TargetLanguageCodes')})
+        self.assertEqual(projected['TargetLanguageCodes']['b:string'], ['ger', 'fre'])
+
+    def test_nested_paths_keep_only_their_branch(self):
+        xml = soap_response('GetEntry', '<Id>7</Id><Languages><TBLanguage><Language>eng</Language><TermItems>'
+                                        '<TBTerm><Text>a</Text></TBTerm></TermItems></TBLanguage><TBLanguage>'
+                                        '<Language>ger</Language></TBLanguage></Languages>')
+
+        self.assertEqual(parse_projected(xml, 'TBEntry', 'GetEntry', {'Id', 'Languages/TBLanguage/Language'}),
+                         {'Id': '7', 'Languages': {'TBLanguage': [{'Language': 'eng'}, {'Language': 'ger'}]}})
+        # A path that ends at an element keeps all of it, whatever longer paths go through it.
+        full = mq.MemoqSoap.parse_xml_response(xml, 'TBEntry', 'GetEntry')
+        self.assertEqual(parse_projected(xml, 'TBEntry', 'GetEntry', {'Languages', 'Languages/TBLanguage/Language'}),
+                         {'Languages': full['Languages']})
+
+    def test_results_keep_the_shapes_of_parse_xml_response(self):
+        responses = {'many': soap_response('ListTMs', '<TMInfo><Name>a</Name><Guid>1</Guid></TMInfo>'
+                                                      '<TMInfo><Name>b</Name><Guid>2</Guid></TMInfo>'),
+                     'one': soap_response('ListTMs', '<TMInfo><Name>a</Name><Guid>1</Guid></TMInfo>'),
+                     'none': soap_response('ListTMs', '')}
+        for name, xml in responses.items():
+            full = mq.MemoqSoap.parse_xml_response(xml, 'TMInfo', 'ListTMs')
+            projected = mq.MemoqSoap.parse_xml_response(xml, 'TMInfo', 'ListTMs', projection={'Guid'})
+            if full is None:
+                self.assertIsNone(projected, name)
+            elif isinstance(full, list):
+                self.assertEqual(projected, [{'Guid': item['Guid']} for item in full], name)
+            else:
+                self.assertEqual(projected, {'Guid': full['Guid']}, name)
+
+    def test_facades_project_listings_and_cache_projections_apart(self):
+        with FakeMemoqServer(projects=30, tms=3) as server, \
+                mq.MemoqSoap(server.url, "some_key", cache=ResponseCache(ttls={'ListTMs': 60})) as soap, \
+                mq.MemoqSoap(server.url, "some_key", result_format=mq.RESULT_RECORDS) as records:
+            projects = MemoqProjects(soap).list_projects()[1]
+            named = MemoqProjects(soap).list_projects(projection=['ServerProjectGuid', 'Name'])[1]
+            streamed = list(MemoqProjects(records).iter_projects(projection={'ServerProjectGuid'}))
+            tm_client = MemoqTm(soap)
+            guids = tm_client.list_tms(projection={'Guid'})[1]
+            tms = tm_client.list_tms()[1]
+            info = tm_client.get_tm_info(guids[0]['Guid'], projection={'Name', 'NumEntries'})[1]
+
+        self.assertEqual(named, [{'ServerProjectGuid': project['ServerProjectGuid'], 'Name': project['Name']}
+                                 for project in projects])
+        self.assertEqual([str(project.ServerProjectGuid) for project in streamed],
+                         [project['ServerProjectGuid'] for project in projects])
+        self.assertIsNone(streamed[0].Name)
+        self.assertEqual(guids, [{'Guid': tm['Guid']} for tm in tms])
+        self.assertEqual(info, {'Name': tms[0]['Name'], 'NumEntries': tms[0]['NumEntries']})
+
+
+class TestIterSoapRequest(unittest.TestCase):
+
+    def test_iter_projects_streams_with_flat_memory(self):
+        count = 20000
+
+        def responder(path, soap_action, body):
+            return 200, streamed_soap_response('ListProjects', (synthetic_project(i) for i in range(count)))
+
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tracemalloc.start()
+            seen = 0
+            for project in MemoqProjects(soap).iter_projects():
+                self.assertEqual(project['Name'], f'Project {seen} – Übersetzung & QA')
+                seen += 1
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.assertEqual(seen, count)
+        # The response is ~10 MB; the parser only ever holds a chunk and one record.
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+    def test_error_status_raises(self):
+        with StubSoapServer(responder=lambda *args: (500, b'fault')) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            with self.assertRaises(mq.MemoqSoapError) as error:
+                list(MemoqProjects(soap).iter_projects())
+
+        self.assertEqual(error.exception.status_code, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
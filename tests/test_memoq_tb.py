@@ -1,7 +1,13 @@
+import base64
+import codecs
+import io
+import re
 import unittest
+import uuid
 from unittest.mock import Mock
 
 from src import memoq_soap as mq, memoq_tb as tb  # Assuming you've created memoq_tb.py
+from tests.stub_server import StubSoapServer, soap_response
 
 
 class TestMemoqTb(unittest.TestCase):
@@ -22,6 +28,92 @@ class TestMemoqTb(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertEqual(data, "term_base_data")
 
+    def test_iter_tbs(self):
+        self.soap_client.iter_soap_request.return_value = iter([{"Name": "a"}, {"Name": "b"}])
+
+        items = list(self.tb_client.iter_tbs())
+
+        self.assertEqual(items, [{"Name": "a"}, {"Name": "b"}])
+        self.assertEqual(self.soap_client.iter_soap_request.call_args.kwargs['action'], 'ListTBs')
+
+    def test_get_entries(self):
+        self.soap_client.batch_call.return_value = mq.BatchResult([(200, "a"), (200, "b")], elapsed=0.1)
+
+        self.tb_client.get_entries('tb-1', [3, 4])
+
+        calls = self.soap_client.batch_call.call_args.args[0]
+        self.assertEqual([(call['action'], call['tbGuid'], call['entryId']) for call in calls],
+                         [('GetEntry', 'tb-1', 3), ('GetEntry', 'tb-1', 4)])
+
+
+class CsvExportResponder:
+    """ Serves term base CSV exports in chunks of chunk_bytes. """
+
+    def __init__(self, exports, chunk_bytes=64):
+        self.exports = exports
+        self.chunk_bytes = chunk_bytes
+        self.sessions = {}
+        self.ended = []
+
+    def __call__(self, path, soap_action, body):
+        action = soap_action.rsplit('/', 1)[-1]
+        if action == 'BeginChunkedCSVExport':
+            guid = re.search(rb'<tbGuid>(.*?)</tbGuid>', body).group(1).decode()
+            if guid not in self.exports:
+                return 500, b'no such TB'
+            session = str(uuid.uuid4())
+            self.sessions[session] = [guid, 0]
+            return 200, soap_response(action, session)
+        session = re.search(rb'<sessionId>(.*?)</sessionId>', body).group(1).decode()
+        if action == 'EndChunkedCSVExport':
+            self.ended.append(session)
+            return 200, soap_response(action, None)
+        guid, offset = self.sessions[session]
+        data = self.exports[guid][offset:offset + self.chunk_bytes]
+        self.sessions[session][1] += len(data)
+        return 200, soap_response(action, base64.b64encode(data).decode() if data else None)
+
+
+def csv_export(rows):
+    return codecs.BOM_UTF16_LE + '\r\n'.join('\t'.join(row) for row in rows).encode('utf-16-le')
+
+
+class TestMemoqTbExport(unittest.TestCase):
+
+    def setUp(self):
+        self.exports = {
+            'tb-1': csv_export([['Entry_ID', 'English', 'German'], ['1', 'notice period', 'Kündigungsfrist'],
+                                ['2', 'party', 'Partei']] + [[str(i), f'term {i}', f'Term {i}'] for i in range(3, 40)]),
+            'tb-2': csv_export([['Entry_ID', 'German', 'English'], ['1', 'Partei', 'party'], ['2', 'Vertrag', 'contract']]),
+        }
+
+    def test_export_csv(self):
+        responder = CsvExportResponder(self.exports)
+        out = io.BytesIO()
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            progress = tb.MemoqTb(soap).export_csv('tb-1', out)
+
+        self.assertEqual(out.getvalue(), self.exports['tb-1'])
+        self.assertGreater(progress.chunks, 10)
+        self.assertEqual(len(responder.ended), 1)
+
+    def test_export_error_ends_the_session(self):
+        responder = CsvExportResponder(self.exports)
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            with self.assertRaises(mq.MemoqSoapError):
+                tb.MemoqTb(soap).export_csv('missing', io.BytesIO())
+
+    def test_load_term_index_and_scan(self):
+        responder = CsvExportResponder(self.exports)
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            index = tb.MemoqTb(soap).load_term_index(['tb-1', 'tb-2'], 'English', 'German')
+
+        self.assertEqual(len(index), 41)
+        hits = index.scan('Each Party must respect the notice period.')
+        self.assertEqual([(hit.term, hit.entry.tb, hit.entry.target_terms) for hit in hits],
+                         [('party', 'tb-1', ('Partei',)), ('party', 'tb-2', ('Partei',)),
+                          ('notice period', 'tb-1', ('Kündigungsfrist',))])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+import codecs
+import io
+import unittest
+
+from src.memoq_terms import TermIndex, iter_csv_entries
+
+
+def csv_export(rows, encoding='utf-16-le', bom=codecs.BOM_UTF16_LE, delimiter='\t'):
+    lines = [delimiter.join(row) for row in rows]
+    return io.BytesIO(bom + '\r\n'.join(lines).encode(encoding))
+
+
+class TestCsvEntries(unittest.TestCase):
+
+    def test_encodings_and_delimiters(self):
+        rows = [['Entry_ID', 'English', 'English_Def', 'German', 'German'], ['7', 'notice', 'def', 'Mitteilung', 'Kündigung']]
+        expected = [('7', ('notice',), ('Mitteilung', 'Kündigung'))]
+        for stream in (csv_export(rows), csv_export(rows, 'utf-8', codecs.BOM_UTF8, ';'),
+                       csv_export(rows, 'utf-8', b'', ',')):
+            self.assertEqual(list(iter_csv_entries(stream, 'english', 'German')), expected)
+
+    def test_quoted_fields(self):
+        stream = io.BytesIO(b'English,German\n"terms, conditions",AGB\n')
+        self.assertEqual(list(iter_csv_entries(stream, 'English', 'German')), [(None, ('terms, conditions',), ('AGB',))])
+
+
+class TestTermIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.entries = [('1', ('notice period', 'notice'), ('Kündigungsfrist', 'Kündigung')),
+                        ('2', ('period',), ('Frist',)),
+                        ('3', ("third-party claim",), ('Drittanspruch',)),
+                        ('4', ('period of notice',), ('Kündigungsfrist',))]
+
+    def test_all_occurrences_are_found(self):
+        index = TermIndex()
+        self.assertEqual(index.add_entries(self.entries, tb='tb-1'), 5)
+
+        hits = index.scan('The Notice Period of notice periods; a THIRD-PARTY claim.')
+
+        found = [(hit.start, hit.end, hit.term, hit.entry.id) for hit in hits]
+        self.assertEqual(found, [(4, 10, 'notice', '1'), (4, 17, 'notice period', '1'), (11, 17, 'period', '2'),
+                                 (11, 27, 'period of notice', '4'), (21, 27, 'notice', '1'),
+                                 (39, 56, 'third-party claim', '3')])
+        self.assertEqual({hit.entry.tb for hit in hits}, {'tb-1'})
+
+    def test_case_folding_and_stemming_are_optional(self):
+        exact = TermIndex(casefold=False)
+        exact.add_entries(self.entries)
+        stemmed = TermIndex(stemmer=lambda word: word[:-1] if word.endswith('s') else word)
+        stemmed.add_entries(self.entries)
+
+        self.assertEqual([hit.term for hit in exact.scan('Notice periods')], [])
+        self.assertEqual([hit.term for hit in stemmed.scan('Notice periods')], ['notice', 'notice period', 'period'])
+
+    def test_failure_links_follow_partial_matches(self):
+        index = TermIndex()
+        index.add_entries([(None, ('a b c',), ('x',)), (None, ('b c d',), ('y',)), (None, ('c',), ('z',))])
+
+        self.assertEqual([hit.term for hit in index.scan('a b c d a b')], ['a b c', 'c', 'b c d'])
+
+    def test_scan_many_reports_segments_with_hits(self):
+        index = TermIndex()
+        index.add_entries(self.entries)
+        index.add_entries([('5', ('period',), ('Zeitraum',))], tb='tb-2')
+
+        results = list(index.scan_many(['nothing here', 'a period', '', 'notice']))
+
+        self.assertEqual([number for number, _ in results], [1, 3])
+        self.assertEqual([hit.entry.target_terms for hit in results[0][1]], [('Frist',), ('Zeitraum',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
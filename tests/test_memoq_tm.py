@@ -1,7 +1,17 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import tracemalloc
 import unittest
 from unittest.mock import Mock
 
 from src import memoq_soap as mq, memoq_tm as tm
+from src.memoq_cache import ResponseCache
+from tests.stub_server import (Disconnect, FixedTmxExportResponder, StubSoapServer, TmxExportResponder,
+                               TmxImportResponder, soap_response)
 
 
 class TestMemoqTm(unittest.TestCase):
@@ -22,6 +32,449 @@ class TestMemoqTm(unittest.TestCase):
         self.assertEqual(status, 200)
         self.assertEqual(data, "some_data")
 
+    def test_get_tm_info_many(self):
+        self.soap_client.batch_call.return_value = mq.BatchResult([(200, "a"), (200, "b")], elapsed=0.1)
+
+        batch = self.tm_client.get_tm_info_many(["guid1", "guid2"], max_workers=2)
+
+        calls = self.soap_client.batch_call.call_args.args[0]
+        self.assertEqual([call['tmGuid'] for call in calls], ["guid1", "guid2"])
+        self.assertEqual({call['action'] for call in calls}, {'GetTMInfo'})
+        self.assertEqual(list(batch), [(200, "a"), (200, "b")])
+
+    def test_iter_tms(self):
+        self.soap_client.iter_soap_request.return_value = iter([{"Name": "a"}, {"Name": "b"}])
+
+        items = list(self.tm_client.iter_tms())
+
+        self.assertEqual(items, [{"Name": "a"}, {"Name": "b"}])
+        self.assertEqual(self.soap_client.iter_soap_request.call_args.kwargs['action'], 'ListTMs')
+
+
+class FailingFile(io.BytesIO):
+
+    def write(self, data):
+        raise OSError('disk full')
+
+
+class TestMemoqTmExport(unittest.TestCase):
+
+    def export(self, responder, out, **kwargs):
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            return tm.MemoqTm(soap).export_tmx('tm-guid', out, **kwargs)
+
+    def test_export_reproduces_the_tm(self):
+        for prefetch in (0, 2):
+            responder = TmxExportResponder(total_bytes=350_000, chunk_bytes=100_000)
+            out = io.BytesIO()
+            seen = []
+
+            stats = self.export(responder, out, prefetch=prefetch, progress=lambda p: seen.append(p.bytes))
+
+            self.assertEqual(out.getvalue(), b''.join(responder.iter_content()))
+            self.assertEqual((stats.chunks, stats.bytes), (4, 350_000))
+            self.assertEqual(seen, [100_000, 200_000, 300_000, 350_000])
+            self.assertEqual(len(responder.ended), 1)
+
+    def test_session_is_ended_on_server_error(self):
+        responder = TmxExportResponder(total_bytes=350_000, chunk_bytes=100_000, fail_at_chunk=2)
+
+        with self.assertRaises(mq.MemoqSoapError):
+            self.export(responder, io.BytesIO())
+
+        self.assertEqual(len(responder.ended), 1)
+
+    def test_failure_to_end_the_session_keeps_the_first_error(self):
+        exporter = TmxExportResponder(total_bytes=350_000, chunk_bytes=100_000, fail_at_chunk=2)
+
+        def responder(path, soap_action, body):
+            if soap_action.endswith('/EndChunkedTMXExport'):
+                raise Disconnect()
+            return exporter(path, soap_action, body)
+
+        with self.assertLogs('src.memoq_tmx', 'WARNING'), self.assertRaises(mq.MemoqSoapError):
+            self.export(responder, io.BytesIO())
+
+    def test_session_is_ended_on_write_error(self):
+        responder = TmxExportResponder(total_bytes=350_000, chunk_bytes=100_000)
+
+        with self.assertRaises(OSError):
+            self.export(responder, FailingFile())
+
+        self.assertEqual(len(responder.ended), 1)
+
+    def test_memory_is_bounded_by_the_chunk_size(self):
+        responder = TmxExportResponder(total_bytes=64 << 20, chunk_bytes=1 << 20)
+        expected = hashlib.sha256()
+        for piece in responder.iter_content():
+            expected.update(piece)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tm.tmx')
+            tracemalloc.start()
+            try:
+                self.export(responder, path, prefetch=1)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            with open(path, 'rb') as exported:
+                actual = hashlib.file_digest(exported, 'sha256')
+
+        self.assertEqual(actual.hexdigest(), expected.hexdigest())
+        # Two decoded chunks in hand plus parser and socket buffers, for a 64 MB TM.
+        self.assertLess(peak, 8 << 20)
+
+
+class TestMemoqTmImport(unittest.TestCase):
+
+    data = bytes(range(256)) * 1000
+
+    def import_tmx(self, responder, source, **kwargs):
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            return tm.MemoqTm(soap).import_tmx('tm-guid', source, **kwargs)
+
+    def test_import_from_file_and_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tm.tmx')
+            with open(path, 'wb') as file:
+                file.write(self.data)
+            for open_source in (lambda: path, lambda: io.BytesIO(self.data)):
+                for prefetch in (0, 1, 3):
+                    responder = TmxImportResponder()
+                    seen = []
+
+                    stats = self.import_tmx(responder, open_source(), chunk_size=100_000, prefetch=prefetch,
+                                            progress=lambda p: seen.append(p.bytes))
+
+                    self.assertEqual(responder.digest, hashlib.sha256(self.data).hexdigest())
+                    self.assertEqual(responder.chunk_sizes, [100_000, 100_000, 56_000])
+                    self.assertEqual(seen, [100_000, 200_000, 256_000])
+                    self.assertEqual(stats.result, {'AllSegmentCount': '3', 'ImportedSegmentCount': '3'})
+
+    def test_empty_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'empty.tmx')
+            open(path, 'wb').close()
+            responder = TmxImportResponder()
+
+            stats = self.import_tmx(responder, path)
+
+        self.assertEqual((stats.chunks, responder.chunk_sizes, len(responder.ended)), (0, [], 1))
+
+    def test_session_is_not_ended_on_server_error(self):
+        responder = TmxImportResponder(fail_at_chunk=1)
+
+        with self.assertRaises(mq.MemoqSoapError):
+            self.import_tmx(responder, io.BytesIO(self.data), chunk_size=100_000)
+
+        # Ending the session would import the chunk it already holds.
+        self.assertEqual((responder.ended, responder.imported_bytes), ([], None))
+
+
+class TestMemoqTmResume(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.directory.name, 'transfer.json')
+        self.tmx = os.path.join(self.directory.name, 'tm.tmx')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def retry_until_done(self, transfer, attempts=5):
+        failures = 0
+        for _ in range(attempts):
+            try:
+                return transfer(), failures
+            except OSError:
+                failures += 1
+                self.assertTrue(os.path.exists(self.state))
+        self.fail('transfer did not complete')
+
+    def test_export_resumes_after_disconnects(self):
+        responder = TmxExportResponder(total_bytes=1_000_000, chunk_bytes=100_000, disconnect_chunks={2, 3, 7})
+        with StubSoapServer(responder=responder, record=True) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap)
+            stats, failures = self.retry_until_done(
+                lambda: tm_client.export_tmx('tm-guid', self.tmx, checkpoint=self.state))
+            actions = [soap_action.rsplit('/', 1)[-1] for _, soap_action, _ in server.requests]
+
+        # The chunks cut off were lost to their sessions, yet the file has every byte, once.
+        with open(self.tmx, 'rb') as exported:
+            self.assertEqual(exported.read(), b''.join(responder.iter_content()))
+        self.assertEqual(failures, 3)
+        self.assertEqual(stats.resumed_bytes + stats.bytes, 1_000_000)
+        self.assertEqual(stats.resumed_bytes, 700_000)
+        # Every attempt runs in a session of its own, which is ended.
+        self.assertEqual((actions.count('BeginChunkedTMXExport'), actions.count('EndChunkedTMXExport')), (4, 4))
+        self.assertFalse(responder.offsets)
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_export_starts_over_when_the_output_changed(self):
+        responder = TmxExportResponder(total_bytes=500_000, chunk_bytes=100_000, disconnect_chunks={3})
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap)
+            with self.assertRaises(OSError):
+                tm_client.export_tmx('tm-guid', self.tmx, checkpoint=self.state)
+            with open(self.tmx, 'r+b') as damaged:
+                damaged.write(b'X')
+
+            stats = tm_client.export_tmx('tm-guid', self.tmx, checkpoint=self.state)
+
+        with open(self.tmx, 'rb') as exported:
+            self.assertEqual(exported.read(), b''.join(responder.iter_content()))
+        self.assertEqual((stats.resumed_bytes, stats.bytes), (0, 500_000))
+
+    def test_export_starts_over_when_the_tm_changed(self):
+        tmx = bytes(range(256)) * 2000
+        responder = FixedTmxExportResponder(tmx, chunk_bytes=100_000, disconnect_chunks={3})
+        with StubSoapServer(responder=responder, record=True) as server, \
+                mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap)
+            with self.assertRaises(OSError):
+                tm_client.export_tmx('tm-guid', self.tmx, checkpoint=self.state)
+            responder.tmx = tmx[:1000] + b'changed' + tmx[1000:]
+            responder.total_bytes = len(responder.tmx)
+
+            stats = tm_client.export_tmx('tm-guid', self.tmx, checkpoint=self.state)
+            sessions = [soap_action for _, soap_action, _ in server.requests].count(
+                'http://kilgray.com/memoqservices/2007/ITMService/BeginChunkedTMXExport')
+
+        with open(self.tmx, 'rb') as exported:
+            self.assertEqual(exported.read(), responder.tmx)
+        self.assertEqual((stats.resumed_bytes, stats.bytes), (0, len(responder.tmx)))
+        self.assertEqual(sessions, 3)
+
+    def test_import_resumes_after_lost_acknowledgements(self):
+        data = b''.join(TmxExportResponder(total_bytes=1_000_000).iter_content())
+        with open(self.tmx, 'wb') as file:
+            file.write(data)
+        for prefetch in (0, 2):
+            responder = TmxImportResponder(disconnect_chunks={1, 4, 9})
+            with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+                tm_client = tm.MemoqTm(soap)
+                stats, failures = self.retry_until_done(
+                    lambda: tm_client.import_tmx('tm-guid', self.tmx, chunk_size=100_000, prefetch=prefetch,
+                                                 checkpoint=self.state))
+
+            self.assertEqual(failures, 3)
+            # The server kept each chunk whose answer was lost: resending it in the same session would have
+            # imported it twice. Only the session that got the whole file, once, is ended.
+            self.assertEqual(responder.digest, hashlib.sha256(data).hexdigest())
+            self.assertEqual(responder.imported_bytes, 1_000_000)
+            self.assertEqual(len(responder.ended), 1)
+            self.assertEqual((stats.resumed_bytes, stats.bytes), (0, 1_000_000))
+            self.assertFalse(os.path.exists(self.state))
+
+    def test_import_resumes_in_its_session_when_no_chunk_was_in_flight(self):
+        data = bytes(range(256)) * 2000
+        responder = TmxImportResponder()
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap)
+            source = FlakyStream(data, fail_at=300_000)
+            stats, failures = self.retry_until_done(
+                lambda: tm_client.import_tmx('tm-guid', source, chunk_size=100_000, prefetch=0,
+                                             checkpoint=self.state))
+
+        self.assertEqual(failures, 1)
+        self.assertEqual(responder.digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(responder.imported_bytes, len(data))
+        self.assertEqual(len(responder.ended), 1)
+        self.assertEqual(stats.resumed_bytes, 300_000)
+
+    def test_import_from_a_seekable_stream(self):
+        data = bytes(range(256)) * 1000
+        responder = TmxImportResponder(disconnect_chunks={1})
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap)
+            source = io.BytesIO(data)
+            self.retry_until_done(lambda: tm_client.import_tmx('tm-guid', source, chunk_size=100_000,
+                                                               checkpoint=self.state))
+
+        self.assertEqual(responder.digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(responder.imported_bytes, len(data))
+
+
+class FlakyStream(io.BytesIO):
+    """ A stream whose first read past fail_at fails, as a disk or network share might. """
+
+    def __init__(self, data, fail_at):
+        super().__init__(data)
+        self.fail_at = fail_at
+
+    def readinto(self, buffer):
+        if self.fail_at is not None and self.tell() >= self.fail_at:
+            self.fail_at = None
+            raise OSError('read failed')
+        return super().readinto(buffer)
+
+
+class EntryResponder:
+    """ Accepts AddOrUpdateEntry calls, failing those whose source contains FAIL. """
+
+    def __init__(self):
+        self.sources = []
+        self.lock = threading.Lock()
+
+    def __call__(self, path, soap_action, body):
+        source = re.search(rb'<SourceSegment>&lt;seg&gt;(.*?)&lt;/seg&gt;</SourceSegment>', body).group(1).decode()
+        with self.lock:
+            self.sources.append(source)
+        if 'FAIL' in source:
+            return 500, b'rejected'
+        return 200, soap_response('AddOrUpdateEntry', None)
+
+
+class TestMemoqTmBulkWrite(unittest.TestCase):
+
+    def test_add_or_update_entry(self):
+        soap_client = Mock(spec=mq.MemoqSoap)
+        soap_client.make_soap_request.return_value = (200, None)
+
+        tm.MemoqTm(soap_client).add_or_update_entry('a < b', 'c', 'tm-guid')
+
+        kwargs = soap_client.make_soap_request.call_args.kwargs
+        self.assertEqual((kwargs['action'], kwargs['tmGuid']), ('AddOrUpdateEntry', 'tm-guid'))
+        self.assertEqual(kwargs['entry'], {'SourceSegment': '<seg>a &lt; b</seg>', 'TargetSegment': '<seg>c</seg>'})
+
+    def test_bulk_write_reports_each_failure(self):
+        entries = [(f'source {i} FAIL' if i % 97 == 0 else f'source {i}', f'target {i}') for i in range(1000)]
+        entries[5] = {'source': 'source 5', 'target': 'target 5', 'Client': 'Acme'}
+        responder = EntryResponder()
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            result = tm.MemoqTm(soap).add_or_update_entries('tm-guid', entries, batch_size=50, max_workers=4)
+
+        failed = [i for i in range(1000) if i % 97 == 0]
+        self.assertEqual((result.mode, result.total, result.failed), ('entries', 1000, len(failed)))
+        self.assertEqual([index for index, _ in result.errors], failed)
+        self.assertTrue(result.is_ok(5))
+        self.assertEqual(sorted(responder.sources), sorted(f'source {i} FAIL' if i % 97 == 0 else f'source {i}'
+                                                           for i in range(1000)))
+
+    def test_bulk_write_applies_backpressure(self):
+        responder = EntryResponder()
+        consumed = []
+        ahead = []
+
+        def entries():
+            for i in range(2000):
+                consumed.append(i)
+                ahead.append(len(consumed) - len(responder.sources))
+                yield f'source {i}', f'target {i}'
+
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            result = tm.MemoqTm(soap).add_or_update_entries('tm-guid', entries(), batch_size=10, max_workers=2,
+                                                            tmx_threshold=None)
+
+        self.assertEqual(result.succeeded, 2000)
+        # At most 2 * max_workers batches queued or in progress, plus the one being filled.
+        self.assertLessEqual(max(ahead), 5 * 10)
+
+    def test_large_volumes_go_through_tmx_import(self):
+        entries = [(f'source {i} & more', f'target {i}') for i in range(300)]
+        expected = io.BytesIO()
+        tm.write_tmx(expected, entries, 'eng', 'ger')
+        responder = TmxImportResponder()
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            result = tm.MemoqTm(soap).add_or_update_entries('tm-guid', iter(entries), tmx_threshold=100,
+                                                            source_lang='eng', target_lang='ger', chunk_size=4096)
+
+        self.assertEqual((result.mode, result.total, result.succeeded), ('tmx', 300, 300))
+        self.assertEqual(responder.digest, hashlib.sha256(expected.getvalue()).hexdigest())
+        self.assertGreater(len(responder.chunk_sizes), 1)
+
+
+class LookupResponder:
+    """ Answers LookupSegment calls with one hit echoing the segment, failing segments that contain FAIL. """
+
+    def __init__(self):
+        self.segments = []
+        self.lock = threading.Lock()
+
+    def __call__(self, path, soap_action, body):
+        segment = re.search(rb'<string>&lt;seg&gt;(.*?)&lt;/seg&gt;</string>', body).group(1).decode()
+        with self.lock:
+            self.segments.append(segment)
+        if 'FAIL' in segment:
+            return 500, b'rejected'
+        return 200, soap_response('LookupSegment', f'<SegmentResult><TMHits><TMHit><MatchRate>100</MatchRate>'
+                                                   f'<Segment>{segment}</Segment></TMHit></TMHits></SegmentResult>')
+
+
+class TestMemoqTmLookup(unittest.TestCase):
+
+    def test_lookup_segment(self):
+        soap_client = Mock(spec=mq.MemoqSoap)
+        soap_client.make_soap_request.return_value = (200, {'TMHits': None})
+
+        tm.MemoqTm(soap_client).lookup_segment('a < b', '', 'tm-guid', {'Options': {'MatchThreshold': 75}})
+
+        kwargs = soap_client.make_soap_request.call_args.kwargs
+        self.assertEqual((kwargs['action'], kwargs['tmGuid']), ('LookupSegment', 'tm-guid'))
+        self.assertEqual(kwargs['request'], {'Options': {'MatchThreshold': 75},
+                                             'Segments': {'string': ['<seg>a &lt; b</seg>']}})
+
+    def test_concordance(self):
+        soap_client = Mock(spec=mq.MemoqSoap)
+        soap_client.make_soap_request.return_value = (200, {})
+
+        tm.MemoqTm(soap_client).concordance('contract', '', 'tm-guid', {})
+
+        kwargs = soap_client.make_soap_request.call_args.kwargs
+        self.assertEqual((kwargs['action'], kwargs['request']), ('Concordance', {'Expression': {'string': ['contract']}}))
+
+    def test_identical_requests_are_sent_once(self):
+        options = {'Options': {'MatchThreshold': 75, 'ReverseLookup': False}}
+        reordered = {'Options': {'ReverseLookup': False, 'MatchThreshold': 75}}
+        requests = [(f'segment {i % 10}', '', 'tm-guid', options if i % 2 else reordered) for i in range(100)]
+        requests.append(('segment 0', '', 'other-guid', options))
+        requests.append(('segment FAIL', '', 'tm-guid', options))
+        responder = LookupResponder()
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            batch = tm.MemoqTm(soap).lookup_segments(requests, max_workers=4)
+
+        self.assertEqual(len(batch), 102)
+        self.assertEqual((batch.unique, batch.calls, len(responder.segments)), (12, 12, 12))
+        self.assertAlmostEqual(batch.dedup_ratio, 1 - 12 / 102)
+        self.assertEqual([index for index, _ in batch.errors], [101])
+        self.assertEqual(batch[13][1]['TMHits']['TMHit']['Segment'], 'segment 3')
+
+    def test_memo_answers_repeated_segments_across_jobs(self):
+        responder = LookupResponder()
+        memo = ResponseCache(ttls={'LookupSegment': 3600}, maxsize=100)
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap, lookup_cache=memo)
+            first = tm_client.lookup_segments([(f'segment {i}', '', 'tm-guid', None) for i in range(10)])
+            second = tm_client.lookup_segments([(f'segment {i}', '', 'tm-guid', None) for i in range(5, 15)])
+            failed = [tm_client.lookup_segments([('segment FAIL', '', 'tm-guid', None)]) for _ in range(2)]
+
+        self.assertEqual((first.calls, first.hit_rate), (10, 0.0))
+        self.assertEqual((second.calls, second.hit_rate), (5, 0.5))
+        # Errors are not memoized.
+        self.assertEqual([batch.calls for batch in failed], [1, 1])
+        self.assertEqual(len(responder.segments), 17)
+
+    def test_writes_drop_the_memoized_answers_of_their_tm(self):
+        lookups = LookupResponder()
+
+        def responder(path, soap_action, body):
+            if soap_action.endswith('/AddOrUpdateEntry'):
+                return 200, soap_response('AddOrUpdateEntry', None)
+            return lookups(path, soap_action, body)
+
+        memo = ResponseCache(ttls={'LookupSegment': 3600}, maxsize=100)
+        requests = [('segment 1', '', 'tm-guid', None), ('segment 1', '', 'other-guid', None)]
+        with StubSoapServer(responder=responder) as server, mq.MemoqSoap(server.url, "some_key") as soap:
+            tm_client = tm.MemoqTm(soap, lookup_cache=memo)
+            tm_client.lookup_segments(requests)
+            self.assertEqual(tm_client.add_or_update_entry('segment 1', 'target', 'tm-guid')[0], 200)
+            after_entry = tm_client.lookup_segments(requests)
+            tm_client.add_or_update_entries('other-guid', [('segment 1', 'target')], tmx_threshold=None)
+            after_entries = tm_client.lookup_segments(requests)
+
+        self.assertEqual((after_entry.calls, after_entries.calls), (1, 1))
+        self.assertEqual(len(lookups.segments), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+
+from src import memoq_soap as mq
+from src.memoq_transport import PerCallTransport, PooledTransport
+from tests.stub_server import StubSoapServer
+
+
+class TestPooledTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubSoapServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_connections_are_reused(self):
+        with mq.MemoqSoap(self.server.url, "some_key") as soap:
+            for _ in range(5):
+                status, data = soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                                      memoq_type='TMInfo', action='ListTMs')
+                self.assertEqual(status, 200)
+
+        self.assertEqual(self.server.connection_count, 1)
+
+    def test_per_call_transport_opens_a_connection_per_call(self):
+        with mq.MemoqSoap(self.server.url, "some_key", transport=PerCallTransport()) as soap:
+            for _ in range(3):
+                soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                       memoq_type='TMInfo', action='ListTMs')
+
+        self.assertEqual(self.server.connection_count, 3)
+
+    def test_route_pool_sizes(self):
+        transport = PooledTransport(pool_maxsize=2, route_pool_sizes={'/memoqservices/tb/TBService': 8})
+        url = f'{self.server.url}/memoqservices/tb/TBService'
+        transport.send('memoqservices/tb/TBService', url, data=b'', headers={'SOAPAction': 'x/ListTBs'})
+
+        adapter = transport.session.get_adapter(url)
+        self.assertEqual(adapter._pool_maxsize, 8)
+        self.assertEqual(transport.session.get_adapter(self.server.url)._pool_maxsize, 2)
+        transport.close()
+
+    def test_route_adapters_are_mounted_before_the_first_call(self):
+        with mq.MemoqSoap(self.server.url, "some_key", pool_maxsize=2,
+                          route_pool_sizes={'memoqservices/tm/TMService': 8}) as soap:
+            adapters = dict(soap.transport.session.adapters)
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='TMInfo', action='ListTMs')
+
+            # Sending mounts nothing: threads sending at once never see the adapters change.
+            self.assertEqual(dict(soap.transport.session.adapters), adapters)
+            self.assertEqual(adapters[soap.service_url('memoqservices/tm/TMService')]._pool_maxsize, 8)
+
+    def test_timeout_is_passed_to_transport(self):
+        soap = mq.MemoqSoap(self.server.url, "some_key", timeout=(3.0, 30.0))
+        with patch.object(soap.transport, 'send', wraps=soap.transport.send) as send:
+            soap.make_soap_request(route='memoqservices/tm/TMService', interface='ITMService',
+                                   memoq_type='TMInfo', action='ListTMs')
+        self.assertEqual(send.call_args.kwargs['timeout'], (3.0, 30.0))
+        soap.close()
+
+
+if __name__ == '__main__':
+    unittest.main()